@@ -18,7 +18,7 @@ class Analytics:
             
             properties = properties or {}
             
-            conn = await get_db_connection()
+            conn = await get_db_connection("background")
             try:
                 await conn.execute(
                     "INSERT INTO analytics_events (user_id, event, properties, timestamp) VALUES ($1, $2, $3, $4)",
@@ -75,7 +75,7 @@ class Analytics:
         try:
             from db_postgresql import get_db_connection, release_db_connection
             
-            conn = await get_db_connection()
+            conn = await get_db_connection("analytics")
             try:
                 start_date = datetime.now() - timedelta(days=days)
                 
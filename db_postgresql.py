@@ -4,32 +4,151 @@ import os
 import asyncio
 import asyncpg
 import re
-from typing import Optional, List, Dict, Any
+import time
+import itertools
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 import json
 from error_handler import log_error_with_context
+from localization import get_localization
+from schema_migrations import run_migrations
+from metrics import DB_POOL_ACQUIRE_SECONDS, register_collector
 import logging
 
 logger = logging.getLogger(__name__)
 
-# 🔗 ПУЛ ПОДКЛЮЧЕНИЙ
+# 🌍 Локализация бота (каталоги загружаются при первом обращении к языку)
+_localization = get_localization()
+
+# 🔗 ПУЛЫ ПОДКЛЮЧЕНИЙ
+#
+# Отдельный пул на каждый профиль нагрузки, чтобы фоновые задачи
+# (планировщики Garmin и лекарств, очереди, GDPR) и тяжелые отчеты
+# не забирали соединения у обработчиков пользователей:
+#   - interactive: обработчики бота и веб-кабинет
+#   - background:  планировщики, очереди, фоновые записи
+#   - analytics:   тяжелые агрегирующие запросы (сверки, отчеты)
+# Профиль, для которого пул не создан, использует пул interactive.
+POOL_PROFILES = {
+    "interactive": {
+        "min_size": int(os.getenv("DB_POOL_INTERACTIVE_MIN", "2")),
+        "max_size": int(os.getenv("DB_POOL_INTERACTIVE_MAX", "10")),
+        "command_timeout": float(os.getenv("DB_POOL_INTERACTIVE_COMMAND_TIMEOUT", "60")),
+        "acquire_timeout": float(os.getenv("DB_POOL_INTERACTIVE_ACQUIRE_TIMEOUT", "30")),
+    },
+    "background": {
+        "min_size": int(os.getenv("DB_POOL_BACKGROUND_MIN", "1")),
+        "max_size": int(os.getenv("DB_POOL_BACKGROUND_MAX", "4")),
+        "command_timeout": float(os.getenv("DB_POOL_BACKGROUND_COMMAND_TIMEOUT", "120")),
+        "acquire_timeout": float(os.getenv("DB_POOL_BACKGROUND_ACQUIRE_TIMEOUT", "60")),
+    },
+    "analytics": {
+        "min_size": int(os.getenv("DB_POOL_ANALYTICS_MIN", "0")),
+        "max_size": int(os.getenv("DB_POOL_ANALYTICS_MAX", "2")),
+        "command_timeout": float(os.getenv("DB_POOL_ANALYTICS_COMMAND_TIMEOUT", "600")),
+        "acquire_timeout": float(os.getenv("DB_POOL_ANALYTICS_ACQUIRE_TIMEOUT", "120")),
+    },
+}
+
+DEFAULT_POOL_PROFILE = "interactive"
+
+# Кэш подготовленных запросов asyncpg. 0 - выключен (обязательно при
+# подключении через PgBouncer в режиме transaction); при прямом подключении
+# к PostgreSQL можно включить, например DB_STATEMENT_CACHE_SIZE=100.
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "0"))
+
+db_pools: Dict[str, asyncpg.Pool] = {}
+
+# Пул interactive (для совместимости: vector_db, health check)
 db_pool: Optional[asyncpg.Pool] = None
 
-async def get_db_connection():
-    """Получить соединение с базой данных"""
-    global db_pool
+# Из какого пула выдано соединение (для release_db_connection)
+_connection_pools: Dict[int, asyncpg.Pool] = {}
+
+_pool_counters: Dict[str, Dict[str, float]] = {}
+
+def _resolve_profile(profile: str) -> str:
+    return profile if profile in db_pools else DEFAULT_POOL_PROFILE
+
+async def get_db_connection(profile: str = DEFAULT_POOL_PROFILE):
+    """Получить соединение с базой данных из пула профиля"""
     if db_pool is None:
         raise Exception("❌ База данных не инициализирована")
-    return await db_pool.acquire()
+
+    profile = _resolve_profile(profile)
+    pool = db_pools[profile]
+    counters = _pool_counters[profile]
+
+    started = time.monotonic()
+    try:
+        connection = await pool.acquire(timeout=POOL_PROFILES[profile]["acquire_timeout"])
+    except asyncio.TimeoutError:
+        counters["acquire_timeouts"] += 1
+        raise
+    waited = time.monotonic() - started
+    DB_POOL_ACQUIRE_SECONDS.observe(waited, profile=profile)
+
+    counters["acquired"] += 1
+    counters["wait_total"] += waited
+    counters["wait_max"] = max(counters["wait_max"], waited)
+    _connection_pools[id(connection)] = pool
+    return connection
 
 async def release_db_connection(connection):
-    """Освободить соединение"""
-    global db_pool
-    if db_pool:
-        await db_pool.release(connection)
+    """Освободить соединение (вернуть в пул, из которого оно выдано)"""
+    pool = _connection_pools.pop(id(connection), None) or db_pool
+    if pool:
+        await pool.release(connection)
+
+def get_pool_stats() -> Dict[str, Dict]:
+    """Статистика пулов соединений по профилям"""
+    stats = {}
+    for profile, pool in db_pools.items():
+        counters = _pool_counters[profile]
+        size = pool.get_size()
+        idle = pool.get_idle_size()
+        stats[profile] = {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "min_size": pool.get_min_size(),
+            "max_size": pool.get_max_size(),
+            "acquired": int(counters["acquired"]),
+            "acquire_timeouts": int(counters["acquire_timeouts"]),
+            "avg_wait_ms": round(counters["wait_total"] / counters["acquired"] * 1000, 2) if counters["acquired"] else 0.0,
+            "max_wait_ms": round(counters["wait_max"] * 1000, 2),
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        }
+    return stats
+
+def _collect_pool_metrics():
+    """Состояние пулов для /metrics"""
+    stats = get_pool_stats()
+    return [
+        ("db_pool_connections", "gauge", "Соединения пула по состоянию", [
+            ({"profile": profile, "state": state}, pool[state])
+            for profile, pool in stats.items() for state in ("in_use", "idle")
+        ]),
+        ("db_pool_max_connections", "gauge", "Максимальный размер пула", [
+            ({"profile": profile}, pool["max_size"]) for profile, pool in stats.items()
+        ]),
+        ("db_pool_acquire_timeouts_total", "counter", "Таймауты ожидания соединения", [
+            ({"profile": profile}, pool["acquire_timeouts"]) for profile, pool in stats.items()
+        ]),
+    ]
+
+register_collector(_collect_pool_metrics)
+
+async def initialize_db_pool(max_connections: Optional[int] = None,
+                             profiles: Tuple[str, ...] = tuple(POOL_PROFILES)):
+    """
+    Инициализация пулов соединений PostgreSQL
 
-async def initialize_db_pool(max_connections: int = 10):
-    """Инициализация пула соединений PostgreSQL"""
+    Args:
+        max_connections: размер пула interactive (по умолчанию из POOL_PROFILES)
+        profiles: какие пулы создать (остальные профили используют interactive)
+    """
     global db_pool
     
     # 🔗 Получаем URL базы данных
@@ -44,16 +163,25 @@ async def initialize_db_pool(max_connections: int = 10):
         db_password = os.getenv("DB_PASSWORD", "")
         
         database_url = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+    profiles = tuple(dict.fromkeys((DEFAULT_POOL_PROFILE,) + tuple(profiles)))
     
     try:
         print("🔗 Подключение к PostgreSQL...")
-        db_pool = await asyncpg.create_pool(
-            database_url,
-            min_size=2,
-            max_size=max_connections,
-            command_timeout=60,
-            statement_cache_size=0
-        )
+        for profile in profiles:
+            config = POOL_PROFILES[profile]
+            max_size = max_connections if profile == DEFAULT_POOL_PROFILE and max_connections else config["max_size"]
+            db_pools[profile] = await asyncpg.create_pool(
+                database_url,
+                min_size=min(config["min_size"], max_size),
+                max_size=max_size,
+                command_timeout=config["command_timeout"],
+                statement_cache_size=DB_STATEMENT_CACHE_SIZE
+            )
+            _pool_counters[profile] = {"acquired": 0, "acquire_timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+        db_pool = db_pools[DEFAULT_POOL_PROFILE]
+        pools_info = ", ".join(f"{name} ({pool.get_max_size()})" for name, pool in db_pools.items())
+        print(f"🔗 Пулы соединений: {pools_info}; кэш запросов: {DB_STATEMENT_CACHE_SIZE or 'выключен'}")
         
         # ✅ Тестируем подключение
         async with db_pool.acquire() as conn:
@@ -69,605 +197,35 @@ async def initialize_db_pool(max_connections: int = 10):
         raise
 
 async def close_db_pool():
-    """Закрытие пула соединений"""
+    """Закрытие пулов соединений"""
     global db_pool
-    if db_pool:
-        await db_pool.close()
+    for pool in db_pools.values():
+        await pool.close()
+    db_pools.clear()
+    _connection_pools.clear()
+    db_pool = None
 
 async def create_tables():
-    """Создание всех таблиц медицинского бота для Railway (включая Garmin) - ОБНОВЛЕНО"""
-    
-    # 🔧 СНАЧАЛА подключаем pgvector расширение
-    pgvector_setup = """
-    -- Подключаем расширение pgvector (если не подключено)
-    CREATE EXTENSION IF NOT EXISTS vector;
-    """
-    
-    tables_sql = """
-    -- 👤 ТАБЛИЦА ПОЛЬЗОВАТЕЛЕЙ
-    CREATE TABLE IF NOT EXISTS users (
-        user_id BIGINT PRIMARY KEY,
-        name TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        birth_year INTEGER,
-        gender TEXT,
-        height_cm INTEGER,
-        weight_kg REAL,
-        chronic_conditions TEXT,
-        medications TEXT,
-        allergies TEXT,
-        smoking TEXT,
-        alcohol TEXT,
-        physical_activity TEXT,
-        family_history TEXT,
-        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        language TEXT DEFAULT 'ru',
-        gdpr_consent BOOLEAN DEFAULT FALSE,
-        gdpr_consent_time TIMESTAMP DEFAULT NULL,
-        total_messages_count INTEGER DEFAULT 0,
-        
-        -- 🆕 Колонки для веб-авторизации
-        google_id VARCHAR(255) UNIQUE,
-        email VARCHAR(255) UNIQUE,
-        registration_source VARCHAR(20) DEFAULT 'telegram'
-    );
-
-    -- 💬 ИСТОРИЯ ЧАТА
-    CREATE TABLE IF NOT EXISTS chat_history (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        role TEXT NOT NULL,
-        message TEXT NOT NULL,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-
-    -- 📄 ДОКУМЕНТЫ
-    CREATE TABLE IF NOT EXISTS documents (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        title TEXT,
-        file_path TEXT,
-        file_type TEXT,
-        raw_text TEXT,
-        summary TEXT,
-        confirmed BOOLEAN DEFAULT FALSE,
-        uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        vector_id TEXT
-    );
-
-    -- 🧠 ВЕКТОРЫ ДОКУМЕНТОВ (pgvector) - ЭТА ТАБЛИЦА ВАЖНА!
-    CREATE TABLE IF NOT EXISTS document_vectors (
-        id SERIAL PRIMARY KEY,
-        document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        chunk_index INTEGER NOT NULL,
-        chunk_text TEXT NOT NULL,
-        embedding vector(1536),  -- OpenAI embeddings размер
-        metadata JSONB DEFAULT '{}',
-        keywords TEXT DEFAULT '',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        
-        -- 🔍 УНИКАЛЬНЫЙ ИНДЕКС
-        CONSTRAINT unique_chunk UNIQUE(document_id, chunk_index)
-    );
-
-    -- 💊 ЛЕКАРСТВА
-    CREATE TABLE IF NOT EXISTS medications (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        name TEXT NOT NULL,
-        time TEXT,
-        label TEXT
-    );
-
-    -- 📊 ЛИМИТЫ ПОЛЬЗОВАТЕЛЕЙ
-    CREATE TABLE IF NOT EXISTS user_limits (
-        user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
-        documents_left INTEGER DEFAULT 2,
-        gpt4o_queries_left INTEGER DEFAULT 10,
-        subscription_type TEXT DEFAULT 'free',
-        subscription_expires_at TIMESTAMP,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-
-    -- 💳 ТРАНЗАКЦИИ
-    CREATE TABLE IF NOT EXISTS transactions (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        stripe_session_id TEXT UNIQUE,
-        amount_usd REAL,
-        package_type TEXT,
-        status TEXT DEFAULT 'pending',
-        payment_method TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        completed_at TIMESTAMP,
-        package_id TEXT,
-        documents_granted INTEGER DEFAULT 0,
-        queries_granted INTEGER DEFAULT 0,
-        promo_code TEXT
-    );
-
-    -- 📦 ПАКЕТЫ ПОДПИСОК
-    CREATE TABLE IF NOT EXISTS subscription_packages (
-        id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        price_usd REAL NOT NULL,
-        documents_included INTEGER DEFAULT 0,
-        gpt4o_queries_included INTEGER DEFAULT 0,
-        type TEXT DEFAULT 'one_time',
-        is_active BOOLEAN DEFAULT TRUE,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-
-    -- 🔄 ПОДПИСКИ ПОЛЬЗОВАТЕЛЕЙ
-    CREATE TABLE IF NOT EXISTS user_subscriptions (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        stripe_subscription_id TEXT UNIQUE,
-        package_id TEXT REFERENCES subscription_packages(id),
-        status TEXT DEFAULT 'active',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        cancelled_at TIMESTAMP
-    );
-
-    -- 🧠 РЕЗЮМЕ РАЗГОВОРОВ
-    CREATE TABLE IF NOT EXISTS conversation_summary (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        summary_text TEXT,
-        last_message_id INTEGER,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-
-    -- 📋 МЕДИЦИНСКАЯ КАРТА ПАЦИЕНТА
-    CREATE TABLE IF NOT EXISTS medical_timeline (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        source_document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
-        event_date DATE NOT NULL,
-        category TEXT DEFAULT 'general' CHECK (category IN ('diagnosis', 'treatment', 'test', 'procedure', 'general')),
-        importance TEXT DEFAULT 'normal' CHECK (importance IN ('critical', 'important', 'normal')),
-        description TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-
-    -- 📊 АНАЛИТИКА
-    CREATE TABLE IF NOT EXISTS analytics_events (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT NOT NULL,
-        event TEXT NOT NULL,
-        properties JSONB DEFAULT '{}',
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-
-    -- ================================
-    -- 🏃 ТАБЛИЦЫ GARMIN ИНТЕГРАЦИИ
-    -- ================================
-
-    -- 📱 ПОДКЛЮЧЕНИЯ К GARMIN (УПРОЩЕННАЯ ВЕРСИЯ)
-    CREATE TABLE IF NOT EXISTS garmin_connections (
-        user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
-        garmin_email TEXT NOT NULL, -- Зашифрованный email
-        garmin_password TEXT NOT NULL, -- Зашифрованный пароль
-        is_active BOOLEAN DEFAULT TRUE,
-        last_sync_date DATE, -- Последняя дата синхронизации
-        sync_errors INTEGER DEFAULT 0, -- Счетчик ошибок подключения
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-
-    -- 📊 ЕЖЕДНЕВНЫЕ ДАННЫЕ ЗДОРОВЬЯ ИЗ GARMIN (РАСШИРЕННАЯ ВЕРСИЯ)
-    CREATE TABLE IF NOT EXISTS garmin_daily_data (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        data_date DATE NOT NULL, -- Дата данных
-        
-        -- Базовая активность
-        steps INTEGER,
-        calories INTEGER,
-        floors_climbed INTEGER,
-        distance_meters INTEGER,
-        
-        -- Данные сна (основные)
-        sleep_duration_minutes INTEGER,
-        sleep_deep_minutes INTEGER,
-        sleep_light_minutes INTEGER,
-        sleep_rem_minutes INTEGER,
-        sleep_awake_minutes INTEGER,
-        sleep_score INTEGER, -- 0-100
-        
-        -- НОВЫЕ: Дополнительные данные сна
-        nap_duration_minutes INTEGER,
-        sleep_need_minutes INTEGER,
-        sleep_baseline_minutes INTEGER,
-        
-        -- Пульс (основные)
-        resting_heart_rate INTEGER,
-        avg_heart_rate INTEGER,
-        max_heart_rate INTEGER,
-        hrv_rmssd REAL, -- Вариабельность пульса
-        
-        -- НОВЫЕ: Дополнительные данные пульса
-        min_heart_rate INTEGER,
-        heart_rate_measurements INTEGER,
-        hr_zone_rest_percent REAL,
-        hr_zone_aerobic_percent REAL,
-        resting_heart_rate_7day_avg INTEGER,
-        
-        -- Стресс и энергия (основные)
-        stress_avg INTEGER, -- 0-100
-        stress_max INTEGER,
-        body_battery_max INTEGER, -- 0-100
-        body_battery_min INTEGER,
-        body_battery_charged INTEGER, -- Восстановление энергии
-        body_battery_drained INTEGER, -- Трата энергии
-        body_battery_after_sleep INTEGER,
-        
-        -- НОВЫЕ: Дополнительные данные стресса
-        stress_min INTEGER,
-        stress_high_periods_count INTEGER,
-        stress_low_periods_count INTEGER,
-        
-        -- НОВЫЕ: Дополнительные данные Body Battery
-        body_battery_avg REAL,
-        body_battery_stress_events INTEGER,
-        body_battery_recovery_events INTEGER,
-        body_battery_activity_events INTEGER,
-        
-        -- Кислород и дыхание
-        spo2_avg REAL, -- Кислород в крови %
-        respiration_avg REAL, -- Частота дыхания
-        
-        -- Готовность и фитнес (основные)
-        training_readiness INTEGER, -- 0-100
-        vo2_max REAL,
-        fitness_age INTEGER,
-        
-        -- НОВЫЕ: Расширенные данные готовности
-        training_readiness_status TEXT,
-        readiness_sleep_factor INTEGER,
-        readiness_hrv_factor INTEGER,
-        readiness_stress_factor INTEGER,
-        
-        -- НОВЫЕ: Данные активности
-        active_periods_15min INTEGER,
-        sedentary_periods_15min INTEGER,
-        sleep_periods_15min INTEGER,
-        total_calories INTEGER,
-        vigorous_intensity_minutes INTEGER,
-        moderate_intensity_minutes INTEGER,
-        
-        -- Тренировки (основные)
-        activities_count INTEGER DEFAULT 0,
-        activities_duration_minutes INTEGER DEFAULT 0,
-        activities_calories INTEGER DEFAULT 0,
-        activities_data JSONB, -- Детали тренировок
-        
-        -- НОВЫЕ: Дополнительные данные тренировок
-        activities_types TEXT,
-        activities_max_intensity INTEGER,
-        
-        -- НОВЫЕ: HRV данные
-        hrv_status TEXT,
-        hrv_baseline REAL,
-        
-        -- НОВЫЕ: Тренировочный статус
-        training_status TEXT,
-        training_load_7day INTEGER,
-        
-        -- НОВЫЕ: Дополнительные биометрические данные
-        body_temperature REAL,
-        hydration_ml INTEGER,
-        menstrual_cycle_phase TEXT,
-        
-        -- НОВЫЕ: Метаданные качества данных
-        data_completeness_score REAL,
-        last_sync_quality TEXT,
-        
-        -- Служебные поля
-        sync_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        data_quality JSONB, -- Какие данные доступны
-        
-        UNIQUE(user_id, data_date) -- Одна запись на день
-    );
-
-    -- 🧠 ИСТОРИЯ AI АНАЛИЗОВ GARMIN
-    CREATE TABLE IF NOT EXISTS garmin_analysis_history (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-        analysis_date DATE NOT NULL,
-        data_period TEXT DEFAULT '1_day', -- 1_day, 7_days, 30_days
-        
-        -- Анализ от AI
-        analysis_text TEXT NOT NULL,
-        recommendations TEXT,
-        health_score REAL, -- Общая оценка здоровья 0-100
-        
-        -- Тренды
-        sleep_trend TEXT, -- improving, stable, declining
-        activity_trend TEXT,
-        stress_trend TEXT,
-        recovery_trend TEXT,
-        
-        -- Использованные лимиты
-        used_consultation_limit BOOLEAN DEFAULT TRUE,
-        gpt_model_used TEXT DEFAULT 'gpt-4o', -- ИСПРАВЛЕНО: используем реальную модель
-        
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        
-        UNIQUE(user_id, analysis_date) -- Один анализ в день
-    );
-
-    -- ⚙️ НАСТРОЙКИ АНАЛИЗА GARMIN (дополнительные)
-    CREATE TABLE IF NOT EXISTS garmin_analysis_settings (
-        user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
-        
-        -- Персонализация анализа
-        focus_areas TEXT[], -- ['sleep', 'activity', 'stress', 'recovery']
-        goals JSONB, -- Цели пользователя
-        medical_conditions TEXT[], -- Учитывать медицинские состояния
-        
-        -- Уведомления
-        enable_daily_analysis BOOLEAN DEFAULT TRUE,
-        enable_weekly_summary BOOLEAN DEFAULT TRUE,
-        enable_alerts BOOLEAN DEFAULT TRUE, -- Предупреждения о проблемах
-        
-        -- Пороги для алертов
-        min_sleep_hours REAL DEFAULT 6.0,
-        max_stress_threshold INTEGER DEFAULT 80,
-        min_body_battery INTEGER DEFAULT 20,
-        target_steps INTEGER DEFAULT 10000,
-        
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-
-    -- Таблица времени последнего сна
-    CREATE TABLE IF NOT EXISTS garmin_users_sleep_tracking (
-        user_id BIGINT PRIMARY KEY,
-        last_analyzed_sleep_duration INTEGER, -- Время сна в минутах для сравнения
-        last_analysis_time TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-    );
-    -- ============================================
-    -- 🔗 ТАБЛИЦА ДЛЯ ПРИВЯЗКИ АККАУНТОВ
-    -- ============================================
-    
-    CREATE TABLE IF NOT EXISTS account_links (
-        link_code VARCHAR(6) PRIMARY KEY,
-        telegram_user_id BIGINT,
-        web_user_id BIGINT,
-        direction VARCHAR(20),
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        expires_at TIMESTAMP NOT NULL,
-        is_used BOOLEAN DEFAULT FALSE
-    );
-
-    CREATE INDEX IF NOT EXISTS idx_account_links_telegram ON account_links(telegram_user_id);
-    CREATE INDEX IF NOT EXISTS idx_account_links_web ON account_links(web_user_id);
-    CREATE INDEX IF NOT EXISTS idx_account_links_active ON account_links(link_code) WHERE is_used = FALSE;
-
-    """
-    
-    # НОВАЯ СЕКЦИЯ: Миграция для добавления полей в существующие таблицы
-    migration_sql = """
-    -- ================================
-    -- 🔄 МИГРАЦИЯ: Добавление новых полей в существующие таблицы
-    -- ================================
-    
-    -- Добавляем новые поля в garmin_daily_data (если их еще нет)
-    DO $$ 
-    BEGIN
-        -- Проверяем и добавляем новые поля
-        IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
-                      WHERE table_name = 'garmin_daily_data' AND column_name = 'nap_duration_minutes') THEN
-            ALTER TABLE garmin_daily_data ADD COLUMN nap_duration_minutes INTEGER;
-        END IF;
-        
-        IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
-                      WHERE table_name = 'garmin_daily_data' AND column_name = 'data_completeness_score') THEN
-            ALTER TABLE garmin_daily_data ADD COLUMN data_completeness_score REAL;
-        END IF;
-        
-        IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
-                      WHERE table_name = 'garmin_daily_data' AND column_name = 'last_sync_quality') THEN
-            ALTER TABLE garmin_daily_data ADD COLUMN last_sync_quality TEXT;
-        END IF;
-        
-        -- Добавляем все остальные поля одним блоком (PostgreSQL игнорирует IF NOT EXISTS если поле уже есть)
-        BEGIN
-            ALTER TABLE garmin_daily_data 
-                ADD COLUMN IF NOT EXISTS sleep_need_minutes INTEGER,
-                ADD COLUMN IF NOT EXISTS sleep_baseline_minutes INTEGER,
-                ADD COLUMN IF NOT EXISTS body_battery_avg REAL,
-                ADD COLUMN IF NOT EXISTS body_battery_stress_events INTEGER,
-                ADD COLUMN IF NOT EXISTS body_battery_recovery_events INTEGER,
-                ADD COLUMN IF NOT EXISTS body_battery_activity_events INTEGER,
-                ADD COLUMN IF NOT EXISTS stress_min INTEGER,
-                ADD COLUMN IF NOT EXISTS stress_high_periods_count INTEGER,
-                ADD COLUMN IF NOT EXISTS stress_low_periods_count INTEGER,
-                ADD COLUMN IF NOT EXISTS min_heart_rate INTEGER,
-                ADD COLUMN IF NOT EXISTS heart_rate_measurements INTEGER,
-                ADD COLUMN IF NOT EXISTS hr_zone_rest_percent REAL,
-                ADD COLUMN IF NOT EXISTS hr_zone_aerobic_percent REAL,
-                ADD COLUMN IF NOT EXISTS resting_heart_rate_7day_avg INTEGER,
-                ADD COLUMN IF NOT EXISTS active_periods_15min INTEGER,
-                ADD COLUMN IF NOT EXISTS sedentary_periods_15min INTEGER,
-                ADD COLUMN IF NOT EXISTS sleep_periods_15min INTEGER,
-                ADD COLUMN IF NOT EXISTS total_calories INTEGER,
-                ADD COLUMN IF NOT EXISTS vigorous_intensity_minutes INTEGER,
-                ADD COLUMN IF NOT EXISTS moderate_intensity_minutes INTEGER,
-                ADD COLUMN IF NOT EXISTS activities_types TEXT,
-                ADD COLUMN IF NOT EXISTS activities_max_intensity INTEGER,
-                ADD COLUMN IF NOT EXISTS hrv_status TEXT,
-                ADD COLUMN IF NOT EXISTS hrv_baseline REAL,
-                ADD COLUMN IF NOT EXISTS training_readiness_status TEXT,
-                ADD COLUMN IF NOT EXISTS readiness_sleep_factor INTEGER,
-                ADD COLUMN IF NOT EXISTS readiness_hrv_factor INTEGER,
-                ADD COLUMN IF NOT EXISTS readiness_stress_factor INTEGER,
-                ADD COLUMN IF NOT EXISTS training_status TEXT,
-                ADD COLUMN IF NOT EXISTS training_load_7day INTEGER,
-                ADD COLUMN IF NOT EXISTS body_temperature REAL,
-                ADD COLUMN IF NOT EXISTS hydration_ml INTEGER,
-                ADD COLUMN IF NOT EXISTS menstrual_cycle_phase TEXT;
-        EXCEPTION WHEN OTHERS THEN
-            -- Игнорируем ошибки если поля уже существуют
-            NULL;
-        END;
-    END $$;
-    """
-
-    indices_sql = """
-    -- ================================
-    -- 📊 ИНДЕКСЫ ДЛЯ ВЕКТОРНОГО ПОИСКА (ВАЖНО!)
-    -- ================================
-    CREATE INDEX IF NOT EXISTS idx_document_vectors_user_id ON document_vectors(user_id);
-    CREATE INDEX IF NOT EXISTS idx_document_vectors_document_id ON document_vectors(document_id);
-    CREATE INDEX IF NOT EXISTS idx_document_vectors_embedding ON document_vectors USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
-    CREATE INDEX IF NOT EXISTS idx_document_vectors_keywords ON document_vectors USING gin(to_tsvector('russian', keywords));
-
-    -- ================================
-    -- 📊 ИНДЕКСЫ ДЛЯ GARMIN ТАБЛИЦ (ВКЛЮЧАЯ НОВЫЕ ПОЛЯ)
-    -- ================================
-    
-    -- Индексы для быстрого поиска данных Garmin
-    CREATE INDEX IF NOT EXISTS idx_garmin_daily_data_user_date ON garmin_daily_data(user_id, data_date DESC);
-    CREATE INDEX IF NOT EXISTS idx_garmin_daily_data_date ON garmin_daily_data(data_date DESC);
-    CREATE INDEX IF NOT EXISTS idx_garmin_analysis_user_date ON garmin_analysis_history(user_id, analysis_date DESC);
-    CREATE INDEX IF NOT EXISTS idx_garmin_connections_active ON garmin_connections(user_id) WHERE is_active = TRUE;
-    CREATE INDEX IF NOT EXISTS idx_garmin_connections_sync_errors ON garmin_connections(sync_errors) WHERE sync_errors >= 5;
-    
-    -- НОВЫЕ индексы для новых полей
-    CREATE INDEX IF NOT EXISTS idx_garmin_daily_completeness ON garmin_daily_data(data_completeness_score) WHERE data_completeness_score IS NOT NULL;
-    CREATE INDEX IF NOT EXISTS idx_garmin_daily_sync_quality ON garmin_daily_data(last_sync_quality) WHERE last_sync_quality IS NOT NULL;
-    CREATE INDEX IF NOT EXISTS idx_garmin_daily_training_status ON garmin_daily_data(user_id, training_status) WHERE training_status IS NOT NULL;
-
-    -- ================================
-    -- 📊 ОСТАЛЬНЫЕ ИНДЕКСЫ
-    -- ================================
-    CREATE INDEX IF NOT EXISTS idx_analytics_user_id ON analytics_events(user_id);
-    CREATE INDEX IF NOT EXISTS idx_analytics_event ON analytics_events(event);
-    CREATE INDEX IF NOT EXISTS idx_analytics_timestamp ON analytics_events(timestamp);
-    CREATE INDEX IF NOT EXISTS idx_analytics_user_event ON analytics_events(user_id, event);
-    CREATE INDEX IF NOT EXISTS idx_medical_timeline_user_date ON medical_timeline(user_id, event_date DESC);
-    CREATE INDEX IF NOT EXISTS idx_medical_timeline_user_importance ON medical_timeline(user_id, importance);
-    CREATE INDEX IF NOT EXISTS idx_medical_timeline_category ON medical_timeline(user_id, category);
-    CREATE INDEX IF NOT EXISTS idx_chat_history_user_id ON chat_history(user_id);
-    CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id);
-    CREATE INDEX IF NOT EXISTS idx_medications_user_id ON medications(user_id);
-    CREATE INDEX IF NOT EXISTS idx_transactions_user_id ON transactions(user_id);
-    CREATE INDEX IF NOT EXISTS idx_user_subscriptions_user_id ON user_subscriptions(user_id);
-    CREATE INDEX IF NOT EXISTS idx_users_gdpr_consent ON users(gdpr_consent);
-    CREATE INDEX IF NOT EXISTS idx_sleep_tracking_user ON garmin_users_sleep_tracking(user_id);
-    """
-
-    functions_sql = """
-    -- ================================
-    -- 🔄 ФУНКЦИИ И ТРИГГЕРЫ
-    -- ================================
-
-    -- Функция для обновления timestamps
-    CREATE OR REPLACE FUNCTION update_medical_timeline_timestamp()
-    RETURNS TRIGGER AS $$
-    BEGIN
-        NEW.updated_at = CURRENT_TIMESTAMP;
-        RETURN NEW;
-    END;
-    $$ LANGUAGE plpgsql;
-
-    -- Функция очистки старых данных Garmin (старше 1 года)
-    CREATE OR REPLACE FUNCTION cleanup_old_garmin_data()
-    RETURNS INTEGER AS $$
-    DECLARE
-        deleted_count INTEGER;
-    BEGIN
-        -- Удаляем данные старше 1 года
-        DELETE FROM garmin_daily_data 
-        WHERE data_date < CURRENT_DATE - INTERVAL '1 year';
-        
-        GET DIAGNOSTICS deleted_count = ROW_COUNT;
-        
-        -- Удаляем анализы старше 6 месяцев
-        DELETE FROM garmin_analysis_history 
-        WHERE analysis_date < CURRENT_DATE - INTERVAL '6 months';
-        
-        -- Логируем результат (если есть таблица логов)
-        BEGIN
-            INSERT INTO analytics_events (user_id, event, properties) 
-            VALUES (0, 'garmin_cleanup', json_build_object('deleted_records', deleted_count)::jsonb);
-        EXCEPTION WHEN OTHERS THEN
-            -- Игнорируем ошибки логирования
-        END;
-        
-        RETURN deleted_count;
-    END;
-    $$ LANGUAGE plpgsql;
-
-    -- Триггер для medical_timeline
-    DO $$ 
-    BEGIN
-        IF NOT EXISTS (
-            SELECT 1 FROM pg_trigger 
-            WHERE tgname = 'medical_timeline_update_timestamp'
-        ) THEN
-            CREATE TRIGGER medical_timeline_update_timestamp
-                BEFORE UPDATE ON medical_timeline
-                FOR EACH ROW
-                EXECUTE FUNCTION update_medical_timeline_timestamp();
-        END IF;
-    END $$;
     """
+    Приведение схемы к актуальной версии (см. schema_migrations.py и migrations/)
 
-    comments_sql = """
-    -- ================================
-    -- 📝 КОММЕНТАРИИ К ТАБЛИЦАМ И НОВЫМ ПОЛЯМ
-    -- ================================
-    COMMENT ON COLUMN users.gdpr_consent IS 'Пользователь дал согласие на обработку данных (GDPR)';
-    COMMENT ON COLUMN users.gdpr_consent_time IS 'Время когда пользователь дал согласие GDPR';
-    COMMENT ON TABLE document_vectors IS 'Векторные эмбеддинги документов для семантического поиска';
-    
-    -- Комментарии для Garmin таблиц
-    COMMENT ON TABLE garmin_connections IS 'Подключения пользователей к Garmin Connect';
-    COMMENT ON TABLE garmin_daily_data IS 'Ежедневные данные здоровья из часов Garmin (расширенная версия)';  
-    COMMENT ON TABLE garmin_analysis_history IS 'История AI анализов данных Garmin';
-    COMMENT ON TABLE garmin_analysis_settings IS 'Настройки персонализации анализа Garmin';
-    COMMENT ON TABLE garmin_users_sleep_tracking IS 'Простое отслеживание сна по продолжительности';
-    COMMENT ON COLUMN garmin_connections.garmin_email IS 'Зашифрованный email от Garmin Connect';
-    COMMENT ON COLUMN garmin_connections.garmin_password IS 'Зашифрованный пароль от Garmin Connect';
-    COMMENT ON COLUMN garmin_connections.sync_errors IS 'Счетчик ошибок синхронизации (при >= 5 пользователь деактивируется)';
-    COMMENT ON COLUMN garmin_daily_data.data_quality IS 'JSON с информацией о качестве и доступности данных';
-    
-    -- Комментарии к новым полям
-    COMMENT ON COLUMN garmin_daily_data.nap_duration_minutes IS 'Длительность дневного сна в минутах';
-    COMMENT ON COLUMN garmin_daily_data.data_completeness_score IS 'Оценка полноты собранных данных от 0 до 100';
-    COMMENT ON COLUMN garmin_daily_data.last_sync_quality IS 'Качество последней синхронизации: good, partial, poor';
-    COMMENT ON COLUMN garmin_daily_data.body_battery_stress_events IS 'Количество стрессовых событий влияющих на Body Battery';
-    COMMENT ON COLUMN garmin_daily_data.heart_rate_measurements IS 'Количество измерений пульса за день';
-    COMMENT ON COLUMN garmin_daily_data.training_readiness_status IS 'Статус готовности к тренировкам: optimal, good, fair, poor';
+    Схема актуальна - один SELECT из schema_migrations; иначе применяются
+    только новые миграции под advisory lock.
     """
-
+    conn = await get_db_connection()
     try:
-        conn = await get_db_connection()
-        
-        # Выполняем создание таблиц по частям
-        await conn.execute(pgvector_setup)
-        await conn.execute(tables_sql)
-        await conn.execute(migration_sql)  # НОВОЕ: выполняем миграцию
-        await conn.execute(indices_sql)
-        await conn.execute(functions_sql)
-        await conn.execute(comments_sql)
-        
-        await release_db_connection(conn)
-        logger.info("✅ Все таблицы и миграции созданы успешно")
-        
+        result = await run_migrations(conn)
+        if result["applied"]:
+            logger.info(f"✅ Применены миграции: {', '.join(result['applied'])}")
+        else:
+            logger.info(f"✅ Схема БД актуальна (версия {result['current_version']})")
     except Exception as e:
-        logger.error(f"❌ Ошибка создания таблиц: {e}")
-        if 'conn' in locals():
-            await release_db_connection(conn)
+        logger.error(f"❌ Ошибка миграции схемы: {e}")
         raise
-        
+    finally:
+        await release_db_connection(conn)
+
+
 # 👤 ФУНКЦИИ ДЛЯ РАБОТЫ С ПОЛЬЗОВАТЕЛЯМИ
 async def get_user(user_id: int) -> Optional[Dict]:
     """Получить данные пользователя"""
@@ -741,13 +299,17 @@ async def update_user_medications(user_id: int, medications: List[Dict]) -> bool
                 "INSERT INTO medications (user_id, name, time, label) VALUES ($1, $2, $3, $4)",
                 user_id, med['name'], med['time'], med['label']
             )
-        return True
     except Exception as e:
         log_error_with_context(e, {"function": "update_user_medications", "user_id": user_id})
         return False
     finally:
         await release_db_connection(conn)
 
+    # 🔔 Пересчитываем напоминания пользователя (без полной перезагрузки расписания)
+    from medication_notifications import reschedule_user_medications
+    await reschedule_user_medications(user_id, medications)
+    return True
+
 # 💳 ФУНКЦИИ ДЛЯ РАБОТЫ С ЛИМИТАМИ И ПОДПИСКАМИ
 async def get_user_limits(user_id: int) -> Dict:
     """Получить лимиты пользователя"""
@@ -964,24 +526,17 @@ async def set_user_language(user_id: int, language: str, telegram_user=None) ->
         await release_db_connection(conn)
 
 def t(key: str, lang: str = "ru", **kwargs) -> str:
-    """Функция локализации (исправленная)"""
+    """Функция локализации (каталоги locales.py, см. localization.py)"""
     try:
-        from locales import translations
-        
-        # Получаем переводы для указанного языка
-        lang_translations = translations.get(lang, translations.get('ru', {}))
-        text = lang_translations.get(key, key)
-        
-        # Форматируем с параметрами если они есть
-        return text.format(**kwargs) if kwargs else text
+        # Неизвестный язык - русский каталог; форматирование только для шаблонов
+        return _localization.translate("bot", key, lang, kwargs, fallback_lang="ru")
     except Exception as e:
         # Fallback в случае ошибки
         return key
 
 def get_all_values_for_key(key: str) -> List[str]:
-    """Получить все значения для ключа локализации"""
-    from locales import translations
-    return [lang_data.get(key) for lang_data in translations.values() if key in lang_data]
+    """Получить все значения для ключа локализации (кэшируется)"""
+    return _localization.values_for_key("bot", key)
 
 # 👤 ДОПОЛНИТЕЛЬНЫЕ ФУНКЦИИ ПРОФИЛЯ
 async def get_user_profile(user_id: int) -> Dict:
@@ -1016,78 +571,15 @@ async def get_user_medications_text(user_id: int) -> str:
 async def delete_user_completely(user_id: int) -> bool:
     """
     GDPR-совместимое удаление пользователя
-    Удаляет ВСЕ данные: файлы + база + векторы + Stripe
+    Удаляет ВСЕ данные: Stripe + база (одна транзакция) + файлы (через очередь удаления)
     """
-    conn = await get_db_connection()
     try:
-        # 1. Получаем список файлов для удаления
-        documents = await conn.fetch(
-            "SELECT file_path FROM documents WHERE user_id = $1", 
-            user_id
-        )
-        
-        # 2. Удаляем физические файлы
-        import os
-        for doc in documents:
-            file_path = doc['file_path']
-            if file_path and file_path != "memory_note" and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except OSError as e:
-                    pass
-        
-        # 3. ✅ НОВОЕ: Удаляем данные из Stripe (GDPR)
-        try:
-            from stripe_manager import StripeGDPRManager
-            await StripeGDPRManager.delete_user_stripe_data_gdpr(user_id)
-        except Exception as e:
-            pass
-        
-        # 4. Удаляем из базы данных (в правильном порядке)
-        tables_to_clear = [
-            "chat_history",
-            "conversation_summary", 
-            "medical_timeline",
-            "medications",
-            "documents",
-            "user_limits",
-            "transactions", 
-            "user_subscriptions",
-            "analytics_events",
-            "users"  # В последнюю очередь
-        ]
-        
-        for table in tables_to_clear:
-            try:
-                await conn.execute(f"DELETE FROM {table} WHERE user_id = $1", user_id)
-            except Exception as e:
-                pass
-        
-        # 5. Удаляем векторы
-        try:
-            from vector_db_postgresql import delete_all_chunks_by_user
-            await delete_all_chunks_by_user(user_id)
-        except Exception as e:
-            pass
-        
-        # 6. Логируем удаление в аналитику (в самом конце)
-        try:
-            from analytics_system import Analytics
-            await Analytics.track(user_id, "user_data_deleted_gdpr", {
-                "timestamp": datetime.now().isoformat(),
-                "reason": "user_request",
-                "stripe_cleaned": True
-            })
-        except Exception as e:
-            pass
-        
-        return True
-        
+        from gdpr_purge import get_purge_engine
+        result = await get_purge_engine().purge_users([user_id])
+        return not result["failed_user_ids"]
     except Exception as e:
         log_error_with_context(e, {"function": "delete_user_completely", "user_id": user_id})
         return False
-    finally:
-        await release_db_connection(conn)
 
 async def update_user_field(user_id: int, field: str, value: Any) -> bool:
     """Совместимость: update_user_field -> update_user_profile"""
@@ -1182,22 +674,89 @@ async def update_document_confirmed(document_id: int, confirmed: int) -> bool:
     finally:
         await release_db_connection(conn)
 
-async def get_documents_by_user(user_id: int, limit: int = 999) -> List[Dict]:
-    """Получить документы пользователя"""
+async def get_documents_by_user(user_id: int, limit: int = 20) -> List[Dict]:
+    """Получить документы пользователя (только метаданные, без текста)"""
+    documents, _ = await get_documents_page(user_id, limit=limit)
+    return documents
+
+# 📄 ПОСТРАНИЧНЫЙ СПИСОК ДОКУМЕНТОВ (keyset-пагинация)
+
+def encode_documents_cursor(uploaded_at: datetime, document_id: int) -> str:
+    """Курсор страницы = последний показанный документ (дата загрузки + id)"""
+    return f"{uploaded_at.isoformat()}|{document_id}"
+
+def decode_documents_cursor(cursor: str):
+    """(дата загрузки, id) из курсора; ValueError, если курсор не разобрать"""
+    try:
+        uploaded_at, document_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(uploaded_at), int(document_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Некорректный курсор страницы документов: {cursor!r}") from None
+
+async def get_documents_page(user_id: int, limit: int = 5, cursor: Optional[str] = None,
+                             confirmed_only: bool = True):
+    """
+    Страница документов пользователя: (документы, курсор следующей страницы или None)
+
+    Возвращает только метаданные (без raw_text и summary). Следующая страница
+    читается по индексу (user_id, uploaded_at DESC, id DESC) от позиции курсора,
+    без OFFSET, поэтому стоимость не растет с номером страницы.
+
+    Raises:
+        ValueError: курсор не удалось разобрать
+    """
+    position = decode_documents_cursor(cursor) if cursor else None
     conn = await get_db_connection()
     try:
         rows = await conn.fetch(
-            """SELECT id, title, file_type, uploaded_at as date 
-               FROM documents 
-               WHERE user_id = $1 AND confirmed = TRUE
-               ORDER BY uploaded_at DESC 
-               LIMIT $2""",
-            user_id, limit
+            """SELECT id, title, file_type, uploaded_at as date
+               FROM documents
+               WHERE user_id = $1
+                 AND ($2 = FALSE OR confirmed = TRUE)
+                 AND ($3::timestamp IS NULL OR (uploaded_at, id) < ($3::timestamp, $4::int))
+               ORDER BY uploaded_at DESC, id DESC
+               LIMIT $5""",
+            user_id, confirmed_only,
+            position[0] if position else None, position[1] if position else None,
+            limit + 1
         )
-        return [dict(row) for row in rows]
+        documents = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit and documents[-1]["date"] is not None:
+            next_cursor = encode_documents_cursor(documents[-1]["date"], documents[-1]["id"])
+        return documents, next_cursor
     except Exception as e:
-        log_error_with_context(e, {"function": "get_documents_by_user", "user_id": user_id})
-        return []
+        log_error_with_context(e, {"function": "get_documents_page", "user_id": user_id})
+        return [], None
+    finally:
+        await release_db_connection(conn)
+
+async def get_document_body(document_id: int, user_id: int, known_etag: Optional[str] = None) -> Optional[Dict]:
+    """
+    Текст документа по запросу (для ленивой загрузки в веб-кабинете)
+
+    etag считается в БД по содержимому; если он совпал с known_etag,
+    raw_text и summary не передаются (ответ 304 без чтения текста клиентом).
+    """
+    conn = await get_db_connection()
+    try:
+        row = await conn.fetchrow(
+            """SELECT d.id, d.uploaded_at, h.etag,
+                      CASE WHEN h.etag = $3 THEN NULL ELSE d.raw_text END AS raw_text,
+                      CASE WHEN h.etag = $3 THEN NULL ELSE d.summary END AS summary
+               FROM documents d,
+                    LATERAL (SELECT md5(COALESCE(d.raw_text, '') || '|' || COALESCE(d.summary, '')) AS etag) h
+               WHERE d.id = $1 AND d.user_id = $2""",
+            document_id, user_id, known_etag
+        )
+        if not row:
+            return None
+        result = dict(row)
+        result["not_modified"] = known_etag is not None and result["etag"] == known_etag
+        return result
+    except Exception as e:
+        log_error_with_context(e, {"function": "get_document_body", "document_id": document_id})
+        return None
     finally:
         await release_db_connection(conn)
 
@@ -1231,13 +790,17 @@ async def replace_medications(user_id: int, new_list: List[Dict]) -> bool:
                 "INSERT INTO medications (user_id, name, time, label) VALUES ($1, $2, $3, $4)",
                 user_id, med.get('name', ''), med.get('time', ''), med.get('label', '')
             )
-        return True
     except Exception as e:
         log_error_with_context(e, {"function": "replace_medications", "user_id": user_id})
         return False
     finally:
         await release_db_connection(conn)
 
+    # 🔔 Пересчитываем напоминания пользователя (без полной перезагрузки расписания)
+    from medication_notifications import reschedule_user_medications
+    await reschedule_user_medications(user_id, new_list)
+    return True
+
 async def format_medications_schedule(user_id: int) -> str:
     """Форматировать расписание лекарств для пользователя"""
     conn = await get_db_connection()
@@ -1291,17 +854,15 @@ def validate_string(value, max_length=500, field_name="поле"):
     
     return value
 
+@lru_cache(maxsize=1024)
+def _convert_placeholders(query: str) -> str:
+    """Замена ? на $1, $2, ... (результат кэшируется по тексту запроса)"""
+    counter = itertools.count(1)
+    return re.sub(r'\?', lambda match: f"${next(counter)}", query)
+
 def convert_sql_to_postgresql(query: str, params: tuple) -> tuple:
     """Конвертирует SQLite запрос в PostgreSQL"""
-    placeholder_count = 0
-    
-    def replace_placeholder(match):
-        nonlocal placeholder_count
-        placeholder_count += 1
-        return f"${placeholder_count}"
-    
-    converted_query = re.sub(r'\?', replace_placeholder, query)
-    return converted_query, params
+    return _convert_placeholders(query), params
 
 async def fetch_one(query: str, params: tuple = ()):
     """Совместимая версия fetch_one с автоконвертацией SQLite → PostgreSQL"""
@@ -1406,70 +967,7 @@ async def delete_user_gdpr_compliant(user_id: int) -> bool:
     GDPR-совместимое удаление пользователя
     Удаляет ВСЕ данные пользователя из всех таблиц + файлы
     """
-    conn = await get_db_connection()
-    try:
-        # 1. Получаем список файлов для удаления
-        documents = await conn.fetch(
-            "SELECT file_path FROM documents WHERE user_id = $1", 
-            user_id
-        )
-        
-        # 2. Удаляем физические файлы
-        import os
-        for doc in documents:
-            file_path = doc['file_path']
-            if file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except OSError as e:
-                    pass
-        
-        # 3. Удаляем из базы данных (в правильном порядке)
-        tables_to_clear = [
-            "chat_history",
-            "conversation_summary", 
-            "document_vectors",  # Векторы документов
-            "medical_timeline",
-            "medications",
-            "documents",
-            "user_limits",
-            "transactions", 
-            "user_subscriptions",
-            "users"  # В последнюю очередь
-        ]
-        
-        for table in tables_to_clear:
-            try:
-                await conn.execute(f"DELETE FROM {table} WHERE user_id = $1", user_id)
-            except Exception as e:
-                pass
-        # 4. Удаляем векторы (если есть отдельная функция)
-        try:
-            from vector_db_postgresql import delete_all_chunks_by_user
-            await delete_all_chunks_by_user(user_id)
-
-        except Exception as e:
-            pass
-        # 5. Логируем удаление в аналитику (перед полным удалением)
-        try:
-            from analytics_system import Analytics
-            await Analytics.track(user_id, "user_data_deleted_gdpr", {
-                "timestamp": datetime.now().isoformat(),
-                "reason": "gdpr_request"
-            })
-        except Exception as e:
-            pass
-
-        return True
-        
-    except Exception as e:
-        log_error_with_context(e, {
-            "function": "delete_user_gdpr_compliant", 
-            "user_id": user_id
-        })
-        return False
-    finally:
-        await release_db_connection(conn)
+    return await delete_user_completely(user_id)
 
 async def get_last_message_id(user_id: int) -> int:
     """Получить ID последнего сообщения пользователя"""
@@ -0,0 +1,184 @@
+# document_pipeline.py - Конвейер обработки загруженных документов
+# Общий для Telegram-бота (upload.py) и веб-приложения (webapp/routes/api.py)
+
+import os
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from save_utils import send_to_gpt_vision
+from pdf_renderer import iter_pdf_pages
+from upload_buffer import UploadBuffer
+from gpt import ask_structured, is_medical_text, generate_medical_summary, generate_title_from_text
+
+logger = logging.getLogger(__name__)
+
+# Сколько страниц PDF одновременно отправляем в Vision
+PAGE_VISION_CONCURRENCY = int(os.getenv("PAGE_VISION_CONCURRENCY", "3"))
+
+
+async def _analyze_page(semaphore: asyncio.Semaphore, page: Union[str, bytes], lang: str,
+                        user_id: Optional[int] = None) -> str:
+    """Распознает одну страницу (путь или PNG bytes), ошибки страницы не прерывают весь документ"""
+    async with semaphore:
+        try:
+            page_text, _ = await send_to_gpt_vision(page, lang, user_id=user_id)
+            return (page_text or "").strip()
+        except Exception as page_error:
+            page_name = page if isinstance(page, str) else f"<{len(page)} bytes>"
+            logger.warning(f"Ошибка обработки страницы {page_name}: {page_error}")
+            return ""
+
+
+async def _cancel_tasks(tasks: List[asyncio.Task]):
+    """Отменяет незавершенные задачи и дожидается их остановки"""
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _iterate(paths: Iterable[str]) -> AsyncIterator[str]:
+    for path in paths:
+        yield path
+
+
+async def analyze_pages(image_paths: Union[List[str], AsyncIterator[Union[str, bytes]]], lang: str,
+                        concurrency: int = PAGE_VISION_CONCURRENCY,
+                        user_id: Optional[int] = None) -> Tuple[str, Optional[bool]]:
+    """
+    Распознает страницы параллельно (не больше concurrency одновременно)
+
+    Страницы могут приходить потоком (async-итератор от pdf_renderer):
+    каждая уходит в Vision сразу после растеризации, не дожидаясь остальных.
+    Проверка is_medical_text запускается сразу по первой странице, пока
+    остальные страницы еще распознаются. Если документ не медицинский -
+    оставшиеся страницы отменяются и в Vision не уходят.
+
+    Args:
+        image_paths: Страницы в порядке следования (пути или PNG bytes; список или async-итератор)
+        lang: Язык ответа
+        concurrency: Максимум одновременных запросов к Vision
+        user_id: Владелец документа (для кэша Vision)
+
+    Returns:
+        Tuple[vision_text, is_medical]: текст страниц в исходном порядке;
+        is_medical = None если текст не удалось извлечь ни с одной страницы
+    """
+    pages = _iterate(image_paths) if isinstance(image_paths, (list, tuple)) else image_paths
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks: List[asyncio.Task] = []
+    first_page_ready = asyncio.Event()
+
+    async def submit_pages():
+        # Ставим страницы в работу по мере их появления
+        try:
+            async for path in pages:
+                tasks.append(asyncio.create_task(_analyze_page(semaphore, path, lang, user_id)))
+                first_page_ready.set()
+        finally:
+            first_page_ready.set()
+
+    producer = asyncio.create_task(submit_pages())
+
+    try:
+        await first_page_ready.wait()
+        if not tasks:
+            await producer  # Пробрасываем ошибку растеризации, если она была
+            return "", None
+
+        # ✅ Первая страница обычно содержит всё, что нужно для классификации
+        first_text = await tasks[0]
+        is_medical = None
+
+        if first_text:
+            is_medical = await is_medical_text(first_text)
+            if not is_medical:
+                await _cancel_tasks([producer] + tasks[1:])
+                return first_text, False
+
+        await producer  # Все страницы поставлены в работу
+        page_texts = [first_text] + list(await asyncio.gather(*tasks[1:]))
+    except BaseException:
+        await _cancel_tasks([producer] + tasks)
+        raise
+
+    # Склеиваем строго в порядке страниц
+    vision_text = "\n\n".join(text for text in page_texts if text).strip()
+    if not vision_text:
+        return "", None
+
+    if is_medical is None:
+        # Первая страница пустая - классифицируем по остальным
+        is_medical = await is_medical_text(vision_text)
+
+    return vision_text, is_medical
+
+
+async def analyze_pdf(pdf_source: Union[str, UploadBuffer], pdf_info: Dict,
+                      output_dir: Optional[str], lang: str,
+                      user_id: Optional[int] = None) -> Tuple[str, Optional[bool]]:
+    """
+    Извлекает текст из PDF
+
+    Цифровые PDF (выгрузки из лабораторий) с нормальным текстовым слоем
+    обрабатываются без растеризации и Vision. Сканы растеризуются в пуле
+    процессов, и страницы потоком уходят в analyze_pages.
+
+    Args:
+        pdf_source: Путь к PDF или буфер загрузки (на диск попадает только
+            если нужна растеризация - poppler работает с файлами)
+        pdf_info: Результат pdf_renderer.inspect_pdf
+        output_dir: Папка для страниц-изображений (None - страницы в памяти)
+        lang: Язык ответа
+        user_id: Владелец документа (для кэша Vision)
+
+    Returns:
+        Tuple[vision_text, is_medical]: is_medical = None, если классификация
+        еще не выполнялась (текстовый слой) или текст не извлечен
+    """
+    if pdf_info.get("text_layer"):
+        logger.info(f"📄 PDF с текстовым слоем: {len(pdf_info['text_layer'])} стр., Vision не требуется")
+        return "\n\n".join(pdf_info["text_layer"]).strip(), None
+
+    if isinstance(pdf_source, UploadBuffer):
+        pdf_path = await pdf_source.ensure_path()
+    else:
+        pdf_path = pdf_source
+
+    return await analyze_pages(iter_pdf_pages(pdf_path, output_dir, pdf_info), lang, user_id=user_id)
+
+
+async def build_document_texts(vision_text: str, lang: str,
+                               title: Optional[str] = None) -> Tuple[str, str, str]:
+    """
+    Параллельно готовит заголовок, структурированный текст и резюме
+
+    Все три шага зависят только от vision_text, поэтому выполняются
+    одновременно (общий лимит задает OPENAI_SEMAPHORE в gpt.py).
+
+    Args:
+        vision_text: Распознанный текст документа
+        lang: Язык ответа
+        title: Готовый заголовок (если задан пользователем) - тогда не генерируем
+
+    Returns:
+        Tuple[title, raw_text, summary]
+    """
+    tasks = [
+        asyncio.create_task(ask_structured(vision_text[:8000], lang=lang)),
+        asyncio.create_task(generate_medical_summary(vision_text[:8000], lang)),
+    ]
+    if not title:
+        tasks.append(asyncio.create_task(generate_title_from_text(text=vision_text[:1500], lang=lang)))
+
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        await _cancel_tasks(tasks)
+        raise
+
+    raw_text, summary = results[0], results[1]
+    auto_title = title or results[2]
+    return auto_title, raw_text, summary
@@ -1,24 +1,50 @@
 import html
+from typing import Optional
 from aiogram import types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from registration import user_states
-from db_postgresql import get_documents_by_user, update_document_confirmed, get_user_language, t
+from db_postgresql import get_documents_page, update_document_confirmed, get_user_language, t
 from vector_db_postgresql import mark_chunks_unconfirmed
 
-async def handle_show_documents(target, user_id: int):
-    documents = await get_documents_by_user(user_id)
+# Документов на одной странице списка
+DOCUMENTS_PAGE_SIZE = 5
+
+async def handle_show_documents(target, user_id: int, page_step: Optional[int] = None):
+    """
+    Список документов постранично.
+
+    page_step=None - первая страница, +1 / -1 - следующая / предыдущая.
+    В состоянии храним курсоры начала уже открытых страниц: вперед идем по
+    курсору из БД, назад - по сохраненному.
+    """
     lang = await get_user_language(user_id)
 
+    state = user_states.get(user_id)
+    if page_step is None or not isinstance(state, dict) or state.get("mode") != "viewing_documents" \
+            or "cursors" not in state:
+        state = {"mode": "viewing_documents", "cursors": [None], "page": 0}
+    cursors = state["cursors"]
+    page = min(max(state["page"] + (page_step or 0), 0), len(cursors) - 1)
+
+    documents, next_cursor = await get_documents_page(user_id, limit=DOCUMENTS_PAGE_SIZE, cursor=cursors[page])
+
     if not documents:
-        await target.answer(t("no_documents", lang))
-        return
+        if page == 0:
+            await target.answer(t("no_documents", lang))
+            return
+        # Документы последней страницы удалены - возвращаемся на первую
+        page, cursors = 0, [None]
+        documents, next_cursor = await get_documents_page(user_id, limit=DOCUMENTS_PAGE_SIZE)
+        if not documents:
+            await target.answer(t("no_documents", lang))
+            return
 
-    if not isinstance(user_states.get(user_id), dict) or user_states[user_id].get("mode") != "viewing_documents":
-        user_states[user_id] = {"mode": "viewing_documents", "offset": 0}
-    offset = user_states[user_id]["offset"]
-    limited_docs = documents[offset:offset + 5]
+    cursors = cursors[:page + 1]
+    if next_cursor:
+        cursors.append(next_cursor)
+    user_states[user_id] = {"mode": "viewing_documents", "cursors": cursors, "page": page}
 
-    for doc in limited_docs:
+    for doc in documents:
         doc_id = doc["id"]
         title = html.escape(doc["title"])
         date = doc["date"]
@@ -43,18 +69,20 @@ async def handle_show_documents(target, user_id: int):
             reply_markup=keyboard
         )
 
-    # Добавляем кнопку "Показать ещё", если есть больше документов
-    if offset == 0 and len(documents) <= 5:
-        await target.answer(t("all_documents_shown", lang))
-    elif len(documents) > offset + 5:
-        remaining = len(documents) - (offset + 5)
-        more_button = InlineKeyboardMarkup(inline_keyboard=[[ 
-            InlineKeyboardButton(text=t("btn_show_more", lang), callback_data="more_docs")
-        ]])
-        await target.answer(t("more_documents", lang, count=remaining), reply_markup=more_button)
+    # Навигация по страницам
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton(text=t("btn_prev_page", lang), callback_data="docs_prev"))
+    if next_cursor:
+        nav_buttons.append(InlineKeyboardButton(text=t("btn_next_page", lang), callback_data="docs_next"))
 
-    else:
+    if not nav_buttons:
         await target.answer(t("all_documents_shown", lang))
+    else:
+        await target.answer(
+            t("documents_page", lang, page=page + 1),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[nav_buttons])
+        )
 
 async def handle_ignore_document(callback: types.CallbackQuery, doc_id: int):
     from db_postgresql import get_document_by_id
@@ -6,6 +6,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove
 from db_postgresql import t  # ✅ ИСПРАВЛЕНО: импортируем из db_postgresql
+from telegram_outbox import send_message, PRIORITY_INTERACTIVE
 import logging
 
 logger = logging.getLogger(__name__)
@@ -107,9 +108,9 @@ async def receive_feedback_message(message: types.Message, state: FSMContext, bo
     
     try:
         # ===== ШАГ 2.3: Отправляем админу с кнопкой =====
-        await bot.send_message(
-            chat_id=ADMIN_USER_ID,
-            text=admin_message,
+        await send_message(
+            bot, ADMIN_USER_ID, admin_message,
+            priority=PRIORITY_INTERACTIVE,
             reply_markup=admin_keyboard,
             parse_mode="HTML"
         )
@@ -220,9 +221,9 @@ async def send_admin_reply_to_user(message: types.Message, state: FSMContext, bo
     
     try:
         # ===== ШАГ 4.4: Отправляем ответ пользователю =====
-        await bot.send_message(
-            chat_id=target_user_id,
-            text=response_message,
+        await send_message(
+            bot, target_user_id, response_message,
+            priority=PRIORITY_INTERACTIVE,
             parse_mode="HTML"
         )
         
@@ -6,6 +6,7 @@ from datetime import datetime, date, timedelta
 from typing import Dict, Optional, List, Any
 
 from garmin_connector import garmin_connector
+from garmin_trends import garmin_trend_engine
 from db_postgresql import get_db_connection, release_db_connection, get_user_language
 from gpt import ask_doctor_gemini
 from save_utils import format_user_profile
@@ -36,9 +37,13 @@ class GarminAnalyzer:
             # Шаг 2: Получаем медицинский профиль пользователя
             user_profile = await self._get_user_medical_profile(user_id)
             
+            # Тренды за 7/30/90 дней (векторный расчет, кэш по последней дате данных);
+            # анализ запускает планировщик - пул background
+            trends = await garmin_trend_engine.get_user_trends(user_id, profile="background")
+            
             # Шаг 3: Формируем структурированные данные
             analysis_context = await self._prepare_analysis_context(
-                daily_data, historical_data, user_profile, lang
+                daily_data, historical_data, user_profile, lang, trends
             )
             
             # Шаг 4: Создаем AI анализ с помощью GPT-5
@@ -49,7 +54,7 @@ class GarminAnalyzer:
                 return None
             
             # Шаг 5: Парсим и структурируем ответ
-            analysis_result = await self._parse_ai_response(ai_response, daily_data)
+            analysis_result = await self._parse_ai_response(ai_response, daily_data, trends)
             
             # Шаг 6: Сохраняем анализ в БД
             saved = await self._save_analysis_to_db(user_id, analysis_result)
@@ -179,7 +184,7 @@ class GarminAnalyzer:
             return None
 
     async def _prepare_analysis_context(self, daily_data: Dict, historical_data: List[Dict], 
-                                  user_profile: Dict, lang: str) -> Dict:
+                                  user_profile: Dict, lang: str, trends: Optional[Dict] = None) -> Dict:
         """Подготовить контекст для AI анализа"""
         
         # Форматируем данные за текущий день
@@ -198,131 +203,10 @@ class GarminAnalyzer:
             'user_profile': user_profile,
             'current_day': current_day_summary,
             'historical_data': historical_summary,
+            'trends': (trends or {}).get('summary_text'),
             'last_analysis': last_analysis  # НОВОЕ ПОЛЕ
         }
 
-    def _calculate_trends(self, current: Dict, historical: List[Dict]) -> Dict:
-        """Вычислить тренды показателей здоровья"""
-        trends = {}
-        
-        try:
-            if len(historical) < 2:
-                return {
-                    'sleep_trend': 'insufficient_data',
-                    'activity_trend': 'insufficient_data', 
-                    'stress_trend': 'insufficient_data',
-                    'recovery_trend': 'insufficient_data'
-                }
-            
-            # Тренд сна (сравниваем последние 3 дня с предыдущими 3)
-            recent_sleep = []
-            older_sleep = []
-            
-            for i, day in enumerate(historical):
-                if day.get('sleep_duration_minutes'):
-                    if i < 3:
-                        recent_sleep.append(day['sleep_duration_minutes'])
-                    elif i < 6:
-                        older_sleep.append(day['sleep_duration_minutes'])
-            
-            if recent_sleep and older_sleep:
-                recent_avg = sum(recent_sleep) / len(recent_sleep)
-                older_avg = sum(older_sleep) / len(older_sleep)
-                
-                if recent_avg > older_avg + 30:  # Больше на 30 минут
-                    trends['sleep_trend'] = 'improving'
-                elif recent_avg < older_avg - 30:
-                    trends['sleep_trend'] = 'declining'
-                else:
-                    trends['sleep_trend'] = 'stable'
-            
-            # Аналогично для других показателей
-            trends.update(self._calculate_activity_trend(historical))
-            trends.update(self._calculate_stress_trend(historical))
-            trends.update(self._calculate_recovery_trend(historical))
-            
-            return trends
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка расчета трендов: {e}")
-            return {'sleep_trend': 'unknown', 'activity_trend': 'unknown', 
-                   'stress_trend': 'unknown', 'recovery_trend': 'unknown'}
-
-    def _calculate_activity_trend(self, historical: List[Dict]) -> Dict:
-        """Вычислить тренд активности"""
-        recent_steps = []
-        older_steps = []
-        
-        for i, day in enumerate(historical):
-            if day.get('steps'):
-                if i < 3:
-                    recent_steps.append(day['steps'])
-                elif i < 6:
-                    older_steps.append(day['steps'])
-        
-        if recent_steps and older_steps:
-            recent_avg = sum(recent_steps) / len(recent_steps)
-            older_avg = sum(older_steps) / len(older_steps)
-            
-            if recent_avg > older_avg * 1.1:  # Больше на 10%
-                return {'activity_trend': 'improving'}
-            elif recent_avg < older_avg * 0.9:
-                return {'activity_trend': 'declining'}
-            else:
-                return {'activity_trend': 'stable'}
-        
-        return {'activity_trend': 'insufficient_data'}
-
-    def _calculate_stress_trend(self, historical: List[Dict]) -> Dict:
-        """Вычислить тренд стресса"""
-        recent_stress = []
-        older_stress = []
-        
-        for i, day in enumerate(historical):
-            if day.get('stress_avg'):
-                if i < 3:
-                    recent_stress.append(day['stress_avg'])
-                elif i < 6:
-                    older_stress.append(day['stress_avg'])
-        
-        if recent_stress and older_stress:
-            recent_avg = sum(recent_stress) / len(recent_stress)
-            older_avg = sum(older_stress) / len(older_stress)
-            
-            if recent_avg < older_avg - 10:  # Стресс снизился
-                return {'stress_trend': 'improving'}
-            elif recent_avg > older_avg + 10:
-                return {'stress_trend': 'declining'}
-            else:
-                return {'stress_trend': 'stable'}
-        
-        return {'stress_trend': 'insufficient_data'}
-
-    def _calculate_recovery_trend(self, historical: List[Dict]) -> Dict:
-        """Вычислить тренд восстановления (Body Battery)"""
-        recent_recovery = []
-        older_recovery = []
-        
-        for i, day in enumerate(historical):
-            if day.get('body_battery_max'):
-                if i < 3:
-                    recent_recovery.append(day['body_battery_max'])
-                elif i < 6:
-                    older_recovery.append(day['body_battery_max'])
-        
-        if recent_recovery and older_recovery:
-            recent_avg = sum(recent_recovery) / len(recent_recovery)
-            older_avg = sum(older_recovery) / len(older_recovery)
-            
-            if recent_avg > older_avg + 5:  # Body Battery улучшается
-                return {'recovery_trend': 'improving'}
-            elif recent_avg < older_avg - 5:
-                return {'recovery_trend': 'declining'}
-            else:
-                return {'recovery_trend': 'stable'}
-        
-        return {'recovery_trend': 'insufficient_data'}
-
     def _format_current_day_data(self, daily_data: Dict) -> str:
         """
         Форматировать данные текущего дня для AI в JSON формате
@@ -336,7 +220,7 @@ class GarminAnalyzer:
             # Технические поля которые не нужны для анализа
             exclude_fields = {
                 'id', 'idx', 'user_id', 'sync_timestamp', 
-                'data_quality', 'activities_data'  # JSON поля исключаем
+                'data_quality', 'activities_data', 'endpoint_sync'  # JSON поля исключаем
             }
             
             # Фильтруем: убираем технические поля и null значения
@@ -374,7 +258,7 @@ class GarminAnalyzer:
             # Технические поля которые не нужны для анализа
             exclude_fields = {
                 'id', 'idx', 'user_id', 'sync_timestamp',
-                'data_quality', 'activities_data'
+                'data_quality', 'activities_data', 'endpoint_sync'
             }
             
             # Сортируем от старых к новым (для хронологии)
@@ -505,6 +389,10 @@ class GarminAnalyzer:
             f"\n📈 ДАННЫЕ ЗА ПРЕДЫДУЩИЕ 7 ДНЕЙ:\n{context['historical_data']}"
         ]
         
+        # Тренды за 7/30/90 дней (средние, базовый уровень, z-оценка последнего дня)
+        if context.get('trends'):
+            prompt_parts.append(f"\n📉 ТРЕНДЫ (СРЕДНИЕ ЗА 7/30/90 ДНЕЙ):\n{context['trends']}")
+        
         # НОВОЕ: Добавляем последний анализ если есть
         if context.get('last_analysis'):
             prompt_parts.append(f"\n📋 ПРЕДЫДУЩИЙ АНАЛИЗ И РЕКОМЕНДАЦИИ:\n{context['last_analysis']}")
@@ -538,14 +426,15 @@ class GarminAnalyzer:
         
         return "\n".join(prompt_parts)
 
-    async def _parse_ai_response(self, ai_response: str, daily_data: Dict) -> Dict:
+    async def _parse_ai_response(self, ai_response: str, daily_data: Dict,
+                                 trends: Optional[Dict] = None) -> Dict:
         """Парсить и структурировать ответ от AI"""
         try:
             # Вычисляем общий балл здоровья на основе данных
             health_score = self._calculate_health_score(daily_data)
             
-            # Извлекаем тренды из данных (базовая логика)
-            trends = self._extract_basic_trends(daily_data)
+            # Тренды из истории (garmin_trends)
+            trends = trends or {}
             
             # Формируем структурированный результат
             analysis_result = {
@@ -657,16 +546,6 @@ class GarminAnalyzer:
             logger.error(f"❌ Ошибка расчета балла здоровья: {e}")
             return 50.0
 
-    def _extract_basic_trends(self, daily_data: Dict) -> Dict:
-        """Извлечь базовые тренды из данных"""
-        # Это упрощенная версия - в реальности тренды вычисляются в _calculate_trends
-        return {
-            'sleep_trend': 'stable',
-            'activity_trend': 'stable', 
-            'stress_trend': 'stable',
-            'recovery_trend': 'stable'
-        }
-
     def _extract_recommendations(self, ai_response: str) -> str:
         """Извлечь рекомендации из ответа AI"""
         # Простое извлечение - ищем секцию с рекомендациями
@@ -0,0 +1,297 @@
+# garmin_collection.py - Движок сбора данных Garmin
+#
+# Вместо последовательного обхода всех пользователей раз в 30 минут
+# пользователи равномерно распределяются по окну цикла: у каждого свой слот
+# (хэш user_id + небольшой случайный сдвиг). Обработка идет пулом воркеров
+# ограниченного размера, один аккаунт не обрабатывается чаще заданного
+# интервала, а аренда в БД не дает циклам накладываться друг на друга
+# (в том числе при нескольких экземплярах бота).
+
+import os
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from db_postgresql import get_db_connection, release_db_connection
+from error_handler import log_error_with_context
+
+logger = logging.getLogger(__name__)
+
+# Длина окна цикла (совпадает с расписанием сбора - каждые 30 минут)
+GARMIN_CYCLE_WINDOW = int(os.getenv("GARMIN_CYCLE_WINDOW", "1800"))
+
+# Доля окна, по которой распределяются слоты (остаток - запас на обработку)
+GARMIN_SPREAD_RATIO = float(os.getenv("GARMIN_SPREAD_RATIO", "0.9"))
+
+# Случайный сдвиг слота (секунды, в обе стороны)
+GARMIN_SLOT_JITTER = int(os.getenv("GARMIN_SLOT_JITTER", "30"))
+
+# Размер пула воркеров
+GARMIN_WORKERS = int(os.getenv("GARMIN_WORKERS", "8"))
+
+# Минимальный интервал между обработками одного аккаунта (секунды)
+GARMIN_ACCOUNT_MIN_INTERVAL = int(os.getenv("GARMIN_ACCOUNT_MIN_INTERVAL", "1200"))
+
+LEASE_NAME = "garmin_collection"
+
+
+def slot_offset(user_id: int, window: float, jitter: float = 0) -> float:
+    """
+    Смещение пользователя от начала окна (секунды)
+
+    Хэш стабилен между циклами и перезапусками, поэтому каждый пользователь
+    опрашивается примерно раз в окно, а не дважды подряд на стыке циклов.
+    """
+    digest = hashlib.sha256(str(user_id).encode()).digest()
+    base = int.from_bytes(digest[:8], "big") / 2 ** 64 * window
+    if jitter:
+        base += random.uniform(-jitter, jitter)
+    return min(max(base, 0.0), window)
+
+
+class GarminCollectionEngine:
+    """
+    Распределенный по времени сбор данных с пулом воркеров
+
+    process_user(user_id) -> bool выполняет обработку одного пользователя
+    (True - проведен анализ).
+    """
+
+    def __init__(self, process_user: Callable[[int], Awaitable[bool]],
+                 window: int = GARMIN_CYCLE_WINDOW, workers: int = GARMIN_WORKERS):
+        self.process_user = process_user
+        self.window = window
+        self.workers = max(1, workers)
+        self.owner_id = f"{os.getenv('RAILWAY_REPLICA_ID') or os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._last_processed: Dict[int, float] = {}  # user_id -> monotonic time
+        self._in_progress: set = set()
+        self._cycle_running = False
+
+        self.metrics = {
+            "cycles_total": 0,
+            "cycles_skipped": 0,
+            "last_cycle_started_at": None,
+            "last_cycle_duration_sec": None,
+            "last_cycle_users": 0,
+            "last_cycle_processed": 0,
+            "last_cycle_analyses": 0,
+            "last_cycle_errors": 0,
+            "last_cycle_rate_limited": 0,
+            "last_cycle_backlog": 0,
+            "last_cycle_max_start_lag_sec": 0.0,
+            "queue_depth": 0,
+        }
+
+    # ==========================================
+    # 🔒 АРЕНДА ЦИКЛА
+    # ==========================================
+
+    async def _acquire_lease(self, ttl_seconds: int) -> bool:
+        """Берет аренду цикла (если свободна или просрочена)"""
+        conn = None
+        try:
+            conn = await get_db_connection("background")
+            owner = await conn.fetchval("""
+                INSERT INTO scheduler_leases (lease_name, owner_id, acquired_at, expires_at)
+                VALUES ($1, $2, NOW(), NOW() + make_interval(secs => $3))
+                ON CONFLICT (lease_name) DO UPDATE
+                SET owner_id = EXCLUDED.owner_id,
+                    acquired_at = EXCLUDED.acquired_at,
+                    expires_at = EXCLUDED.expires_at
+                WHERE scheduler_leases.expires_at < NOW()
+                   OR scheduler_leases.owner_id = EXCLUDED.owner_id
+                RETURNING owner_id
+            """, LEASE_NAME, self.owner_id, float(ttl_seconds))
+            return owner == self.owner_id
+        except Exception as e:
+            log_error_with_context(e, {"function": "garmin_acquire_lease"})
+            return False
+        finally:
+            if conn:
+                await release_db_connection(conn)
+
+    async def _release_lease(self):
+        """Освобождает аренду цикла"""
+        conn = None
+        try:
+            conn = await get_db_connection("background")
+            await conn.execute("""
+                DELETE FROM scheduler_leases
+                WHERE lease_name = $1 AND owner_id = $2
+            """, LEASE_NAME, self.owner_id)
+        except Exception as e:
+            log_error_with_context(e, {"function": "garmin_release_lease"})
+        finally:
+            if conn:
+                await release_db_connection(conn)
+
+    # ==========================================
+    # 🔄 ЦИКЛ СБОРА
+    # ==========================================
+
+    async def _get_active_users(self) -> List[int]:
+        conn = await get_db_connection("background")
+        try:
+            rows = await conn.fetch("""
+                SELECT user_id
+                FROM garmin_connections
+                WHERE is_active = TRUE
+            """)
+            return [row["user_id"] for row in rows]
+        finally:
+            await release_db_connection(conn)
+
+    def _is_rate_limited(self, user_id: int, now: float) -> bool:
+        """Аккаунт обрабатывается сейчас или обрабатывался недавно"""
+        if user_id in self._in_progress:
+            return True
+        last = self._last_processed.get(user_id)
+        return last is not None and now - last < GARMIN_ACCOUNT_MIN_INTERVAL
+
+    async def run_user(self, user_id: int, respect_rate_limit: bool = True) -> Optional[bool]:
+        """
+        Обрабатывает одного пользователя с учетом ограничений аккаунта
+
+        Returns:
+            результат process_user или None если аккаунт пропущен
+        """
+        if respect_rate_limit and self._is_rate_limited(user_id, time.monotonic()):
+            return None
+        if user_id in self._in_progress:
+            return None
+
+        self._in_progress.add(user_id)
+        try:
+            return await self.process_user(user_id)
+        finally:
+            self._in_progress.discard(user_id)
+            self._last_processed[user_id] = time.monotonic()
+
+    async def run_cycle(self):
+        """Один цикл: слоты по окну, пул воркеров, метрики"""
+        if self._cycle_running:
+            self.metrics["cycles_skipped"] += 1
+            logger.warning("⏭️ Garmin: предыдущий цикл еще выполняется, пропуск")
+            return
+
+        lease_ttl = self.window + 300
+        if not await self._acquire_lease(lease_ttl):
+            self.metrics["cycles_skipped"] += 1
+            logger.info("⏭️ Garmin: цикл выполняется другим экземпляром")
+            return
+
+        self._cycle_running = True
+        started = time.monotonic()
+        # Небольшой запас, чтобы цикл закончился до следующего запуска по расписанию
+        deadline = started + self.window - 30
+        counters = {"processed": 0, "analyses": 0, "errors": 0, "rate_limited": 0, "max_lag": 0.0}
+        queue: asyncio.Queue = asyncio.Queue()
+        workers: List[asyncio.Task] = []
+        backlog = 0
+
+        try:
+            user_ids = await self._get_active_users()
+            self.metrics["last_cycle_started_at"] = time.time()
+            self.metrics["last_cycle_users"] = len(user_ids)
+
+            if not user_ids:
+                logger.info("👥 Нет активных пользователей Garmin")
+                return
+
+            spread = self.window * GARMIN_SPREAD_RATIO
+            schedule = sorted(
+                (slot_offset(user_id, spread, GARMIN_SLOT_JITTER), user_id)
+                for user_id in user_ids
+            )
+            logger.info(
+                f"👥 Garmin: {len(user_ids)} пользователей, окно {int(spread)}с, "
+                f"воркеров {self.workers}"
+            )
+
+            async def worker():
+                while True:
+                    slot_time, user_id = await queue.get()
+                    try:
+                        counters["max_lag"] = max(counters["max_lag"], time.monotonic() - slot_time)
+                        result = await self.run_user(user_id)
+                        if result is None:
+                            counters["rate_limited"] += 1
+                        else:
+                            counters["processed"] += 1
+                            if result:
+                                counters["analyses"] += 1
+                    except Exception as e:
+                        counters["errors"] += 1
+                        logger.error(f"❌ Ошибка обработки пользователя {user_id}: {e}")
+                    finally:
+                        queue.task_done()
+                        self.metrics["queue_depth"] = queue.qsize()
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.workers)]
+
+            # Диспетчер: кладем пользователя в очередь в момент его слота
+            for offset, user_id in schedule:
+                delay = started + offset - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                queue.put_nowait((started + offset, user_id))
+                self.metrics["queue_depth"] = queue.qsize()
+
+            # Ждем обработки очереди, но не дольше окна
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                try:
+                    await asyncio.wait_for(queue.join(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            backlog = queue.qsize()
+            if backlog:
+                logger.warning(f"⚠️ Garmin: не успели обработать {backlog} пользователей за окно")
+
+        except Exception as e:
+            log_error_with_context(e, {"function": "garmin_run_cycle"})
+        finally:
+            for task in workers:
+                task.cancel()
+            if workers:
+                await asyncio.gather(*workers, return_exceptions=True)
+
+            duration = time.monotonic() - started
+            self.metrics.update({
+                "cycles_total": self.metrics["cycles_total"] + 1,
+                "last_cycle_duration_sec": round(duration, 1),
+                "last_cycle_processed": counters["processed"],
+                "last_cycle_analyses": counters["analyses"],
+                "last_cycle_errors": counters["errors"],
+                "last_cycle_rate_limited": counters["rate_limited"],
+                "last_cycle_backlog": backlog,
+                "last_cycle_max_start_lag_sec": round(counters["max_lag"], 1),
+                "queue_depth": 0,
+            })
+            self._forget_stale_accounts()
+            self._cycle_running = False
+            await self._release_lease()
+
+            logger.info(
+                f"✅ Garmin цикл: {counters['processed']} обработано, "
+                f"{counters['analyses']} анализов, {counters['errors']} ошибок, "
+                f"отставание {backlog}, {duration:.0f}с"
+            )
+
+    def _forget_stale_accounts(self):
+        """Удаляет из памяти отметки давно обработанных аккаунтов"""
+        cutoff = time.monotonic() - max(GARMIN_ACCOUNT_MIN_INTERVAL, self.window) * 2
+        self._last_processed = {
+            user_id: processed_at for user_id, processed_at in self._last_processed.items()
+            if processed_at >= cutoff
+        }
+
+    def get_metrics(self) -> Dict:
+        """Метрики последнего цикла"""
+        return {**self.metrics, "cycle_running": self._cycle_running, "workers": self.workers}
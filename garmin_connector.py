@@ -2,8 +2,10 @@
 
 import os
 import json
+import time as time_module
 import asyncio
 import logging
+from collections import OrderedDict
 from datetime import time, datetime, date, timedelta
 from typing import Dict, Optional, List, Any
 from cryptography.fernet import Fernet # type: ignore
@@ -12,6 +14,8 @@ from dotenv import load_dotenv
 
 # Импортируем функции для работы с БД
 from db_postgresql import get_db_connection, release_db_connection
+from garmin_executor import run_garmin_call, GARMIN_LOGIN_TIMEOUT
+from garmin_daily_writer import GarminDailyWriter
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -33,6 +37,57 @@ NIGHT_SLEEP_FIELDS = [
     'sleep_periods_15min'          # Периоды сна по 15 минут
 ]
 
+# ================================
+# КЕШ API-КЛИЕНТОВ
+# ================================
+
+# Максимум клиентов в памяти (вытесняются давно неиспользуемые)
+GARMIN_CLIENT_CACHE_SIZE = int(os.getenv("GARMIN_CLIENT_CACHE_SIZE", "500"))
+
+# Время жизни клиента в кеше (секунды); после - восстановление из сохраненных токенов
+GARMIN_CLIENT_CACHE_TTL = int(os.getenv("GARMIN_CLIENT_CACHE_TTL", str(6 * 3600)))
+
+# Одновременных полных логинов (Garmin ограничивает частоту входа)
+GARMIN_LOGIN_CONCURRENCY = int(os.getenv("GARMIN_LOGIN_CONCURRENCY", "2"))
+
+# Максимум одновременных запросов к API от одного пользователя
+# (один медленный аккаунт не занимает весь пул Garmin)
+GARMIN_USER_FANOUT = int(os.getenv("GARMIN_USER_FANOUT", "4"))
+
+# ================================
+# API GARMIN И СВЕЖЕСТЬ ДАННЫХ
+# ================================
+
+# Эндпоинты: имя -> (метод API, аргументы: 'date' - дата, 'range' - дата начала и конца, None - без даты)
+# Порядок важен: более поздние парсеры перезаписывают поля более ранних
+GARMIN_ENDPOINTS = {
+    'steps': ('get_steps_data', 'date'),
+    'heart_rate': ('get_heart_rates', 'date'),
+    'sleep': ('get_sleep_data', 'date'),
+    'body_battery': ('get_body_battery', 'range'),
+    'stress': ('get_stress_data', 'date'),
+    'spo2': ('get_spo2_data', 'date'),
+    'respiration': ('get_respiration_data', 'date'),
+    'training_readiness': ('get_training_readiness', 'date'),
+    'activities': ('get_activities_by_date', 'range'),
+    'hrv': ('get_hrv_data', 'date'),
+    'daily_summary': ('get_daily_summary', 'date'),
+    'training_status': ('get_training_status', None)
+}
+
+# Через сколько часов после окончания дня его данные считаются окончательными
+GARMIN_FINAL_AFTER_HOURS = int(os.getenv("GARMIN_FINAL_AFTER_HOURS", "12"))
+
+def is_endpoint_final(fetched_at: Optional[str], data_date: date) -> bool:
+    """Данные API за день запрошены после того, как день завершился (повторный запрос не нужен)"""
+    if not fetched_at:
+        return False
+    final_after = datetime.combine(data_date + timedelta(days=1), time.min) + timedelta(hours=GARMIN_FINAL_AFTER_HOURS)
+    try:
+        return datetime.fromisoformat(fetched_at) >= final_after
+    except ValueError:
+        return False
+
 # ================================
 # ШИФРОВАНИЕ ДАННЫХ GARMIN
 # ================================
@@ -69,11 +124,42 @@ def decrypt_data(encrypted_data: str) -> str:
 # КЛАСС ПОДКЛЮЧЕНИЯ К GARMIN
 # ================================
 
+def is_auth_error(error: Exception) -> bool:
+    """Ошибка авторизации Garmin (истекшая или отозванная сессия)"""
+    text = str(error).lower()
+    return ("authentication" in type(error).__name__.lower()
+            or "401" in text or "unauthorized" in text)
+
+def dump_session_tokens(api: Garmin) -> Optional[str]:
+    """OAuth токены сессии клиента (garth) в виде строки"""
+    garth = getattr(api, "garth", None)
+    if garth is None:
+        return None
+    try:
+        return garth.dumps()
+    except Exception:
+        return None
+
 class GarminConnector:
     """Класс для работы с Garmin Connect API"""
     
     def __init__(self):
-        self._api_cache = {}  # Кеш подключений API
+        # Кеш подключений API (LRU + TTL): user_id -> {api, tokens, created_at}
+        self._api_cache: "OrderedDict[int, Dict]" = OrderedDict()
+        self._login_semaphore = asyncio.Semaphore(GARMIN_LOGIN_CONCURRENCY)
+        self.daily_writer = GarminDailyWriter(NIGHT_SLEEP_FIELDS)
+        self.sync_metrics = {
+            'api_calls': 0,
+            'fresh_skips': 0
+        }
+        self.client_metrics = {
+            'cache_hits': 0,
+            'token_reuses': 0,
+            'logins': 0,
+            'login_failures': 0,
+            'auth_refreshes': 0,
+            'cache_evictions': 0
+        }
 
     async def save_garmin_connection(self, user_id: int, email: str, password: str) -> bool:
         """
@@ -96,10 +182,13 @@ class GarminConnector:
                     garmin_password = EXCLUDED.garmin_password,
                     is_active = TRUE,
                     sync_errors = 0,
+                    session_tokens = NULL,
+                    tokens_updated_at = NULL,
                     updated_at = NOW()
             """, user_id, encrypted_email, encrypted_password)
             
             await release_db_connection(conn)
+            self.invalidate_api(user_id)
             logger.info(f"✅ Garmin подключение сохранено для пользователя {user_id}")
             return True
             
@@ -139,8 +228,8 @@ class GarminConnector:
         """Проверить подключение к Garmin"""
         try:
             api = Garmin(email, password)
-            await asyncio.get_event_loop().run_in_executor(None, api.login)
-            profile = await asyncio.get_event_loop().run_in_executor(None, api.get_full_name)
+            await run_garmin_call(api.login, timeout=GARMIN_LOGIN_TIMEOUT)
+            profile = await run_garmin_call(api.get_full_name)
             return True, f"User: {profile}"
             
         except Exception as e:
@@ -159,14 +248,13 @@ class GarminConnector:
             
             await conn.execute("""
                 UPDATE garmin_connections 
-                SET is_active = FALSE, updated_at = NOW()
+                SET is_active = FALSE, session_tokens = NULL, updated_at = NOW()
                 WHERE user_id = $1
             """, user_id)
             
             await release_db_connection(conn)
             
-            if user_id in self._api_cache:
-                del self._api_cache[user_id]
+            self.invalidate_api(user_id)
                 
             logger.info(f"Garmin отключен для пользователя {user_id}")
             return True
@@ -177,27 +265,122 @@ class GarminConnector:
                 await release_db_connection(conn)
             return False
 
-    async def get_garmin_api(self, user_id: int) -> Optional[Garmin]:
-        """Получить API подключение к Garmin с кешированием"""
+    # ================================
+    # КЕШ КЛИЕНТОВ И ТОКЕНЫ СЕССИИ
+    # ================================
+
+    def _cache_get(self, user_id: int) -> Optional[Dict]:
+        """Клиент из кеша (с учетом TTL)"""
+        entry = self._api_cache.get(user_id)
+        if entry is None:
+            return None
+        if time_module.monotonic() - entry['created_at'] > GARMIN_CLIENT_CACHE_TTL:
+            del self._api_cache[user_id]
+            self.client_metrics['cache_evictions'] += 1
+            return None
+        self._api_cache.move_to_end(user_id)
+        return entry
+
+    def _cache_put(self, user_id: int, api: Garmin, tokens: Optional[str]):
+        """Кладет клиент в кеш, вытесняя давно неиспользуемые"""
+        self._api_cache[user_id] = {
+            'api': api,
+            'tokens': tokens,
+            'created_at': time_module.monotonic()
+        }
+        self._api_cache.move_to_end(user_id)
+        while len(self._api_cache) > GARMIN_CLIENT_CACHE_SIZE:
+            self._api_cache.popitem(last=False)
+            self.client_metrics['cache_evictions'] += 1
+
+    def invalidate_api(self, user_id: int):
+        """Удаляет клиент пользователя из кеша"""
+        self._api_cache.pop(user_id, None)
+
+    async def _save_session_tokens(self, user_id: int, tokens: str):
+        """Сохраняет зашифрованные токены сессии"""
         try:
-            if user_id in self._api_cache:
-                return self._api_cache[user_id]
-            
-            connection = await self.get_garmin_connection(user_id)
+            conn = await get_db_connection("background")
+            await conn.execute("""
+                UPDATE garmin_connections
+                SET session_tokens = $2, tokens_updated_at = NOW()
+                WHERE user_id = $1
+            """, user_id, encrypt_data(tokens))
+            await release_db_connection(conn)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения токенов Garmin: {type(e).__name__}")
+            if 'conn' in locals():
+                await release_db_connection(conn)
+
+    async def persist_refreshed_tokens(self, user_id: int):
+        """Сохраняет токены, если клиент обновил их во время запросов"""
+        entry = self._api_cache.get(user_id)
+        if not entry:
+            return
+        tokens = dump_session_tokens(entry['api'])
+        if tokens and tokens != entry['tokens']:
+            entry['tokens'] = tokens
+            await self._save_session_tokens(user_id, tokens)
+
+    async def get_garmin_api(self, user_id: int, force_login: bool = False) -> Optional[Garmin]:
+        """
+        Получить API подключение к Garmin с кешированием
+
+        Порядок: кеш в памяти -> сохраненные токены сессии -> полный логин
+        (force_login=True - сразу полный логин, например после ошибки авторизации)
+        """
+        try:
+            entry = None if force_login else self._cache_get(user_id)
+            if entry:
+                self.client_metrics['cache_hits'] += 1
+                return entry['api']
+
+            conn = await get_db_connection("background")
+            connection = await conn.fetchrow("""
+                SELECT garmin_email, garmin_password, session_tokens
+                FROM garmin_connections
+                WHERE user_id = $1 AND is_active = TRUE
+            """, user_id)
+            await release_db_connection(conn)
+
             if not connection:
                 return None
-            
-            api = Garmin(connection['garmin_email'], connection['garmin_password'])
-            await asyncio.get_event_loop().run_in_executor(None, api.login)
-            
-            self._api_cache[user_id] = api
+
+            # 1. Восстанавливаем сессию из токенов (без логина)
+            if connection['session_tokens'] and not force_login:
+                tokens = decrypt_data(connection['session_tokens'])
+                try:
+                    api = Garmin()
+                    await run_garmin_call(api.login, tokens, timeout=GARMIN_LOGIN_TIMEOUT)
+                    self.client_metrics['token_reuses'] += 1
+                    self._cache_put(user_id, api, tokens)
+                    # При входе garth мог обновить OAuth2 токен - сохраняем новый
+                    await self.persist_refreshed_tokens(user_id)
+                    return api
+                except Exception as e:
+                    logger.info(f"Токены Garmin недействительны, выполняем вход: {type(e).__name__}")
+
+            # 2. Полный логин по учетным данным
+            async with self._login_semaphore:
+                api = Garmin(
+                    decrypt_data(connection['garmin_email']),
+                    decrypt_data(connection['garmin_password'])
+                )
+                await run_garmin_call(api.login, timeout=GARMIN_LOGIN_TIMEOUT)
+            self.client_metrics['logins'] += 1
+
+            tokens = dump_session_tokens(api)
+            if tokens:
+                await self._save_session_tokens(user_id, tokens)
+            self._cache_put(user_id, api, tokens)
             return api
             
         except Exception as e:
             logger.error(f"Ошибка создания Garmin API для {user_id}: {e}")
+            self.client_metrics['login_failures'] += 1
             
             try:
-                conn = await get_db_connection()
+                conn = await get_db_connection("background")
                 await conn.execute("""
                     UPDATE garmin_connections 
                     SET sync_errors = sync_errors + 1, updated_at = NOW()
@@ -209,12 +392,77 @@ class GarminConnector:
                 
             return None
 
-    async def collect_daily_data(self, user_id: int, target_date: date = None) -> Optional[Dict]:
-        """ОБНОВЛЕННЫЙ сбор данных с исправлениями и дополнительными API"""
+    def get_client_metrics(self) -> Dict:
+        """Статистика логинов, кеша клиентов и запросов к API"""
+        return {**self.client_metrics, **self.sync_metrics, 'cached_clients': len(self._api_cache)}
+
+    async def _get_endpoint_sync(self, user_id: int, target_date: date) -> Dict:
+        """Сохраненная запись дня и время запросов по каждому API"""
+        try:
+            conn = await get_db_connection("background")
+            row = await conn.fetchrow("""
+                SELECT * FROM garmin_daily_data
+                WHERE user_id = $1 AND data_date = $2
+            """, user_id, target_date)
+            await release_db_connection(conn)
+        except Exception as e:
+            logger.error(f"Ошибка чтения сохраненных данных Garmin: {type(e).__name__}")
+            if 'conn' in locals():
+                await release_db_connection(conn)
+            return {}
+
+        if not row:
+            return {}
+        stored = dict(row)
+        sync_state = stored.pop('endpoint_sync', None) or {}
+        if isinstance(sync_state, str):
+            sync_state = json.loads(sync_state)
+        return {'stored': stored, 'sync_state': sync_state}
+
+    async def collect_daily_data(self, user_id: int, target_date: date = None,
+                                 endpoints: Optional[List[str]] = None,
+                                 incremental: bool = False, save: bool = True) -> Optional[Dict]:
+        """
+        ОБНОВЛЕННЫЙ сбор данных с исправлениями и дополнительными API
+
+        Args:
+            endpoints: какие API запрашивать (по умолчанию все из GARMIN_ENDPOINTS)
+            incremental: не запрашивать API, данные которых за этот день уже окончательные
+                         (значения берутся из сохраненной записи)
+            save: сохранять ли полученные данные в БД
+        """
         if not target_date:
             target_date = date.today() - timedelta(days=1)
             
         try:
+            wanted = list(endpoints or GARMIN_ENDPOINTS)
+            stored = {}
+            if incremental:
+                saved_day = await self._get_endpoint_sync(user_id, target_date)
+                stored = saved_day.get('stored', {})
+                sync_state = saved_day.get('sync_state', {})
+                fresh = [name for name in wanted if is_endpoint_final(sync_state.get(name), target_date)]
+                if fresh:
+                    self.sync_metrics['fresh_skips'] += len(fresh)
+                    wanted = [name for name in wanted if name not in fresh]
+
+            # Формируем структурированные данные (сохраненные значения + новые).
+            # Ночной сон не переносим - его заполняет только анализ сна, иначе
+            # сохраненные значения перезапишут свежие; id/endpoint_sync - служебные
+            daily_data = {
+                k: v for k, v in stored.items()
+                if v is not None and k not in NIGHT_SLEEP_FIELDS and k not in ('id', 'endpoint_sync')
+            }
+            daily_data.update({
+                'user_id': user_id,
+                'data_date': target_date,
+                'sync_timestamp': datetime.now()
+            })
+
+            if not wanted:
+                logger.debug(f"Данные Garmin за {target_date} уже окончательные, запросы не нужны")
+                return daily_data
+
             api = await self.get_garmin_api(user_id)
             if not api:
                 logger.warning(f"Не удалось получить Garmin API для пользователя")
@@ -222,119 +470,53 @@ class GarminConnector:
             
             # Безопасное логирование
             hashed_id = hash(str(user_id)) % 10000
-            logger.info(f"Расширенный сбор данных Garmin за {target_date} для #{hashed_id}")
-            
-            loop = asyncio.get_event_loop()
-            tasks = []
-            
-            # Основные API
-            tasks.extend([
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_steps_data, target_date.isoformat())),
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_heart_rates, target_date.isoformat())),  
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_sleep_data, target_date.isoformat())),
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_body_battery, target_date.isoformat(), target_date.isoformat())),
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_stress_data, target_date.isoformat())),
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_spo2_data, target_date.isoformat())),
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_respiration_data, target_date.isoformat())),
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_training_readiness, target_date.isoformat()))
-            ])
+            logger.info(f"Сбор данных Garmin за {target_date} для #{hashed_id}: {len(wanted)} API")
             
-            # Дополнительные API для полного анализа (если поддерживаются)
-            tasks.extend([
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_activities_by_date, target_date.isoformat(), target_date.isoformat())),
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_hrv_data, target_date.isoformat())),
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_daily_summary, target_date.isoformat())),
-                loop.run_in_executor(None, lambda: safe_api_call(api.get_training_status))
-            ])
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            results = await self._fetch_endpoints(api, target_date, wanted)
+
+            # Сессия истекла - обновляем токены полным логином и повторяем
+            if any(isinstance(r, Exception) and is_auth_error(r) for r in results.values()):
+                logger.info("🔑 Сессия Garmin истекла, обновляем токены")
+                self.client_metrics['auth_refreshes'] += 1
+                self.invalidate_api(user_id)
+                api = await self.get_garmin_api(user_id, force_login=True)
+                if not api:
+                    return None
+                results = await self._fetch_endpoints(api, target_date, wanted)
+
+            await self.persist_refreshed_tokens(user_id)
             
             # Безопасное логирование результатов
-            success_count = len([r for r in results if r is not None and not isinstance(r, Exception)])
+            success_count = len([r for r in results.values() if r is not None and not isinstance(r, Exception)])
             logger.info(f"Получено {success_count}/{len(results)} успешных ответов от Garmin API")
             
-            # Распаковка результатов
-            basic_results = results[:8]  # Основные 8 API
-            extended_results = results[8:] if len(results) > 8 else [None, None, None, None]
-            
-            (steps_data, heart_data, sleep_data, battery_data, stress_data, spo2_data,
-             respiration_data, readiness_data) = basic_results
-             
-            (activities_data, hrv_data, daily_summary, training_status) = extended_results
-            
-            # Формируем структурированные данные
-            daily_data = {
-                'user_id': user_id,
-                'data_date': target_date,
-                'sync_timestamp': datetime.now()
-            }
-            
-            # ИСПРАВЛЕННЫЕ ПАРСЕРЫ
-            if steps_data and not isinstance(steps_data, Exception):
-                parsed = parse_steps_data_complete(steps_data)
-                daily_data.update(parsed)
-                logger.info(f"Шаги: {parsed.get('steps', 'нет данных')}")
-            
-            if heart_data and not isinstance(heart_data, Exception):
-                parsed = parse_heart_data_complete(heart_data)
-                daily_data.update(parsed)
-                logger.info(f"Пульс: покоя {parsed.get('resting_heart_rate', '?')}, макс {parsed.get('max_heart_rate', '?')}")
-            
-            if sleep_data and not isinstance(sleep_data, Exception):
-                parsed = parse_sleep_data_complete(sleep_data)
-                daily_data.update(parsed)
-                sleep_info = parsed.get('sleep_duration_minutes') or parsed.get('nap_duration_minutes')
+            # ИСПРАВЛЕННЫЕ ПАРСЕРЫ (в порядке GARMIN_ENDPOINTS)
+            fetched_at = datetime.now().isoformat()
+            endpoint_sync = {}
+            for name in GARMIN_ENDPOINTS:
+                response = results.get(name)
+                if response is None or isinstance(response, Exception):
+                    continue
+                endpoint_sync[name] = fetched_at
+                if response:
+                    daily_data.update(ENDPOINT_PARSERS[name](response))
+
+            if 'sleep' in results:
+                sleep_info = daily_data.get('sleep_duration_minutes') or daily_data.get('nap_duration_minutes')
                 logger.info(f"Сон: {sleep_info} мин" if sleep_info else "Сон: нет данных")
             
-            if battery_data and not isinstance(battery_data, Exception):
-                parsed = parse_body_battery_complete(battery_data)
-                daily_data.update(parsed)
-                logger.info(f"Body Battery: {parsed.get('body_battery_min', '?')}-{parsed.get('body_battery_max', '?')}%")
-            
-            if stress_data and not isinstance(stress_data, Exception):
-                parsed = parse_stress_data_complete(stress_data)
-                daily_data.update(parsed)
-                logger.info(f"Стресс: средний {parsed.get('stress_avg', '?')}, макс {parsed.get('stress_max', '?')}")
-            
-            # Стандартные парсеры для остальных данных
-            if spo2_data and not isinstance(spo2_data, Exception):
-                daily_data.update(parse_spo2_data(spo2_data))
-                
-            if respiration_data and not isinstance(respiration_data, Exception):
-                daily_data.update(parse_respiration_data(respiration_data))
-                
-            if readiness_data and not isinstance(readiness_data, Exception):
-                parsed = parse_training_readiness_complete(readiness_data)
-                daily_data.update(parsed)
-                logger.info(f"Готовность: {parsed.get('training_readiness', '?')}/100")
-            
-            # ДОПОЛНИТЕЛЬНЫЕ ДАННЫЕ
-            if activities_data and not isinstance(activities_data, Exception):
-                parsed = parse_activities_data(activities_data)
-                daily_data.update(parsed)
-                
-            if hrv_data and not isinstance(hrv_data, Exception):
-                parsed = parse_hrv_data(hrv_data)
-                daily_data.update(parsed)
-                
-            if daily_summary and not isinstance(daily_summary, Exception):
-                parsed = parse_daily_summary(daily_summary)
-                daily_data.update(parsed)
-                
-            if training_status and not isinstance(training_status, Exception):
-                parsed = parse_training_status(training_status)
-                daily_data.update(parsed)
-            
             # Вычисляем оценку полноты данных
             daily_data['data_completeness_score'] = self._calculate_data_completeness(daily_data)
             daily_data['last_sync_quality'] = 'good' if success_count > 6 else 'partial' if success_count > 3 else 'poor'
+            daily_data['endpoint_sync'] = json.dumps(endpoint_sync)
             
             # Безопасное логирование итогов
             non_null_fields = len([k for k, v in daily_data.items() if v is not None])
-            logger.info(f"Собраны расширенные данные Garmin: {non_null_fields} полей")
+            logger.info(f"Собраны данные Garmin: {non_null_fields} полей")
             
             # Сохраняем в БД
-            await self.save_daily_data(daily_data)
+            if save:
+                await self.save_daily_data(daily_data)
             
             return daily_data
             
@@ -342,6 +524,30 @@ class GarminConnector:
             logger.error(f"Ошибка расширенного сбора данных Garmin: {type(e).__name__}")
             return None
 
+    async def _fetch_endpoints(self, api: Garmin, target_date: date, endpoints: List[str]) -> Dict[str, Any]:
+        """
+        Параллельные запросы к выбранным API за дату (ошибки авторизации - исключениями)
+
+        Запросы идут в пул Garmin, не больше GARMIN_USER_FANOUT одновременно
+        """
+        iso_date = target_date.isoformat()
+        fanout = asyncio.Semaphore(GARMIN_USER_FANOUT)
+
+        async def call_endpoint(name: str):
+            method_name, arg_style = GARMIN_ENDPOINTS[name]
+            if arg_style == 'date':
+                args = (iso_date,)
+            elif arg_style == 'range':
+                args = (iso_date, iso_date)
+            else:
+                args = ()
+            async with fanout:
+                return await run_garmin_call(safe_api_call, getattr(api, method_name), *args)
+
+        self.sync_metrics['api_calls'] += len(endpoints)
+        results = await asyncio.gather(*(call_endpoint(name) for name in endpoints), return_exceptions=True)
+        return dict(zip(endpoints, results))
+
     def _calculate_data_completeness(self, daily_data: Dict) -> float:
         """Вычисляет оценку полноты собранных данных (0-100)"""
         try:
@@ -372,170 +578,26 @@ class GarminConnector:
             return 0.0
 
     async def save_daily_data(self, daily_data: Dict) -> bool:
-        """ОБНОВЛЕННОЕ сохранение с новыми полями"""
-        try:
-            conn = await get_db_connection()
-            
-            # Фильтруем только существующие поля таблицы
-            table_fields = {
-                'user_id', 'data_date', 'steps', 'calories', 'floors_climbed', 'distance_meters',
-                'sleep_duration_minutes', 'sleep_deep_minutes', 'sleep_light_minutes', 
-                'sleep_rem_minutes', 'sleep_awake_minutes', 'sleep_score',
-                'resting_heart_rate', 'avg_heart_rate', 'max_heart_rate', 'min_heart_rate',
-                'hrv_rmssd', 'stress_avg', 'stress_max', 'stress_min',
-                'body_battery_max', 'body_battery_min', 'body_battery_charged', 'body_battery_drained',
-                'spo2_avg', 'respiration_avg', 'training_readiness', 'vo2_max', 'fitness_age',
-                'activities_count', 'activities_duration_minutes', 'activities_calories', 
-                'activities_data', 'sync_timestamp', 'data_quality',
-                # Новые поля
-                'nap_duration_minutes', 'sleep_need_minutes', 'sleep_baseline_minutes',
-                'body_battery_avg', 'body_battery_stress_events', 'body_battery_recovery_events',
-                'heart_rate_measurements', 'hr_zone_rest_percent', 'resting_heart_rate_7day_avg',
-                'active_periods_15min', 'sedentary_periods_15min', 'total_calories',
-                'vigorous_intensity_minutes', 'moderate_intensity_minutes',
-                'activities_types', 'hrv_status', 'hrv_baseline', 
-                'training_readiness_status', 'training_status', 'training_load_7day',
-                'data_completeness_score', 'last_sync_quality', 'body_battery_after_sleep'
-            }
-            
-            # Отфильтровываем только те поля, которые есть в таблице
-            filtered_data = {k: v for k, v in daily_data.items() 
-                           if k in table_fields and v is not None}
-            
-            if not filtered_data:
-                logger.warning("Нет данных для сохранения в БД")
-                return False
-            
-            # Строим запрос
-            fields = list(filtered_data.keys())
-            values = list(filtered_data.values())
-            placeholders = [f'${i+1}' for i in range(len(values))]
-            
-            # UPSERT запрос
-            query = f"""
-                INSERT INTO garmin_daily_data ({', '.join(fields)})
-                VALUES ({', '.join(placeholders)})
-                ON CONFLICT (user_id, data_date) 
-                DO UPDATE SET {', '.join(f'{field} = EXCLUDED.{field}' for field in fields)}
-                RETURNING id
-            """
-            
-            result = await conn.fetchrow(query, *values)
-            await release_db_connection(conn)
-            
-            if result:
-                logger.info(f"Данные сохранены в БД (ID: {result['id']})")
-                
-                # ============================================
-                # НОВАЯ ЛОГИКА: Переносим данные сна в предыдущий день
-                # ============================================
-                await self._update_previous_day_sleep(daily_data)
-                
-                return True
-            else:
-                logger.warning("Данные не были сохранены в БД")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Ошибка сохранения в БД: {type(e).__name__}")
-            if 'conn' in locals():
-                await release_db_connection(conn)
-            return False
-    
-    async def _update_previous_day_sleep(self, daily_data: Dict) -> bool:
         """
-        Обновляет данные НОЧНОГО сна в записи предыдущего дня
-        
-        Логика:
-        - Берем данные сна из текущего дня (например, 7 октября)
-        - Переносим их в предыдущий день (6 октября)
-        - Обновляем ТОЛЬКО если запись за предыдущий день УЖЕ СУЩЕСТВУЕТ
-        - НЕ создаем новые записи
-        
-        ВАЖНО: Дневной сон (nap_duration_minutes) НЕ переносится!
+        Сохранение записи дня через пакетный writer
+
+        Во время цикла сбора запись попадает в буфер и сохраняется вместе с
+        остальными (многострочный UPSERT + перенос ночного сна в предыдущий день),
+        вне цикла - сразу.
         """
-        try:
-            # Проверяем наличие обязательных полей
-            if 'user_id' not in daily_data or 'data_date' not in daily_data:
-                logger.warning("Отсутствуют user_id или data_date, пропускаем обновление сна")
-                return False
-            
-            user_id = daily_data['user_id']
-            current_date = daily_data['data_date']
-            
-            # Вычисляем дату предыдущего дня
-            if isinstance(current_date, str):
-                current_date = datetime.strptime(current_date, '%Y-%m-%d').date()
-            
-            previous_date = current_date - timedelta(days=1)
-            
-            # Извлекаем ТОЛЬКО данные ночного сна из текущих данных
-            sleep_data = {}
-            for field in NIGHT_SLEEP_FIELDS:
-                if field in daily_data and daily_data[field] is not None:
-                    sleep_data[field] = daily_data[field]
-            
-            # Если данных сна нет - нечего обновлять
-            if not sleep_data:
-                logger.info("Данных ночного сна нет, пропускаем обновление предыдущего дня")
-                return False
-            
-            # Проверяем, существует ли запись за предыдущий день
-            conn = await get_db_connection()
-            
-            existing_record = await conn.fetchrow("""
-                SELECT id FROM garmin_daily_data 
-                WHERE user_id = $1 AND data_date = $2
-            """, user_id, previous_date)
-            
-            # Если записи нет - не создаем новую, просто выходим
-            if not existing_record:
-                logger.info(f"Запись за {previous_date} не найдена, пропускаем обновление сна")
-                await release_db_connection(conn)
-                return False
-            
-            # Формируем SQL запрос для обновления ТОЛЬКО полей сна
-            update_fields = []
-            values = []
-            param_index = 1
-            
-            for field, value in sleep_data.items():
-                update_fields.append(f"{field} = ${param_index}")
-                values.append(value)
-                param_index += 1
-            
-            # Добавляем user_id и data_date в конец списка параметров
-            values.append(user_id)
-            values.append(previous_date)
-            
-            # SQL запрос: обновляем ТОЛЬКО поля сна
-            update_query = f"""
-                UPDATE garmin_daily_data
-                SET {', '.join(update_fields)}
-                WHERE user_id = ${param_index} AND data_date = ${param_index + 1}
-            """
-            
-            # Выполняем обновление
-            await conn.execute(update_query, *values)
-            await release_db_connection(conn)
-            
-            # Безопасное логирование (без конкретных значений)
-            logger.info(f"✅ Данные ночного сна ({len(sleep_data)} полей) обновлены в записи предыдущего дня")
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка обновления сна в предыдущем дне: {type(e).__name__}")
-            return False
+        return await self.daily_writer.add(daily_data)
 
 # ================================
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ПАРСИНГА
 # ================================
 
 def safe_api_call(func, *args, **kwargs):
-    """Безопасный вызов API функции"""
+    """Безопасный вызов API функции (ошибки авторизации пробрасываются)"""
     try:
         return func(*args, **kwargs)
     except Exception as e:
+        if is_auth_error(e):
+            raise
         logger.debug(f"API вызов не удался: {func.__name__}: {e}")
         return None
 
@@ -1071,6 +1133,22 @@ def parse_respiration_data(respiration_data):
         logger.debug(f"Ошибка парсинга дыхания: {e}")
     return result
 
+# Парсер ответа для каждого эндпоинта из GARMIN_ENDPOINTS
+ENDPOINT_PARSERS = {
+    'steps': parse_steps_data_complete,
+    'heart_rate': parse_heart_data_complete,
+    'sleep': parse_sleep_data_complete,
+    'body_battery': parse_body_battery_complete,
+    'stress': parse_stress_data_complete,
+    'spo2': parse_spo2_data,
+    'respiration': parse_respiration_data,
+    'training_readiness': parse_training_readiness_complete,
+    'activities': parse_activities_data,
+    'hrv': parse_hrv_data,
+    'daily_summary': parse_daily_summary,
+    'training_status': parse_training_status
+}
+
 # ================================
 # ГЛОБАЛЬНЫЙ ЭКЗЕМПЛЯР
 # ================================
@@ -0,0 +1,246 @@
+# garmin_daily_writer.py - Пакетная запись ежедневных данных Garmin
+#
+# Во время цикла сбора записи дней не пишутся по одной, а накапливаются
+# в буфере (по ключу user_id + data_date) и сохраняются многострочными
+# INSERT ... ON CONFLICT пачками. Перенос ночного сна в предыдущий день
+# выполняется одним UPDATE на пачку.
+
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from db_postgresql import get_db_connection, release_db_connection
+from error_handler import log_error_with_context
+
+logger = logging.getLogger(__name__)
+
+# Строк в одной пачке
+GARMIN_UPSERT_BATCH_SIZE = int(os.getenv("GARMIN_UPSERT_BATCH_SIZE", "200"))
+
+# Ограничение PostgreSQL на число параметров запроса (с запасом)
+MAX_QUERY_PARAMS = 30000
+
+# Столбцы garmin_daily_data, которые заполняет сборщик
+GARMIN_DAILY_FIELDS = [
+    'user_id', 'data_date', 'steps', 'calories', 'floors_climbed', 'distance_meters',
+    'sleep_duration_minutes', 'sleep_deep_minutes', 'sleep_light_minutes',
+    'sleep_rem_minutes', 'sleep_awake_minutes', 'sleep_score',
+    'resting_heart_rate', 'avg_heart_rate', 'max_heart_rate', 'min_heart_rate',
+    'hrv_rmssd', 'stress_avg', 'stress_max', 'stress_min',
+    'body_battery_max', 'body_battery_min', 'body_battery_charged', 'body_battery_drained',
+    'spo2_avg', 'respiration_avg', 'training_readiness', 'vo2_max', 'fitness_age',
+    'activities_count', 'activities_duration_minutes', 'activities_calories',
+    'activities_data', 'sync_timestamp', 'data_quality',
+    'nap_duration_minutes', 'sleep_need_minutes', 'sleep_baseline_minutes',
+    'body_battery_avg', 'body_battery_stress_events', 'body_battery_recovery_events',
+    'heart_rate_measurements', 'hr_zone_rest_percent', 'resting_heart_rate_7day_avg',
+    'active_periods_15min', 'sedentary_periods_15min', 'total_calories',
+    'vigorous_intensity_minutes', 'moderate_intensity_minutes',
+    'activities_types', 'hrv_status', 'hrv_baseline',
+    'training_readiness_status', 'training_status', 'training_load_7day',
+    'data_completeness_score', 'last_sync_quality', 'body_battery_after_sleep',
+    'endpoint_sync'
+]
+
+KEY_FIELDS = ('user_id', 'data_date')
+
+
+class GarminDailyWriter:
+    """
+    Буфер записей garmin_daily_data с пакетным сохранением
+
+    Вне режима буферизации add() сохраняет запись сразу (тем же пакетным запросом).
+    """
+
+    def __init__(self, night_sleep_fields: List[str]):
+        self.night_sleep_fields = list(night_sleep_fields)
+        self._buffer: Dict[Tuple[int, date], Dict] = {}
+        self._buffering = 0
+        self._flush_lock = asyncio.Lock()
+        self.metrics = {
+            "flushes": 0,
+            "rows_written": 0,
+            "sleep_rows_moved": 0,
+            "last_flush_rows": 0,
+            "last_flush_sec": None,
+            "last_rows_per_sec": None,
+        }
+
+    # ==========================================
+    # 📥 БУФЕР
+    # ==========================================
+
+    def start_buffering(self):
+        """Начать накопление записей (например, на время цикла сбора)"""
+        self._buffering += 1
+
+    async def stop_buffering(self):
+        """Закончить накопление и сохранить буфер"""
+        self._buffering = max(0, self._buffering - 1)
+        if not self._buffering:
+            await self.flush()
+
+    async def add(self, daily_data: Dict) -> bool:
+        """Добавляет запись дня (поля с None не перезаписывают сохраненные значения)"""
+        record = {
+            k: v for k, v in daily_data.items()
+            if (k in GARMIN_DAILY_FIELDS or k in self.night_sleep_fields) and v is not None
+        }
+        if 'user_id' not in record or 'data_date' not in record or len(record) <= len(KEY_FIELDS):
+            logger.warning("Нет данных для сохранения в БД")
+            return False
+
+        if isinstance(record['data_date'], str):
+            record['data_date'] = datetime.strptime(record['data_date'], '%Y-%m-%d').date()
+
+        self._merge(record, newer=True)
+
+        if not self._buffering or len(self._buffer) >= GARMIN_UPSERT_BATCH_SIZE:
+            return await self.flush()
+        return True
+
+    def _merge(self, record: Dict, newer: bool):
+        """
+        Объединяет запись с буфером по ключу (user_id, data_date)
+
+        newer=True - запись новее буферной (ее поля побеждают), False - старше
+        (возврат несохраненной пачки: новые значения из буфера сохраняются).
+        Время запросов API (endpoint_sync) объединяется в любом случае.
+        """
+        key = (record['user_id'], record['data_date'])
+        existing = self._buffer.get(key)
+        if existing is None:
+            self._buffer[key] = record
+            return
+
+        older, latest = (existing, record) if newer else (record, existing)
+        merged = {**older, **latest}
+        if 'endpoint_sync' in older and 'endpoint_sync' in latest:
+            merged['endpoint_sync'] = json.dumps(
+                {**json.loads(older['endpoint_sync']), **json.loads(latest['endpoint_sync'])}
+            )
+        self._buffer[key] = merged
+
+    # ==========================================
+    # 💾 СОХРАНЕНИЕ
+    # ==========================================
+
+    async def flush(self, user_id: Optional[int] = None) -> bool:
+        """
+        Сохраняет накопленные записи пачками
+
+        Args:
+            user_id: сохранить только записи этого пользователя (например,
+                перед анализом, который читает garmin_daily_data из БД)
+
+        При ошибке записи возвращаются в буфер и сохраняются следующим flush().
+        """
+        if not self._buffer:
+            return True
+
+        async with self._flush_lock:
+            keys = [key for key in self._buffer if user_id is None or key[0] == user_id]
+            records = [self._buffer.pop(key) for key in keys]
+            if not records:
+                return True
+
+            started = time.monotonic()
+            conn = None
+            try:
+                conn = await get_db_connection("background")
+                async with conn.transaction():
+                    await self._upsert_records(conn, records)
+                    moved = await self._move_night_sleep(conn, records)
+            except Exception as e:
+                log_error_with_context(e, {"function": "garmin_daily_flush", "rows": len(records)})
+                for record in records:
+                    self._merge(record, newer=False)
+                return False
+            finally:
+                if conn:
+                    await release_db_connection(conn)
+
+            duration = time.monotonic() - started
+            self.metrics.update({
+                "flushes": self.metrics["flushes"] + 1,
+                "rows_written": self.metrics["rows_written"] + len(records),
+                "sleep_rows_moved": self.metrics["sleep_rows_moved"] + moved,
+                "last_flush_rows": len(records),
+                "last_flush_sec": round(duration, 3),
+                "last_rows_per_sec": round(len(records) / duration, 1) if duration > 0 else None,
+            })
+            logger.info(
+                f"💾 Garmin: сохранено {len(records)} записей дней за {duration:.2f}с "
+                f"({self.metrics['last_rows_per_sec']} строк/с), сон перенесен в {moved}"
+            )
+            return True
+
+    async def _upsert_records(self, conn, records: List[Dict]):
+        """Многострочный INSERT ... ON CONFLICT (только заполненные поля обновляются)"""
+        columns = [field for field in GARMIN_DAILY_FIELDS if any(field in record for record in records)]
+        updates = []
+        for field in columns:
+            if field in KEY_FIELDS:
+                continue
+            if field == 'endpoint_sync':
+                updates.append(
+                    f"{field} = COALESCE(garmin_daily_data.{field}, '{{}}'::jsonb)"
+                    f" || COALESCE(EXCLUDED.{field}, '{{}}'::jsonb)"
+                )
+            else:
+                updates.append(f"{field} = COALESCE(EXCLUDED.{field}, garmin_daily_data.{field})")
+
+        rows_per_query = max(1, min(GARMIN_UPSERT_BATCH_SIZE, MAX_QUERY_PARAMS // len(columns)))
+        for offset in range(0, len(records), rows_per_query):
+            chunk = records[offset:offset + rows_per_query]
+            values = []
+            placeholders = []
+            for record in chunk:
+                start = len(values)
+                values.extend(record.get(field) for field in columns)
+                placeholders.append(f"({', '.join(f'${start + i + 1}' for i in range(len(columns)))})")
+
+            await conn.execute(f"""
+                INSERT INTO garmin_daily_data ({', '.join(columns)})
+                VALUES {', '.join(placeholders)}
+                ON CONFLICT (user_id, data_date)
+                DO UPDATE SET {', '.join(updates)}
+            """, *values)
+
+    async def _move_night_sleep(self, conn, records: List[Dict]) -> int:
+        """
+        Переносит данные НОЧНОГО сна каждой записи в запись предыдущего дня
+
+        Обновляются только существующие записи (новые не создаются),
+        дневной сон (nap_duration_minutes) не переносится.
+        """
+        moves = [
+            record for record in records
+            if any(record.get(field) is not None for field in self.night_sleep_fields)
+        ]
+        if not moves:
+            return 0
+
+        fields = self.night_sleep_fields
+        arrays = [
+            [record['user_id'] for record in moves],
+            [record['data_date'] - timedelta(days=1) for record in moves],
+        ] + [[record.get(field) for record in moves] for field in fields]
+
+        unnest_args = ", ".join(
+            ["$1::bigint[]", "$2::date[]"] + [f"${i + 3}::integer[]" for i in range(len(fields))]
+        )
+        result = await conn.execute(f"""
+            UPDATE garmin_daily_data AS g
+            SET {', '.join(f'{field} = COALESCE(v.{field}, g.{field})' for field in fields)}
+            FROM unnest({unnest_args}) AS v(user_id, data_date, {', '.join(fields)})
+            WHERE g.user_id = v.user_id AND g.data_date = v.data_date
+        """, *arrays)
+        return int(result.split()[-1])
+
+    def get_metrics(self) -> Dict:
+        return {**self.metrics, "buffered": len(self._buffer)}
@@ -0,0 +1,138 @@
+# garmin_executor.py - Отдельный пул потоков для блокирующих вызовов Garmin SDK
+#
+# garminconnect - синхронная библиотека. Раньше все ее вызовы шли в пул
+# по умолчанию (loop.run_in_executor(None, ...)), общий с asyncio.to_thread,
+# и под нагрузкой Garmin вытеснял остальные задачи (Gemini, файлы).
+# Теперь у Garmin свой пул ограниченного размера, таймаут на вызов и метрики.
+#
+# Вызовы ждут свободный поток на семафоре размером с пул (а не в очереди
+# пула), поэтому таймаут отсчитывается от начала выполнения: долгая очередь
+# не приводит к таймаутам вызовов, которые еще не начинались.
+
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Размер пула потоков Garmin
+GARMIN_EXECUTOR_WORKERS = int(os.getenv("GARMIN_EXECUTOR_WORKERS", "16"))
+
+# Таймаут одного вызова API после получения потока (секунды)
+GARMIN_CALL_TIMEOUT = float(os.getenv("GARMIN_CALL_TIMEOUT", "30"))
+
+# Таймаут логина (секунды)
+GARMIN_LOGIN_TIMEOUT = float(os.getenv("GARMIN_LOGIN_TIMEOUT", "60"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+_metrics = {
+    "calls": 0,
+    "timeouts": 0,
+    "errors": 0,
+    "in_flight": 0,
+    "queue_wait_total_sec": 0.0,
+    "queue_wait_max_sec": 0.0,
+    "call_duration_total_sec": 0.0,
+    "call_duration_max_sec": 0.0,
+}
+
+
+def get_garmin_executor() -> ThreadPoolExecutor:
+    """Получить пул потоков Garmin (Singleton)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, GARMIN_EXECUTOR_WORKERS),
+            thread_name_prefix="garmin",
+        )
+        logger.info(f"✅ Пул Garmin запущен: {GARMIN_EXECUTOR_WORKERS} поток(ов)")
+    return _executor
+
+
+def _get_slots() -> asyncio.Semaphore:
+    """Семафор свободных потоков пула"""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(1, GARMIN_EXECUTOR_WORKERS))
+    return _slots
+
+
+def shutdown_garmin_executor():
+    """Остановка пула потоков (задачи в очереди отменяются)"""
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _slots = None
+
+
+async def run_garmin_call(func: Callable, *args, timeout: float = GARMIN_CALL_TIMEOUT) -> Any:
+    """
+    Выполняет блокирующий вызов Garmin SDK в отдельном пуле
+
+    Сначала ждет свободный поток (без ограничения по времени), затем
+    выполняет вызов с таймаутом. При таймауте начатый вызов дорабатывает
+    в своем потоке (результат игнорируется) и держит поток до завершения.
+    """
+    loop = asyncio.get_running_loop()
+    slots = _get_slots()
+    submitted_at = time.monotonic()
+    timings = {}
+
+    def release_slot(_):
+        try:
+            loop.call_soon_threadsafe(slots.release)
+        except RuntimeError:
+            pass  # event loop уже закрыт
+
+    def timed_call():
+        started_at = time.monotonic()
+        timings["queue_wait"] = started_at - submitted_at
+        try:
+            return func(*args)
+        finally:
+            timings["duration"] = time.monotonic() - started_at
+
+    _metrics["calls"] += 1
+    _metrics["in_flight"] += 1
+    try:
+        await slots.acquire()
+        try:
+            future = get_garmin_executor().submit(timed_call)
+        except BaseException:
+            slots.release()
+            raise
+        # Поток освобождается, когда вызов действительно завершился (не по таймауту)
+        future.add_done_callback(release_slot)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+    except asyncio.TimeoutError:
+        _metrics["timeouts"] += 1
+        logger.warning(f"⏱️ Garmin: вызов {getattr(func, '__name__', 'api')} превысил {timeout:g}с")
+        raise
+    except Exception:
+        _metrics["errors"] += 1
+        raise
+    finally:
+        _metrics["in_flight"] -= 1
+        if "queue_wait" in timings:
+            _metrics["queue_wait_total_sec"] += timings["queue_wait"]
+            _metrics["queue_wait_max_sec"] = max(_metrics["queue_wait_max_sec"], timings["queue_wait"])
+        if "duration" in timings:
+            _metrics["call_duration_total_sec"] += timings["duration"]
+            _metrics["call_duration_max_sec"] = max(_metrics["call_duration_max_sec"], timings["duration"])
+
+
+def get_executor_metrics() -> Dict:
+    """Метрики пула: очередь, длительность вызовов, таймауты"""
+    calls = _metrics["calls"] or 1
+    return {
+        **{key: round(value, 3) if isinstance(value, float) else value for key, value in _metrics.items()},
+        "workers": GARMIN_EXECUTOR_WORKERS,
+        "queue_wait_avg_sec": round(_metrics["queue_wait_total_sec"] / calls, 3),
+        "call_duration_avg_sec": round(_metrics["call_duration_total_sec"] / calls, 3),
+    }
@@ -10,18 +10,29 @@ import pytz
 
 from garmin_connector import garmin_connector
 from garmin_analyzer import garmin_analyzer
+from garmin_collection import GarminCollectionEngine
+from garmin_executor import get_executor_metrics
+from garmin_trends import garmin_trend_engine
+from telegram_outbox import send_message, PRIORITY_BROADCAST
 from db_postgresql import get_db_connection, release_db_connection
+from metrics import track_cycle
 from aiogram import Bot
 
 logger = logging.getLogger(__name__)
 
 class GarminScheduler:
-    """Планировщик с простой логикой: каждые 30 минут сравниваем время сна"""
+    """
+    Планировщик с простой логикой: каждые 30 минут сравниваем время сна
+
+    За цикл у пользователя запрашивается только сон; полный сбор данных
+    выполняется, когда появился новый сон.
+    """
     
     def __init__(self, bot: Bot):
         self.bot = bot
         self.scheduler = AsyncIOScheduler(timezone=pytz.UTC)
         self.is_running = False
+        self.collection_engine = GarminCollectionEngine(self._collect_and_check_sleep)
         
     async def initialize(self):
         """Инициализация планировщика"""
@@ -32,6 +43,17 @@ class GarminScheduler:
                 trigger=CronTrigger(minute='*/30'),  # Каждые 30 минут
                 id='garmin_collect_every_30min',
                 name='Сбор данных Garmin каждые 30 минут',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            
+            # Пакетный пересчет трендов всех пользователей (раз в сутки, ночью)
+            self.scheduler.add_job(
+                func=garmin_trend_engine.refresh_all_users,
+                trigger=CronTrigger(hour=3, minute=45),
+                id='garmin_trends_batch',
+                name='Пересчет трендов Garmin',
                 replace_existing=True
             )
             
@@ -48,7 +70,8 @@ class GarminScheduler:
             self.is_running = True
             
             logger.info("✅ Простой планировщик Garmin запущен")
-            logger.info("   🔄 Сбор данных: каждые 30 минут")
+            logger.info("   🔄 Сбор данных: каждые 30 минут (пользователи распределены по окну)")
+            logger.info(f"   👷 Воркеров: {self.collection_engine.workers}")
             logger.info("   🧠 Логика: сравнение времени сна")
             
         except Exception as e:
@@ -60,57 +83,28 @@ class GarminScheduler:
         if self.is_running:
             self.scheduler.shutdown(wait=True)
             self.is_running = False
+            # Сохраняем записи, накопленные прерванным циклом
+            await garmin_connector.daily_writer.flush()
             logger.info("🛑 Garmin планировщик остановлен")
 
+    @track_cycle("garmin_collect")
     async def _collect_and_analyze_all_users(self):
         """
         ГЛАВНАЯ ФУНКЦИЯ: Каждые 30 минут собираем данные у всех пользователей
         и проверяем изменение времени сна
+
+        Пользователи распределены по 30-минутному окну и обрабатываются
+        пулом воркеров (см. garmin_collection.py). Записи дней копятся
+        в буфере и сохраняются пачками (см. garmin_daily_writer.py)
         """
+        garmin_connector.daily_writer.start_buffering()
         try:
             logger.info("🔄 Запуск сбора данных каждые 30 минут...")
-            
-            # Получаем ВСЕХ активных пользователей Garmin
-            conn = await get_db_connection()
-            users = await conn.fetch("""
-                SELECT user_id 
-                FROM garmin_connections 
-                WHERE is_active = TRUE
-            """)
-            await release_db_connection(conn)
-            
-            if not users:
-                logger.info("👥 Нет активных пользователей Garmin")
-                return
-            
-            logger.info(f"👥 Собираем данные у {len(users)} пользователей")
-            
-            analysis_count = 0
-            
-            for user_row in users:
-                user_id = user_row['user_id']
-                
-                try:
-                    # Собираем данные и проверяем сон
-                    analyzed = await self._collect_and_check_sleep(user_id)
-                    
-                    if analyzed:
-                        analysis_count += 1
-                    
-                    # Пауза между пользователями (безопасность API)
-                    await asyncio.sleep(2)
-                    
-                except Exception as e:
-                    logger.error(f"❌ Ошибка обработки пользователя {user_id}: {e}")
-                    continue
-            
-            if analysis_count > 0:
-                logger.info(f"✅ Проведено {analysis_count} новых анализов")
-            else:
-                logger.debug("💤 Нет пользователей с изменившимся сном")
-                
+            await self.collection_engine.run_cycle()
         except Exception as e:
             logger.error(f"❌ Критическая ошибка сбора данных: {e}")
+        finally:
+            await garmin_connector.daily_writer.stop_buffering()
 
     async def _collect_and_check_sleep(self, user_id: int) -> bool:
         """
@@ -121,21 +115,14 @@ class GarminScheduler:
             True если провели анализ, False если нет
         """
         try:
-            # 1. СОБИРАЕМ ДАННЫЕ ГИБРИДНО
+            # 1. ДЕШЕВАЯ ПРОВЕРКА: только сон за сегодня (один запрос, без записи в БД)
             today = date.today()
             yesterday = today - timedelta(days=1)
             
-            logger.debug(f"Гибридный сбор данных для пользователя {user_id}")
-            
-            # Собираем данные за вчера (активность) и сегодня (сон)
-            yesterday_data = await garmin_connector.collect_daily_data(user_id, yesterday)
-            today_data = await garmin_connector.collect_daily_data(user_id, today)
-            
-            # Создаем гибридную запись
-            hybrid_data = self._create_hybrid_record(yesterday_data, today_data, yesterday)
-            
-            # Получаем время сна из гибридных данных
-            current_sleep_minutes = hybrid_data.get('sleep_duration_minutes')
+            sleep_probe = await garmin_connector.collect_daily_data(
+                user_id, today, endpoints=['sleep'], save=False
+            )
+            current_sleep_minutes = (sleep_probe or {}).get('sleep_duration_minutes')
             
             if not current_sleep_minutes or current_sleep_minutes < 60:
                 logger.debug(f"Нет данных сна для пользователя {user_id}")
@@ -148,10 +135,29 @@ class GarminScheduler:
                 logger.debug(f"Сон не изменился для пользователя {user_id} ({current_sleep_minutes} мин)")
                 return False
             
+            # 3. НОВЫЙ СОН: СОБИРАЕМ ДАННЫЕ ГИБРИДНО
+            logger.debug(f"Гибридный сбор данных для пользователя {user_id}")
+            
+            # Вчера (активность): все API, кроме уже окончательных за этот день
+            yesterday_data = await garmin_connector.collect_daily_data(user_id, yesterday, incremental=True)
+            # Сегодня: только сон и Body Battery (восстановление после сна)
+            today_data = await garmin_connector.collect_daily_data(
+                user_id, today, endpoints=['sleep', 'body_battery']
+            )
+            
+            # Создаем гибридную запись
+            hybrid_data = self._create_hybrid_record(yesterday_data, today_data, yesterday)
+            
             # Логируем что получилось в гибридной записи
             self._log_hybrid_result(user_id, hybrid_data, yesterday, today)
+
+            # Анализ читает garmin_daily_data из БД (история, тренды) - сохраняем
+            # записи пользователя из буфера цикла, включая перенос ночного сна в D-1
+            if not await garmin_connector.daily_writer.flush(user_id=user_id):
+                logger.warning(f"⚠️ Данные пользователя {user_id} не сохранены, анализ в следующем цикле")
+                return False
             
-            # 3. ПРОВЕРЯЕМ ЛИМИТЫ
+            # 4. ПРОВЕРЯЕМ ЛИМИТЫ
             logger.info(f"🧠 Новый сон у пользователя {user_id}: {current_sleep_minutes} мин")
             
             from subscription_manager import SubscriptionManager
@@ -165,13 +171,13 @@ class GarminScheduler:
             await self._save_analyzed_sleep_duration(user_id, current_sleep_minutes)
             logger.debug(f"💾 Сохранили новое время сна: {current_sleep_minutes} мин")
             
-            # 4. ПРОВЕРЯЕМ ЕСТЬ ЛИ ЛИМИТЫ
+            # 5. ПРОВЕРЯЕМ ЕСТЬ ЛИ ЛИМИТЫ
             if gpt4o_left <= 0:
                 logger.info(f"⚠️ У пользователя {user_id} закончились консультации")
                 await self._send_data_collected_notification(user_id)
                 return False
             
-            # 5. СОЗДАЁМ АНАЛИЗ (только если есть лимиты)
+            # 6. СОЗДАЁМ АНАЛИЗ (только если есть лимиты)
             analysis_date = yesterday
             daily_data = hybrid_data
             
@@ -193,7 +199,7 @@ class GarminScheduler:
     async def _check_sleep_duration_changed(self, user_id: int, current_sleep_minutes: int) -> bool:
         """Проверить, изменилось ли время сна"""
         try:
-            conn = await get_db_connection()
+            conn = await get_db_connection("background")
             
             result = await conn.fetchrow("""
                 SELECT last_analyzed_sleep_duration 
@@ -316,7 +322,7 @@ class GarminScheduler:
     async def _save_analyzed_sleep_duration(self, user_id: int, sleep_minutes: int):
         """Сохранить время проанализированного сна"""
         try:
-            conn = await get_db_connection()
+            conn = await get_db_connection("background")
             
             await conn.execute("""
                 INSERT INTO garmin_users_sleep_tracking (user_id, last_analyzed_sleep_duration, last_analysis_time)
@@ -340,7 +346,7 @@ class GarminScheduler:
             from db_postgresql import get_user_language, t
             lang = await get_user_language(user_id)
             message = t("garmin_data_collected_reminder", lang)
-            await self.bot.send_message(chat_id=user_id, text=message, parse_mode='HTML')
+            await send_message(self.bot, user_id, message, priority=PRIORITY_BROADCAST, parse_mode='HTML')
             logger.info(f"📤 Отправлено напоминание о лимитах пользователю {user_id}")
         except Exception as e:
             logger.error(f"❌ Ошибка отправки напоминания пользователю {user_id}: {e}")
@@ -379,9 +385,9 @@ class GarminScheduler:
             
             # ✅ ПОПЫТКА 1: С HTML
             try:
-                await self.bot.send_message(
-                    chat_id=user_id,
-                    text=message_text,
+                await send_message(
+                    self.bot, user_id, message_text,
+                    priority=PRIORITY_BROADCAST,
                     parse_mode='HTML'
                 )
                 logger.info(f"📤 Анализ отправлен пользователю {user_id} (с HTML)")
@@ -396,9 +402,9 @@ class GarminScheduler:
                     import re
                     clean_text = re.sub(r'<[^>]+>', '', message_text)
                     
-                    await self.bot.send_message(
-                        chat_id=user_id,
-                        text=clean_text
+                    await send_message(
+                        self.bot, user_id, clean_text,
+                        priority=PRIORITY_BROADCAST
                         # БЕЗ parse_mode
                     )
                     
@@ -412,11 +418,12 @@ class GarminScheduler:
             logger.error(f"❌ Ошибка создания/отправки анализа для {user_id}: {e}")
             return False
 
+    @track_cycle("garmin_cleanup")
     async def _cleanup_old_data(self):
         """Очистка старых данных"""
         try:
             logger.info("🧹 Начинаю очистку старых данных Garmin")
-            conn = await get_db_connection()
+            conn = await get_db_connection("background")
             
             cutoff_daily = date.today() - timedelta(days=90)
             cutoff_analysis = date.today() - timedelta(days=365)
@@ -456,7 +463,8 @@ class GarminScheduler:
                 return False
             
             # ИСПРАВЛЕНИЕ: используем нашу логику без повторных вызовов
-            result = await self._collect_and_check_sleep(user_id)
+            # (без ограничения частоты, но не параллельно с циклом сбора)
+            result = await self.collection_engine.run_user(user_id, respect_rate_limit=False)
             
             if result:
                 logger.info(f"✅ Принудительный анализ выполнен для пользователя {user_id}")
@@ -515,6 +523,11 @@ class GarminScheduler:
                 'users_with_sleep_tracking': sleep_stats['users_with_sleep_tracking'] if sleep_stats else 0,
                 'analyzed_today': sleep_stats['analyzed_today'] if sleep_stats else 0,
                 'next_check': self._get_next_job_time('garmin_collect_every_30min'),
+                'collection': self.collection_engine.get_metrics(),
+                'clients': garmin_connector.get_client_metrics(),
+                'executor': get_executor_metrics(),
+                'daily_writer': garmin_connector.daily_writer.get_metrics(),
+                'trends': garmin_trend_engine.get_metrics(),
                 'next_cleanup': self._get_next_job_time('garmin_cleanup')
             }
             
@@ -0,0 +1,272 @@
+# garmin_trends.py - Векторный расчет трендов Garmin (NumPy)
+#
+# История пользователя загружается одним запросом в столбцы NumPy
+# (пользователи x метрики x дни, пропуски = NaN), после чего скользящие
+# средние за 7/30/90 дней, изменения, z-оценки и базовые уровни считаются
+# для всех метрик (и всех пользователей в пакетном режиме) сразу.
+# Результат кэшируется по (user_id, последняя дата данных, время синхронизации).
+
+import os
+import time
+import logging
+import warnings
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db_postgresql import get_db_connection, release_db_connection
+from error_handler import log_error_with_context
+
+logger = logging.getLogger(__name__)
+
+# Глубина истории (дней) и окна скользящих средних
+HISTORY_DAYS = 90
+TREND_WINDOWS = (7, 30, 90)
+
+# Метрики истории (столбцы garmin_daily_data)
+TREND_METRICS = [
+    'sleep_duration_minutes',
+    'steps',
+    'stress_avg',
+    'body_battery_max',
+    'resting_heart_rate',
+    'hrv_rmssd',
+]
+
+# Тренды для garmin_analysis_history: последние 3 дня против 3 предыдущих
+# тренд -> (метрика, порог, порог в долях от старого значения, больше = лучше)
+TREND_RULES = {
+    'sleep_trend': ('sleep_duration_minutes', 30, False, True),   # ±30 минут
+    'activity_trend': ('steps', 0.1, True, True),                 # ±10%
+    'stress_trend': ('stress_avg', 10, False, False),             # ±10, ниже - лучше
+    'recovery_trend': ('body_battery_max', 5, False, True),       # ±5 пунктов Body Battery
+}
+
+# Максимум пользователей в кэше трендов
+GARMIN_TREND_CACHE_SIZE = int(os.getenv("GARMIN_TREND_CACHE_SIZE", "2000"))
+
+
+def compute_trend_stats(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Статистика по массиву истории (users x metrics x days, последний день - справа)
+
+    Returns:
+        словарь массивов формы (users x metrics), для трендов - (users,)
+    """
+    with warnings.catch_warnings():
+        # Пустые окна (все NaN) дают NaN - это ожидаемо
+        warnings.simplefilter("ignore", RuntimeWarning)
+
+        stats = {f"mean_{window}": np.nanmean(values[..., -window:], axis=-1) for window in TREND_WINDOWS}
+        std_30 = np.nanstd(values[..., -30:], axis=-1)
+        stats["baseline"] = np.nanmedian(values[..., -HISTORY_DAYS:], axis=-1)
+        stats["days_30"] = np.count_nonzero(~np.isnan(values[..., -30:]), axis=-1)
+
+        # Последнее известное значение (справа налево до первого не-NaN)
+        has_value = ~np.isnan(values)
+        last_index = values.shape[-1] - 1 - np.argmax(has_value[..., ::-1], axis=-1)
+        latest = np.take_along_axis(values, last_index[..., None], axis=-1)[..., 0]
+        stats["latest"] = np.where(has_value.any(axis=-1), latest, np.nan)
+
+        stats["delta_7_vs_30"] = stats["mean_7"] - stats["mean_30"]
+        stats["zscore"] = np.where(std_30 > 0, (stats["latest"] - stats["mean_30"]) / std_30, np.nan)
+
+        recent = np.nanmean(values[..., -3:], axis=-1)
+        older = np.nanmean(values[..., -6:-3], axis=-1)
+
+    for trend_name, (metric, threshold, relative, higher_is_better) in TREND_RULES.items():
+        m = TREND_METRICS.index(metric)
+        limit = threshold * older[:, m] if relative else threshold
+        diff = recent[:, m] - older[:, m]
+        up, down = diff > limit, diff < -limit
+        better, worse = (up, down) if higher_is_better else (down, up)
+        labels = np.where(better, 'improving', np.where(worse, 'declining', 'stable'))
+        stats[trend_name] = np.where(np.isnan(diff), 'insufficient_data', labels)
+
+    return stats
+
+
+def _to_number(value) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), 2)
+
+
+class GarminTrendEngine:
+    """Расчет и кэш трендов по истории Garmin"""
+
+    def __init__(self):
+        self._cache: "OrderedDict[int, Tuple[tuple, Dict]]" = OrderedDict()
+        self.metrics = {"cache_hits": 0, "computed": 0, "last_batch_users": 0, "last_batch_sec": None}
+
+    # ==========================================
+    # 📥 ЗАГРУЗКА ИСТОРИИ
+    # ==========================================
+
+    async def _fetch_cache_keys(self, user_ids: Optional[List[int]], end_date: date,
+                                profile: str) -> Dict[int, tuple]:
+        """Последняя дата данных и время синхронизации по каждому пользователю"""
+        conn = await get_db_connection(profile)
+        try:
+            if user_ids is None:
+                rows = await conn.fetch("""
+                    SELECT d.user_id, MAX(d.data_date) AS last_date, MAX(d.sync_timestamp) AS last_sync
+                    FROM garmin_daily_data d
+                    JOIN garmin_connections c ON c.user_id = d.user_id AND c.is_active = TRUE
+                    WHERE d.data_date BETWEEN $1 AND $2
+                    GROUP BY d.user_id
+                """, end_date - timedelta(days=HISTORY_DAYS - 1), end_date)
+            else:
+                rows = await conn.fetch("""
+                    SELECT user_id, MAX(data_date) AS last_date, MAX(sync_timestamp) AS last_sync
+                    FROM garmin_daily_data
+                    WHERE user_id = ANY($1::bigint[]) AND data_date BETWEEN $2 AND $3
+                    GROUP BY user_id
+                """, user_ids, end_date - timedelta(days=HISTORY_DAYS - 1), end_date)
+        finally:
+            await release_db_connection(conn)
+        return {row['user_id']: (end_date, row['last_date'], row['last_sync']) for row in rows}
+
+    async def _load_history(self, user_ids: List[int], start_date: date, end_date: date,
+                            profile: str) -> np.ndarray:
+        """История как массив float32: users x metrics x days (NaN - нет данных)"""
+        conn = await get_db_connection(profile)
+        try:
+            rows = await conn.fetch(f"""
+                SELECT user_id, data_date, {', '.join(TREND_METRICS)}
+                FROM garmin_daily_data
+                WHERE user_id = ANY($1::bigint[]) AND data_date BETWEEN $2 AND $3
+            """, user_ids, start_date, end_date)
+        finally:
+            await release_db_connection(conn)
+
+        days = (end_date - start_date).days + 1
+        values = np.full((len(user_ids), len(TREND_METRICS), days), np.nan, dtype=np.float32)
+        if not rows:
+            return values
+
+        user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+        u_idx = np.fromiter((user_index[row['user_id']] for row in rows), dtype=np.intp, count=len(rows))
+        d_idx = np.fromiter(((row['data_date'] - start_date).days for row in rows), dtype=np.intp, count=len(rows))
+        for m, column in enumerate(TREND_METRICS):
+            values[u_idx, m, d_idx] = np.fromiter(
+                (np.nan if row[column] is None else row[column] for row in rows),
+                dtype=np.float32, count=len(rows)
+            )
+        return values
+
+    # ==========================================
+    # 📈 РАСЧЕТ
+    # ==========================================
+
+    def _build_result(self, stats: Dict[str, np.ndarray], u: int) -> Dict:
+        """Результат для одного пользователя (строка массивов статистики)"""
+        metrics = {}
+        for m, metric in enumerate(TREND_METRICS):
+            if stats["days_30"][u, m] == 0 and np.isnan(stats["mean_90"][u, m]):
+                continue
+            metrics[metric] = {
+                'latest': _to_number(stats["latest"][u, m]),
+                **{f"mean_{window}d": _to_number(stats[f"mean_{window}"][u, m]) for window in TREND_WINDOWS},
+                'baseline': _to_number(stats["baseline"][u, m]),
+                'delta_7_vs_30': _to_number(stats["delta_7_vs_30"][u, m]),
+                'zscore': _to_number(stats["zscore"][u, m]),
+                'days_30': int(stats["days_30"][u, m]),
+            }
+
+        result = {trend_name: str(stats[trend_name][u]) for trend_name in TREND_RULES}
+        result['metrics'] = metrics
+        result['summary_text'] = self._format_summary(metrics)
+        return result
+
+    def _format_summary(self, metrics: Dict) -> str:
+        """Компактная текстовая сводка трендов для промпта (строится один раз)"""
+        if not metrics:
+            return ""
+        lines = []
+        for metric, values in metrics.items():
+            parts = [f"{metric}:"]
+            parts += [f"{window}д={values[f'mean_{window}d']}" for window in TREND_WINDOWS
+                      if values[f'mean_{window}d'] is not None]
+            if values['baseline'] is not None:
+                parts.append(f"база={values['baseline']}")
+            if values['zscore'] is not None:
+                parts.append(f"z={values['zscore']:+.1f}")
+            lines.append(" ".join(parts))
+        return "\n".join(lines)
+
+    def _empty_result(self) -> Dict:
+        result = {trend_name: 'insufficient_data' for trend_name in TREND_RULES}
+        result.update({'metrics': {}, 'summary_text': ""})
+        return result
+
+    async def compute_trends(self, user_ids: Optional[List[int]] = None,
+                             end_date: Optional[date] = None,
+                             profile: str = "interactive") -> Dict[int, Dict]:
+        """
+        Тренды для списка пользователей (None - все активные) одним расчетом
+
+        Пользователи, у которых данные не менялись, берутся из кэша.
+        profile - пул БД (пакетный пересчет идет через "analytics").
+        """
+        end_date = end_date or date.today() - timedelta(days=1)
+        start_date = end_date - timedelta(days=HISTORY_DAYS - 1)
+
+        cache_keys = await self._fetch_cache_keys(user_ids, end_date, profile)
+        results = {}
+        stale = []
+        for user_id, key in cache_keys.items():
+            cached = self._cache.get(user_id)
+            if cached and cached[0] == key:
+                self._cache.move_to_end(user_id)
+                self.metrics["cache_hits"] += 1
+                results[user_id] = cached[1]
+            else:
+                stale.append(user_id)
+
+        if stale:
+            values = await self._load_history(stale, start_date, end_date, profile)
+            stats = compute_trend_stats(values)
+            for u, user_id in enumerate(stale):
+                results[user_id] = self._build_result(stats, u)
+                self._cache_put(user_id, cache_keys[user_id], results[user_id])
+            self.metrics["computed"] += len(stale)
+
+        for user_id in user_ids or []:
+            results.setdefault(user_id, self._empty_result())
+        return results
+
+    def _cache_put(self, user_id: int, key: tuple, result: Dict):
+        self._cache[user_id] = (key, result)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > GARMIN_TREND_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    async def get_user_trends(self, user_id: int, profile: str = "interactive") -> Dict:
+        """Тренды одного пользователя (при ошибке - insufficient_data)"""
+        try:
+            return (await self.compute_trends([user_id], profile=profile))[user_id]
+        except Exception as e:
+            log_error_with_context(e, {"function": "get_user_trends", "user_id": user_id})
+            return self._empty_result()
+
+    async def refresh_all_users(self) -> int:
+        """Пакетный пересчет трендов всех активных пользователей (прогрев кэша)"""
+        started = time.monotonic()
+        try:
+            results = await self.compute_trends(profile="analytics")
+        except Exception as e:
+            log_error_with_context(e, {"function": "refresh_all_users_trends"})
+            return 0
+
+        self.metrics["last_batch_users"] = len(results)
+        self.metrics["last_batch_sec"] = round(time.monotonic() - started, 2)
+        logger.info(f"📈 Тренды Garmin пересчитаны: {len(results)} пользователей за {self.metrics['last_batch_sec']}с")
+        return len(results)
+
+    def get_metrics(self) -> Dict:
+        return {**self.metrics, "cached_users": len(self._cache)}
+
+
+# Глобальный экземпляр
+garmin_trend_engine = GarminTrendEngine()
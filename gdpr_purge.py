@@ -0,0 +1,419 @@
+# gdpr_purge.py - Удаление данных пользователей (GDPR)
+#
+# 1. Данные в БД удаляются в одной транзакции, set-based запросами
+#    (WHERE user_id = ANY(...)) в порядке внешних ключей - сразу для пачки
+#    пользователей.
+# 2. Пути файлов удаленных документов в той же транзакции попадают в
+#    очередь storage_deletion_queue. Файлы удаляет фоновый обработчик
+#    пакетными запросами; при ошибке запись остается в очереди и
+#    повторяется позже (очередь переживает перезапуск).
+
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+from db_postgresql import get_db_connection, release_db_connection
+from error_handler import log_error_with_context
+from metrics import track_cycle
+
+logger = logging.getLogger(__name__)
+
+# Пользователей в одной транзакции
+PURGE_BATCH_SIZE = int(os.getenv("GDPR_PURGE_BATCH_SIZE", "200"))
+
+# Одновременных запросов к Stripe при удалении
+STRIPE_CONCURRENCY = 5
+
+# Очередь удаления файлов
+QUEUE_BATCH_SIZE = 500  # Записей за один проход
+QUEUE_POLL_INTERVAL = 300  # Секунд между проходами фонового обработчика
+QUEUE_LEASE_MINUTES = 10  # На сколько запись "занимается" обработчиком
+QUEUE_MAX_BACKOFF_MINUTES = 360
+
+# Таблицы с user_id в порядке удаления: сначала зависимые, users - последней.
+# documents удаляется отдельно (пути файлов уходят в очередь удаления).
+PURGE_TABLES = [
+    "document_vectors",  # → documents, users
+    "medical_timeline",  # → documents, users
+    "chat_history",
+    "conversation_summary",
+    "medications",
+    "notification_history",
+    "notification_settings",
+    "user_limits",
+    "transactions",
+    "user_subscriptions",
+    "garmin_daily_data",
+    "garmin_analysis_history",
+    "garmin_analysis_settings",
+    "garmin_users_sleep_tracking",
+    "garmin_connections",
+    "analytics_events",
+    "conversation_state",
+    "vision_cache",
+    "user_stats",
+]
+
+
+class GDPRPurgeEngine:
+    """Транзакционное удаление пользователей + очередь удаления файлов"""
+
+    def __init__(self):
+        self.worker_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._background_tasks = set()
+
+        # Накопительные метрики
+        self.stats = {
+            "users_purged": 0,
+            "users_failed": 0,
+            "rows_deleted": 0,
+            "objects_enqueued": 0,
+            "objects_deleted": 0,
+            "queue_failures": 0,
+            "last_purge_duration": 0.0,
+        }
+
+    # ==========================================
+    # 🗑️ УДАЛЕНИЕ ИЗ БАЗЫ
+    # ==========================================
+
+    async def _get_existing_tables(self, conn) -> set:
+        """
+        Какие таблицы из PURGE_TABLES есть в схеме (часть создается модулями лениво)
+
+        Не кэшируется: таблица, созданная после запуска процесса, должна
+        попасть в удаление уже в следующей пачке. Запрос - один на пачку.
+        """
+        rows = await conn.fetch("""
+            SELECT DISTINCT table_name FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND column_name = 'user_id'
+              AND table_name = ANY($1::text[])
+        """, PURGE_TABLES + ["documents", "users"])
+        return {row["table_name"] for row in rows}
+
+    async def _purge_batch(self, conn, user_ids: List[int]) -> Dict[str, int]:
+        """Удаляет пачку пользователей в одной транзакции"""
+        deleted = {}
+        existing = await self._get_existing_tables(conn)
+
+        async with conn.transaction():
+            for table in PURGE_TABLES:
+                if table not in existing:
+                    continue
+                result = await conn.execute(
+                    f"DELETE FROM {table} WHERE user_id = ANY($1::bigint[])", user_ids
+                )
+                deleted[table] = int(result.split()[-1])
+
+            # Документы: пути файлов сразу в очередь удаления (атомарно с удалением строк)
+            result = await conn.execute("""
+                WITH removed AS (
+                    DELETE FROM documents WHERE user_id = ANY($1::bigint[])
+                    RETURNING user_id, file_path
+                )
+                INSERT INTO storage_deletion_queue (user_id, storage_path, is_prefix)
+                SELECT user_id, file_path, FALSE FROM removed
+                WHERE file_path IS NOT NULL AND file_path <> 'memory_note'
+            """, user_ids)
+            deleted["storage_objects"] = int(result.split()[-1])
+
+            # Плюс зачистка всей папки пользователя (файлы без записи в documents)
+            await conn.execute("""
+                INSERT INTO storage_deletion_queue (user_id, storage_path, is_prefix)
+                SELECT uid, 'users/' || uid, TRUE FROM unnest($1::bigint[]) AS uid
+            """, user_ids)
+
+            result = await conn.execute("""
+                DELETE FROM account_links
+                WHERE telegram_user_id = ANY($1::bigint[]) OR web_user_id = ANY($1::bigint[])
+            """, user_ids)
+            deleted["account_links"] = int(result.split()[-1])
+
+            result = await conn.execute(
+                "DELETE FROM users WHERE user_id = ANY($1::bigint[])", user_ids
+            )
+            deleted["users"] = int(result.split()[-1])
+
+        return deleted
+
+    async def _delete_stripe_data(self, user_ids: List[int]):
+        """Отмена подписок и удаление customer в Stripe (до удаления строк из БД)"""
+        from stripe_manager import StripeGDPRManager
+        semaphore = asyncio.Semaphore(STRIPE_CONCURRENCY)
+
+        async def delete_one(user_id: int):
+            async with semaphore:
+                try:
+                    await StripeGDPRManager.delete_user_stripe_data_gdpr(user_id)
+                except Exception as e:
+                    log_error_with_context(e, {"function": "gdpr_purge_stripe", "user_id": user_id})
+
+        await asyncio.gather(*(delete_one(user_id) for user_id in user_ids))
+
+    async def purge_users(self, user_ids: List[int], batch_size: int = PURGE_BATCH_SIZE,
+                          include_stripe: bool = True,
+                          progress_callback: Callable = None) -> Dict:
+        """
+        Удаляет всех указанных пользователей
+
+        Args:
+            user_ids: ID пользователей
+            batch_size: Пользователей в одной транзакции
+            include_stripe: Удалять ли данные в Stripe
+            progress_callback: Вызывается после каждой пачки с текущими метриками
+
+        Returns:
+            Dict: метрики прогона (processed, failed_user_ids, rows_deleted, ...)
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        started = time.monotonic()
+        progress = {
+            "total": len(user_ids),
+            "processed": 0,
+            "failed_user_ids": [],
+            "batches": 0,
+            "rows_deleted": 0,
+            "rows_by_table": {},
+            "objects_enqueued": 0,
+            "elapsed_sec": 0.0,
+            "users_per_sec": 0.0,
+        }
+
+        for offset in range(0, len(user_ids), max(1, batch_size)):
+            batch = user_ids[offset:offset + batch_size]
+
+            if include_stripe:
+                await self._delete_stripe_data(batch)
+
+            conn = await get_db_connection("background")
+            try:
+                deleted = await self._purge_batch(conn, batch)
+            except Exception as e:
+                log_error_with_context(e, {"function": "gdpr_purge_batch", "batch_size": len(batch)})
+                progress["failed_user_ids"].extend(batch)
+                deleted = None
+            finally:
+                await release_db_connection(conn)
+
+            if deleted is not None:
+                progress["processed"] += len(batch)
+                progress["objects_enqueued"] += deleted.pop("storage_objects", 0)
+                for table, count in deleted.items():
+                    progress["rows_by_table"][table] = progress["rows_by_table"].get(table, 0) + count
+                    progress["rows_deleted"] += count
+
+            progress["batches"] += 1
+            progress["elapsed_sec"] = round(time.monotonic() - started, 3)
+            done = progress["processed"] + len(progress["failed_user_ids"])
+            progress["users_per_sec"] = round(done / progress["elapsed_sec"], 1) if progress["elapsed_sec"] else 0.0
+
+            logger.info(
+                f"🗑️ GDPR: {done}/{progress['total']} пользователей, "
+                f"строк удалено {progress['rows_deleted']}, файлов в очереди {progress['objects_enqueued']}, "
+                f"ошибок {len(progress['failed_user_ids'])}, {progress['users_per_sec']} польз/сек"
+            )
+            if progress_callback:
+                result = progress_callback(dict(progress))
+                if asyncio.iscoroutine(result):
+                    await result
+
+        self.stats["users_purged"] += progress["processed"]
+        self.stats["users_failed"] += len(progress["failed_user_ids"])
+        self.stats["rows_deleted"] += progress["rows_deleted"]
+        self.stats["objects_enqueued"] += progress["objects_enqueued"]
+        self.stats["last_purge_duration"] = progress["elapsed_sec"]
+
+        # Аналитика без идентификатора удаленного пользователя
+        if progress["processed"]:
+            try:
+                from analytics_system import Analytics
+                await Analytics.track(0, "gdpr_purge", {
+                    "users": progress["processed"],
+                    "failed": len(progress["failed_user_ids"]),
+                    "duration_sec": progress["elapsed_sec"],
+                })
+            except Exception:
+                pass
+
+        self._schedule_queue_processing()
+        return progress
+
+    # ==========================================
+    # 📦 ОЧЕРЕДЬ УДАЛЕНИЯ ФАЙЛОВ
+    # ==========================================
+
+    def _schedule_queue_processing(self):
+        """Будит фоновый обработчик (или запускает разовый проход)"""
+        if self.worker_task is not None:
+            self._wakeup.set()
+            return
+        task = asyncio.create_task(self.process_deletion_queue())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _claim_queue_items(self, limit: int) -> list:
+        """Забирает записи очереди (SKIP LOCKED - безопасно для нескольких процессов)"""
+        conn = await get_db_connection("background")
+        try:
+            return await conn.fetch(f"""
+                UPDATE storage_deletion_queue
+                SET attempts = attempts + 1,
+                    next_attempt_at = NOW() + INTERVAL '{QUEUE_LEASE_MINUTES} minutes'
+                WHERE id IN (
+                    SELECT id FROM storage_deletion_queue
+                    WHERE next_attempt_at <= NOW()
+                    ORDER BY id
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, user_id, storage_path, is_prefix, attempts
+            """, limit)
+        finally:
+            await release_db_connection(conn)
+
+    async def _finish_queue_items(self, done_ids: List[int], failed: List[tuple]):
+        """Удаляет выполненные записи, для неудачных - откладывает повтор"""
+        conn = await get_db_connection("background")
+        try:
+            if done_ids:
+                await conn.execute(
+                    "DELETE FROM storage_deletion_queue WHERE id = ANY($1::bigint[])", done_ids
+                )
+            if failed:
+                await conn.executemany(f"""
+                    UPDATE storage_deletion_queue
+                    SET last_error = $2,
+                        next_attempt_at = NOW() + make_interval(mins => LEAST(power(2, attempts)::int, {QUEUE_MAX_BACKOFF_MINUTES}))
+                    WHERE id = $1
+                """, failed)
+        finally:
+            await release_db_connection(conn)
+
+    @track_cycle("gdpr_queue")
+    async def process_deletion_queue(self, limit: int = QUEUE_BATCH_SIZE) -> Dict:
+        """
+        Удаляет файлы из очереди, пока она не опустеет
+
+        Returns:
+            Dict: {"deleted": N, "failed": M}
+        """
+        from file_storage import get_file_storage
+
+        totals = {"deleted": 0, "failed": 0}
+        try:
+            storage = get_file_storage()
+        except Exception as e:
+            log_error_with_context(e, {"function": "process_deletion_queue"})
+            return totals
+
+        while True:
+            try:
+                items = await self._claim_queue_items(limit)
+            except Exception as e:
+                log_error_with_context(e, {"function": "process_deletion_queue_claim"})
+                break
+
+            if not items:
+                break
+
+            done_ids = []
+            failed = []
+
+            # Отдельные файлы - одним пакетным удалением
+            objects = [item for item in items if not item["is_prefix"]]
+            if objects:
+                if await storage.delete_files([item["storage_path"] for item in objects]):
+                    done_ids.extend(item["id"] for item in objects)
+                else:
+                    failed.extend((item["id"], "batch delete failed") for item in objects)
+
+            # Папки пользователей - список файлов + пакетное удаление
+            for item in (item for item in items if item["is_prefix"]):
+                if await storage.delete_user_files(item["user_id"]):
+                    done_ids.append(item["id"])
+                else:
+                    failed.append((item["id"], "prefix delete failed"))
+
+            try:
+                await self._finish_queue_items(done_ids, failed)
+            except Exception as e:
+                log_error_with_context(e, {"function": "process_deletion_queue_finish"})
+                break
+
+            totals["deleted"] += len(done_ids)
+            totals["failed"] += len(failed)
+
+            if len(items) < limit:
+                break
+
+        self.stats["objects_deleted"] += totals["deleted"]
+        self.stats["queue_failures"] += totals["failed"]
+        if totals["deleted"] or totals["failed"]:
+            logger.info(f"📦 Очередь удаления файлов: удалено {totals['deleted']}, отложено {totals['failed']}")
+        return totals
+
+    async def start_worker(self):
+        """Запуск фонового обработчика очереди"""
+        if self.worker_task is None:
+            self.worker_task = asyncio.create_task(self._worker_loop())
+            logger.info("✅ GDPR: обработчик очереди удаления файлов запущен")
+
+    async def stop_worker(self):
+        """Остановка фонового обработчика"""
+        if self.worker_task:
+            self.worker_task.cancel()
+            try:
+                await self.worker_task
+            except asyncio.CancelledError:
+                pass
+            self.worker_task = None
+            logger.info("🛑 GDPR: обработчик очереди удаления файлов остановлен")
+
+    async def _worker_loop(self):
+        """Проход по очереди раз в QUEUE_POLL_INTERVAL или по сигналу"""
+        while True:
+            try:
+                await self.process_deletion_queue()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_error_with_context(e, {"function": "gdpr_queue_worker"})
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=QUEUE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def get_queue_stats(self) -> Dict:
+        """Метрики движка + текущий размер очереди"""
+        stats = dict(self.stats)
+        conn = await get_db_connection("background")
+        try:
+            row = await conn.fetchrow("""
+                SELECT COUNT(*) AS pending,
+                       COUNT(*) FILTER (WHERE attempts > 1) AS retrying,
+                       MIN(enqueued_at) AS oldest
+                FROM storage_deletion_queue
+            """)
+            stats["queue_pending"] = row["pending"]
+            stats["queue_retrying"] = row["retrying"]
+            stats["queue_oldest"] = row["oldest"].isoformat() if row["oldest"] else None
+        finally:
+            await release_db_connection(conn)
+        return stats
+
+
+# Глобальный экземпляр
+purge_engine = None
+
+def get_purge_engine() -> GDPRPurgeEngine:
+    """Получить движок удаления (Singleton)"""
+    global purge_engine
+    if purge_engine is None:
+        purge_engine = GDPRPurgeEngine()
+    return purge_engine
@@ -1,12 +1,73 @@
 # gemini_analyzer.py - Очищенная версия для медицинского анализа
 
+import io
 import os
 import json
 import google.generativeai as genai
 import asyncio
-from PIL import Image
-from typing import Tuple, List, Dict
+from PIL import Image, ImageOps, ImageStat
+from typing import Tuple, List, Dict, Union
 from db_postgresql import t
+from vision_cache import content_sha256, build_cache_keys, get_cached_vision_result, save_vision_result
+
+# 🖼 Предобработка изображений перед отправкой в Vision
+VISION_MAX_SIDE = 2048  # Максимальная сторона в пикселях
+VISION_MAX_BYTES = 1_500_000  # Максимальный размер JPEG
+VISION_JPEG_QUALITY = 85
+VISION_MIN_JPEG_QUALITY = 50
+TEXT_DOCUMENT_MAX_SATURATION = 40  # Средняя насыщенность (0-255), ниже - документ
+
+
+def _looks_like_text_document(image: Image.Image) -> bool:
+    """Почти бесцветное изображение - скан/фото текстового документа"""
+    if image.mode == "L":
+        return True
+    thumb = image.convert("RGB").copy()
+    thumb.thumbnail((64, 64))
+    saturation = ImageStat.Stat(thumb.convert("HSV")).mean[1]
+    return saturation < TEXT_DOCUMENT_MAX_SATURATION
+
+
+def prepare_image_for_vision(image_source: Union[str, bytes, memoryview]) -> Dict:
+    """
+    Уменьшает изображение, переводит документы в оттенки серого и
+    перекодирует в JPEG ограниченного размера
+
+    Блокирующая - вызывать через asyncio.to_thread.
+
+    Args:
+        image_source: Путь к файлу или содержимое изображения
+
+    Returns:
+        Dict: {"mime_type": "image/jpeg", "data": bytes} для Gemini
+    """
+    if not isinstance(image_source, str):
+        image_source = io.BytesIO(image_source)
+
+    with Image.open(image_source) as original:
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE), Image.LANCZOS)
+
+        # Цвет не несет информации для текста, а для снимков/фото сохраняем
+        if _looks_like_text_document(image):
+            image = image.convert("L")
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        quality = VISION_JPEG_QUALITY
+        while True:
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=quality, optimize=True)
+            if buffer.tell() <= VISION_MAX_BYTES:
+                break
+            if quality > VISION_MIN_JPEG_QUALITY:
+                quality -= 10
+            else:
+                # Качество уже минимальное - уменьшаем разрешение
+                image = image.resize((int(image.width * 0.75), int(image.height * 0.75)), Image.LANCZOS)
+
+    return {"mime_type": "image/jpeg", "data": buffer.getvalue()}
+
 
 class GeminiMedicalAnalyzer:
     """Анализатор медицинских изображений через Gemini API"""
@@ -21,14 +82,18 @@ class GeminiMedicalAnalyzer:
         self.model = genai.GenerativeModel('gemini-2.5-pro')
         print("✅ Gemini 2.5 Pro Latest инициализирован")
     
-    async def analyze_medical_image(self, image_path: str, lang: str = "ru", custom_prompt: str = None) -> Tuple[str, str]:
+    async def analyze_medical_image(self, image_path: Union[str, bytes, memoryview], lang: str = "ru",
+                                    custom_prompt: str = None, file_unique_id: str = None,
+                                    user_id: int = None) -> Tuple[str, str]:
         """
         Анализирует медицинское изображение
         
         Args:
-            image_path: Путь к изображению
+            image_path: Путь к изображению или его содержимое (bytes/memoryview)
             lang: Язык ответа (ru, uk, en)
             custom_prompt: Кастомный промпт (если нужен)
+            file_unique_id: Telegram file_unique_id (дополнительный ключ кэша)
+            user_id: Владелец документа (без него результат не кэшируется)
             
         Returns:
             Tuple[analysis_text, error_message]
@@ -36,11 +101,21 @@ class GeminiMedicalAnalyzer:
         try:
             
             # Проверяем существование файла
-            if not os.path.exists(image_path):
+            if isinstance(image_path, str) and not os.path.exists(image_path):
                 return "", t("gemini_file_not_found", lang, path=image_path)
             
-            # Загружаем изображение
-            image = Image.open(image_path)
+            # ♻️ Кэш только для стандартного промпта (кастомный содержит вопрос и контекст пользователя)
+            # и только с известным владельцем - иначе запись не удалить вместе с аккаунтом
+            cache_keys = []
+            if custom_prompt is None and user_id is not None:
+                content_hash = await asyncio.to_thread(content_sha256, image_path)
+                cache_keys = build_cache_keys(user_id, content_hash, lang, file_unique_id)
+                cached_text = await get_cached_vision_result(user_id, cache_keys)
+                if cached_text:
+                    return cached_text, ""
+            
+            # Уменьшаем и перекодируем изображение вне event loop
+            image = await asyncio.to_thread(prepare_image_for_vision, image_path)
             
             # Используем хитрый образовательный промпт
             prompt = custom_prompt or self._get_educational_prompt(lang)
@@ -108,6 +183,7 @@ class GeminiMedicalAnalyzer:
             if not analysis_text:
                 return "", t("gemini_no_analysis", lang)
             
+            await save_vision_result(user_id, cache_keys, analysis_text)
             return analysis_text, ""
             
         except Exception as e:
@@ -182,22 +258,35 @@ This is for academic study purposes only.
 
 IMPORTANT: Please respond in {response_language} language."""
 
+# Глобальный экземпляр анализатора
+gemini_analyzer = None
+
+def get_gemini_analyzer() -> GeminiMedicalAnalyzer:
+    """Получить анализатор Gemini (Singleton)"""
+    global gemini_analyzer
+    if gemini_analyzer is None:
+        gemini_analyzer = GeminiMedicalAnalyzer()
+    return gemini_analyzer
+
 # ✅ ОСНОВНАЯ ФУНКЦИЯ ДЛЯ ИСПОЛЬЗОВАНИЯ В ПРОЕКТЕ
-async def send_to_gemini_vision(image_path: str, lang: str = "ru", prompt: str = None) -> Tuple[str, str]:
+async def send_to_gemini_vision(image_path: Union[str, bytes, memoryview], lang: str = "ru", prompt: str = None,
+                                file_unique_id: str = None, user_id: int = None) -> Tuple[str, str]:
     """
     Основная функция для анализа медицинских изображений
     
     Args:
-        image_path: Путь к изображению
+        image_path: Путь к изображению или его содержимое
         lang: Язык ответа (ru, uk, en)
         prompt: Кастомный промпт (если нужен)
+        file_unique_id: Telegram file_unique_id (для кэша)
+        user_id: Владелец документа (для кэша)
         
     Returns:
         Tuple[analysis_result, error_message]
     """
     try:
-        analyzer = GeminiMedicalAnalyzer()
-        return await analyzer.analyze_medical_image(image_path, lang, prompt)
+        analyzer = get_gemini_analyzer()
+        return await analyzer.analyze_medical_image(image_path, lang, prompt, file_unique_id, user_id)
     except Exception as e:
         return "", t("gemini_image_analysis_error", lang, error=str(e))
     
@@ -3,6 +3,7 @@
 
 import os
 import base64
+import time
 import asyncio
 import logging
 import re
@@ -12,6 +13,7 @@ from dotenv import load_dotenv
 from error_handler import OpenAIError, log_error_with_context, FileProcessingError
 from subscription_manager import check_gpt4o_limit, spend_gpt4o_limit
 from gemini_analyzer import send_to_gemini_vision
+from metrics import observe_llm
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -650,6 +652,8 @@ async def ask_doctor(context_text: str, user_question: str,
         pass
 
     # ✅ ЕДИНЫЙ ВЫЗОВ API
+    response = None
+    started = time.perf_counter()
     try:
         # GPT-5 использует особые параметры
         if model == "gpt-5-chat-latest":
@@ -674,15 +678,20 @@ async def ask_doctor(context_text: str, user_question: str,
                 max_tokens=2500,
                 temperature=0.5,
             )
+        observe_llm(model, started, response)
         
         answer = response.choices[0].message.content.strip()
         return safe_telegram_text(answer)
         
     except Exception as e:
+        if response is None:
+            observe_llm(model, started, error=True)
         logger.error(f"❌ Ошибка модели {model}: {str(e)}")
         
         # Fallback на GPT-4o-mini при любой ошибке
         if model != "gpt-4o-mini":
+            response = None
+            started = time.perf_counter()
             try:
                 logger.warning(f"⚠️ Fallback на GPT-4o-mini")
                 response = await client.chat.completions.create(
@@ -694,11 +703,14 @@ async def ask_doctor(context_text: str, user_question: str,
                     max_tokens=2500,
                     temperature=0.5
                 )
+                observe_llm("gpt-4o-mini", started, response)
                 
                 answer = response.choices[0].message.content.strip()
                 return safe_telegram_text(answer)
                 
             except Exception as fallback_error:
+                if response is None:
+                    observe_llm("gpt-4o-mini", started, error=True)
                 logger.error(f"❌ Fallback тоже не работает: {str(fallback_error)}")
         
         return safe_telegram_text("Извините, временная техническая ошибка. Попробуйте повторить запрос.")
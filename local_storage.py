@@ -0,0 +1,133 @@
+# local_storage.py - Локальное файловое хранилище (разработка и тесты)
+#
+# Тот же интерфейс, что у SupabaseStorage: upload_file / upload_bytes /
+# download_file / delete_file / delete_files / list_files / close.
+# Пути в хранилище имеют тот же формат users/{user_id}/medical_doc_{uuid}.{ext},
+# относительно root_dir.
+
+import os
+import uuid
+import shutil
+import asyncio
+import logging
+from typing import List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStorage:
+    """Хранилище файлов на локальном диске"""
+
+    def __init__(self, root_dir: str = None):
+        self.root_dir = root_dir or os.getenv("LOCAL_STORAGE_DIR", "/app/files")
+        os.makedirs(self.root_dir, exist_ok=True)
+        logger.info(f"✅ Локальное хранилище: {self.root_dir}")
+
+    def _generate_file_path(self, user_id: int, filename: str) -> str:
+        """Формат пути как в Supabase: users/{user_id}/medical_doc_{uuid}.{ext}"""
+        extension = os.path.splitext(filename.lower())[1] or ".pdf"
+        return f"users/{user_id}/medical_doc_{uuid.uuid4().hex[:12]}{extension}"
+
+    def _absolute_path(self, storage_path: str) -> str:
+        """Абсолютный путь с защитой от выхода за пределы root_dir"""
+        root = os.path.realpath(self.root_dir)
+        # Старые записи могут хранить полный локальный путь
+        if os.path.isabs(storage_path):
+            full_path = os.path.realpath(storage_path)
+        else:
+            full_path = os.path.realpath(os.path.join(root, storage_path))
+        if not full_path.startswith(root + os.sep):
+            raise ValueError("Path outside storage directory")
+        return full_path
+
+    async def upload_file(self, user_id: int, file_path: str, filename: str) -> Tuple[bool, str]:
+        """Копирует файл в хранилище"""
+        try:
+            if not os.path.exists(file_path):
+                return False, f"Файл не найден: {file_path}"
+
+            storage_path = self._generate_file_path(user_id, filename)
+            destination = self._absolute_path(storage_path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+            await asyncio.to_thread(shutil.copyfile, file_path, destination)
+            logger.info(f"✅ [LOCAL] Файл сохранен: {storage_path}")
+            return True, storage_path
+
+        except Exception as e:
+            logger.error(f"❌ [LOCAL] Ошибка сохранения файла: {e}")
+            return False, f"Local save error: {str(e)}"
+
+    async def upload_bytes(self, user_id: int, data: Union[bytes, memoryview], filename: str) -> Tuple[bool, str]:
+        """Записывает содержимое из памяти в хранилище"""
+        try:
+            storage_path = self._generate_file_path(user_id, filename)
+            destination = self._absolute_path(storage_path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+            def write_file():
+                with open(destination, "wb") as file:
+                    file.write(data)
+
+            await asyncio.to_thread(write_file)
+            logger.info(f"✅ [LOCAL] Файл сохранен: {storage_path}")
+            return True, storage_path
+
+        except Exception as e:
+            logger.error(f"❌ [LOCAL] Ошибка сохранения файла: {e}")
+            return False, f"Local save error: {str(e)}"
+
+    async def download_file(self, storage_path: str, local_path: str) -> bool:
+        """Копирует файл из хранилища в local_path"""
+        try:
+            source = self._absolute_path(storage_path)
+            if not os.path.isfile(source):
+                return False
+
+            local_dir = os.path.dirname(local_path)
+            if local_dir:
+                os.makedirs(local_dir, exist_ok=True)
+            await asyncio.to_thread(shutil.copyfile, source, local_path)
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ [LOCAL] Ошибка чтения файла: {e}")
+            return False
+
+    async def delete_file(self, storage_path: str) -> bool:
+        """Удаляет файл"""
+        return bool(await self.delete_files([storage_path]))
+
+    async def delete_files(self, storage_paths: List[str]) -> Optional[int]:
+        """Удаляет несколько файлов (None если хотя бы один не удалось удалить)"""
+        deleted_count = 0
+        failed = False
+        for storage_path in storage_paths:
+            try:
+                full_path = self._absolute_path(storage_path)
+                if os.path.isfile(full_path):
+                    await asyncio.to_thread(os.remove, full_path)
+                    deleted_count += 1
+            except Exception as e:
+                logger.error(f"❌ [LOCAL] Ошибка удаления файла: {e}")
+                failed = True
+        return None if failed else deleted_count
+
+    async def list_files(self, prefix: str) -> Optional[List[str]]:
+        """Список файлов в папке хранилища (пути относительно root_dir)"""
+        try:
+            prefix = prefix.strip("/")
+            directory = self._absolute_path(prefix)
+            if not os.path.isdir(directory):
+                return []
+            return [
+                f"{prefix}/{name}" for name in sorted(os.listdir(directory))
+                if os.path.isfile(os.path.join(directory, name))
+            ]
+        except Exception as e:
+            logger.error(f"❌ [LOCAL] Ошибка получения списка файлов: {e}")
+            return None
+
+    async def close(self):
+        """Совместимость с SupabaseStorage (ресурсов для закрытия нет)"""
+        return None
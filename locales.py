@@ -579,6 +579,9 @@ translations = {
         "no_documents": "📭 У Вас пока нет загруженных документов.",
         "all_documents_shown": "📁 Это все ваши документы.",
         "more_documents": "📄 У вас ещё {count} документ(а/ов)",
+        "btn_prev_page": "⬅️ Назад",
+        "btn_next_page": "Далее ➡️",
+        "documents_page": "📄 Страница {page}",
         "excluded": "⛔ Документ исключён из списка.",
         "note_not_found": "⚠️ Не удалось найти заметку.",
         "reset_done": "🔄 Все ваши данные удалены. Можете начать заново, нажав 🚀 Старт.",
@@ -1225,6 +1228,9 @@ translations = {
     "no_documents": "📭 У Вас поки що немає завантажених документів.",
     "all_documents_shown": "📁 Це всі ваші документи.",
     "more_documents": "📄 У вас ще {count} документ(а/ів)",
+    "btn_prev_page": "⬅️ Назад",
+    "btn_next_page": "Далі ➡️",
+    "documents_page": "📄 Сторінка {page}",
     "excluded": "⛔ Документ виключено зі списку.",
     "note_not_found": "⚠️ Не вдалося знайти нотатку.",
     "reset_done": "🔄 Всі ваші дані видалено. Можете почати заново, натиснувши 🚀 Старт.",
@@ -1867,6 +1873,9 @@ Garmin analysis requires detailed consultations.
     "no_documents": "📭 You don't have any uploaded documents yet.",
     "all_documents_shown": "📁 These are all your documents.",
     "more_documents": "📄 You have {count} more document(s)",
+    "btn_prev_page": "⬅️ Back",
+    "btn_next_page": "Next ➡️",
+    "documents_page": "📄 Page {page}",
     "excluded": "⛔ Document excluded from list.",
     "note_not_found": "⚠️ Could not find note.",
     "reset_done": "🔄 All your data deleted. You can start over by pressing 🚀 Start.",
@@ -2475,6 +2484,9 @@ Für die Garmin-Analyse sind detaillierte Beratungen erforderlich.
     "no_documents": "📭 Sie haben noch keine hochgeladenen Dokumente.",
     "all_documents_shown": "📁 Das sind alle Ihre Dokumente.",
     "more_documents": "📄 Sie haben noch {count} weitere Dokument(e)",
+    "btn_prev_page": "⬅️ Zurück",
+    "btn_next_page": "Weiter ➡️",
+    "documents_page": "📄 Seite {page}",
     "excluded": "⛔ Dokument aus Liste ausgeschlossen.",
     "note_not_found": "⚠️ Konnte Notiz nicht finden.",
     "reset_done": "🔄 Alle Ihre Daten gelöscht. Sie können mit 🚀 Start neu beginnen.",
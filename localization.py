@@ -0,0 +1,239 @@
+# localization.py - Общий движок локализации (бот и веб-кабинет)
+#
+# Исходные словари:
+#   - bot: locales.py (язык -> ключ -> текст)
+#   - web: webapp/translations_catalog.py (ключ -> язык -> текст)
+#
+# Каталог каждого языка компилируется в компактный файл (marshal) в
+# __pycache__/l10n и загружается лениво при первом обращении к языку.
+# Исходный модуль импортируется только для перекомпиляции (файла нет или
+# исходник изменился), поэтому процесс не держит в памяти все языки сразу.
+#
+# При загрузке строки делятся на простые и шаблоны ("{name}"): простые
+# возвращаются сразу, format_map вызывается только для шаблонов и только
+# когда переданы параметры.
+
+import os
+import marshal
+import logging
+import importlib
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Каталог скомпилированных файлов
+L10N_CACHE_DIR = os.getenv("L10N_CACHE_DIR", os.path.join(_ROOT, "__pycache__", "l10n"))
+
+# Версия формата скомпилированного файла
+_FORMAT_VERSION = 1
+
+# Домены: модуль-источник, имя словаря, путь к файлу, ориентация словаря
+_DOMAINS = {
+    "bot": {
+        "module": "locales",
+        "attr": "translations",
+        "path": os.path.join(_ROOT, "locales.py"),
+        "by_language": True,
+    },
+    "web": {
+        "module": "webapp.translations_catalog",
+        "attr": "TRANSLATIONS",
+        "path": os.path.join(_ROOT, "webapp", "translations_catalog.py"),
+        "by_language": False,
+    },
+}
+
+
+class Catalog:
+    """Скомпилированный каталог одного языка"""
+
+    __slots__ = ("plain", "templates")
+
+    def __init__(self, entries: Dict[str, str]):
+        self.plain: Dict[str, str] = {}
+        self.templates: Dict[str, str] = {}
+        for key, text in entries.items():
+            if "{" in text or "}" in text:
+                self.templates[key] = text
+            else:
+                self.plain[key] = text
+
+    def get(self, key: str) -> Optional[str]:
+        text = self.plain.get(key)
+        return text if text is not None else self.templates.get(key)
+
+    def keys(self):
+        return self.plain.keys() | self.templates.keys()
+
+
+class LocalizationEngine:
+    """Каталоги по (домен, язык), загружаемые при первом обращении"""
+
+    def __init__(self):
+        self._catalogs: Dict[Tuple[str, str], Catalog] = {}
+        self._languages: Dict[str, List[str]] = {}
+        self._values_by_key: Dict[Tuple[str, str], List[str]] = {}
+        self._lock = threading.Lock()
+
+    # ==========================================
+    # 📦 КОМПИЛЯЦИЯ И ЗАГРУЗКА
+    # ==========================================
+
+    @staticmethod
+    def _source_signature(domain: str) -> Tuple[int, int]:
+        stat = os.stat(_DOMAINS[domain]["path"])
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _compiled_path(domain: str, lang: str) -> str:
+        return os.path.join(L10N_CACHE_DIR, f"{domain}.{lang}.marshal")
+
+    @staticmethod
+    def _index_path(domain: str) -> str:
+        return os.path.join(L10N_CACHE_DIR, f"{domain}.index.marshal")
+
+    @staticmethod
+    def _read(path: str):
+        try:
+            with open(path, "rb") as f:
+                return marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def _compile(self, domain: str) -> Dict[str, Dict[str, str]]:
+        """Импорт исходного словаря и запись каталогов всех языков домена"""
+        config = _DOMAINS[domain]
+        signature = self._source_signature(domain)
+        source = getattr(importlib.import_module(config["module"]), config["attr"])
+
+        if config["by_language"]:
+            by_language = {lang: dict(entries) for lang, entries in source.items()}
+        else:
+            by_language = {}
+            for key, variants in source.items():
+                for lang, text in variants.items():
+                    by_language.setdefault(lang, {})[key] = text
+
+        try:
+            os.makedirs(L10N_CACHE_DIR, exist_ok=True)
+            for lang, entries in by_language.items():
+                with open(self._compiled_path(domain, lang), "wb") as f:
+                    marshal.dump((_FORMAT_VERSION, signature, entries), f)
+            with open(self._index_path(domain), "wb") as f:
+                marshal.dump((_FORMAT_VERSION, signature, sorted(by_language)), f)
+        except OSError as e:
+            # Только чтение - работаем из памяти
+            logger.warning(f"⚠️ Не удалось сохранить каталоги {domain}: {e}")
+
+        logger.info(f"🌍 Каталоги {domain} скомпилированы: {', '.join(sorted(by_language))}")
+        return by_language
+
+    def languages(self, domain: str) -> List[str]:
+        """Языки домена (из индекса, без загрузки каталогов)"""
+        languages = self._languages.get(domain)
+        if languages is None:
+            with self._lock:
+                languages = self._languages.get(domain)
+                if languages is None:
+                    index = self._read(self._index_path(domain))
+                    if index and index[0] == _FORMAT_VERSION and index[1] == self._source_signature(domain):
+                        languages = list(index[2])
+                    else:
+                        languages = sorted(self._compile(domain))
+                    self._languages[domain] = languages
+        return languages
+
+    def catalog(self, domain: str, lang: str) -> Optional[Catalog]:
+        """Каталог языка (None, если языка нет)"""
+        catalog = self._catalogs.get((domain, lang))
+        if catalog is not None:
+            return catalog
+        if lang not in self.languages(domain):
+            return None
+
+        with self._lock:
+            catalog = self._catalogs.get((domain, lang))
+            if catalog is None:
+                data = self._read(self._compiled_path(domain, lang))
+                if data and data[0] == _FORMAT_VERSION and data[1] == self._source_signature(domain):
+                    entries = data[2]
+                else:
+                    entries = self._compile(domain).get(lang, {})
+                catalog = Catalog(entries)
+                self._catalogs[(domain, lang)] = catalog
+        return catalog
+
+    # ==========================================
+    # 🔤 ПЕРЕВОД
+    # ==========================================
+
+    def get(self, domain: str, key: str, lang: str, fallback_lang: Optional[str] = None) -> Optional[str]:
+        """Исходный текст по ключу (без форматирования)"""
+        catalog = self.catalog(domain, lang)
+        if catalog is None and fallback_lang:
+            catalog = self.catalog(domain, fallback_lang)
+        return catalog.get(key) if catalog is not None else None
+
+    def translate(self, domain: str, key: str, lang: str, kwargs: Optional[Dict] = None,
+                  fallback_lang: Optional[str] = None, strict: bool = True) -> str:
+        """
+        Перевод с подстановкой параметров
+
+        Нет ключа - возвращается сам ключ. Ошибка подстановки: strict=True -
+        исключение, strict=False - текст без подстановки.
+        """
+        catalog = self.catalog(domain, lang)
+        if catalog is None and fallback_lang:
+            catalog = self.catalog(domain, fallback_lang)
+        if catalog is None:
+            return key
+
+        # Быстрый путь: строка без параметров
+        text = catalog.plain.get(key)
+        if text is not None:
+            return text
+
+        template = catalog.templates.get(key)
+        if template is None:
+            return key
+        if not kwargs:
+            return template
+        try:
+            return template.format_map(kwargs)
+        except (KeyError, ValueError, IndexError, AttributeError):
+            if strict:
+                raise
+            return template
+
+    def values_for_key(self, domain: str, key: str) -> List[str]:
+        """Текст ключа на всех языках (для фильтров по тексту кнопок)"""
+        values = self._values_by_key.get((domain, key))
+        if values is None:
+            values = []
+            for lang in self.languages(domain):
+                text = self.catalog(domain, lang).get(key)
+                if text is not None:
+                    values.append(text)
+            self._values_by_key[(domain, key)] = values
+        return values
+
+    def get_stats(self) -> Dict:
+        return {
+            "loaded_catalogs": sorted(f"{domain}.{lang}" for domain, lang in self._catalogs),
+            "entries": sum(len(c.plain) + len(c.templates) for c in self._catalogs.values()),
+            "cached_key_lookups": len(self._values_by_key),
+        }
+
+
+# Глобальный экземпляр
+_engine = None
+
+def get_localization() -> LocalizationEngine:
+    """Получить движок локализации (Singleton)"""
+    global _engine
+    if _engine is None:
+        _engine = LocalizationEngine()
+    return _engine
@@ -17,6 +17,10 @@ from db_postgresql import (
     get_user_language, t, get_all_values_for_key, initialize_db_pool, close_db_pool, set_user_language, save_user
 )
 from registration import user_states, start_registration, handle_registration_step
+from user_state_manager import (
+    UserStateManager, StateDict, prefetch_user_state, start_state_store, stop_state_store
+)
+from state_store import STATE_STORE_BACKEND
 from error_handler import handle_telegram_errors, BotError, OpenAIError, get_user_friendly_message, log_error_with_context, check_openai_health
 from keyboards import main_menu_keyboard, settings_keyboard, show_main_menu
 from profile_keyboards import (
@@ -43,6 +47,7 @@ from safe_message_answer import send_error_message, send_response_message
 from medication_notifications import initialize_medication_notifications, shutdown_medication_notifications
 from medication_ui_handlers import handle_medication_callbacks, show_medications_schedule_updated
 from garmin_scheduler import initialize_garmin_scheduler, shutdown_garmin_scheduler
+from telegram_outbox import send_message, start_telegram_outbox, stop_telegram_outbox, PRIORITY_INTERACTIVE
 from garmin_ui_handlers import GARMIN_CALLBACK_HANDLERS, GarminStates
 from garmin_ui_handlers import (
     handle_garmin_email_input, 
@@ -58,6 +63,8 @@ from feedback_handler import (
     FeedbackStates
 )
 from user_checker import full_process_debug_7374723347
+from startup import StartupOrchestrator
+from metrics import StageTimer, MESSAGE_STAGE_SECONDS, MESSAGES_TOTAL, register_collector
 
 logging.basicConfig(
     level=logging.INFO,
@@ -85,6 +92,27 @@ bot = Bot(
 )
 dp = Dispatcher()
 
+# ⏱️ Шаги запуска и время до первого обновления (объявляются в main())
+startup = StartupOrchestrator()
+register_collector(startup.collect_metrics)
+
+
+@dp.update.outer_middleware()
+async def first_update_middleware(handler, event, data):
+    """Отмечает время первого обновления после запуска"""
+    if startup.first_update_at is None:
+        startup.mark_first_update()
+    return await handler(event, data)
+
+
+@dp.update.outer_middleware()
+async def state_prefetch_middleware(handler, event, data):
+    """Подтягивает состояние диалога пользователя из общего хранилища перед обработкой"""
+    user = data.get("event_from_user")
+    if user:
+        await prefetch_user_state(user.id)
+    return await handler(event, data)
+
 def detect_user_language(user: types.User) -> str:
     """Автоопределение языка по Telegram"""
     phone_lang = user.language_code if user.language_code else 'en'
@@ -390,8 +418,6 @@ async def handle_garmin_password(message: types.Message, state: FSMContext):
 @dp.message(lambda msg: msg.text in get_all_values_for_key("main_documents"))
 @handle_telegram_errors
 async def show_documents_handler(message: types.Message):
-    user_id = message.from_user.id
-    user_states[user_id] = {"mode": "viewing_documents", "offset": 0}
     await handle_show_documents(message, user_id=message.from_user.id)
 
 @dp.message(lambda msg: msg.text in get_all_values_for_key("main_schedule"))
@@ -452,7 +478,8 @@ async def reset_user(message: types.Message):
     lang = "ru"  # ✅ ИСПРАВЛЕНО: используем дефолтный язык после удаления
     await message.answer(t("reset_done", lang))
 
-delete_confirmation_states = {}
+# Подтверждение удаления профиля (общее хранилище состояний, 10 минут)
+delete_confirmation_states = StateDict(UserStateManager(ttl_minutes=10, namespace="delete_confirmation"))
 
 @dp.callback_query(lambda c: c.data == "delete_profile_data")
 @handle_telegram_errors  
@@ -1073,6 +1100,9 @@ async def handle_user_message(message: types.Message):
                         message, user_id, reason="better_response"
                     )
             
+            # ⏱️ Этапы ответа: context → llm → send (см. metrics.py)
+            timer = StageTimer(MESSAGE_STAGE_SECONDS)
+
             # 🔍 ДЕТАЛЬНАЯ ОБРАБОТКА ВОПРОСА С ЛОГИРОВАНИЕМ
             try:
                 prompt_data = await process_user_question_detailed(user_id, user_input)
@@ -1158,6 +1188,8 @@ async def handle_user_message(message: types.Message):
                     
                     full_context = "\n\n".join(context_parts)
 
+                timer.mark("context")
+
                 # ✅ ОПРЕДЕЛЯЕМ КАКУЮ МОДЕЛЬ ИСПОЛЬЗОВАТЬ
                 has_premium_limits = await check_gpt4o_limit(user_id)
                 
@@ -1178,6 +1210,7 @@ async def handle_user_message(message: types.Message):
 
                 try:
                     # Основной запрос к модели
+                    timer.skip()
                     response = await ask_doctor(
                         context_text=full_context,
                         user_question=user_input,
@@ -1185,6 +1218,7 @@ async def handle_user_message(message: types.Message):
                         user_id=user_id,
                         use_gemini=use_gemini
                     )
+                    timer.mark("llm")
                     
                     # Удаляем уведомление перед отправкой ответа
                     if processing_msg:
@@ -1211,6 +1245,9 @@ async def handle_user_message(message: types.Message):
                 # Отправляем ответ пользователю
                 if response:
                     await send_response_message(message, response)
+                    timer.mark("send")
+                    timer.finish()
+                    MESSAGES_TOTAL.inc(outcome="ok")
                     
                     # ✅ ИСПРАВЛЕНИЕ: Тратим лимит только если ДЕЙСТВИТЕЛЬНО использовали продвинутую модель
                     if use_gemini:  # Если использовали Gemini - точно тратим лимит
@@ -1238,13 +1275,16 @@ async def handle_user_message(message: types.Message):
                                     message, user_id, reason="summary_updated"
                                 )
                 else:
+                    MESSAGES_TOTAL.inc(outcome="empty")
                     await send_error_message(message, get_user_friendly_message("Не удалось получить ответ", lang))
                     
             except Exception as e:
+                MESSAGES_TOTAL.inc(outcome="llm_error")
                 log_error_with_context(e, {"user_id": user_id, "action": "gpt_request"})
                 await send_error_message(message, get_user_friendly_message(e, lang))
                     
         except Exception as e:
+            MESSAGES_TOTAL.inc(outcome="error")
             log_error_with_context(e, {"user_id": user_id, "action": "message_processing"})
             await send_error_message(message, get_user_friendly_message(e, lang))
     
@@ -1523,9 +1563,11 @@ async def handle_subscription_settings(callback: types.CallbackQuery):
     lang = await get_user_language(user_id)
     
     try:
-        await bot.send_message(
-            ADMIN_USER_ID,
+        # Информирование админа не задерживает ответ пользователю
+        await send_message(
+            bot, ADMIN_USER_ID,
             f"💎 <b>Нажато Подписка</b>\n👤 ID: <code>{user_id}</code>\n👤 @{username}",
+            priority=PRIORITY_INTERACTIVE, wait=False,
             parse_mode="HTML"
         )
     except:
@@ -1664,14 +1706,15 @@ async def process_cancel_photo_analysis(callback_query: types.CallbackQuery):
 @dp.callback_query()
 @handle_telegram_errors
 async def handle_button_action(callback: types.CallbackQuery):
-    if callback.data == "more_docs":
+    if callback.data in ("docs_next", "docs_prev", "more_docs"):
         user_id = callback.from_user.id
         state = user_states.get(user_id)
 
         if isinstance(state, dict) and state.get("mode") == "viewing_documents":
-            user_states[user_id]["offset"] += 5
-            await handle_show_documents(callback.message, user_id=user_id)
+            page_step = -1 if callback.data == "docs_prev" else 1
+            await handle_show_documents(callback.message, user_id=user_id, page_step=page_step)
         else:
+            lang = await get_user_language(user_id)
             await callback.message.answer(t("unknown_state", lang))
         await callback.answer()
         return
@@ -1748,45 +1791,36 @@ async def handle_button_action(callback: types.CallbackQuery):
                 from file_storage import get_file_storage
                 storage = get_file_storage()
                 
-                if storage.storage_type == "supabase":
-                    # ✅ ДЛЯ ПРИВАТНОГО BUCKET СРАЗУ ИСПОЛЬЗУЕМ БЕЗОПАСНОЕ СКАЧИВАНИЕ
-                    logger.info(f"📥 [SUPABASE] Скачиваем файл для пользователя: {file_path}")
-                    
-                    # Определяем имя файла для пользователя
-                    original_filename = doc.get("title", "document")
-                    file_ext = os.path.splitext(file_path)[1] or ".pdf"
-                    safe_filename = f"{original_filename}{file_ext}"
-                    
-                    # Создаем временный файл
-                    import tempfile
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-                        temp_path = temp_file.name
-                    
-                    # Скачиваем файл из Supabase Storage
-                    import asyncio
-                    download_success = await storage.storage_manager.download_file(file_path, temp_path)
-                    
-                    if download_success and os.path.exists(temp_path):
-                        # Отправляем файл пользователю
-                        await callback.message.answer_document(
-                            types.FSInputFile(path=temp_path, filename=safe_filename)
-                        )
-                        logger.info(f"✅ [SUPABASE] Файл отправлен пользователю: {safe_filename}")
-                        
-                        # Удаляем временный файл
-                        try:
-                            os.remove(temp_path)
-                        except:
-                            pass
-                    else:
-                        await callback.message.answer(t("file_not_found", lang))
-                        
+                # ✅ СКАЧИВАЕМ ЧЕРЕЗ ХРАНИЛИЩЕ (Supabase или локальный бэкенд)
+                logger.info(f"📥 [STORAGE] Скачиваем файл для пользователя: {file_path}")
+                
+                # Определяем имя файла для пользователя
+                original_filename = doc.get("title", "document")
+                file_ext = os.path.splitext(file_path)[1] or ".pdf"
+                safe_filename = f"{original_filename}{file_ext}"
+                
+                # Создаем временный файл
+                import tempfile
+                with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
+                    temp_path = temp_file.name
+                
+                # Скачиваем файл из хранилища
+                download_success = await storage.download_file(file_path, temp_path)
+                
+                if download_success and os.path.exists(temp_path):
+                    # Отправляем файл пользователю
+                    await callback.message.answer_document(
+                        types.FSInputFile(path=temp_path, filename=safe_filename)
+                    )
+                    logger.info(f"✅ [STORAGE] Файл отправлен пользователю: {safe_filename}")
                 else:
-                    # ✅ ЛОКАЛЬНЫЕ ФАЙЛЫ (для fallback режима разработки)
-                    if not os.path.exists(file_path):
-                        await callback.message.answer(t("file_not_found", lang))
-                        return
-                    await callback.message.answer_document(types.FSInputFile(path=file_path))
+                    await callback.message.answer(t("file_not_found", lang))
+                
+                # Удаляем временный файл
+                try:
+                    os.remove(temp_path)
+                except:
+                    pass
                     
             except Exception as e:
                 logger.error(f"❌ Ошибка скачивания файла: {e}")
@@ -1807,6 +1841,7 @@ async def handle_button_action(callback: types.CallbackQuery):
 async def main():
     """Главная функция запуска бота (Railway-ready)"""
     print("🚀 Запуск медицинского бота...")
+    webhook_runner = None
     
     try:
         # 🔧 Получаем порт от Railway (для webhook)
@@ -1816,116 +1851,157 @@ async def main():
         print(f"🚀 Запуск бота {'на Railway' if is_railway else 'локально'}")
         print(f"🌐 Webhook порт: {port}")
         
-        # 🔧 1. ИНИЦИАЛИЗАЦИЯ СИСТЕМЫ USER STATE
-        from user_state_manager import UserStateManager
-        user_state_manager = UserStateManager(ttl_minutes=60)
-        print("✅ Бот инициализирован")
-        
-        # 💳 2. ПРОВЕРКА STRIPE
-        stripe_ok = check_stripe_setup()  # БЕЗ await - функция не async!
-        if stripe_ok:
-            print("✅ Stripe API готов")
-            print("💳 Stripe готов к работе")
-        else:
-            print("⚠️ Stripe недоступен (возможно, ключи не настроены)")
-        
-        # 🗄️ 3. ИНИЦИАЛИЗАЦИЯ POSTGRESQL (КРИТИЧНО!)
-        print("🔗 Подключение к PostgreSQL...")
-        database_url = os.getenv("DATABASE_URL")
-        if not database_url:
-            raise Exception("❌ DATABASE_URL не найден в переменных окружения")
-        
-        await initialize_db_pool(max_connections=10)
-        print("🗄️ PostgreSQL pool готов")
+        # 🔧 1. СИСТЕМА USER STATE (глобальный менеджер из user_state_manager)
+        print(f"✅ Бот инициализирован (хранилище состояний: {STATE_STORE_BACKEND})")
+
+        # 💳 Stripe: для webhook достаточно наличия ключей, запрос к API - отложенная проверка
+        from stripe_config import StripeConfig
+        stripe_ok = StripeConfig.validate_config()
+
+        # Обновления Telegram принимаются на том же сервере, если задан TELEGRAM_WEBHOOK_URL
+        from telegram_webhook import is_webhook_mode, create_webhook_ingress
+        telegram_ingress = create_webhook_ingress(bot, dp) if is_webhook_mode() else None
+
+        # ==========================================
+        # 🧩 ШАГИ ЗАПУСКА (независимые выполняются параллельно, см. startup.py)
+        # ==========================================
+
+        # 🗄️ POSTGRESQL (КРИТИЧНО!)
+        @startup.step("db_pool", critical=True)
+        async def start_db_pool():
+            print("🔗 Подключение к PostgreSQL...")
+            if not os.getenv("DATABASE_URL"):
+                raise Exception("❌ DATABASE_URL не найден в переменных окружения")
+            await initialize_db_pool()
+            print("🗄️ PostgreSQL pool готов")
+
+        # 📋 КОМАНДЫ БОТА (не зависят от БД)
+        @startup.step("bot_commands")
+        async def setup_bot_commands():
+            from aiogram.types import MenuButtonCommands, BotCommand
+
+            def commands_for(lang: str):
+                return [
+                    BotCommand(command="start", description=t("cmd_menu", lang)),
+                    BotCommand(command="subscription", description=t("cmd_subscription", lang)),
+                ]
+
+            languages = ["ru", "uk", "en", "de"]
+            await asyncio.gather(
+                *(bot.set_my_commands(commands_for(lang), language_code=lang) for lang in languages),
+                bot.set_my_commands(commands_for("ru")),  # По умолчанию русский
+                bot.set_chat_menu_button(menu_button=MenuButtonCommands()),
+            )
+            print("✅ Команды установлены для: ru, uk, en, de")
 
-        from aiogram.types import MenuButtonCommands, BotCommand
-    
-        languages = ["ru", "uk", "en", "de"]
-        
-        for lang in languages:
-            commands = [
-                BotCommand(command="start", description=t("cmd_menu", lang)),
-                BotCommand(command="subscription", description=t("cmd_subscription", lang)),
-            ]
-            await bot.set_my_commands(commands, language_code=lang)
-        
-        # По умолчанию русский
-        commands_default = [
-            BotCommand(command="start", description=t("cmd_menu", "ru")),
-            BotCommand(command="subscription", description=t("cmd_subscription", "ru")),
-        ]
-        await bot.set_my_commands(commands_default)
-        await bot.set_chat_menu_button(menu_button=MenuButtonCommands())
-        
-        print("✅ Команды установлены для: ru, uk, en, de")
-              
-        # 🧠 4. ИНИЦИАЛИЗАЦИЯ VECTOR DB (ПОСЛЕ PostgreSQL!)
-        print("🧠 Инициализация pgvector...")
-        try:
-            await initialize_vector_db()
-            print("✅ Vector database готова")
-        except Exception as e:
-            print(f"❌ Ошибка pgvector: {e}")
-            print("⚠️ Проверьте, что расширение pgvector включено в Railway PostgreSQL")
-            raise
+        # 💬 Хранилище состояний диалогов (очистка по TTL + восстановление после перезапуска)
+        @startup.step("state_store", depends=["db_pool"])
+        async def start_states():
+            await start_state_store()
 
-        # 💊 5. ИНИЦИАЛИЗАЦИЯ СИСТЕМЫ УВЕДОМЛЕНИЙ О ЛЕКАРСТВАХ
-        print("💊 Инициализация системы уведомлений о лекарствах...")
-        try:
+        # 🧠 VECTOR DB (ПОСЛЕ PostgreSQL!)
+        @startup.step("vector_db", depends=["db_pool"], critical=True)
+        async def start_vector_db():
+            print("🧠 Инициализация pgvector...")
+            try:
+                await initialize_vector_db()
+                print("✅ Vector database готова")
+            except Exception as e:
+                print(f"❌ Ошибка pgvector: {e}")
+                print("⚠️ Проверьте, что расширение pgvector включено в Railway PostgreSQL")
+                raise
+
+        # 📤 ОЧЕРЕДЬ ИСХОДЯЩИХ СООБЩЕНИЙ (до систем, которые сами пишут пользователям)
+        @startup.step("telegram_outbox", depends=["db_pool"])
+        async def start_outbox():
+            try:
+                await start_telegram_outbox(bot)
+                print("✅ Очередь исходящих сообщений запущена")
+            except Exception:
+                print("⚠️ Сообщения будут отправляться напрямую")
+                raise
+
+        # 💊 СИСТЕМА УВЕДОМЛЕНИЙ О ЛЕКАРСТВАХ (бот может работать без уведомлений)
+        @startup.step("medication_notifications", depends=["db_pool", "telegram_outbox"])
+        async def start_medications():
+            print("💊 Инициализация системы уведомлений о лекарствах...")
             await initialize_medication_notifications(bot)
             print("✅ Система уведомлений о лекарствах запущена")
-        except Exception as e:
-            print(f"❌ Ошибка системы уведомлений: {e}")
-            # НЕ поднимаем исключение - бот может работать без уведомлений
-            print("⚠️ Бот продолжит работу без уведомлений о лекарствах")
 
-        # 🏃 6. ИНИЦИАЛИЗАЦИЯ GARMIN ПЛАНИРОВЩИКА
-        print("🏃 Инициализация Garmin планировщика...")
-        try:
+        # 🏃 GARMIN ПЛАНИРОВЩИК (бот может работать без Garmin)
+        @startup.step("garmin_scheduler", depends=["db_pool", "telegram_outbox"])
+        async def start_garmin():
+            print("🏃 Инициализация Garmin планировщика...")
             await initialize_garmin_scheduler(bot)
             print("✅ Garmin планировщик запущен")
-        except Exception as e:
-            print(f"❌ Ошибка Garmin планировщика: {e}")
-            # НЕ поднимаем исключение - бот может работать без Garmin
-            print("⚠️ Бот продолжит работу без анализа Garmin")
-        
-        # 📁 5. ПРОВЕРКА ФАЙЛОВОГО ХРАНИЛИЩА (ВСТАВИТЬ СЮДА!)
-        try:
+
+        # 🗑️ ОЧЕРЕДЬ УДАЛЕНИЯ ФАЙЛОВ (GDPR)
+        @startup.step("gdpr_worker", depends=["db_pool"])
+        async def start_gdpr_worker():
+            from gdpr_purge import get_purge_engine
+            await get_purge_engine().start_worker()
+            print("✅ Очередь удаления файлов (GDPR) запущена")
+
+        # 📊 НОЧНАЯ СВЕРКА СЧЕТЧИКОВ ЛИЧНОГО КАБИНЕТА
+        @startup.step("user_stats_reconciler", depends=["db_pool"])
+        async def start_user_stats_reconciler():
+            from user_stats import get_user_stats_reconciler
+            await get_user_stats_reconciler().start()
+
+        # 🌐 WEBHOOK СЕРВЕР (на Railway порту)
+        @startup.step("webhook_server", depends=["db_pool"], critical=True)
+        async def start_webhook():
+            nonlocal webhook_runner
+            if not (stripe_ok or telegram_ingress):
+                return
+            print(f"🔗 Запуск webhook сервера на порту {port}...")
+            from webhook_subscription_handler import start_webhook_server
+            webhook_runner = await start_webhook_server(
+                bot, port=port, telegram_ingress=telegram_ingress, stripe_enabled=stripe_ok
+            )
+            print("✅ Webhook сервер запущен")
+
+        # ⏳ ОТЛОЖЕННЫЕ ПРОВЕРКИ (после начала приема обновлений)
+        @startup.step("stripe_check", deferred=True)
+        async def deferred_stripe_check():
+            if not stripe_ok:
+                print("⚠️ Stripe недоступен (ключи не настроены)")
+                return
+            if await asyncio.to_thread(check_stripe_setup):
+                print("✅ Stripe API готов")
+            else:
+                print("⚠️ Stripe API не отвечает (проверьте ключи)")
+
+        @startup.step("openai_check", deferred=True)
+        async def deferred_openai_check():
+            if await check_openai_status():
+                print("✅ OpenAI API доступен")
+            else:
+                print("⚠️ Проблемы с OpenAI API")
+
+        @startup.step("storage_check", deferred=True)
+        async def deferred_storage_check():
             from file_storage import check_storage_setup
-            storage_info = check_storage_setup()
-            
+            storage_info = await asyncio.to_thread(check_storage_setup)
+
             if storage_info['success']:
                 stats = storage_info['stats']
                 print(f"✅ Файловое хранилище готово:")
                 print(f"   📂 Тип: {stats['storage_type']}")
                 print(f"   📍 Путь: {stats['storage_path']}")
-                print(f"   📊 Файлов: {stats['file_count']}")
-                print(f"   💾 Размер: {stats['total_size_mb']} MB")
-                
+                if 'file_count' in stats:
+                    print(f"   📊 Файлов: {stats['file_count']}")
+                    print(f"   💾 Размер: {stats['total_size_mb']} MB")
+
                 if stats['storage_type'] == 'persistent':
                     print("   🎉 Railway Volumes активны!")
-                else:
+                elif stats['storage_type'] != 'supabase':
                     print("   ⚠️ Временное хранилище (добавьте Railway Volume)")
             else:
                 print(f"❌ Ошибка хранилища: {storage_info['error']}")
-                
-        except Exception as e:
-            print(f"⚠️ Ошибка проверки хранилища: {e}")
-        
-        # 🤖 6. ПРОВЕРКА OPENAI
-        openai_status = await check_openai_status()
-        if openai_status:
-            print("✅ OpenAI API доступен")
-        else:
-            print("⚠️ Проблемы с OpenAI API")
-        
-        # 🌐 7. ЗАПУСК WEBHOOK СЕРВЕРА (на Railway порту)
-        if stripe_ok:
-            print(f"🔗 Запуск Stripe webhook сервера на порту {port}...")
-            from webhook_subscription_handler import start_webhook_server
-            webhook_runner = await start_webhook_server(bot, port=port)
-            print("✅ Webhook сервер запущен")
-        
+
+        await startup.run()
+
         print("🚦 Rate Limiter активирован")
         print("   - Сообщения: 10/мин")
         print("   - Документы: 3/5мин") 
@@ -1933,8 +2009,17 @@ async def main():
         print("   - Заметки: 5/5мин")
         print("🚀 Бот готов к работе на Railway!")
         
-        # 🚀 8. ЗАПУСК БОТА
-        await dp.start_polling(bot)
+        # 🚀 ЗАПУСК БОТА (отложенные проверки - в фоне)
+        if telegram_ingress:
+            await telegram_ingress.start()
+            print("📡 Обновления Telegram принимаются через webhook")
+            startup.start_deferred()
+            await asyncio.Event().wait()  # Работаем до остановки процесса
+        else:
+            # Локальный запуск: polling (webhook, если был установлен, снимается)
+            await bot.delete_webhook(drop_pending_updates=False)
+            startup.start_deferred()
+            await dp.start_polling(bot)
         
     except KeyboardInterrupt:
         print("\n🛑 Получен сигнал остановки...")
@@ -1946,6 +2031,24 @@ async def main():
     finally:
         # 🧹 ОЧИСТКА РЕСУРСОВ
         print("🧹 Закрытие соединений...")
+        await startup.stop_deferred()
+
+        try:
+            # 📡 Сначала дообрабатываем принятые обновления Telegram
+            from telegram_webhook import get_webhook_ingress
+            if get_webhook_ingress():
+                await get_webhook_ingress().stop()
+                print("✅ Прием обновлений через webhook остановлен")
+        except Exception as e:
+            print(f"⚠️ Ошибка остановки webhook: {e}")
+
+        try:
+            if webhook_runner:
+                await webhook_runner.cleanup()
+                print("✅ Webhook сервер остановлен")
+        except Exception as e:
+            print(f"⚠️ Ошибка остановки webhook сервера: {e}")
+
         try:
             # 💊 Остановка системы уведомлений
             await shutdown_medication_notifications()
@@ -1953,6 +2056,37 @@ async def main():
         except Exception as e:
             print(f"⚠️ Ошибка остановки уведомлений: {e}")
         
+        try:
+            # ⌚ До закрытия БД: сохраняет буфер записей Garmin
+            await shutdown_garmin_scheduler()
+            print("✅ Garmin планировщик остановлен")
+        except Exception as e:
+            print(f"⚠️ Ошибка остановки Garmin планировщика: {e}")
+
+        try:
+            from gdpr_purge import get_purge_engine
+            await get_purge_engine().stop_worker()
+        except Exception as e:
+            print(f"⚠️ Ошибка остановки очереди удаления файлов: {e}")
+
+        try:
+            from user_stats import get_user_stats_reconciler
+            await get_user_stats_reconciler().stop()
+        except Exception as e:
+            print(f"⚠️ Ошибка остановки сверки счетчиков: {e}")
+
+        try:
+            await stop_telegram_outbox()
+            print("✅ Очередь исходящих сообщений остановлена")
+        except Exception as e:
+            print(f"⚠️ Ошибка остановки очереди исходящих: {e}")
+
+        try:
+            # 💬 Сохраняем несохраненные состояния диалогов
+            await stop_state_store()
+        except Exception as e:
+            print(f"⚠️ Ошибка остановки хранилища состояний: {e}")
+        
         try:
             await close_db_pool()
             print("✅ База данных закрыта")
@@ -1960,10 +2094,24 @@ async def main():
             print(f"⚠️ Ошибка закрытия БД: {e}")
 
         try:
-            await shutdown_garmin_scheduler()
-            print("✅ Garmin планировщик остановлен")
+            from garmin_executor import shutdown_garmin_executor
+            shutdown_garmin_executor()
+            print("✅ Пул Garmin остановлен")
         except Exception as e:
-            print(f"⚠️ Ошибка остановки Garmin планировщика: {e}")
+            print(f"⚠️ Ошибка остановки пула Garmin: {e}")
+
+        try:
+            from file_storage import close_file_storage
+            await close_file_storage()
+        except Exception as e:
+            print(f"⚠️ Ошибка закрытия хранилища: {e}")
+
+        try:
+            from pdf_renderer import shutdown_pdf_executor
+            shutdown_pdf_executor()
+            print("✅ Пул обработки PDF остановлен")
+        except Exception as e:
+            print(f"⚠️ Ошибка остановки пула PDF: {e}")
 
 # 🎯 ТОЧКА ВХОДА (в самом конце файла, замените существующую)
 if __name__ == "__main__":
@@ -1,5 +1,8 @@
 # medication_notifications.py - Система уведомлений о приеме лекарств
 
+import os
+import re
+import heapq
 import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
@@ -7,79 +10,133 @@ from typing import Dict, List, Optional
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from db_postgresql import get_db_connection, release_db_connection, get_user_language, t
+from metrics import track_cycle
+from telegram_outbox import send_message, PRIORITY_BROADCAST
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 logger = logging.getLogger(__name__)
 
+# Окно досылки пропущенных напоминаний при запуске (минуты)
+REMINDER_WINDOW_MINUTES = 30
+
+# Формат времени приема (ЧЧ:ММ)
+MEDICATION_TIME_RE = re.compile(r'^([01][0-9]|2[0-3]):[0-5][0-9]$')
+
+# Максимум одновременно отправляемых напоминаний
+MEDICATION_SEND_CONCURRENCY = int(os.getenv("MEDICATION_SEND_CONCURRENCY", "20"))
+
+# Расписание лекарств пользователей с включенными уведомлениями
+SCHEDULE_SQL = """
+    SELECT ns.user_id, COALESCE(ns.timezone_offset, 0) AS timezone_offset,
+           m.name, m.time, m.label
+    FROM notification_settings ns
+    JOIN medications m ON m.user_id = ns.user_id
+    WHERE ns.notifications_enabled = TRUE
+"""
+
+# Все наступившие напоминания по всем пользователям одним запросом:
+# местное время = UTC + смещение, minutes_ago - сколько минут назад было время приема
+# (через полночь корректно), уже отправленные исключаются по notification_history
+DUE_REMINDERS_SQL = """
+    SELECT m.user_id, m.name, m.time, m.label,
+           l.local_now - make_interval(mins => a.minutes_ago) AS notification_time
+    FROM notification_settings ns
+    JOIN medications m ON m.user_id = ns.user_id
+    CROSS JOIN LATERAL (
+        SELECT date_trunc('minute', $1::timestamp + make_interval(mins => COALESCE(ns.timezone_offset, 0))) AS local_now
+    ) l
+    CROSS JOIN LATERAL (
+        SELECT CASE WHEN m.time ~ '^([01][0-9]|2[0-3]):[0-5][0-9]$' THEN
+            (
+                (EXTRACT(HOUR FROM l.local_now)::int * 60 + EXTRACT(MINUTE FROM l.local_now)::int)
+                - (split_part(m.time, ':', 1)::int * 60 + split_part(m.time, ':', 2)::int)
+                + 1440
+            ) % 1440
+        END AS minutes_ago
+    ) a
+    WHERE ns.notifications_enabled = TRUE
+      AND a.minutes_ago < $2
+      AND NOT EXISTS (
+          SELECT 1 FROM notification_history h
+          WHERE h.user_id = m.user_id
+            AND h.medication_name = m.name
+            AND h.notification_time = l.local_now - make_interval(mins => a.minutes_ago)
+      )
+    ORDER BY m.user_id, notification_time, m.time
+"""
+
+def next_fire_utc(time_str: str, offset_minutes: int, now_utc: datetime) -> datetime:
+    """Ближайший (строго после now_utc) момент приема ЧЧ:ММ местного времени в UTC"""
+    hour, minute = map(int, time_str.split(':'))
+    local_now = now_utc + timedelta(minutes=offset_minutes)
+    fire_local = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if fire_local <= local_now:
+        fire_local += timedelta(days=1)
+    return fire_local - timedelta(minutes=offset_minutes)
+
+
 class MedicationNotificationSystem:
-    """Система уведомлений о приеме лекарств"""
+    """
+    Система уведомлений о приеме лекарств
+
+    Для каждого пользователя хранится расписание (время ЧЧ:ММ -> лекарства),
+    а ближайшие моменты приема в UTC лежат в куче. Фоновая задача спит до
+    ближайшего момента и отправляет напоминание точно в нужную минуту.
+    При изменении лекарств или часового пояса пересчитывается только этот
+    пользователь (устаревшие записи кучи отбрасываются по версии).
+    """
     
     def __init__(self, bot: Bot):
         self.bot = bot
         self.scheduler = AsyncIOScheduler(timezone='UTC')
-        self.user_timezones: Dict[int, str] = {}  # Кэш часовых поясов
+        self.user_timezones: Dict[int, Dict] = {}  # Кэш настроек: offset, name, enabled
+
+        # user_id -> {'offset': int, 'slots': {ЧЧ:ММ: [лекарства]}}
+        self._schedules: Dict[int, Dict] = {}
+        self._versions: Dict[int, int] = {}
+        self._heap: List[tuple] = []  # (fire_at_utc, user_id, ЧЧ:ММ, версия)
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._send_semaphore = asyncio.Semaphore(MEDICATION_SEND_CONCURRENCY)
+        self._send_tasks: set = set()
+        self.metrics = {"fired": 0, "reschedules": 0, "skipped": 0, "late_max_sec": 0.0}
         
     async def initialize(self):
         """Инициализация системы"""
         try:
-            # 1. Создаем таблицы если их нет
-            await self._create_notification_tables()
-            
-            # 2. Загружаем настройки пользователей
+            # Таблицы уведомлений создаются миграциями (migrations/0001_baseline.sql)
+
+            # 1. Загружаем настройки пользователей
             await self._load_user_timezones()
             
-            # 3. Запускаем планировщик
+            # 2. Досылаем напоминания, пропущенные за время перезапуска
+            await self._check_medication_reminders()
+
+            # 3. Строим расписание и запускаем таймер
+            await self._load_schedule()
+            self._runner = asyncio.create_task(self._run_timer())
+
+            # 4. Раз в сутки сверяем расписание с БД (изменения в обход бота)
             self.scheduler.start()
-            
-            # 4. Добавляем задачу проверки каждые 30 минут
             self.scheduler.add_job(
-                self._check_medication_reminders,
-                CronTrigger(minute='0,30'),  # В 00 и 30 минут каждого часа
-                id='medication_check',
+                self._load_schedule,
+                CronTrigger(hour=3, minute=15),
+                id='medication_schedule_resync',
                 replace_existing=True
             )
             
-            logger.info("✅ Система уведомлений о лекарствах запущена (проверка каждые 30 минут)")
+            logger.info(
+                f"✅ Система уведомлений о лекарствах запущена "
+                f"({len(self._schedules)} пользователей, {len(self._heap)} напоминаний в расписании)"
+            )
             
         except Exception as e:
             logger.error(f"❌ Ошибка инициализации системы уведомлений: {e}")
     
-    async def _create_notification_tables(self):
-        """Создание таблиц для уведомлений"""
-        conn = await get_db_connection()
-        try:
-            await conn.execute("""
-                -- Настройки уведомлений пользователей
-                CREATE TABLE IF NOT EXISTS notification_settings (
-                    user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
-                    notifications_enabled BOOLEAN DEFAULT TRUE,
-                    timezone_offset INTEGER DEFAULT 0,  -- Смещение в минутах от UTC
-                    timezone_name TEXT DEFAULT 'UTC',
-                    last_timezone_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                -- История отправленных уведомлений (чтобы не спамить)
-                CREATE TABLE IF NOT EXISTS notification_history (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-                    medication_name TEXT NOT NULL,
-                    notification_time TIMESTAMP NOT NULL,
-                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, medication_name, notification_time)
-                );
-                
-                -- Индексы для производительности
-                CREATE INDEX IF NOT EXISTS idx_notification_history_user_time 
-                    ON notification_history(user_id, notification_time);
-            """)
-        finally:
-            await release_db_connection(conn)
-    
     async def _load_user_timezones(self):
         """Загрузка часовых поясов пользователей"""
-        conn = await get_db_connection()
+        conn = await get_db_connection("background")
         try:
             rows = await conn.fetch("""
                 SELECT user_id, timezone_offset, timezone_name 
@@ -90,114 +147,220 @@ class MedicationNotificationSystem:
             for row in rows:
                 self.user_timezones[row['user_id']] = {
                     'offset': row['timezone_offset'],
-                    'name': row['timezone_name']
+                    'name': row['timezone_name'],
+                    'enabled': True
                 }
                 
         finally:
             await release_db_connection(conn)
+
+    # ==========================================
+    # ⏰ РАСПИСАНИЕ И ТАЙМЕР
+    # ==========================================
+
+    def _build_user_schedule(self, user_id: int, offset: int, medications: list):
+        """Заменяет расписание пользователя и кладет в кучу ближайшие приемы"""
+        version = self._versions.get(user_id, 0) + 1
+        self._versions[user_id] = version
+
+        slots: Dict[str, list] = {}
+        for med in medications:
+            time_str = (med['time'] or '').strip()
+            if MEDICATION_TIME_RE.match(time_str):
+                slots.setdefault(time_str, []).append(
+                    {'name': med['name'], 'time': time_str, 'label': med['label']}
+                )
+
+        if not slots:
+            self._schedules.pop(user_id, None)
+            return
+
+        self._schedules[user_id] = {'offset': offset, 'slots': slots}
+        now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        for time_str in slots:
+            heapq.heappush(self._heap, (next_fire_utc(time_str, offset, now_utc), user_id, time_str, version))
+
+    def _compact_heap(self):
+        """Убирает из кучи устаревшие записи, если их стало слишком много"""
+        live = sum(len(schedule['slots']) for schedule in self._schedules.values())
+        if len(self._heap) > 2 * live + 100:
+            self._heap = [entry for entry in self._heap if self._versions.get(entry[1]) == entry[3]]
+            heapq.heapify(self._heap)
+
+    @track_cycle("medication_schedule")
+    async def _load_schedule(self):
+        """Полная загрузка расписания всех пользователей (при запуске и раз в сутки)"""
+        conn = await get_db_connection("background")
+        try:
+            rows = await conn.fetch(SCHEDULE_SQL)
+        finally:
+            await release_db_connection(conn)
+
+        by_user: Dict[int, Dict] = {}
+        for row in rows:
+            entry = by_user.setdefault(row['user_id'], {'offset': row['timezone_offset'], 'meds': []})
+            entry['meds'].append(row)
+
+        for user_id in list(self._schedules):
+            if user_id not in by_user:
+                self._build_user_schedule(user_id, 0, [])
+        for user_id, entry in by_user.items():
+            self._build_user_schedule(user_id, entry['offset'], entry['meds'])
+
+        self._compact_heap()
+        self._wakeup.set()
+
+    async def _get_user_settings(self, user_id: int) -> Dict:
+        """Настройки пользователя из кэша (при промахе - из БД)"""
+        settings = self.user_timezones.get(user_id)
+        if settings is None:
+            current = await self.get_notification_settings(user_id)
+            settings = {
+                'offset': current['timezone_offset'] or 0,
+                'name': current['timezone_name'],
+                'enabled': current['enabled']
+            }
+            self.user_timezones[user_id] = settings
+        return settings
+
+    async def reschedule_user(self, user_id: int, medications: Optional[list] = None):
+        """
+        Пересчет расписания одного пользователя
+
+        medications - новый список лекарств (если None - читается из БД)
+        """
+        try:
+            settings = await self._get_user_settings(user_id)
+            if not settings.get('enabled', True):
+                medications = []
+            elif medications is None:
+                conn = await get_db_connection()
+                try:
+                    medications = await conn.fetch(
+                        "SELECT name, time, label FROM medications WHERE user_id = $1", user_id
+                    )
+                finally:
+                    await release_db_connection(conn)
+
+            medications = [
+                {'name': med.get('name', ''), 'time': med.get('time', ''), 'label': med.get('label', '')}
+                if isinstance(med, dict) else med
+                for med in medications
+            ]
+            self._build_user_schedule(user_id, settings.get('offset') or 0, medications)
+            self.metrics["reschedules"] += 1
+            self._compact_heap()
+            self._wakeup.set()
+        except Exception as e:
+            logger.error(f"❌ Ошибка пересчета напоминаний пользователя {user_id}: {e}")
+
+    async def _run_timer(self):
+        """Фоновая задача: спит до ближайшего приема и отправляет напоминания"""
+        while True:
+            try:
+                self._wakeup.clear()
+                now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+
+                while self._heap and self._heap[0][0] <= now_utc:
+                    fire_at, user_id, time_str, version = heapq.heappop(self._heap)
+                    schedule = self._schedules.get(user_id)
+                    if self._versions.get(user_id) != version or not schedule or time_str not in schedule['slots']:
+                        continue  # расписание пользователя изменилось
+
+                    # Следующий прием - через сутки
+                    heapq.heappush(self._heap, (fire_at + timedelta(days=1), user_id, time_str, version))
+
+                    self.metrics["fired"] += 1
+                    self.metrics["late_max_sec"] = max(
+                        self.metrics["late_max_sec"], round((now_utc - fire_at).total_seconds(), 1)
+                    )
+                    notification_time = fire_at + timedelta(minutes=schedule['offset'])
+                    task = asyncio.create_task(
+                        self._send_limited(user_id, list(schedule['slots'][time_str]), notification_time)
+                    )
+                    self._send_tasks.add(task)
+                    task.add_done_callback(self._send_tasks.discard)
+
+                timeout = (self._heap[0][0] - now_utc).total_seconds() if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка таймера напоминаний: {e}")
+                await asyncio.sleep(5)
+
+    async def _send_limited(self, user_id: int, medications: list, notification_time: datetime):
+        async with self._send_semaphore:
+            await self._send_medication_reminder(user_id, medications, notification_time)
+
+    def get_metrics(self) -> Dict:
+        """Метрики таймера напоминаний"""
+        return {
+            **self.metrics,
+            "users": len(self._schedules),
+            "heap_size": len(self._heap),
+            "next_fire_utc": self._heap[0][0].isoformat() if self._heap else None,
+        }
     
+    @track_cycle("medication_reminders")
     async def _check_medication_reminders(self):
-        """Проверка и отправка напоминаний о лекарствах - каждые 30 минут"""
+        """
+        Досылка напоминаний, наступивших за последние 30 минут (при запуске)
+
+        Все такие напоминания по местному времени пользователей выбираются
+        одним запросом (с исключением уже отправленных), отправка идет
+        параллельно с ограничением.
+        """
         try:
             # Получаем UTC время БЕЗ timezone info для совместимости с PostgreSQL
             current_utc = datetime.now(timezone.utc).replace(tzinfo=None)
-            
-            # Получаем пользователей с включенными уведомлениями
-            conn = await get_db_connection()
+
+            conn = await get_db_connection("background")
             try:
-                users = await conn.fetch("""
-                    SELECT DISTINCT u.user_id, ns.timezone_offset, ns.timezone_name
-                    FROM users u
-                    JOIN notification_settings ns ON u.user_id = ns.user_id
-                    JOIN medications m ON u.user_id = m.user_id
-                    WHERE ns.notifications_enabled = TRUE
-                """)
-                
-                for user in users:
-                    await self._check_user_medications_range(
-                        user['user_id'], 
-                        user['timezone_offset'],
-                        current_utc
-                    )
-                    
+                due_rows = await conn.fetch(DUE_REMINDERS_SQL, current_utc, REMINDER_WINDOW_MINUTES)
             finally:
                 await release_db_connection(conn)
-                
+
+            # Группируем лекарства: одно сообщение на (пользователь, время приема)
+            reminders: Dict[tuple, list] = {}
+            for row in due_rows:
+                reminders.setdefault((row['user_id'], row['notification_time']), []).append(row)
+
+            if not reminders:
+                return
+
+            logger.info(
+                f"🎯 Напоминаний к отправке: {len(reminders)} "
+                f"({len(due_rows)} лекарств, {len({user_id for user_id, _ in reminders})} пользователей)"
+            )
+
+            await asyncio.gather(*(
+                self._send_limited(user_id, meds, notification_time)
+                for (user_id, notification_time), meds in reminders.items()
+            ))
+
         except Exception as e:
             logger.error(f"❌ Ошибка проверки напоминаний: {e}")
     
-    async def _check_user_medications_range(self, user_id: int, timezone_offset: int, current_utc: datetime):
-        """Проверка лекарств пользователя за последние 30 минут"""
-        try:
-            # Вычисляем местное время пользователя (уже offset-naive)
-            user_local_time = current_utc + timedelta(minutes=timezone_offset)
-            
-            # Создаем список времен для проверки (последние 30 минут)
-            times_to_check = []
-            for minutes_back in range(30):  # Проверяем последние 30 минут
-                check_time = user_local_time - timedelta(minutes=minutes_back)
-                times_to_check.append(check_time.strftime("%H:%M"))
-            
-            # Логируем для отладки
-            logger.info(f"🔍 Пользователь {user_id}: UTC={current_utc.strftime('%H:%M')}, местное={user_local_time.strftime('%H:%M')}, проверяем: {times_to_check}")
-            
-            # Получаем лекарства на эти времена
-            conn = await get_db_connection()
-            try:
-                medications = await conn.fetch("""
-                    SELECT name, time, label 
-                    FROM medications 
-                    WHERE user_id = $1 AND time = ANY($2)
-                """, user_id, times_to_check)
-                
-                if medications:
-                    logger.info(f"🎯 Найдены лекарства для пользователя {user_id}: {[med['name'] + ' в ' + med['time'] for med in medications]}")
-                
-                # Группируем лекарства по времени
-                meds_by_time = {}
-                for med in medications:
-                    time_key = med['time']
-                    if time_key not in meds_by_time:
-                        meds_by_time[time_key] = []
-                    meds_by_time[time_key].append(med)
-                
-                # Отправляем уведомления для каждого времени
-                for time_str, meds in meds_by_time.items():
-                    # Вычисляем точную дату-время для этого времени (без timezone)
-                    try:
-                        hour, minute = map(int, time_str.split(':'))
-                        notification_time = user_local_time.replace(
-                            hour=hour, 
-                            minute=minute, 
-                            second=0, 
-                            microsecond=0
-                        )
-                        
-                        # Проверяем, не отправляли ли уже уведомление
-                        already_sent = await conn.fetchrow("""
-                            SELECT id FROM notification_history 
-                            WHERE user_id = $1 
-                            AND notification_time = $2
-                            AND DATE(sent_at) = CURRENT_DATE
-                        """, user_id, notification_time)
-                        
-                        if not already_sent:
-                            await self._send_medication_reminder(user_id, meds, notification_time)
-                        else:
-                            logger.info(f"⏭️ Уведомление для {time_str} уже отправлено сегодня")
-                            
-                    except ValueError as ve:
-                        logger.error(f"❌ Неверный формат времени {time_str} для пользователя {user_id}: {ve}")
-                        continue
-                        
-            finally:
-                await release_db_connection(conn)
-                
-        except Exception as e:
-            logger.error(f"❌ Ошибка проверки лекарств пользователя {user_id}: {e}")
-    
     async def _send_medication_reminder(self, user_id: int, medications: list, notification_time: datetime):
         """Отправка напоминания о лекарствах"""
+        # Сначала занимаем запись в истории: при нескольких репликах
+        # напоминание отправит только та, чья вставка прошла. Расписание в
+        # памяти другой реплики может быть устаревшим, поэтому запись
+        # создается только для актуальных лекарств и включенных уведомлений
+        try:
+            medications = await self._claim_notification(user_id, medications, notification_time)
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи напоминания пользователя {user_id}: {e}")
+            return
+        if not medications:
+            self.metrics["skipped"] += 1
+            return
+
         try:
             lang = await get_user_language(user_id)
             
@@ -224,31 +387,70 @@ class MedicationNotificationSystem:
             ])
             
             # Отправляем уведомление
-            await self.bot.send_message(
-                chat_id=user_id,
-                text=message_text,
+            await send_message(
+                self.bot, user_id, message_text,
+                priority=PRIORITY_BROADCAST,
                 reply_markup=keyboard,
                 parse_mode="HTML"
             )
             
-            # Записываем в историю
-            await self._log_notification(user_id, medications, notification_time)
-            
             logger.info(f"✅ Отправлено напоминание пользователю {user_id} о {len(medications)} лекарствах")
             
         except Exception as e:
             logger.error(f"❌ Ошибка отправки напоминания пользователю {user_id}: {e}")
+            # Освобождаем запись - досылка при следующем запуске повторит напоминание
+            try:
+                await self._release_notification(user_id, medications, notification_time)
+            except Exception as release_error:
+                logger.error(f"❌ Ошибка отмены записи напоминания пользователя {user_id}: {release_error}")
     
-    async def _log_notification(self, user_id: int, medications: list, notification_time: datetime):
-        """Логирование отправленного уведомления"""
-        conn = await get_db_connection()
+    async def _claim_notification(self, user_id: int, medications: list, notification_time: datetime) -> list:
+        """
+        Записывает напоминание в историю до отправки
+
+        Запись создается только для лекарств, которые по-прежнему есть в
+        medications с тем же временем приема, если уведомления включены и
+        время приема по текущему часовому поясу наступило не раньше
+        REMINDER_WINDOW_MINUTES назад (изменения с другой реплики).
+
+        Returns:
+            list: лекарства, запись которых вставлена этим процессом (остальные
+            уже отправлены, отправляются другой репликой или больше не актуальны)
+        """
+        now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        conn = await get_db_connection("background")
         try:
-            for med in medications:
-                await conn.execute("""
-                    INSERT INTO notification_history (user_id, medication_name, notification_time)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (user_id, medication_name, notification_time) DO NOTHING
-                """, user_id, med['name'], notification_time)
+            rows = await conn.fetch("""
+                INSERT INTO notification_history (user_id, medication_name, notification_time)
+                SELECT DISTINCT m.user_id, m.name, $4::timestamp
+                FROM medications m
+                JOIN notification_settings ns ON ns.user_id = m.user_id
+                CROSS JOIN LATERAL (
+                    SELECT $5::timestamp + make_interval(mins => COALESCE(ns.timezone_offset, 0)) AS local_now
+                ) l
+                WHERE m.user_id = $1
+                  AND (m.name, trim(m.time)) IN (SELECT * FROM unnest($2::text[], $3::text[]))
+                  AND ns.notifications_enabled = TRUE
+                  AND $4::timestamp > l.local_now - make_interval(mins => $6)
+                  AND $4::timestamp <= l.local_now + INTERVAL '1 minute'
+                ON CONFLICT (user_id, medication_name, notification_time) DO NOTHING
+                RETURNING medication_name
+            """, user_id, [med['name'] for med in medications], [med['time'] for med in medications],
+                notification_time, now_utc, REMINDER_WINDOW_MINUTES)
+        finally:
+            await release_db_connection(conn)
+
+        claimed = {row['medication_name'] for row in rows}
+        return [med for med in medications if med['name'] in claimed]
+
+    async def _release_notification(self, user_id: int, medications: list, notification_time: datetime):
+        """Удаляет записи истории неотправленного напоминания"""
+        conn = await get_db_connection("background")
+        try:
+            await conn.execute("""
+                DELETE FROM notification_history
+                WHERE user_id = $1 AND medication_name = ANY($2::text[]) AND notification_time = $3
+            """, user_id, [med['name'] for med in medications], notification_time)
         finally:
             await release_db_connection(conn)
     
@@ -265,14 +467,12 @@ class MedicationNotificationSystem:
                     last_timezone_update = CURRENT_TIMESTAMP
             """, user_id, timezone_offset, timezone_name)
             
-            # Обновляем кэш
-            self.user_timezones[user_id] = {
-                'offset': timezone_offset,
-                'name': timezone_name
-            }
-            
         finally:
             await release_db_connection(conn)
+
+        # Время приема в UTC сдвинулось - сбрасываем кэш и пересчитываем расписание
+        self.user_timezones.pop(user_id, None)
+        await self.reschedule_user(user_id)
     
     async def toggle_notifications(self, user_id: int) -> bool:
         """Переключение уведомлений пользователя"""
@@ -296,10 +496,13 @@ class MedicationNotificationSystem:
                     notifications_enabled = EXCLUDED.notifications_enabled
             """, user_id, new_state)
             
-            return new_state
-            
         finally:
             await release_db_connection(conn)
+
+        # Включение/выключение - добавляем или убираем напоминания пользователя
+        self.user_timezones.pop(user_id, None)
+        await self.reschedule_user(user_id)
+        return new_state
     
     async def get_notification_settings(self, user_id: int) -> Dict:
         """Получение настроек уведомлений пользователя"""
@@ -328,7 +531,11 @@ class MedicationNotificationSystem:
             await release_db_connection(conn)
     
     async def shutdown(self):
-        """Остановка планировщика"""
+        """Остановка планировщика и таймера"""
+        if self._runner:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, *self._send_tasks, return_exceptions=True)
+            self._runner = None
         if self.scheduler.running:
             self.scheduler.shutdown()
             logger.info("🛑 Система уведомлений остановлена")
@@ -363,6 +570,12 @@ async def set_user_medication_timezone(user_id: int, offset_minutes: int, timezo
     if notification_system:
         await notification_system.set_user_timezone(user_id, offset_minutes, timezone_name)
 
+async def reschedule_user_medications(user_id: int, medications: Optional[list] = None):
+    """Пересчитать напоминания пользователя после изменения списка лекарств"""
+    global notification_system
+    if notification_system:
+        await notification_system.reschedule_user(user_id, medications)
+
 async def get_user_notification_settings(user_id: int) -> Dict:
     """Получить настройки уведомлений пользователя"""
     global notification_system
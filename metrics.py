@@ -0,0 +1,288 @@
+# metrics.py - Метрики производительности в формате Prometheus
+#
+# Счетчики и гистограммы хранятся в памяти процесса; запись метрики -
+# словарь + bisect, без блокировок и внешних зависимостей, поэтому
+# инструментирование можно не выключать в продакшене.
+#
+# Экспорт: render_metrics() отдается на /metrics сервера вебхуков бота
+# (webhook_subscription_handler.py) и веб-кабинета (webapp/app.py).
+# Эндпоинт требует "Authorization: Bearer <METRICS_TOKEN>"; без METRICS_TOKEN
+# /metrics закрыт (метрики раскрывают нагрузку и внутреннее устройство).
+#
+# Показатели, которые уже считают сами модули (пулы БД, состояния, очередь
+# сообщений), не дублируются: модуль регистрирует сборщик через
+# register_collector(), и он вызывается только в момент запроса /metrics.
+
+import os
+import hmac
+import time
+import bisect
+import logging
+import functools
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы гистограмм (секунды)
+FAST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+SLOW_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+# Сборщик: () -> [(имя, тип, описание, [(метки, значение), ...]), ...]
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    __slots__ = ("name", "help", "labelnames", "values")
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными границами"""
+
+    __slots__ = ("name", "help", "labelnames", "buckets", "values")
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счетчики по корзинам (+Inf последняя), сумма, количество]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def time(self, **labels) -> "_Timer":
+        """with HISTOGRAM.time(stage="..."): ... - замер блока кода"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        for key, (counts, total, count) in self.values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class StageTimer:
+    """
+    Последовательные этапы одного запроса
+
+    mark(stage) записывает время с предыдущей отметки, finish() - общее
+    время с создания таймера (stage="total").
+    """
+
+    __slots__ = ("histogram", "labels", "started", "last")
+
+    def __init__(self, histogram: Histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = self.last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.histogram.observe(now - self.last, stage=stage, **self.labels)
+        self.last = now
+
+    def skip(self):
+        """Не учитывать время с прошлой отметки (ожидание, не относящееся к этапам)"""
+        self.last = time.perf_counter()
+
+    def finish(self, stage: str = "total"):
+        self.histogram.observe(time.perf_counter() - self.started, stage=stage, **self.labels)
+
+
+# ==========================================
+# 📋 РЕЕСТР
+# ==========================================
+
+_metrics: Dict[str, object] = {}
+_collectors: List[Collector] = []
+
+
+def counter(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = Counter(name, help, labelnames)
+    return metric
+
+
+def histogram(name: str, help: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = Histogram(name, help, labelnames, buckets)
+    return metric
+
+
+def register_collector(collector: Collector):
+    """Сборщик показателей, которые модуль считает сам (вызывается при запросе /metrics)"""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+# ==========================================
+# 📤 ЭКСПОРТ
+# ==========================================
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _render_family(lines: List[str], name: str, kind: str, help: str, samples):
+    help = help.replace("\\", "\\\\").replace("\n", "\\n")
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} {kind}")
+    for sample_name, labels, value in samples:
+        lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+
+
+def render_metrics() -> str:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    lines: List[str] = []
+    for metric in list(_metrics.values()):
+        _render_family(lines, metric.name, metric.kind, metric.help, metric.samples())
+
+    for collector in list(_collectors):
+        try:
+            families = list(collector())
+        except Exception as e:
+            logger.warning(f"⚠️ Сборщик метрик {getattr(collector, '__name__', collector)}: {e}")
+            continue
+        for name, kind, help, samples in families:
+            _render_family(lines, name, kind, help,
+                           ((name, labels, value) for labels, value in samples if value is not None))
+
+    return "\n".join(lines) + "\n"
+
+
+def is_authorized(authorization: Optional[str]) -> bool:
+    """Проверка заголовка Authorization для /metrics (без METRICS_TOKEN - доступ закрыт)"""
+    if not METRICS_TOKEN or not authorization:
+        return False
+    return hmac.compare_digest(authorization.encode("utf-8"), f"Bearer {METRICS_TOKEN}".encode("utf-8"))
+
+
+# ==========================================
+# ⏱️ МЕТРИКИ ГОРЯЧИХ ПУТЕЙ
+# ==========================================
+
+MESSAGE_STAGE_SECONDS = histogram(
+    "bot_message_stage_seconds",
+    "Ответ на вопрос пользователя по этапам: context (сбор контекста вместе с retrieval), "
+    "retrieval (поиск по документам), llm, send, total",
+    ("stage",),
+)
+MESSAGES_TOTAL = counter("bot_messages_total", "Вопросы пользователей по результату", ("outcome",))
+
+UPLOAD_STAGE_SECONDS = histogram(
+    "upload_stage_seconds",
+    "Загрузка документа по этапам",
+    ("source", "stage"),
+    buckets=SLOW_BUCKETS,
+)
+
+LLM_REQUEST_SECONDS = histogram(
+    "llm_request_seconds", "Длительность запросов к модели", ("model", "outcome"),
+)
+LLM_TOKENS_TOTAL = counter("llm_tokens_total", "Токены запросов к модели", ("model", "kind"))
+
+DB_POOL_ACQUIRE_SECONDS = histogram(
+    "db_pool_acquire_seconds", "Ожидание соединения из пула", ("profile",), buckets=FAST_BUCKETS,
+)
+
+SCHEDULER_CYCLE_SECONDS = histogram(
+    "scheduler_cycle_seconds", "Длительность циклов фоновых задач", ("job",), buckets=SLOW_BUCKETS,
+)
+SCHEDULER_CYCLE_ERRORS = counter("scheduler_cycle_errors_total", "Циклы фоновых задач с ошибкой", ("job",))
+
+
+def observe_llm(model: str, started: float, response=None, error: bool = False):
+    """Длительность и токены запроса к модели (started - time.perf_counter() до запроса)"""
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=model,
+                                outcome="error" if error else "ok")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS_TOTAL.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+        LLM_TOKENS_TOTAL.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+
+
+def track_cycle(job: str):
+    """Декоратор async-функции фоновой задачи: длительность цикла и ошибки"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                SCHEDULER_CYCLE_ERRORS.inc(job=job)
+                raise
+            finally:
+                SCHEDULER_CYCLE_SECONDS.observe(time.perf_counter() - started, job=job)
+        return wrapper
+    return decorator
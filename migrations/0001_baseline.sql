@@ -0,0 +1,711 @@
+-- 0001_baseline.sql - Исходная схема базы данных
+--
+-- Схема, которую раньше create_tables() выполнял при каждом запуске.
+-- Все операторы идемпотентны (IF NOT EXISTS): на существующей базе
+-- миграция только фиксирует текущее состояние.
+-- Индексы больших таблиц - в 0002_indexes.sql (CREATE INDEX CONCURRENTLY).
+
+-- Подключаем расширение pgvector (если не подключено)
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- 👤 ТАБЛИЦА ПОЛЬЗОВАТЕЛЕЙ
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    name TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    birth_year INTEGER,
+    gender TEXT,
+    height_cm INTEGER,
+    weight_kg REAL,
+    chronic_conditions TEXT,
+    medications TEXT,
+    allergies TEXT,
+    smoking TEXT,
+    alcohol TEXT,
+    physical_activity TEXT,
+    family_history TEXT,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    language TEXT DEFAULT 'ru',
+    gdpr_consent BOOLEAN DEFAULT FALSE,
+    gdpr_consent_time TIMESTAMP DEFAULT NULL,
+    total_messages_count INTEGER DEFAULT 0,
+
+    -- 🆕 Колонки для веб-авторизации
+    google_id VARCHAR(255) UNIQUE,
+    email VARCHAR(255) UNIQUE,
+    registration_source VARCHAR(20) DEFAULT 'telegram'
+);
+
+-- 💬 ИСТОРИЯ ЧАТА
+CREATE TABLE IF NOT EXISTS chat_history (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    message TEXT NOT NULL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 📄 ДОКУМЕНТЫ
+CREATE TABLE IF NOT EXISTS documents (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    title TEXT,
+    file_path TEXT,
+    file_type TEXT,
+    raw_text TEXT,
+    summary TEXT,
+    confirmed BOOLEAN DEFAULT FALSE,
+    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    vector_id TEXT
+);
+
+-- 🧠 ВЕКТОРЫ ДОКУМЕНТОВ (pgvector) - ЭТА ТАБЛИЦА ВАЖНА!
+CREATE TABLE IF NOT EXISTS document_vectors (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    chunk_index INTEGER NOT NULL,
+    chunk_text TEXT NOT NULL,
+    embedding vector(1536),  -- OpenAI embeddings размер
+    metadata JSONB DEFAULT '{}',
+    keywords TEXT DEFAULT '',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    -- 🔍 УНИКАЛЬНЫЙ ИНДЕКС
+    CONSTRAINT unique_chunk UNIQUE(document_id, chunk_index)
+);
+
+-- 💊 ЛЕКАРСТВА
+CREATE TABLE IF NOT EXISTS medications (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    time TEXT,
+    label TEXT
+);
+
+-- 📊 ЛИМИТЫ ПОЛЬЗОВАТЕЛЕЙ
+CREATE TABLE IF NOT EXISTS user_limits (
+    user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    documents_left INTEGER DEFAULT 2,
+    gpt4o_queries_left INTEGER DEFAULT 10,
+    subscription_type TEXT DEFAULT 'free',
+    subscription_expires_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 💳 ТРАНЗАКЦИИ
+CREATE TABLE IF NOT EXISTS transactions (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    stripe_session_id TEXT UNIQUE,
+    amount_usd REAL,
+    package_type TEXT,
+    status TEXT DEFAULT 'pending',
+    payment_method TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP,
+    package_id TEXT,
+    documents_granted INTEGER DEFAULT 0,
+    queries_granted INTEGER DEFAULT 0,
+    promo_code TEXT
+);
+
+-- 📦 ПАКЕТЫ ПОДПИСОК
+CREATE TABLE IF NOT EXISTS subscription_packages (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    price_usd REAL NOT NULL,
+    documents_included INTEGER DEFAULT 0,
+    gpt4o_queries_included INTEGER DEFAULT 0,
+    type TEXT DEFAULT 'one_time',
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 🔄 ПОДПИСКИ ПОЛЬЗОВАТЕЛЕЙ
+CREATE TABLE IF NOT EXISTS user_subscriptions (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    stripe_subscription_id TEXT UNIQUE,
+    package_id TEXT REFERENCES subscription_packages(id),
+    status TEXT DEFAULT 'active',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    cancelled_at TIMESTAMP
+);
+
+-- 🧠 РЕЗЮМЕ РАЗГОВОРОВ
+CREATE TABLE IF NOT EXISTS conversation_summary (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    summary_text TEXT,
+    last_message_id INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 📋 МЕДИЦИНСКАЯ КАРТА ПАЦИЕНТА
+CREATE TABLE IF NOT EXISTS medical_timeline (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    source_document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+    event_date DATE NOT NULL,
+    category TEXT DEFAULT 'general' CHECK (category IN ('diagnosis', 'treatment', 'test', 'procedure', 'general')),
+    importance TEXT DEFAULT 'normal' CHECK (importance IN ('critical', 'important', 'normal')),
+    description TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 📊 АНАЛИТИКА
+CREATE TABLE IF NOT EXISTS analytics_events (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    event TEXT NOT NULL,
+    properties JSONB DEFAULT '{}',
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ================================
+-- 🏃 ТАБЛИЦЫ GARMIN ИНТЕГРАЦИИ
+-- ================================
+
+-- 📱 ПОДКЛЮЧЕНИЯ К GARMIN (УПРОЩЕННАЯ ВЕРСИЯ)
+CREATE TABLE IF NOT EXISTS garmin_connections (
+    user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    garmin_email TEXT NOT NULL, -- Зашифрованный email
+    garmin_password TEXT NOT NULL, -- Зашифрованный пароль
+    session_tokens TEXT, -- Зашифрованные OAuth токены сессии (без повторного логина)
+    tokens_updated_at TIMESTAMP,
+    is_active BOOLEAN DEFAULT TRUE,
+    last_sync_date DATE, -- Последняя дата синхронизации
+    sync_errors INTEGER DEFAULT 0, -- Счетчик ошибок подключения
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 📊 ЕЖЕДНЕВНЫЕ ДАННЫЕ ЗДОРОВЬЯ ИЗ GARMIN (РАСШИРЕННАЯ ВЕРСИЯ)
+CREATE TABLE IF NOT EXISTS garmin_daily_data (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    data_date DATE NOT NULL, -- Дата данных
+
+    -- Базовая активность
+    steps INTEGER,
+    calories INTEGER,
+    floors_climbed INTEGER,
+    distance_meters INTEGER,
+
+    -- Данные сна (основные)
+    sleep_duration_minutes INTEGER,
+    sleep_deep_minutes INTEGER,
+    sleep_light_minutes INTEGER,
+    sleep_rem_minutes INTEGER,
+    sleep_awake_minutes INTEGER,
+    sleep_score INTEGER, -- 0-100
+
+    -- НОВЫЕ: Дополнительные данные сна
+    nap_duration_minutes INTEGER,
+    sleep_need_minutes INTEGER,
+    sleep_baseline_minutes INTEGER,
+
+    -- Пульс (основные)
+    resting_heart_rate INTEGER,
+    avg_heart_rate INTEGER,
+    max_heart_rate INTEGER,
+    hrv_rmssd REAL, -- Вариабельность пульса
+
+    -- НОВЫЕ: Дополнительные данные пульса
+    min_heart_rate INTEGER,
+    heart_rate_measurements INTEGER,
+    hr_zone_rest_percent REAL,
+    hr_zone_aerobic_percent REAL,
+    resting_heart_rate_7day_avg INTEGER,
+
+    -- Стресс и энергия (основные)
+    stress_avg INTEGER, -- 0-100
+    stress_max INTEGER,
+    body_battery_max INTEGER, -- 0-100
+    body_battery_min INTEGER,
+    body_battery_charged INTEGER, -- Восстановление энергии
+    body_battery_drained INTEGER, -- Трата энергии
+    body_battery_after_sleep INTEGER,
+
+    -- НОВЫЕ: Дополнительные данные стресса
+    stress_min INTEGER,
+    stress_high_periods_count INTEGER,
+    stress_low_periods_count INTEGER,
+
+    -- НОВЫЕ: Дополнительные данные Body Battery
+    body_battery_avg REAL,
+    body_battery_stress_events INTEGER,
+    body_battery_recovery_events INTEGER,
+    body_battery_activity_events INTEGER,
+
+    -- Кислород и дыхание
+    spo2_avg REAL, -- Кислород в крови %
+    respiration_avg REAL, -- Частота дыхания
+
+    -- Готовность и фитнес (основные)
+    training_readiness INTEGER, -- 0-100
+    vo2_max REAL,
+    fitness_age INTEGER,
+
+    -- НОВЫЕ: Расширенные данные готовности
+    training_readiness_status TEXT,
+    readiness_sleep_factor INTEGER,
+    readiness_hrv_factor INTEGER,
+    readiness_stress_factor INTEGER,
+
+    -- НОВЫЕ: Данные активности
+    active_periods_15min INTEGER,
+    sedentary_periods_15min INTEGER,
+    sleep_periods_15min INTEGER,
+    total_calories INTEGER,
+    vigorous_intensity_minutes INTEGER,
+    moderate_intensity_minutes INTEGER,
+
+    -- Тренировки (основные)
+    activities_count INTEGER DEFAULT 0,
+    activities_duration_minutes INTEGER DEFAULT 0,
+    activities_calories INTEGER DEFAULT 0,
+    activities_data JSONB, -- Детали тренировок
+
+    -- НОВЫЕ: Дополнительные данные тренировок
+    activities_types TEXT,
+    activities_max_intensity INTEGER,
+
+    -- НОВЫЕ: HRV данные
+    hrv_status TEXT,
+    hrv_baseline REAL,
+
+    -- НОВЫЕ: Тренировочный статус
+    training_status TEXT,
+    training_load_7day INTEGER,
+
+    -- НОВЫЕ: Дополнительные биометрические данные
+    body_temperature REAL,
+    hydration_ml INTEGER,
+    menstrual_cycle_phase TEXT,
+
+    -- НОВЫЕ: Метаданные качества данных
+    data_completeness_score REAL,
+    last_sync_quality TEXT,
+
+    -- Служебные поля
+    sync_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    data_quality JSONB, -- Какие данные доступны
+    endpoint_sync JSONB DEFAULT '{}', -- Время последнего запроса по каждому API
+
+    UNIQUE(user_id, data_date) -- Одна запись на день
+);
+
+-- 🧠 ИСТОРИЯ AI АНАЛИЗОВ GARMIN
+CREATE TABLE IF NOT EXISTS garmin_analysis_history (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    analysis_date DATE NOT NULL,
+    data_period TEXT DEFAULT '1_day', -- 1_day, 7_days, 30_days
+
+    -- Анализ от AI
+    analysis_text TEXT NOT NULL,
+    recommendations TEXT,
+    health_score REAL, -- Общая оценка здоровья 0-100
+
+    -- Тренды
+    sleep_trend TEXT, -- improving, stable, declining
+    activity_trend TEXT,
+    stress_trend TEXT,
+    recovery_trend TEXT,
+
+    -- Использованные лимиты
+    used_consultation_limit BOOLEAN DEFAULT TRUE,
+    gpt_model_used TEXT DEFAULT 'gpt-4o', -- ИСПРАВЛЕНО: используем реальную модель
+
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    UNIQUE(user_id, analysis_date) -- Один анализ в день
+);
+
+-- ⚙️ НАСТРОЙКИ АНАЛИЗА GARMIN (дополнительные)
+CREATE TABLE IF NOT EXISTS garmin_analysis_settings (
+    user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+
+    -- Персонализация анализа
+    focus_areas TEXT[], -- ['sleep', 'activity', 'stress', 'recovery']
+    goals JSONB, -- Цели пользователя
+    medical_conditions TEXT[], -- Учитывать медицинские состояния
+
+    -- Уведомления
+    enable_daily_analysis BOOLEAN DEFAULT TRUE,
+    enable_weekly_summary BOOLEAN DEFAULT TRUE,
+    enable_alerts BOOLEAN DEFAULT TRUE, -- Предупреждения о проблемах
+
+    -- Пороги для алертов
+    min_sleep_hours REAL DEFAULT 6.0,
+    max_stress_threshold INTEGER DEFAULT 80,
+    min_body_battery INTEGER DEFAULT 20,
+    target_steps INTEGER DEFAULT 10000,
+
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Таблица времени последнего сна
+CREATE TABLE IF NOT EXISTS garmin_users_sleep_tracking (
+    user_id BIGINT PRIMARY KEY,
+    last_analyzed_sleep_duration INTEGER, -- Время сна в минутах для сравнения
+    last_analysis_time TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+-- ============================================
+-- 🔗 ТАБЛИЦА ДЛЯ ПРИВЯЗКИ АККАУНТОВ
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS account_links (
+    link_code VARCHAR(6) PRIMARY KEY,
+    telegram_user_id BIGINT,
+    web_user_id BIGINT,
+    direction VARCHAR(20),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    is_used BOOLEAN DEFAULT FALSE
+);
+
+CREATE INDEX IF NOT EXISTS idx_account_links_telegram ON account_links(telegram_user_id);
+CREATE INDEX IF NOT EXISTS idx_account_links_web ON account_links(web_user_id);
+CREATE INDEX IF NOT EXISTS idx_account_links_active ON account_links(link_code) WHERE is_used = FALSE;
+
+-- ============================================
+-- 👁 КЭШ РЕЗУЛЬТАТОВ VISION
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS vision_cache (
+    cache_key TEXT PRIMARY KEY,
+    user_id BIGINT NOT NULL, -- владелец (удаляется вместе с аккаунтом)
+    result_text TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_vision_cache_expires ON vision_cache(expires_at);
+CREATE INDEX IF NOT EXISTS idx_vision_cache_user ON vision_cache(user_id);
+
+-- ============================================
+-- 🗑️ ОЧЕРЕДЬ УДАЛЕНИЯ ФАЙЛОВ (GDPR)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS storage_deletion_queue (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL, -- без FK: пользователь уже удален
+    storage_path TEXT NOT NULL,
+    is_prefix BOOLEAN DEFAULT FALSE, -- TRUE: удалить всю папку пользователя
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_storage_deletion_queue_next ON storage_deletion_queue(next_attempt_at, id);
+
+-- ============================================
+-- 🔒 АРЕНДА ФОНОВЫХ ЗАДАЧ (защита от параллельных запусков)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS scheduler_leases (
+    lease_name TEXT PRIMARY KEY,
+    owner_id TEXT NOT NULL, -- экземпляр приложения, владеющий арендой
+    acquired_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- ============================================
+-- 💬 СОСТОЯНИЯ ДИАЛОГОВ (общие для экземпляров бота)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS conversation_state (
+    namespace TEXT NOT NULL, -- user_states, delete_confirmation, upsell
+    user_id BIGINT NOT NULL,
+    state JSONB NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (namespace, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversation_state_user ON conversation_state(user_id);
+CREATE INDEX IF NOT EXISTS idx_conversation_state_expires ON conversation_state(expires_at);
+
+-- ============================================
+-- 📊 СЧЕТЧИКИ ПОЛЬЗОВАТЕЛЯ (личный кабинет)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id BIGINT PRIMARY KEY,
+    total_documents INTEGER NOT NULL DEFAULT 0,
+    total_messages BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ============================================
+-- 💊 УВЕДОМЛЕНИЯ О ЛЕКАРСТВАХ
+-- ============================================
+
+-- Настройки уведомлений пользователей
+CREATE TABLE IF NOT EXISTS notification_settings (
+    user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    notifications_enabled BOOLEAN DEFAULT TRUE,
+    timezone_offset INTEGER DEFAULT 0,  -- Смещение в минутах от UTC
+    timezone_name TEXT DEFAULT 'UTC',
+    last_timezone_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- История отправленных уведомлений (чтобы не спамить)
+CREATE TABLE IF NOT EXISTS notification_history (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    medication_name TEXT NOT NULL,
+    notification_time TIMESTAMP NOT NULL,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, medication_name, notification_time)
+);
+
+-- ================================
+-- 🔄 МИГРАЦИЯ: Добавление новых полей в существующие таблицы
+-- ================================
+
+-- Добавляем новые поля в garmin_daily_data (если их еще нет)
+DO $$ 
+BEGIN
+    -- Проверяем и добавляем новые поля
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
+                  WHERE table_name = 'garmin_daily_data' AND column_name = 'nap_duration_minutes') THEN
+        ALTER TABLE garmin_daily_data ADD COLUMN nap_duration_minutes INTEGER;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
+                  WHERE table_name = 'garmin_daily_data' AND column_name = 'data_completeness_score') THEN
+        ALTER TABLE garmin_daily_data ADD COLUMN data_completeness_score REAL;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
+                  WHERE table_name = 'garmin_daily_data' AND column_name = 'last_sync_quality') THEN
+        ALTER TABLE garmin_daily_data ADD COLUMN last_sync_quality TEXT;
+    END IF;
+
+    -- Добавляем все остальные поля одним блоком (PostgreSQL игнорирует IF NOT EXISTS если поле уже есть)
+    BEGIN
+        ALTER TABLE garmin_daily_data 
+            ADD COLUMN IF NOT EXISTS sleep_need_minutes INTEGER,
+            ADD COLUMN IF NOT EXISTS sleep_baseline_minutes INTEGER,
+            ADD COLUMN IF NOT EXISTS body_battery_avg REAL,
+            ADD COLUMN IF NOT EXISTS body_battery_stress_events INTEGER,
+            ADD COLUMN IF NOT EXISTS body_battery_recovery_events INTEGER,
+            ADD COLUMN IF NOT EXISTS body_battery_activity_events INTEGER,
+            ADD COLUMN IF NOT EXISTS stress_min INTEGER,
+            ADD COLUMN IF NOT EXISTS stress_high_periods_count INTEGER,
+            ADD COLUMN IF NOT EXISTS stress_low_periods_count INTEGER,
+            ADD COLUMN IF NOT EXISTS min_heart_rate INTEGER,
+            ADD COLUMN IF NOT EXISTS heart_rate_measurements INTEGER,
+            ADD COLUMN IF NOT EXISTS hr_zone_rest_percent REAL,
+            ADD COLUMN IF NOT EXISTS hr_zone_aerobic_percent REAL,
+            ADD COLUMN IF NOT EXISTS resting_heart_rate_7day_avg INTEGER,
+            ADD COLUMN IF NOT EXISTS active_periods_15min INTEGER,
+            ADD COLUMN IF NOT EXISTS sedentary_periods_15min INTEGER,
+            ADD COLUMN IF NOT EXISTS sleep_periods_15min INTEGER,
+            ADD COLUMN IF NOT EXISTS total_calories INTEGER,
+            ADD COLUMN IF NOT EXISTS vigorous_intensity_minutes INTEGER,
+            ADD COLUMN IF NOT EXISTS moderate_intensity_minutes INTEGER,
+            ADD COLUMN IF NOT EXISTS activities_types TEXT,
+            ADD COLUMN IF NOT EXISTS activities_max_intensity INTEGER,
+            ADD COLUMN IF NOT EXISTS hrv_status TEXT,
+            ADD COLUMN IF NOT EXISTS hrv_baseline REAL,
+            ADD COLUMN IF NOT EXISTS training_readiness_status TEXT,
+            ADD COLUMN IF NOT EXISTS readiness_sleep_factor INTEGER,
+            ADD COLUMN IF NOT EXISTS readiness_hrv_factor INTEGER,
+            ADD COLUMN IF NOT EXISTS readiness_stress_factor INTEGER,
+            ADD COLUMN IF NOT EXISTS training_status TEXT,
+            ADD COLUMN IF NOT EXISTS training_load_7day INTEGER,
+            ADD COLUMN IF NOT EXISTS body_temperature REAL,
+            ADD COLUMN IF NOT EXISTS hydration_ml INTEGER,
+            ADD COLUMN IF NOT EXISTS menstrual_cycle_phase TEXT;
+    EXCEPTION WHEN OTHERS THEN
+        -- Игнорируем ошибки если поля уже существуют
+        NULL;
+    END;
+END $$;
+
+-- Время запроса каждого API Garmin (не запрашиваем повторно завершенные дни)
+ALTER TABLE garmin_daily_data
+    ADD COLUMN IF NOT EXISTS endpoint_sync JSONB DEFAULT '{}';
+
+-- Токены сессии Garmin (повторное использование после перезапуска)
+ALTER TABLE garmin_connections
+    ADD COLUMN IF NOT EXISTS session_tokens TEXT,
+    ADD COLUMN IF NOT EXISTS tokens_updated_at TIMESTAMP;
+
+-- ================================
+-- 🔄 ФУНКЦИИ И ТРИГГЕРЫ
+-- ================================
+
+-- Функция для обновления timestamps
+CREATE OR REPLACE FUNCTION update_medical_timeline_timestamp()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Функция очистки старых данных Garmin (старше 1 года)
+CREATE OR REPLACE FUNCTION cleanup_old_garmin_data()
+RETURNS INTEGER AS $$
+DECLARE
+    deleted_count INTEGER;
+BEGIN
+    -- Удаляем данные старше 1 года
+    DELETE FROM garmin_daily_data 
+    WHERE data_date < CURRENT_DATE - INTERVAL '1 year';
+
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+
+    -- Удаляем анализы старше 6 месяцев
+    DELETE FROM garmin_analysis_history 
+    WHERE analysis_date < CURRENT_DATE - INTERVAL '6 months';
+
+    -- Логируем результат (если есть таблица логов)
+    BEGIN
+        INSERT INTO analytics_events (user_id, event, properties) 
+        VALUES (0, 'garmin_cleanup', json_build_object('deleted_records', deleted_count)::jsonb);
+    EXCEPTION WHEN OTHERS THEN
+        -- Игнорируем ошибки логирования
+    END;
+
+    RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггер для medical_timeline
+DO $$ 
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_trigger 
+        WHERE tgname = 'medical_timeline_update_timestamp'
+    ) THEN
+        CREATE TRIGGER medical_timeline_update_timestamp
+            BEFORE UPDATE ON medical_timeline
+            FOR EACH ROW
+            EXECUTE FUNCTION update_medical_timeline_timestamp();
+    END IF;
+END $$;
+
+-- Счетчики user_stats: одно обновление на пользователя за оператор (см. user_stats.py)
+CREATE OR REPLACE FUNCTION user_stats_rows_inserted()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'documents' THEN
+        INSERT INTO user_stats (user_id, total_documents)
+        SELECT user_id, COUNT(*) FROM new_rows WHERE user_id IS NOT NULL GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET total_documents = user_stats.total_documents + EXCLUDED.total_documents,
+            updated_at = CURRENT_TIMESTAMP;
+    ELSE
+        INSERT INTO user_stats (user_id, total_messages)
+        SELECT user_id, COUNT(*) FROM new_rows WHERE user_id IS NOT NULL GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET total_messages = user_stats.total_messages + EXCLUDED.total_messages,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_stats_rows_deleted()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'documents' THEN
+        UPDATE user_stats s
+        SET total_documents = GREATEST(s.total_documents - d.total, 0),
+            updated_at = CURRENT_TIMESTAMP
+        FROM (SELECT user_id, COUNT(*) AS total FROM old_rows GROUP BY user_id) d
+        WHERE s.user_id = d.user_id;
+    ELSE
+        UPDATE user_stats s
+        SET total_messages = GREATEST(s.total_messages - d.total, 0),
+            updated_at = CURRENT_TIMESTAMP
+        FROM (SELECT user_id, COUNT(*) AS total FROM old_rows GROUP BY user_id) d
+        WHERE s.user_id = d.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'documents_user_stats_insert') THEN
+        CREATE TRIGGER documents_user_stats_insert
+            AFTER INSERT ON documents
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION user_stats_rows_inserted();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'documents_user_stats_delete') THEN
+        CREATE TRIGGER documents_user_stats_delete
+            AFTER DELETE ON documents
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION user_stats_rows_deleted();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'chat_history_user_stats_insert') THEN
+        CREATE TRIGGER chat_history_user_stats_insert
+            AFTER INSERT ON chat_history
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION user_stats_rows_inserted();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'chat_history_user_stats_delete') THEN
+        CREATE TRIGGER chat_history_user_stats_delete
+            AFTER DELETE ON chat_history
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION user_stats_rows_deleted();
+    END IF;
+
+    -- Первичное заполнение (один раз, пока таблица пуста)
+    IF NOT EXISTS (SELECT 1 FROM user_stats) THEN
+        INSERT INTO user_stats (user_id, total_documents, total_messages)
+        SELECT u.user_id, COALESCE(d.total, 0), COALESCE(m.total, 0)
+        FROM users u
+        LEFT JOIN (SELECT user_id, COUNT(*) AS total FROM documents GROUP BY user_id) d
+            ON d.user_id = u.user_id
+        LEFT JOIN (SELECT user_id, COUNT(*) AS total FROM chat_history GROUP BY user_id) m
+            ON m.user_id = u.user_id
+        ON CONFLICT (user_id) DO NOTHING;
+    END IF;
+END $$;
+
+-- ================================
+-- 📝 КОММЕНТАРИИ К ТАБЛИЦАМ И НОВЫМ ПОЛЯМ
+-- ================================
+COMMENT ON COLUMN users.gdpr_consent IS 'Пользователь дал согласие на обработку данных (GDPR)';
+COMMENT ON COLUMN users.gdpr_consent_time IS 'Время когда пользователь дал согласие GDPR';
+COMMENT ON TABLE document_vectors IS 'Векторные эмбеддинги документов для семантического поиска';
+
+-- Комментарии для Garmin таблиц
+COMMENT ON TABLE garmin_connections IS 'Подключения пользователей к Garmin Connect';
+COMMENT ON TABLE garmin_daily_data IS 'Ежедневные данные здоровья из часов Garmin (расширенная версия)';  
+COMMENT ON TABLE garmin_analysis_history IS 'История AI анализов данных Garmin';
+COMMENT ON TABLE garmin_analysis_settings IS 'Настройки персонализации анализа Garmin';
+COMMENT ON TABLE garmin_users_sleep_tracking IS 'Простое отслеживание сна по продолжительности';
+COMMENT ON COLUMN garmin_connections.garmin_email IS 'Зашифрованный email от Garmin Connect';
+COMMENT ON COLUMN garmin_connections.garmin_password IS 'Зашифрованный пароль от Garmin Connect';
+COMMENT ON COLUMN garmin_connections.sync_errors IS 'Счетчик ошибок синхронизации (при >= 5 пользователь деактивируется)';
+COMMENT ON COLUMN garmin_daily_data.data_quality IS 'JSON с информацией о качестве и доступности данных';
+
+-- Комментарии к новым полям
+COMMENT ON COLUMN garmin_daily_data.nap_duration_minutes IS 'Длительность дневного сна в минутах';
+COMMENT ON COLUMN garmin_daily_data.data_completeness_score IS 'Оценка полноты собранных данных от 0 до 100';
+COMMENT ON COLUMN garmin_daily_data.last_sync_quality IS 'Качество последней синхронизации: good, partial, poor';
+COMMENT ON COLUMN garmin_daily_data.body_battery_stress_events IS 'Количество стрессовых событий влияющих на Body Battery';
+COMMENT ON COLUMN garmin_daily_data.heart_rate_measurements IS 'Количество измерений пульса за день';
+COMMENT ON COLUMN garmin_daily_data.training_readiness_status IS 'Статус готовности к тренировкам: optimal, good, fair, poor';
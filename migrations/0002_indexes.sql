@@ -0,0 +1,56 @@
+-- migration: no-transaction
+-- 0002_indexes.sql - Индексы больших таблиц
+--
+-- Выполняется вне транзакции, по одному оператору: CONCURRENTLY не
+-- блокирует запись в таблицу во время построения индекса.
+-- Каждый оператор - на одной строке и заканчивается ";".
+
+-- ================================
+-- 📊 ИНДЕКСЫ ДЛЯ ВЕКТОРНОГО ПОИСКА (ВАЖНО!)
+-- ================================
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_vectors_user_id ON document_vectors(user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_vectors_document_id ON document_vectors(document_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_vectors_embedding ON document_vectors USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_vectors_keywords ON document_vectors USING gin(to_tsvector('russian', keywords));
+
+-- ================================
+-- 📊 ИНДЕКСЫ ДЛЯ GARMIN ТАБЛИЦ (ВКЛЮЧАЯ НОВЫЕ ПОЛЯ)
+-- ================================
+
+-- Индексы для быстрого поиска данных Garmin
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_garmin_daily_data_user_date ON garmin_daily_data(user_id, data_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_garmin_daily_data_date ON garmin_daily_data(data_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_garmin_analysis_user_date ON garmin_analysis_history(user_id, analysis_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_garmin_connections_active ON garmin_connections(user_id) WHERE is_active = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_garmin_connections_sync_errors ON garmin_connections(sync_errors) WHERE sync_errors >= 5;
+
+-- НОВЫЕ индексы для новых полей
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_garmin_daily_completeness ON garmin_daily_data(data_completeness_score) WHERE data_completeness_score IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_garmin_daily_sync_quality ON garmin_daily_data(last_sync_quality) WHERE last_sync_quality IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_garmin_daily_training_status ON garmin_daily_data(user_id, training_status) WHERE training_status IS NOT NULL;
+
+-- ================================
+-- 📊 ОСТАЛЬНЫЕ ИНДЕКСЫ
+-- ================================
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_analytics_user_id ON analytics_events(user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_analytics_event ON analytics_events(event);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_analytics_timestamp ON analytics_events(timestamp);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_analytics_user_event ON analytics_events(user_id, event);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_medical_timeline_user_date ON medical_timeline(user_id, event_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_medical_timeline_user_importance ON medical_timeline(user_id, importance);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_medical_timeline_category ON medical_timeline(user_id, category);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_history_user_id ON chat_history(user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_user_id ON documents(user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_user_uploaded ON documents(user_id, uploaded_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_medications_user_id ON medications(user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_medications_user_time ON medications(user_id, time);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactions_user_id ON transactions(user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_subscriptions_user_id ON user_subscriptions(user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_gdpr_consent ON users(gdpr_consent);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sleep_tracking_user ON garmin_users_sleep_tracking(user_id);
+
+-- ================================
+-- 💊 ИНДЕКСЫ УВЕДОМЛЕНИЙ
+-- ================================
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notification_history_user_time ON notification_history(user_id, notification_time);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notification_settings_enabled ON notification_settings(user_id) WHERE notifications_enabled = TRUE;
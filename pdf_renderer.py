@@ -0,0 +1,251 @@
+# pdf_renderer.py - Обработка PDF вне event loop
+#
+# Разбор и растеризация PDF выполняются в отдельном пуле процессов, чтобы
+# не блокировать бота на время работы poppler. Модуль намеренно импортирует
+# только stdlib на верхнем уровне: дочерние процессы (spawn) загружают его
+# без aiogram/openai/asyncpg.
+
+import io
+import os
+import shutil
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Количество процессов для обработки PDF
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+
+# Адаптивный DPI: длинная сторона страницы в пикселях и допустимые границы
+TARGET_LONG_SIDE_PX = 2000
+MIN_DPI = 100
+MAX_DPI = 200
+
+# Порог "настоящего" текстового слоя (цифровые PDF из лабораторий)
+MIN_TEXT_LAYER_CHARS_PER_PAGE = 80
+MIN_TEXT_LAYER_ALNUM_RATIO = 0.5
+
+# Кандидаты на расположение poppler (проверяются один раз на процесс)
+POPPLER_CANDIDATES = [
+    None,  # Системный PATH (Railway / Linux)
+    "/usr/bin",  # Linux
+    "/usr/local/bin",  # macOS с Homebrew
+    os.path.join(os.getcwd(), "poppler", "Library", "bin"),  # Windows (поставляется с репозиторием)
+]
+
+_poppler_path: Optional[str] = None
+_poppler_resolved = False
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+# ==========================================
+# 🔧 ФУНКЦИИ РАБОЧЕГО ПРОЦЕССА
+# ==========================================
+
+def _resolve_poppler_path() -> Optional[str]:
+    """Находит рабочий poppler один раз на процесс (вместо перебора при каждой ошибке)"""
+    global _poppler_path, _poppler_resolved
+    if _poppler_resolved:
+        return _poppler_path
+
+    for candidate in POPPLER_CANDIDATES:
+        if candidate is None:
+            if shutil.which("pdftoppm"):
+                _poppler_path = None
+                break
+        elif shutil.which("pdftoppm", path=candidate):
+            _poppler_path = candidate
+            break
+    else:
+        logger.warning("⚠️ poppler (pdftoppm) не найден, используется системный PATH")
+        _poppler_path = None
+
+    _poppler_resolved = True
+    return _poppler_path
+
+
+def _warmup_worker():
+    """Инициализатор процесса: заранее импортирует библиотеки и ищет poppler"""
+    try:
+        import pdf2image  # noqa: F401
+        import pypdf  # noqa: F401
+        from PIL import Image  # noqa: F401
+    except ImportError as e:
+        logger.warning(f"⚠️ Не удалось предзагрузить библиотеки PDF: {e}")
+    _resolve_poppler_path()
+
+
+def _adaptive_dpi(width_pt: float, height_pt: float) -> int:
+    """DPI по размеру страницы: длинная сторона ≈ TARGET_LONG_SIDE_PX пикселей"""
+    long_side_inches = max(width_pt, height_pt) / 72.0
+    if long_side_inches <= 0:
+        return MAX_DPI
+    dpi = int(TARGET_LONG_SIDE_PX / long_side_inches)
+    return max(MIN_DPI, min(MAX_DPI, dpi))
+
+
+def _is_usable_text(text: str) -> bool:
+    """Проверяет, что текст страницы - настоящий текст, а не мусор из шрифтов"""
+    stripped = "".join(text.split())
+    if len(stripped) < MIN_TEXT_LAYER_CHARS_PER_PAGE:
+        return False
+    alnum = sum(1 for c in stripped if c.isalnum())
+    return alnum / len(stripped) >= MIN_TEXT_LAYER_ALNUM_RATIO
+
+
+def inspect_pdf_sync(pdf_source: Union[str, bytes], max_pages: int = 5) -> Dict:
+    """
+    Читает структуру PDF через pypdf (без растеризации)
+
+    Args:
+        pdf_source: Путь к PDF или его содержимое
+
+    Returns:
+        Dict: page_count, dpi (список по страницам), text_layer (текст страниц
+        или None, если хотя бы одна страница без нормального текстового слоя)
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_source if isinstance(pdf_source, str) else io.BytesIO(pdf_source))
+    page_count = len(reader.pages)
+    pages = reader.pages[:max_pages]
+
+    dpi_list = []
+    page_texts = []
+    has_text_layer = True
+
+    for page in pages:
+        box = page.mediabox
+        dpi_list.append(_adaptive_dpi(float(box.width), float(box.height)))
+
+        if has_text_layer:
+            try:
+                text = page.extract_text() or ""
+            except Exception:
+                text = ""
+            if _is_usable_text(text):
+                page_texts.append(text.strip())
+            else:
+                has_text_layer = False
+
+    return {
+        "page_count": page_count,
+        "dpi": dpi_list,
+        "text_layer": page_texts if has_text_layer and page_texts else None,
+    }
+
+
+def render_page_sync(pdf_path: str, page_number: int, dpi: int,
+                     output_path: Optional[str] = None) -> Union[str, bytes]:
+    """
+    Растеризует одну страницу (нумерация с 1)
+
+    Returns:
+        Путь к сохраненному PNG или PNG в виде bytes, если output_path не задан
+    """
+    from pdf2image import convert_from_path
+
+    images = convert_from_path(
+        pdf_path,
+        first_page=page_number,
+        last_page=page_number,
+        dpi=dpi,
+        fmt="png",
+        poppler_path=_resolve_poppler_path(),
+    )
+    if not images:
+        raise ValueError(f"Страница {page_number} не растеризована")
+
+    # compress_level=1: изображение промежуточное, скорость важнее размера
+    if output_path is None:
+        buffer = io.BytesIO()
+        images[0].save(buffer, "PNG", compress_level=1)
+        return buffer.getvalue()
+
+    images[0].save(output_path, "PNG", compress_level=1)
+    return output_path
+
+
+# ==========================================
+# ⚙️ ПУЛ ПРОЦЕССОВ
+# ==========================================
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """Получить пул процессов для PDF (Singleton)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, PDF_WORKERS),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warmup_worker,
+        )
+        logger.info(f"✅ Пул обработки PDF запущен: {PDF_WORKERS} процесс(ов)")
+    return _executor
+
+
+def shutdown_pdf_executor():
+    """Остановка пула процессов"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# ==========================================
+# 🚀 ASYNC API
+# ==========================================
+
+async def inspect_pdf(pdf_source: Union[str, bytes], max_pages: int = 5) -> Optional[Dict]:
+    """Асинхронно читает структуру и текстовый слой PDF (None если PDF не читается)"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_pdf_executor(), inspect_pdf_sync, pdf_source, max_pages)
+    except Exception as e:
+        logger.error(f"❌ Ошибка чтения PDF: {type(e).__name__}: {e}")
+        return None
+
+
+async def iter_pdf_pages(pdf_path: str, output_dir: Optional[str],
+                         pdf_info: Dict) -> AsyncIterator[Union[str, bytes]]:
+    """
+    Растеризует страницы в пуле процессов и отдает их по мере готовности
+
+    Все страницы ставятся в очередь сразу (рендерятся параллельно), а
+    выдаются строго по порядку - первая страница уходит в Vision, не
+    дожидаясь остальных. Страница с ошибкой пропускается.
+
+    Без output_dir страницы возвращаются как PNG bytes (без записи на диск).
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Удаляем старые страницы
+        for f in os.listdir(output_dir):
+            if f.endswith(".png"):
+                os.remove(os.path.join(output_dir, f))
+
+    loop = asyncio.get_running_loop()
+    executor = get_pdf_executor()
+
+    futures: List[asyncio.Future] = [
+        loop.run_in_executor(
+            executor, render_page_sync, pdf_path, page_number, dpi,
+            os.path.join(output_dir, f"page_{page_number}.png") if output_dir else None
+        )
+        for page_number, dpi in enumerate(pdf_info["dpi"], start=1)
+    ]
+
+    try:
+        for page_number, future in enumerate(futures, start=1):
+            try:
+                yield await future
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка растеризации страницы {page_number}: {e}")
+    finally:
+        for future in futures:
+            future.cancel()
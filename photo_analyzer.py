@@ -121,6 +121,15 @@ async def handle_photo_question(message: types.Message, bot):
         
         photo_path = state.get("photo_path")
         user_question = message.text
+
+        # Фото сохранено другим экземпляром бота (или до перезапуска) - скачиваем заново
+        if photo_path and not os.path.exists(photo_path) and state.get("photo_file_id"):
+            try:
+                file_info = await bot.get_file(state["photo_file_id"])
+                os.makedirs(os.path.dirname(photo_path), exist_ok=True)
+                await bot.download_file(file_info.file_path, destination=photo_path)
+            except Exception:
+                logger.warning("Не удалось повторно скачать фото для анализа")
         
         if not photo_path or not os.path.exists(photo_path):
             await message.answer(t("photo_file_not_found", lang))
@@ -10,6 +10,7 @@ import logging
 from typing import Optional, Tuple, Dict, Any
 from aiogram import types
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from telegram_outbox import send_message, PRIORITY_BROADCAST
 
 logger = logging.getLogger(__name__)
 
@@ -135,9 +136,9 @@ class PromoManager:
             keyboard.adjust(1)  # Все кнопки в столбец
             
             # 5️⃣ Отправляем сообщение
-            message = await bot.send_message(
-                chat_id=user_id,
-                text=text,
+            message = await send_message(
+                bot, user_id, text,
+                priority=PRIORITY_BROADCAST,
                 reply_markup=keyboard.as_markup(),
                 parse_mode="HTML"
             )
@@ -1,8 +1,11 @@
+import time
 import logging
 import json
 from datetime import datetime
 from typing import List, Dict, Tuple, Optional
 
+from metrics import MESSAGE_STAGE_SECONDS
+
 # Настройка логирования для продакшена
 logger = logging.getLogger(__name__)
 
@@ -248,6 +251,7 @@ async def process_user_question_detailed(user_id: int, user_input: str) -> Dict:
             summary_text = "Ошибка получения сводки разговора"
         
         # ШАГ 4: Обработка векторов (оптимизированная)
+        retrieval_started = time.perf_counter()
         if vector_count == 0:
             # Пустая база: пропускаем поиск
             chunks_text = "У пользователя нет загруженных медицинских документов"
@@ -314,6 +318,7 @@ async def process_user_question_detailed(user_id: int, user_input: str) -> Dict:
                 all_chunks = list(dict.fromkeys(vector_texts + keyword_texts))
                 chunks_text = "\n\n".join(all_chunks[:5])
                 chunks_found = len(all_chunks)
+        MESSAGE_STAGE_SECONDS.observe(time.perf_counter() - retrieval_started, stage="retrieval")
         
         # ШАГ 5: Получение языка и создание системного промта
         try:
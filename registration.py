@@ -188,6 +188,9 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
                 await message.answer(t("birth_year_invalid", lang))
                 return True
         state["step"] = "awaiting_gender"
+        # Состояние меняется на месте - записываем обратно, иначе изменения
+        # не попадут в хранилище (state_store) и будут перезаписаны при подгрузке
+        user_states[user_id] = state
         await message.answer(t("gender_prompt", lang), reply_markup=gender_keyboard(lang))
         return True
 
@@ -207,6 +210,7 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
             return True
             
         state["step"] = "awaiting_height"
+        user_states[user_id] = state
         await message.answer(t("height_prompt", lang), reply_markup=skip_keyboard(lang))
         return True
 
@@ -224,6 +228,7 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
                 await message.answer(t("height_invalid", lang))
                 return True
         state["step"] = "awaiting_weight"
+        user_states[user_id] = state
         await message.answer(t("weight_prompt", lang), reply_markup=skip_keyboard(lang))
         return True
 
@@ -247,6 +252,7 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
         await update_user_field(user_id, "weight_kg", state.get("weight_kg"))
 
         state["step"] = "ask_full_profile"
+        user_states[user_id] = state
         await message.answer(
             t("registration_done", lang),
             reply_markup=registration_keyboard(lang)
@@ -265,6 +271,7 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
             
         if message.text == t("complete_profile", lang):
             state["step"] = "chronic_conditions"
+            user_states[user_id] = state
             await message.answer(t("profile_extra_prompt", lang), reply_markup=skip_keyboard(lang))
         else:
             user_states[user_id] = None
@@ -282,6 +289,7 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
                 return True
             await update_user_field(user_id, "chronic_conditions", text)
         state["step"] = "allergies"
+        user_states[user_id] = state
         await message.answer(t("allergies_prompt", lang), reply_markup=skip_keyboard(lang))
         return True
     
@@ -294,6 +302,7 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
                 return True
             await update_user_field(user_id, "allergies", text)
         state["step"] = "smoking"
+        user_states[user_id] = state
         await message.answer(t("smoking_prompt", lang), reply_markup=smoking_keyboard(lang))
         return True
 
@@ -311,6 +320,7 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
         if message.text != t("skip", lang):
             await update_user_field(user_id, "smoking", message.text.strip())
         state["step"] = "alcohol"
+        user_states[user_id] = state
         await message.answer(t("alcohol_prompt", lang), reply_markup=alcohol_keyboard(lang))
         return True
 
@@ -328,6 +338,7 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
         if message.text != t("skip", lang):
             await update_user_field(user_id, "alcohol", message.text.strip())
         state["step"] = "physical_activity"
+        user_states[user_id] = state
         await message.answer(t("activity_prompt", lang), reply_markup=activity_keyboard(lang))
         return True
 
@@ -379,6 +390,7 @@ async def handle_registration_step(user_id: int, message: Message) -> bool:
             await update_user_field(user_id, "physical_activity", unified_value)
         
         state["step"] = "family_history"
+        user_states[user_id] = state
         await message.answer(t("family_prompt", lang), reply_markup=skip_keyboard(lang))
         return True
 
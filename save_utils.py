@@ -4,7 +4,6 @@ import base64
 import mimetypes
 import os
 from dotenv import load_dotenv
-from pdf2image import convert_from_path
 from db_postgresql import get_last_message_id, get_conversation_summary, get_messages_after, save_conversation_summary, get_user_medications_text, update_user_field, get_user_language
 
 from gpt import client, OPENAI_SEMAPHORE
@@ -28,72 +27,38 @@ def encode_file_to_base64(file_path, user_id):
     mime_type, _ = mimetypes.guess_type(file_path)
     return f"data:{mime_type};base64,{encoded}"
 
-async def send_to_gpt_vision(image_path: str, lang: str = "ru", prompt: str = None):
+async def send_to_gpt_vision(image_path: str, lang: str = "ru", prompt: str = None, file_unique_id: str = None,
+                             user_id: int = None):
     """Перенаправляем на Gemini вместо GPT Vision"""
     from gemini_analyzer import send_to_gemini_vision
-    return await send_to_gemini_vision(image_path, lang, prompt)
+    return await send_to_gemini_vision(image_path, lang, prompt, file_unique_id, user_id)
 
 
 def convert_pdf_to_images(pdf_path: str, output_dir: str, max_pages: int = 5):
-    """Исправленная функция конвертации PDF в изображения"""
+    """
+    Синхронная конвертация PDF в изображения
+
+    ⚠️ Блокирует вызывающий поток. В async-обработчиках используйте
+    document_pipeline.analyze_pdf (пул процессов + потоковая передача страниц).
+    """
     try:
         import os
-        from pdf2image import convert_from_path
-        
+        from pdf_renderer import inspect_pdf_sync, render_page_sync
+
         os.makedirs(output_dir, exist_ok=True)
-        
+
         # Удаляем старые страницы
         for f in os.listdir(output_dir):
             if f.endswith(".png"):
                 os.remove(os.path.join(output_dir, f))
-        
-        # ✅ ИСПРАВЛЕНИЕ: Убираем hardcoded путь к poppler
-        # Railway и большинство Linux систем имеют poppler в системном PATH
-        try:
-            # Пробуем без указания пути (для Railway/Linux)
-            images = convert_from_path(
-                pdf_path,
-                first_page=1,
-                last_page=max_pages,
-                dpi=200,  # Добавляем DPI для лучшего качества
-                fmt='PNG'
-            )
-        except Exception as e:
-            # Fallback: пробуем с возможными путями poppler
-            poppler_paths = [
-                None,  # Системный PATH
-                "/usr/bin",  # Linux
-                "/usr/local/bin",  # macOS с Homebrew
-                os.path.join(os.getcwd(), "poppler", "Library", "bin"),  # Windows
-            ]
-            
-            images = None
-            last_error = None
-            
-            for poppler_path in poppler_paths:
-                try:
-                    images = convert_from_path(
-                        pdf_path,
-                        first_page=1,
-                        last_page=max_pages,
-                        poppler_path=poppler_path,
-                        dpi=200,
-                        fmt='PNG'
-                    )
-                    break  # Успешно конвертировали
-                except Exception as err:
-                    last_error = err
-                    continue
-            
-            if images is None:
-                raise last_error or Exception("Не удалось найти poppler")
 
-        # Сохраняем изображения
+        # ✅ DPI по размеру страницы, poppler ищется один раз на процесс
+        pdf_info = inspect_pdf_sync(pdf_path, max_pages)
+
         image_paths = []
-        for i, image in enumerate(images):
-            image_path = os.path.join(output_dir, f"page_{i+1}.png")
-            image.save(image_path, "PNG", optimize=True)
-            image_paths.append(image_path)
+        for page_number, dpi in enumerate(pdf_info["dpi"], start=1):
+            image_path = os.path.join(output_dir, f"page_{page_number}.png")
+            image_paths.append(render_page_sync(pdf_path, page_number, dpi, image_path))
 
         return image_paths
         
@@ -0,0 +1,174 @@
+# schema_migrations.py - Версионные миграции схемы базы данных
+#
+# Миграции - файлы migrations/NNNN_name.sql, применяются по возрастанию
+# номера и записываются в schema_migrations. На актуальной схеме запуск
+# стоит один SELECT; DDL выполняется только для новых миграций.
+#
+# - Несколько экземпляров (бот, веб-кабинет, реплики) применяют миграции
+#   под pg_advisory_lock - одновременно это делает только один процесс.
+# - Обычная миграция выполняется в одной транзакции.
+# - Миграция с первой строкой "-- migration: no-transaction" выполняется
+#   по одному оператору вне транзакции (нужно для CREATE INDEX CONCURRENTLY).
+#   Каждый оператор такой миграции заканчивается ";" в конце строки.
+
+import os
+import re
+import time
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Ключ advisory lock для миграций (любое постоянное число)
+MIGRATIONS_LOCK_KEY = 72_431_905
+
+NO_TRANSACTION_MARKER = "-- migration: no-transaction"
+
+_FILENAME_RE = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+_CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE
+)
+
+
+class Migration:
+    """Файл миграции"""
+
+    __slots__ = ("version", "name", "sql", "checksum", "transactional")
+
+    def __init__(self, version: int, name: str, sql: str):
+        self.version = version
+        self.name = name
+        self.sql = sql
+        self.checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+        self.transactional = not sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+    def statements(self) -> List[str]:
+        """Операторы миграции без транзакции (по ";" в конце строки)"""
+        statements, current = [], []
+        for line in self.sql.splitlines():
+            if not current and (not line.strip() or line.lstrip().startswith("--")):
+                continue
+            current.append(line)
+            if line.rstrip().endswith(";"):
+                statements.append("\n".join(current))
+                current = []
+        if current:
+            statements.append("\n".join(current))
+        return statements
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Миграции из каталога по возрастанию версии"""
+    migrations: Dict[int, Migration] = {}
+    for filename in os.listdir(directory):
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Две миграции с номером {version}: {migrations[version].name}, {match.group(2)}")
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            migrations[version] = Migration(version, match.group(2), f.read())
+    return [migrations[version] for version in sorted(migrations)]
+
+
+async def _applied_migrations(conn) -> Dict[int, str]:
+    """version -> checksum (пусто, если таблицы еще нет)"""
+    try:
+        rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+    except asyncpg.exceptions.UndefinedTableError:
+        return {}
+    return {row["version"]: row["checksum"] for row in rows}
+
+
+async def _drop_invalid_index(conn, index_name: str):
+    """Удаляет индекс, оставшийся невалидным после прерванного CONCURRENTLY"""
+    invalid = await conn.fetchval("""
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = $1 AND NOT i.indisvalid
+    """, index_name)
+    if invalid:
+        logger.warning(f"⚠️ Пересоздаем невалидный индекс {index_name}")
+        await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+
+
+async def _apply(conn, migration: Migration):
+    started = time.monotonic()
+    record_sql = """
+        INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+        VALUES ($1, $2, $3, $4)
+    """
+
+    if migration.transactional:
+        async with conn.transaction():
+            await conn.execute(migration.sql)
+            await conn.execute(
+                record_sql, migration.version, migration.name, migration.checksum,
+                int((time.monotonic() - started) * 1000)
+            )
+    else:
+        for statement in migration.statements():
+            match = _CONCURRENT_INDEX_RE.search(statement)
+            if match:
+                await _drop_invalid_index(conn, match.group(1))
+            await conn.execute(statement)
+        await conn.execute(
+            record_sql, migration.version, migration.name, migration.checksum,
+            int((time.monotonic() - started) * 1000)
+        )
+
+    logger.info(f"🏗️ Миграция {migration.version:04d}_{migration.name} применена за {time.monotonic() - started:.2f} сек")
+
+
+async def run_migrations(conn, migrations: Optional[List[Migration]] = None) -> Dict:
+    """
+    Применяет новые миграции
+
+    Returns:
+        Dict: {"applied": [...], "current_version": N}
+    """
+    migrations = load_migrations() if migrations is None else migrations
+
+    # Быстрый путь: схема актуальна - один SELECT
+    applied = await _applied_migrations(conn)
+    pending = [m for m in migrations if m.version not in applied]
+
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum and checksum != migration.checksum:
+            logger.warning(f"⚠️ Миграция {migration.version:04d}_{migration.name} изменена после применения")
+
+    result = {"applied": [], "current_version": max(applied, default=0)}
+    if not pending:
+        return result
+
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_KEY)
+    try:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                duration_ms INTEGER
+            )
+        """)
+
+        # Другой процесс мог применить миграции, пока мы ждали блокировку
+        applied = await _applied_migrations(conn)
+        for migration in migrations:
+            if migration.version in applied:
+                continue
+            await _apply(conn, migration)
+            result["applied"].append(f"{migration.version:04d}_{migration.name}")
+            result["current_version"] = migration.version
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_KEY)
+
+    return result
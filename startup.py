@@ -0,0 +1,220 @@
+# startup.py - Запуск компонентов бота с учетом зависимостей
+#
+# Шаги объявляются с зависимостями; шаг стартует, как только завершились
+# все его зависимости, независимые шаги выполняются параллельно.
+#   - critical=True:  ошибка останавливает запуск;
+#   - critical=False: ошибка логируется, зависящие шаги пропускаются;
+#   - deferred=True:  шаг выполняется в фоне после того, как бот начал
+#                     принимать обновления (проверки, не нужные для работы).
+# После каждой фазы в лог выводится время шагов; время до первого
+# обновления отмечается через mark_first_update().
+
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from error_handler import log_error_with_context
+
+logger = logging.getLogger(__name__)
+
+
+class StartupStep:
+    """Шаг запуска"""
+
+    __slots__ = ("name", "func", "depends", "critical", "deferred",
+                 "status", "started_at", "duration", "error")
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], depends: Iterable[str],
+                 critical: bool, deferred: bool):
+        self.name = name
+        self.func = func
+        self.depends = tuple(depends)
+        self.critical = critical
+        self.deferred = deferred
+        self.status = "pending"  # pending | running | ok | failed | skipped | cancelled
+        self.started_at: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class StartupOrchestrator:
+    """Граф шагов запуска"""
+
+    def __init__(self):
+        self.steps: Dict[str, StartupStep] = {}
+        self.started_at = time.monotonic()
+        self.ready_at: Optional[float] = None
+        self.first_update_at: Optional[float] = None
+        self._deferred_task: Optional[asyncio.Task] = None
+
+    def step(self, name: str, depends: Iterable[str] = (), critical: bool = False,
+             deferred: bool = False):
+        """Декоратор: регистрирует async-функцию как шаг запуска"""
+        def decorator(func: Callable[[], Awaitable]):
+            self.add(name, func, depends=depends, critical=critical, deferred=deferred)
+            return func
+        return decorator
+
+    def add(self, name: str, func: Callable[[], Awaitable], depends: Iterable[str] = (),
+            critical: bool = False, deferred: bool = False):
+        if name in self.steps:
+            raise ValueError(f"Шаг запуска уже объявлен: {name}")
+        self.steps[name] = StartupStep(name, func, depends, critical, deferred)
+
+    # ==========================================
+    # ▶️ ВЫПОЛНЕНИЕ
+    # ==========================================
+
+    def _validate(self, steps: List[StartupStep]):
+        names = {step.name for step in steps}
+        for step in steps:
+            for dependency in step.depends:
+                if dependency not in self.steps:
+                    raise ValueError(f"Шаг {step.name}: неизвестная зависимость {dependency}")
+                if dependency not in names and self.steps[dependency].status == "pending":
+                    raise ValueError(f"Шаг {step.name}: зависимость {dependency} еще не выполнена")
+
+        # Проверка циклов (обход в глубину)
+        visiting, done = set(), set()
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Цикл в зависимостях запуска: {name}")
+            visiting.add(name)
+            for dependency in self.steps[name].depends:
+                if dependency in names:
+                    visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for step in steps:
+            visit(step.name)
+
+    async def _run_step(self, step: StartupStep, tasks: Dict[str, asyncio.Task]):
+        # Ждем зависимости текущей фазы (шаги прошлых фаз уже завершены)
+        for dependency in step.depends:
+            if dependency in tasks:
+                await asyncio.shield(tasks[dependency])
+
+        failed = [d for d in step.depends if self.steps[d].status in ("failed", "skipped")]
+        if failed:
+            step.status = "skipped"
+            step.error = f"зависимость не запущена: {', '.join(failed)}"
+            logger.warning(f"⏭️ {step.name}: пропущен ({step.error})")
+            return
+
+        step.status = "running"
+        step.started_at = time.monotonic()
+        try:
+            await step.func()
+            step.status = "ok"
+        except asyncio.CancelledError:
+            step.status = "cancelled"
+            raise
+        except Exception as e:
+            step.status = "failed"
+            step.error = f"{type(e).__name__}: {e}"
+            if step.critical:
+                raise
+            log_error_with_context(e, {"function": "startup_step", "step": step.name})
+            print(f"⚠️ {step.name}: {step.error}")
+        finally:
+            step.duration = time.monotonic() - step.started_at
+
+    async def _run_phase(self, steps: List[StartupStep]):
+        self._validate(steps)
+        tasks: Dict[str, asyncio.Task] = {}
+        for step in steps:
+            tasks[step.name] = asyncio.create_task(self._run_step(step, tasks), name=f"startup:{step.name}")
+
+        try:
+            # Первая ошибка критичного шага прерывает запуск
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+    async def run(self):
+        """Основная фаза: все шаги, кроме отложенных"""
+        await self._run_phase([step for step in self.steps.values() if not step.deferred])
+        self.ready_at = time.monotonic()
+        self.log_report("Запуск")
+
+    def start_deferred(self):
+        """Отложенные шаги в фоне (после начала приема обновлений)"""
+        deferred = [step for step in self.steps.values() if step.deferred]
+        if not deferred or self._deferred_task is not None:
+            return
+
+        async def runner():
+            try:
+                await self._run_phase(deferred)
+            except Exception as e:
+                log_error_with_context(e, {"function": "startup_deferred"})
+            self.log_report("Отложенные проверки", deferred_only=True)
+
+        self._deferred_task = asyncio.create_task(runner(), name="startup:deferred")
+
+    async def stop_deferred(self):
+        if self._deferred_task and not self._deferred_task.done():
+            self._deferred_task.cancel()
+            await asyncio.gather(self._deferred_task, return_exceptions=True)
+
+    def mark_first_update(self):
+        """Отметка первого обработанного обновления Telegram"""
+        if self.first_update_at is None:
+            self.first_update_at = time.monotonic()
+            logger.info(f"📨 Первое обновление через {self.first_update_at - self.started_at:.2f} сек после запуска")
+
+    # ==========================================
+    # 📊 ОТЧЕТ
+    # ==========================================
+
+    def get_timings(self) -> Dict:
+        return {
+            "ready_sec": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+            "first_update_sec": round(self.first_update_at - self.started_at, 3) if self.first_update_at else None,
+            "steps": {
+                step.name: {
+                    "status": step.status,
+                    "start_offset_sec": round(step.started_at - self.started_at, 3) if step.started_at else None,
+                    "duration_sec": round(step.duration, 3) if step.duration is not None else None,
+                    "deferred": step.deferred,
+                    "error": step.error,
+                }
+                for step in self.steps.values()
+            },
+        }
+
+    def collect_metrics(self):
+        """Время запуска для /metrics (см. metrics.register_collector)"""
+        timings = self.get_timings()
+        return [
+            ("startup_ready_seconds", "gauge", "Время от запуска до готовности", [
+                ({}, timings["ready_sec"])
+            ]),
+            ("startup_first_update_seconds", "gauge", "Время от запуска до первого обновления", [
+                ({}, timings["first_update_sec"])
+            ]),
+            ("startup_step_seconds", "gauge", "Длительность шагов запуска", [
+                ({"step": name, "status": step["status"]}, step["duration_sec"])
+                for name, step in timings["steps"].items()
+            ]),
+        ]
+
+    def log_report(self, title: str, deferred_only: bool = False):
+        icons = {"ok": "✅", "failed": "❌", "skipped": "⏭️", "pending": "⏳", "running": "⏳", "cancelled": "🛑"}
+        steps = [step for step in self.steps.values() if step.deferred == deferred_only]
+        steps.sort(key=lambda step: step.started_at if step.started_at is not None else float("inf"))
+
+        lines = [f"⏱️ {title}: {time.monotonic() - self.started_at:.2f} сек"]
+        for step in steps:
+            offset = f"+{step.started_at - self.started_at:.2f}" if step.started_at else "   -"
+            duration = f"{step.duration:.2f}" if step.duration is not None else "-"
+            lines.append(f"   {icons.get(step.status, '?')} {step.name:<22} {offset:>7} сек  {duration:>6} сек")
+        print("\n".join(lines))
@@ -0,0 +1,235 @@
+# state_store.py - Хранилище состояний диалогов (память или PostgreSQL)
+#
+# Состояния диалогов (регистрация, вопрос к фото, подтверждение удаления,
+# счетчики upsell) читаются синхронно из локального кэша процесса.
+# Бэкенд определяет, что происходит с записями:
+#   - memory:   только локальный кэш (как раньше, один экземпляр бота);
+#   - postgres: записи асинхронно сохраняются в conversation_state (JSONB + TTL),
+#               перед обработкой обновления состояние пользователя подтягивается
+#               из БД, если локальная копия старше STATE_CACHE_TTL. Так переживаются
+#               перезапуски и работают несколько экземпляров бота.
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from db_postgresql import get_db_connection, release_db_connection
+from error_handler import log_error_with_context
+
+logger = logging.getLogger(__name__)
+
+# memory | postgres
+STATE_STORE_BACKEND = os.getenv("STATE_STORE_BACKEND", "memory").lower()
+
+# Сколько секунд локальная копия состояния пользователя считается свежей
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "5"))
+
+# Интервал фоновой записи изменений в БД (секунды)
+STATE_FLUSH_INTERVAL = 0.5
+
+# Интервал удаления просроченных записей из БД (секунды)
+STATE_EXPIRE_INTERVAL = 600
+
+_DELETE = object()  # Маркер удаления в очереди записи
+
+
+class MemoryStateStore:
+    """Состояния только в памяти процесса"""
+
+    persistent = False
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def schedule_write(self, namespace: str, user_id: int, value: Any, ttl_seconds: float):
+        pass
+
+    def schedule_delete(self, namespace: str, user_id: int):
+        pass
+
+    def has_pending(self, namespace: str, user_id: int) -> bool:
+        return False
+
+    async def load_user(self, user_id: int) -> Dict[str, Tuple[Any, float]]:
+        return {}
+
+    async def load_all(self) -> Dict[str, Dict[int, Tuple[Any, float]]]:
+        return {}
+
+    def get_stats(self) -> Dict:
+        return {"backend": "memory"}
+
+
+class PostgresStateStore:
+    """
+    Состояния в таблице conversation_state
+
+    Записи копятся в очереди и сохраняются пачками фоновой задачей;
+    последняя запись по ключу (namespace, user_id) побеждает.
+    """
+
+    persistent = True
+
+    def __init__(self):
+        self._pending: Dict[Tuple[str, int], Any] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._last_expire = 0.0
+        self.stats = {"writes": 0, "deletes": 0, "flushes": 0, "flush_errors": 0, "loads": 0}
+
+    # ==========================================
+    # ✍️ ЗАПИСЬ (АСИНХРОННО)
+    # ==========================================
+
+    def schedule_write(self, namespace: str, user_id: int, value: Any, ttl_seconds: float):
+        self._pending[(namespace, user_id)] = (json.dumps(value, ensure_ascii=False, default=str), ttl_seconds)
+        self._wakeup.set()
+
+    def schedule_delete(self, namespace: str, user_id: int):
+        self._pending[(namespace, user_id)] = _DELETE
+        self._wakeup.set()
+
+    def has_pending(self, namespace: str, user_id: int) -> bool:
+        return (namespace, user_id) in self._pending
+
+    async def flush(self):
+        """Сохраняет накопленные изменения"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        writes = [
+            (namespace, user_id, value[0], float(value[1]))
+            for (namespace, user_id), value in pending.items() if value is not _DELETE
+        ]
+        deletes = [key for key, value in pending.items() if value is _DELETE]
+
+        conn = None
+        try:
+            conn = await get_db_connection("background")
+            async with conn.transaction():
+                if writes:
+                    await conn.executemany("""
+                        INSERT INTO conversation_state (namespace, user_id, state, expires_at, updated_at)
+                        VALUES ($1, $2, $3::jsonb, NOW() + make_interval(secs => $4), NOW())
+                        ON CONFLICT (namespace, user_id) DO UPDATE
+                        SET state = EXCLUDED.state,
+                            expires_at = EXCLUDED.expires_at,
+                            updated_at = NOW()
+                    """, writes)
+                if deletes:
+                    await conn.execute("""
+                        DELETE FROM conversation_state
+                        WHERE (namespace, user_id) IN (
+                            SELECT * FROM unnest($1::text[], $2::bigint[])
+                        )
+                    """, [key[0] for key in deletes], [key[1] for key in deletes])
+            self.stats["writes"] += len(writes)
+            self.stats["deletes"] += len(deletes)
+            self.stats["flushes"] += 1
+        except Exception as e:
+            self.stats["flush_errors"] += 1
+            log_error_with_context(e, {"function": "state_store_flush", "rows": len(pending)})
+            # Возвращаем в очередь то, что не перезаписано новыми изменениями
+            for key, value in pending.items():
+                self._pending.setdefault(key, value)
+        finally:
+            if conn:
+                await release_db_connection(conn)
+
+    async def _expire_rows(self):
+        conn = await get_db_connection("background")
+        try:
+            await conn.execute("DELETE FROM conversation_state WHERE expires_at < NOW()")
+        finally:
+            await release_db_connection(conn)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await self._wakeup.wait()
+                await asyncio.sleep(STATE_FLUSH_INTERVAL)  # Копим изменения
+                self._wakeup.clear()
+                await self.flush()
+
+                if time.monotonic() - self._last_expire > STATE_EXPIRE_INTERVAL:
+                    self._last_expire = time.monotonic()
+                    await self._expire_rows()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_error_with_context(e, {"function": "state_store_flush_loop"})
+                await asyncio.sleep(STATE_FLUSH_INTERVAL)
+
+    # ==========================================
+    # 📥 ЧТЕНИЕ
+    # ==========================================
+
+    async def load_user(self, user_id: int) -> Dict[str, Tuple[Any, float]]:
+        """Все неистекшие состояния пользователя: namespace -> (значение, осталось секунд)"""
+        conn = await get_db_connection()
+        try:
+            rows = await conn.fetch("""
+                SELECT namespace, state, EXTRACT(EPOCH FROM (expires_at - NOW())) AS ttl_left
+                FROM conversation_state
+                WHERE user_id = $1 AND expires_at > NOW()
+            """, user_id)
+        finally:
+            await release_db_connection(conn)
+        self.stats["loads"] += 1
+        return {row["namespace"]: (json.loads(row["state"]), float(row["ttl_left"])) for row in rows}
+
+    async def load_all(self) -> Dict[str, Dict[int, Tuple[Any, float]]]:
+        """Все неистекшие состояния (прогрев кэша при запуске)"""
+        conn = await get_db_connection("background")
+        try:
+            rows = await conn.fetch("""
+                SELECT namespace, user_id, state, EXTRACT(EPOCH FROM (expires_at - NOW())) AS ttl_left
+                FROM conversation_state
+                WHERE expires_at > NOW()
+            """)
+        finally:
+            await release_db_connection(conn)
+
+        result: Dict[str, Dict[int, Tuple[Any, float]]] = {}
+        for row in rows:
+            result.setdefault(row["namespace"], {})[row["user_id"]] = (
+                json.loads(row["state"]), float(row["ttl_left"])
+            )
+        return result
+
+    # ==========================================
+    # ▶️ ЗАПУСК / ОСТАНОВКА
+    # ==========================================
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Остановка с сохранением накопленных изменений"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "backend": "postgres", "pending": len(self._pending)}
+
+
+_store = None
+
+
+def get_state_store():
+    """Хранилище состояний (Singleton), бэкенд из STATE_STORE_BACKEND"""
+    global _store
+    if _store is None:
+        _store = PostgresStateStore() if STATE_STORE_BACKEND == "postgres" else MemoryStateStore()
+    return _store
@@ -9,6 +9,7 @@ from stripe_manager import StripeManager
 from db_postgresql import get_user_language, get_user_name, fetch_one, t
 from datetime import datetime
 from error_handler import log_error_with_context
+from user_state_manager import UserStateManager
 
 logger = logging.getLogger(__name__)
 
@@ -585,21 +586,30 @@ class SubscriptionHandlers:
 # В файл subscription_handlers.py ЗАМЕНИТЬ весь класс UpsellTracker:
 
 class UpsellTracker:
-    """Отслеживает показ upsell сообщений пользователям"""
+    """
+    Отслеживает показ upsell сообщений пользователям
+
+    Счетчики хранятся в общем хранилище состояний (пространство имен "upsell"),
+    поэтому не сбрасываются при перезапуске и общие для экземпляров бота.
+    """
     
     def __init__(self):
-        self.user_message_counts = {}  # user_id: count
-        self.user_last_upsell = {}     # user_id: timestamp
-        self.user_summary_counts = {}  # user_id: count обновлений сводки
+        # user_id: {"messages": N, "summaries": N, "last_upsell": timestamp}
+        self.counters = UserStateManager(ttl_minutes=30 * 24 * 60, namespace="upsell")
+
+    def _get(self, user_id: int) -> dict:
+        return dict(self.counters.get_state(user_id) or {})
     
     def should_show_upsell(self, user_id: int) -> bool:
         """Определяет, нужно ли показать upsell сообщение"""
-        current_count = self.user_message_counts.get(user_id, 0)
+        counters = self._get(user_id)
+        current_count = counters.get("messages", 0)
         
         # ✅ ИЗМЕНЯЕМ: показываем каждые 7 сообщений (вместо 5)
         if current_count >= 7:
-            self.user_message_counts[user_id] = 0  # Сбрасываем счетчик
-            self.user_last_upsell[user_id] = datetime.now().timestamp()
+            counters["messages"] = 0  # Сбрасываем счетчик
+            counters["last_upsell"] = datetime.now().timestamp()
+            self.counters.set_state(user_id, counters)
             return True
         
         return False
@@ -608,31 +618,34 @@ class UpsellTracker:
         """
         ✅ НОВОЕ: Определяет, нужно ли показать upsell при обновлении сводки
         """
-        current_count = self.user_summary_counts.get(user_id, 0)
+        counters = self._get(user_id)
+        current_count = counters.get("summaries", 0)
         
         # Показываем каждое 3-е обновление сводки
         if current_count >= 3:
-            self.user_summary_counts[user_id] = 0  # Сбрасываем счетчик
+            counters["summaries"] = 0  # Сбрасываем счетчик
+            self.counters.set_state(user_id, counters)
             return True
         
         return False
     
     def increment_message_count(self, user_id: int):
         """Увеличивает счетчик сообщений пользователя"""
-        self.user_message_counts[user_id] = self.user_message_counts.get(user_id, 0) + 1
+        counters = self._get(user_id)
+        counters["messages"] = counters.get("messages", 0) + 1
+        self.counters.set_state(user_id, counters)
     
     def increment_summary_count(self, user_id: int):
         """
         ✅ НОВОЕ: Увеличивает счетчик обновлений сводки
         """
-        self.user_summary_counts[user_id] = self.user_summary_counts.get(user_id, 0) + 1
+        counters = self._get(user_id)
+        counters["summaries"] = counters.get("summaries", 0) + 1
+        self.counters.set_state(user_id, counters)
     
     def reset_count(self, user_id: int):
         """Сбрасывает счетчики для пользователя (например, после покупки подписки)"""
-        self.user_message_counts[user_id] = 0
-        self.user_summary_counts[user_id] = 0
-        if user_id in self.user_last_upsell:
-            del self.user_last_upsell[user_id]
+        self.counters.clear_state(user_id)
 
 # Глобальный экземпляр трекера
 upsell_tracker = UpsellTracker()
\ No newline at end of file
@@ -780,10 +780,11 @@ async def _show_limits_exhausted_notification(user_id: int, message, bot, subscr
                 )]
             ])
         
-        # Отправляем уведомление
-        await bot.send_message(
-            chat_id=user_id,
-            text=text,
+        # Отправляем уведомление через очередь исходящих
+        from telegram_outbox import send_message, PRIORITY_NOTIFICATION
+        await send_message(
+            bot, user_id, text,
+            priority=PRIORITY_NOTIFICATION,
             reply_markup=keyboard,
             parse_mode="Markdown"
         )
@@ -2,8 +2,10 @@
 
 import os
 import uuid
+import asyncio
 import logging
-from typing import Tuple, Optional
+from typing import AsyncIterator, List, Tuple, Optional, Union
+import httpx
 try:
     from supabase import create_client, Client
 except ImportError:
@@ -13,6 +15,11 @@ from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# 🌐 Настройки HTTP-клиента Storage API
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", "4"))  # Одновременных загрузок/скачиваний
+STORAGE_TIMEOUT = float(os.getenv("STORAGE_TIMEOUT", "30"))
+STREAM_CHUNK_SIZE = 256 * 1024
+
 class SupabaseStorage:
     """Менеджер файлов на Supabase Storage для медицинского бота"""
     
@@ -24,10 +31,20 @@ class SupabaseStorage:
         if not supabase_url or not supabase_key:
             raise Exception("❌ SUPABASE_URL и SUPABASE_SERVICE_KEY должны быть в .env файле")
         
-        # Создаем клиент Supabase
+        # Создаем клиент Supabase (подписанные/публичные ссылки)
         self.supabase: Client = create_client(supabase_url, supabase_key)
         self.bucket_name = "medical-documents"
         
+        # Загрузка/скачивание/удаление идут напрямую в Storage API через общий
+        # пул соединений httpx (клиент supabase-py синхронный и блокирует loop)
+        self._storage_url = f"{supabase_url.rstrip('/')}/storage/v1"
+        self._auth_headers = {
+            "Authorization": f"Bearer {supabase_key}",
+            "apikey": supabase_key,
+        }
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(STORAGE_MAX_CONCURRENCY)
+        
         # 📋 ДОПУСТИМЫЕ РАСШИРЕНИЯ для медицинского бота
         self.allowed_extensions = {
             '.pdf', '.jpg', '.jpeg', '.png', '.webp', 
@@ -36,6 +53,36 @@ class SupabaseStorage:
         
         logger.info(f"✅ Supabase Storage инициализирован: {self.bucket_name}")
     
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Общий HTTP-клиент с пулом keep-alive соединений"""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self._storage_url,
+                headers=self._auth_headers,
+                timeout=httpx.Timeout(STORAGE_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=STORAGE_MAX_CONCURRENCY * 2,
+                    max_keepalive_connections=STORAGE_MAX_CONCURRENCY,
+                ),
+            )
+        return self._http
+    
+    async def close(self):
+        """Закрывает HTTP-клиент"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+    
+    @staticmethod
+    async def _iter_file(file_path: str) -> AsyncIterator[bytes]:
+        """Читает файл частями в отдельном потоке (без загрузки целиком в память)"""
+        with open(file_path, 'rb') as file:
+            while True:
+                chunk = await asyncio.to_thread(file.read, STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    
     def _generate_safe_filename(self, original_filename: str, user_id: int) -> str:
         """
         🎯 ПРОСТАЯ ГЕНЕРАЦИЯ БЕЗОПАСНОГО ИМЕНИ ФАЙЛА
@@ -82,7 +129,7 @@ class SupabaseStorage:
     
     async def upload_file(self, user_id: int, file_path: str, filename: str) -> Tuple[bool, str]:
         """
-        Загружает файл в Supabase Storage
+        Загружает файл в Supabase Storage (потоково, без чтения в память целиком)
         
         Args:
             user_id: ID пользователя
@@ -97,54 +144,63 @@ class SupabaseStorage:
             if not os.path.exists(file_path):
                 return False, f"Файл не найден: {file_path}"
             
-            # Генерируем путь в хранилище
-            storage_path = self._generate_file_path(user_id, filename)
+            return await self._upload(
+                user_id, filename, self._iter_file(file_path), os.path.getsize(file_path)
+            )
             
-            # ✅ ЧИТАЕМ ФАЙЛ
-            with open(file_path, 'rb') as file:
-                file_data = file.read()
+        except Exception as e:
+            logger.error(f"❌ [SUPABASE] Ошибка загрузки файла: {e}")
+            return False, str(e)
+    
+    async def upload_bytes(self, user_id: int, data: Union[bytes, memoryview], filename: str) -> Tuple[bool, str]:
+        """Загружает содержимое из памяти (без временного файла)"""
+        try:
+            view = memoryview(data)
             
-            # ✅ ПРОВЕРЯЕМ ЧТО file_data это bytes
-            if not isinstance(file_data, bytes):
-                return False, f"Ошибка чтения файла: неверный тип данных"
+            async def iter_chunks():
+                for offset in range(0, len(view), STREAM_CHUNK_SIZE):
+                    yield view[offset:offset + STREAM_CHUNK_SIZE].tobytes()
             
-            logger.info(f"🔍 [DEBUG] Читаем файл: {len(file_data)} bytes")
-            
-            # ✅ ЗАГРУЖАЕМ В SUPABASE
-            try:
-                response = self.supabase.storage.from_(self.bucket_name).upload(
-                    path=storage_path,
-                    file=file_data
-                )
-                
-                logger.info(f"🔍 [DEBUG] Supabase response type: {type(response)}")
-                
-                # ✅ ПРОВЕРЯЕМ РЕЗУЛЬТАТ
-                if response is None:
-                    return False, "Supabase вернул None"
-                
-                # Supabase должен вернуть словарь с путем к файлу
-                if isinstance(response, dict):
-                    if 'error' in response and response['error']:
-                        return False, f"Supabase error: {response['error']}"
-                    
-                    logger.info(f"✅ [SUPABASE] Файл загружен: {storage_path}")
-                    return True, storage_path
-                else:
-                    logger.info(f"✅ [SUPABASE] Файл загружен: {storage_path}")
-                    return True, storage_path
-                
-            except Exception as upload_error:
-                logger.error(f"❌ [SUPABASE] Ошибка API: {upload_error}")
-                return False, f"Upload failed: {str(upload_error)}"
+            return await self._upload(user_id, filename, iter_chunks(), len(view))
             
         except Exception as e:
             logger.error(f"❌ [SUPABASE] Ошибка загрузки файла: {e}")
             return False, str(e)
     
+    async def _upload(self, user_id: int, filename: str, content: AsyncIterator[bytes],
+                      size: int) -> Tuple[bool, str]:
+        """Отправляет содержимое в Storage API"""
+        # Генерируем путь в хранилище
+        storage_path = self._generate_file_path(user_id, filename)
+        
+        headers = {
+            "Content-Type": self._get_content_type(filename),
+            "Content-Length": str(size),
+            "x-upsert": "false",
+        }
+        
+        # ✅ ЗАГРУЖАЕМ В SUPABASE
+        try:
+            async with self._semaphore:
+                response = await self._get_http_client().post(
+                    f"/object/{self.bucket_name}/{storage_path}",
+                    content=content,
+                    headers=headers,
+                )
+        except httpx.HTTPError as upload_error:
+            logger.error(f"❌ [SUPABASE] Ошибка API: {upload_error}")
+            return False, f"Upload failed: {str(upload_error)}"
+        
+        if response.status_code >= 400:
+            logger.error(f"❌ [SUPABASE] Ошибка загрузки {response.status_code}: {response.text[:200]}")
+            return False, f"Supabase error: {response.status_code}"
+        
+        logger.info(f"✅ [SUPABASE] Файл загружен: {storage_path} ({size} bytes)")
+        return True, storage_path
+    
     async def download_file(self, storage_path: str, local_path: str) -> bool:
         """
-        Скачивает файл из Supabase Storage
+        Скачивает файл из Supabase Storage (потоково на диск)
         
         Args:
             storage_path: Путь к файлу в хранилище
@@ -154,19 +210,21 @@ class SupabaseStorage:
             bool: Успех операции
         """
         try:
-            # Скачиваем файл
-            response = self.supabase.storage.from_(self.bucket_name).download(storage_path)
-            
-            # ✅ ПРОВЕРЯЕМ ЧТО ПОЛУЧИЛИ BYTES
-            if not isinstance(response, bytes):
-                logger.error(f"❌ [SUPABASE] Неверный тип ответа: {type(response)}")
-                return False
+            local_dir = os.path.dirname(local_path)
+            if local_dir:
+                os.makedirs(local_dir, exist_ok=True)
             
-            # Сохраняем локально
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            
-            with open(local_path, 'wb') as file:
-                file.write(response)
+            async with self._semaphore:
+                async with self._get_http_client().stream(
+                    "GET", f"/object/authenticated/{self.bucket_name}/{storage_path}"
+                ) as response:
+                    if response.status_code >= 400:
+                        logger.error(f"❌ [SUPABASE] Ошибка скачивания {response.status_code}: {storage_path}")
+                        return False
+                    
+                    with open(local_path, 'wb') as file:
+                        async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                            await asyncio.to_thread(file.write, chunk)
             
             logger.info(f"✅ [SUPABASE] Файл скачан: {storage_path} → {local_path}")
             return True
@@ -185,15 +243,73 @@ class SupabaseStorage:
         Returns:
             bool: Успех операции
         """
+        return bool(await self.delete_files([storage_path]))
+    
+    async def delete_files(self, storage_paths: List[str]) -> Optional[int]:
+        """
+        Удаляет несколько файлов одним запросом
+        
+        Returns:
+            Optional[int]: Количество удаленных файлов (отсутствующие файлы
+            не считаются ошибкой) или None при ошибке API
+        """
+        if not storage_paths:
+            return 0
+        
         try:
-            self.supabase.storage.from_(self.bucket_name).remove([storage_path])
+            async with self._semaphore:
+                response = await self._get_http_client().request(
+                    "DELETE", f"/object/{self.bucket_name}",
+                    json={"prefixes": list(storage_paths)},
+                )
             
-            logger.info(f"✅ [SUPABASE] Файл удален: {storage_path}")
-            return True
+            if response.status_code >= 400:
+                logger.error(f"❌ [SUPABASE] Ошибка удаления {response.status_code}: {response.text[:200]}")
+                return None
+            
+            deleted = response.json()
+            deleted_count = len(deleted) if isinstance(deleted, list) else 0
+            logger.info(f"✅ [SUPABASE] Удалено файлов: {deleted_count}")
+            return deleted_count
             
         except Exception as e:
-            logger.error(f"❌ [SUPABASE] Ошибка удаления файла: {e}")
-            return False
+            logger.error(f"❌ [SUPABASE] Ошибка удаления файлов: {e}")
+            return None
+    
+    async def list_files(self, prefix: str, page_size: int = 1000) -> Optional[List[str]]:
+        """
+        Список файлов в "папке" хранилища (например users/{user_id})
+        
+        Returns:
+            Optional[List[str]]: Полные пути файлов или None при ошибке API
+        """
+        prefix = prefix.strip("/")
+        paths = []
+        offset = 0
+        
+        try:
+            while True:
+                async with self._semaphore:
+                    response = await self._get_http_client().post(
+                        f"/object/list/{self.bucket_name}",
+                        json={"prefix": prefix, "limit": page_size, "offset": offset},
+                    )
+                
+                if response.status_code >= 400:
+                    logger.error(f"❌ [SUPABASE] Ошибка списка файлов {response.status_code}: {response.text[:200]}")
+                    return None
+                
+                items = response.json()
+                # У "папок" нет id - пропускаем их
+                paths.extend(f"{prefix}/{item['name']}" for item in items if item.get("id"))
+                
+                if len(items) < page_size:
+                    return paths
+                offset += page_size
+                
+        except Exception as e:
+            logger.error(f"❌ [SUPABASE] Ошибка получения списка файлов: {e}")
+            return None
     
     def get_public_url(self, storage_path: str) -> str:
         """
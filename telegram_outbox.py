@@ -0,0 +1,324 @@
+# telegram_outbox.py - Единая очередь исходящих сообщений Telegram
+#
+# Все сообщения, которые бот отправляет сам (напоминания, анализы Garmin,
+# уведомления о платежах, промо, ответы поддержки), проходят через одну
+# очередь с приоритетами:
+#   - ограничение скорости: общий token bucket (~30 сообщений/с у Telegram)
+#     и отдельный bucket на каждый чат;
+#   - при 429 (retry_after) отправка приостанавливается на указанное время,
+#     сообщение возвращается в очередь.
+
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from error_handler import log_error_with_context
+from metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты (меньше - раньше)
+PRIORITY_INTERACTIVE = 0   # Ответы поддержки, сообщения администратору
+PRIORITY_NOTIFICATION = 1  # Платежи, продления, лимиты
+PRIORITY_BROADCAST = 2     # Напоминания, анализы Garmin, промо
+
+# Лимиты Telegram (с запасом)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))  # сообщений/с
+TELEGRAM_GLOBAL_BURST = int(os.getenv("TELEGRAM_GLOBAL_BURST", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))  # сообщений/с в один чат
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+
+# Воркеры отправки и повторы
+OUTBOX_WORKERS = int(os.getenv("TELEGRAM_OUTBOX_WORKERS", "4"))
+OUTBOX_MAX_RETRIES = 3
+
+# Сколько ждать отправки очереди при остановке (секунды)
+OUTBOX_DRAIN_TIMEOUT = 10
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self, now: float) -> float:
+        """Берет токен; возвращает 0 или сколько секунд ждать до следующего"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class TelegramOutbox:
+    """Очередь исходящих сообщений с приоритетами и ограничением скорости"""
+
+    def __init__(self, bot: Bot, workers: int = OUTBOX_WORKERS):
+        self.bot = bot
+        self.workers = max(1, workers)
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = 0
+        self._global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._paused_until = 0.0
+        self._tasks = []
+        self._depth_by_priority: Dict[int, int] = {}
+        # Сообщения, отложенные лимитом чата: seq -> (TimerHandle, item)
+        self._delayed: Dict[int, tuple] = {}
+
+        self.metrics = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "retry_after_events": 0,
+            "chat_throttled": 0,
+            "global_throttled_sec": 0.0,
+        }
+
+    # ==========================================
+    # 📤 ПОСТАНОВКА В ОЧЕРЕДЬ
+    # ==========================================
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    def _enqueue(self, item: Dict):
+        self._queue.put_nowait((item["priority"], item["seq"], item))
+        self._depth_by_priority[item["priority"]] = self._depth_by_priority.get(item["priority"], 0) + 1
+
+    async def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_NOTIFICATION,
+                           wait: bool = True, **kwargs):
+        """
+        Отправка сообщения через очередь
+
+        wait=True - дождаться отправки (возвращает Message, ошибки пробрасываются),
+        wait=False - поставить в очередь и не ждать (ошибки только в лог).
+        """
+        if not self.is_running:
+            return await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+
+        self._seq += 1
+        item = {
+            "chat_id": chat_id,
+            "kwargs": {"text": text, **kwargs},
+            "priority": priority,
+            "seq": self._seq,
+            "attempts": 0,
+            "future": asyncio.get_running_loop().create_future() if wait else None,
+        }
+        self._enqueue(item)
+        self.metrics["enqueued"] += 1
+
+        if item["future"] is not None:
+            return await item["future"]
+        return None
+
+    # ==========================================
+    # 🚚 ОТПРАВКА
+    # ==========================================
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                # Чаты, не получавшие сообщений больше минуты - снова с полным bucket
+                cutoff = time.monotonic() - 60
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if value.updated_at >= cutoff
+                }
+            bucket = self._chat_buckets[chat_id] = TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            _, _, item = await self._queue.get()
+            self._depth_by_priority[item["priority"]] -= 1
+            try:
+                # Пауза после 429 действует на все воркеры
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+
+                # Чат перегружен - возвращаем сообщение позже, воркер не ждет
+                wait = self._chat_bucket(item["chat_id"]).try_acquire(time.monotonic())
+                if wait > 0:
+                    self.metrics["chat_throttled"] += 1
+                    handle = asyncio.get_running_loop().call_later(wait, self._enqueue_delayed, item["seq"])
+                    self._delayed[item["seq"]] = (handle, item)
+                    continue
+
+                wait = self._global_bucket.try_acquire(time.monotonic())
+                while wait > 0:
+                    self.metrics["global_throttled_sec"] += wait
+                    await asyncio.sleep(wait)
+                    wait = self._global_bucket.try_acquire(time.monotonic())
+
+                await self._deliver(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_error_with_context(e, {"function": "telegram_outbox_worker"})
+            finally:
+                self._queue.task_done()
+
+    def _enqueue_delayed(self, seq: int):
+        _, item = self._delayed.pop(seq)
+        self._enqueue(item)
+
+    async def _deliver(self, item: Dict):
+        try:
+            result = await self.bot.send_message(chat_id=item["chat_id"], **item["kwargs"])
+        except TelegramRetryAfter as e:
+            self.metrics["retry_after_events"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            logger.warning(f"⏸️ Telegram 429: пауза отправки {e.retry_after}с")
+            if item["attempts"] < OUTBOX_MAX_RETRIES:
+                item["attempts"] += 1
+                self.metrics["retried"] += 1
+                self._enqueue(item)
+                return
+            await self._finish(item, error=e)
+            return
+        except Exception as e:
+            await self._finish(item, error=e)
+            return
+
+        await self._finish(item, result=result)
+
+    async def _finish(self, item: Dict, result=None, error: Optional[Exception] = None):
+        future = item["future"]
+        if error is None:
+            self.metrics["sent"] += 1
+            if future is not None and not future.done():
+                future.set_result(result)
+        else:
+            self.metrics["failed"] += 1
+            if future is not None and not future.done():
+                future.set_exception(error)
+            else:
+                logger.warning(f"❌ Сообщение в чат {item['chat_id']} не отправлено: {type(error).__name__}")
+
+    # ==========================================
+    # ▶️ ЗАПУСК / ОСТАНОВКА
+    # ==========================================
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"✅ Очередь исходящих сообщений запущена ({self.workers} воркеров)")
+
+    async def _drain(self):
+        """Ждет отправки очереди и сообщений, отложенных лимитом чата"""
+        while True:
+            await self._queue.join()
+            if not self._delayed:
+                return
+            await asyncio.sleep(0.1)
+
+    async def stop(self):
+        """Остановка: ждем отправки очереди (не дольше OUTBOX_DRAIN_TIMEOUT)"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout=OUTBOX_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"⚠️ Очередь исходящих: не отправлено {self._queue.qsize() + len(self._delayed)} сообщений"
+            )
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Не дождавшиеся отправки вызовы получают ошибку
+        pending = [item for _, _, item in (self._queue.get_nowait() for _ in range(self._queue.qsize()))]
+        for handle, item in self._delayed.values():
+            handle.cancel()
+            pending.append(item)
+        self._delayed.clear()
+        for item in pending:
+            if item["future"] is not None and not item["future"].done():
+                item["future"].set_exception(RuntimeError("Очередь исходящих сообщений остановлена"))
+        logger.info("🛑 Очередь исходящих сообщений остановлена")
+
+    def get_metrics(self) -> Dict:
+        """Метрики: глубина очереди по приоритетам, троттлинг, 429"""
+        return {
+            **{key: round(value, 2) if isinstance(value, float) else value for key, value in self.metrics.items()},
+            "queue_depth": self._queue.qsize(),
+            "chat_delayed": len(self._delayed),
+            "queue_depth_by_priority": dict(self._depth_by_priority),
+            "paused_for_sec": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "tracked_chats": len(self._chat_buckets),
+        }
+
+
+# Глобальный экземпляр
+_outbox: Optional[TelegramOutbox] = None
+
+
+def get_telegram_outbox() -> Optional[TelegramOutbox]:
+    return _outbox
+
+
+def _collect_outbox_metrics():
+    """Очередь исходящих сообщений для /metrics"""
+    if _outbox is None:
+        return []
+    metrics = _outbox.get_metrics()
+    return [
+        ("telegram_outbox_queue_depth", "gauge", "Сообщения в очереди по приоритету", [
+            ({"priority": priority}, depth) for priority, depth in metrics["queue_depth_by_priority"].items()
+        ]),
+        ("telegram_outbox_events_total", "counter", "События очереди исходящих сообщений", [
+            ({"event": event}, metrics[event])
+            for event in ("enqueued", "sent", "failed", "retried", "retry_after_events", "chat_throttled")
+        ]),
+        ("telegram_outbox_throttled_seconds_total", "counter", "Время ожидания глобального лимита", [
+            ({}, metrics["global_throttled_sec"])
+        ]),
+    ]
+
+register_collector(_collect_outbox_metrics)
+
+
+async def start_telegram_outbox(bot: Bot) -> TelegramOutbox:
+    """Создать и запустить очередь исходящих сообщений"""
+    global _outbox
+    if _outbox is None:
+        _outbox = TelegramOutbox(bot)
+    await _outbox.start()
+    return _outbox
+
+
+async def stop_telegram_outbox():
+    if _outbox is not None:
+        await _outbox.stop()
+
+
+async def send_message(bot: Bot, chat_id: int, text: str, priority: int = PRIORITY_NOTIFICATION,
+                       wait: bool = True, **kwargs):
+    """
+    Отправить сообщение через очередь (если она не запущена - напрямую через bot)
+
+    Параметры kwargs - как у Bot.send_message (parse_mode, reply_markup, ...).
+    """
+    if _outbox is not None and _outbox.is_running:
+        return await _outbox.send_message(chat_id, text, priority=priority, wait=wait, **kwargs)
+    return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
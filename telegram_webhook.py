@@ -0,0 +1,174 @@
+# telegram_webhook.py - Прием обновлений Telegram через webhook
+#
+# Вместо long polling обновления приходят POST-запросами на тот же aiohttp
+# сервер, что и webhook Stripe. Запрос проверяется по секретному токену,
+# обновление кладется в ограниченную очередь и обрабатывается пулом воркеров.
+# Если очередь заполнена, Telegram получает 503 и повторит доставку позже
+# (back-pressure вместо неограниченного числа фоновых задач).
+#
+# Режим включается переменной TELEGRAM_WEBHOOK_URL; без нее (локальный
+# запуск) бот работает через polling. TELEGRAM_WEBHOOK_SECRET обязателен:
+# без него любой мог бы отправлять поддельные обновления (в том числе от
+# имени администратора). Секрет общий для всех экземпляров бота.
+
+import os
+import hmac
+import time
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from error_handler import log_error_with_context
+
+logger = logging.getLogger(__name__)
+
+# Публичный адрес сервиса (например, https://bot.up.railway.app)
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "").rstrip("/")
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/webhook/telegram")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+
+# Очередь обновлений и воркеры
+TELEGRAM_UPDATE_QUEUE_SIZE = int(os.getenv("TELEGRAM_UPDATE_QUEUE_SIZE", "1000"))
+TELEGRAM_UPDATE_WORKERS = int(os.getenv("TELEGRAM_UPDATE_WORKERS", "16"))
+
+# Сколько запрос ждет места в очереди, прежде чем ответить 503 (секунды)
+ENQUEUE_TIMEOUT = 5
+
+# Сколько ждать обработки очереди при остановке (секунды)
+DRAIN_TIMEOUT = 15
+
+
+def is_webhook_mode() -> bool:
+    """Webhook включен, если задан публичный адрес"""
+    return bool(TELEGRAM_WEBHOOK_URL)
+
+
+class TelegramWebhookIngress:
+    """Прием обновлений: проверка секрета, ограниченная очередь, пул воркеров"""
+
+    def __init__(self, bot: Bot, dispatcher: Dispatcher,
+                 queue_size: int = TELEGRAM_UPDATE_QUEUE_SIZE,
+                 workers: int = TELEGRAM_UPDATE_WORKERS):
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.workers = max(1, workers)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self._tasks = []
+        self.metrics = {
+            "received": 0,
+            "processed": 0,
+            "errors": 0,
+            "rejected_secret": 0,
+            "rejected_invalid": 0,
+            "rejected_queue_full": 0,
+            "max_queue_wait_sec": 0.0,
+        }
+
+    # ==========================================
+    # 🌐 HTTP
+    # ==========================================
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """POST от Telegram"""
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not TELEGRAM_WEBHOOK_SECRET or not hmac.compare_digest(token, TELEGRAM_WEBHOOK_SECRET):
+            self.metrics["rejected_secret"] += 1
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            self.metrics["rejected_invalid"] += 1
+            return web.Response(status=400)
+
+        try:
+            await asyncio.wait_for(self._queue.put((time.monotonic(), update)), timeout=ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Telegram повторит доставку этого обновления позже
+            self.metrics["rejected_queue_full"] += 1
+            logger.warning(f"⚠️ Очередь обновлений заполнена ({self._queue.qsize()}), ответ 503")
+            return web.Response(status=503)
+
+        self.metrics["received"] += 1
+        return web.Response(status=200)
+
+    def setup_routes(self, app: web.Application):
+        app.router.add_post(TELEGRAM_WEBHOOK_PATH, self.handle)
+
+    # ==========================================
+    # ⚙️ ОБРАБОТКА
+    # ==========================================
+
+    async def _worker(self):
+        while True:
+            enqueued_at, update = await self._queue.get()
+            try:
+                self.metrics["max_queue_wait_sec"] = max(
+                    self.metrics["max_queue_wait_sec"], round(time.monotonic() - enqueued_at, 2)
+                )
+                await self.dispatcher.feed_update(self.bot, update)
+                self.metrics["processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics["errors"] += 1
+                log_error_with_context(e, {"function": "telegram_webhook_update", "update_id": update.update_id})
+            finally:
+                self._queue.task_done()
+
+    async def start(self):
+        """Запуск воркеров и регистрация webhook в Telegram"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        await self.bot.set_webhook(
+            url=f"{TELEGRAM_WEBHOOK_URL}{TELEGRAM_WEBHOOK_PATH}",
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=self.dispatcher.resolve_used_update_types(),
+            max_connections=min(100, self.workers * 2),
+        )
+        logger.info(f"✅ Telegram webhook: {TELEGRAM_WEBHOOK_PATH}, воркеров {self.workers}")
+
+    async def stop(self):
+        """Остановка: дожидаемся обработки принятых обновлений (не дольше DRAIN_TIMEOUT)"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Не обработано обновлений при остановке: {self._queue.qsize()}")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("🛑 Прием обновлений через webhook остановлен")
+
+    def get_metrics(self) -> Dict:
+        return {
+            **self.metrics,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "workers": self.workers,
+        }
+
+
+# Глобальный экземпляр (создается при запуске в режиме webhook)
+_ingress: Optional[TelegramWebhookIngress] = None
+
+
+def create_webhook_ingress(bot: Bot, dispatcher: Dispatcher) -> TelegramWebhookIngress:
+    global _ingress
+    if not TELEGRAM_WEBHOOK_SECRET:
+        raise RuntimeError("❌ TELEGRAM_WEBHOOK_SECRET не задан - webhook без секрета принимает поддельные обновления")
+    if _ingress is None:
+        _ingress = TelegramWebhookIngress(bot, dispatcher)
+    return _ingress
+
+
+def get_webhook_ingress() -> Optional[TelegramWebhookIngress]:
+    return _ingress
@@ -5,13 +5,17 @@ import html
 import logging
 from aiogram import types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from save_utils import send_to_gpt_vision, convert_pdf_to_images
-from gpt import ask_structured, is_medical_text, generate_medical_summary, generate_title_from_text, extract_text_from_image
+from save_utils import send_to_gpt_vision
+from gpt import is_medical_text, extract_text_from_image
+from document_pipeline import analyze_pdf, build_document_texts
+from pdf_renderer import inspect_pdf
 from db_postgresql import save_document, get_user_language, t
 from registration import user_states
 from vector_db_postgresql import split_into_chunks, add_chunks_to_vector_db
-from file_utils import validate_file_size, validate_file_extension, create_simple_file_path
+from file_utils import MAX_FILE_SIZE
+from upload_buffer import UploadBuffer, FileTooLargeError
 from file_storage import get_file_storage
+from metrics import StageTimer, UPLOAD_STAGE_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +40,7 @@ async def handle_document_upload(message: types.Message, bot):
     from keyboards import show_main_menu
     await show_main_menu(message, lang)
 
+    upload = None
     try:
         file = message.document or message.photo[-1]
         file_id = file.file_id
@@ -49,31 +54,22 @@ async def handle_document_upload(message: types.Message, bot):
             # Для фото без имени создаем простое имя
             original_filename = f"document_{file_id[:8]}.jpg"
 
-        # ✅ СОЗДАНИЕ БЕЗОПАСНОГО ПУТИ - используем простую функцию
-        try:
-            local_file = create_simple_file_path(user_id, original_filename)
-        except ValueError as e:
-            # Локализуем ошибки файловой системы
-            error_key = {
-                "Empty filename": "file_empty_name_error",
-                "Invalid filename: contains dangerous characters": "file_invalid_name_error", 
-                "Filename too long": "file_name_too_long_error",
-                "File path outside allowed directory": "file_path_security_error",
-            }.get(str(e), "file_creation_error")
-            await message.answer(t(error_key, lang))
-            return  # ← НЕ записываем лимит при ошибке пути
-        except Exception as e:
-            await message.answer(t("file_creation_error", lang))
-            return  # ← НЕ записываем лимит при ошибке
+        # ✅ ПРОВЕРКА РАЗМЕРА ДО СКАЧИВАНИЯ (Telegram сообщает размер заранее)
+        if file.file_size and file.file_size > MAX_FILE_SIZE:
+            await message.answer(t("file_too_large", lang))
+            return  # ← НЕ записываем лимит для больших файлов
 
-        # СКАЧИВАНИЕ ФАЙЛА
-        await bot.download_file(file_path, destination=local_file)
+        # ⏱️ Этапы загрузки (см. metrics.py)
+        timer = StageTimer(UPLOAD_STAGE_SECONDS, source="bot")
 
-        # ПРОВЕРКА РАЗМЕРА ФАЙЛА ПОСЛЕ СКАЧИВАНИЯ
-        if not validate_file_size(local_file):
-            os.remove(local_file)  # Удаляем слишком большой файл
+        # СКАЧИВАНИЕ ФАЙЛА В ПАМЯТЬ (на диск - только если файл больше порога)
+        upload = UploadBuffer(original_filename)
+        try:
+            await bot.download_file(file_path, destination=upload)
+        except FileTooLargeError:
             await message.answer(t("file_too_large", lang))
             return  # ← НЕ записываем лимит для больших файлов
+        timer.mark("download")
 
         # Определяем тип файла
         file_ext = os.path.splitext(original_filename.lower())[1]
@@ -83,33 +79,26 @@ async def handle_document_upload(message: types.Message, bot):
         file_type = "pdf" if file_ext == ".pdf" else "image"
 
         await message.answer(t("document_received", lang))
+        timer.skip()
 
         # ОБРАБОТКА ФАЙЛА
         # ===== ЗАМЕНИ БЛОК "ОБРАБОТКА ФАЙЛА" В upload.py =====
 
         if file_ext == '.pdf':
             try:
-                image_paths = convert_pdf_to_images(local_file, output_dir=f"files/{user_id}/pages")
-                if not image_paths:
+                # ✅ Разбор PDF в пуле процессов (event loop не блокируется)
+                pdf_info = await inspect_pdf(upload.read_bytes(), max_pages=5)
+                if not pdf_info or not pdf_info["page_count"]:
                     await message.answer(t("pdf_read_failed", lang))
                     return  # ← НЕ записываем лимит если PDF нечитаемый
-                if len(image_paths) > 5:
-                    await message.answer(t("file_too_many_pages", lang, pages=len(image_paths)))
-                    image_paths = image_paths[:5]
+                if pdf_info["page_count"] > 5:
+                    await message.answer(t("file_too_many_pages", lang, pages=pdf_info["page_count"]))
+
+                # ✅ Текстовый слой - без Vision; сканы растеризуются и потоком
+                # распознаются параллельно, проверка "медицинский ли документ"
+                # выполняется уже по первой странице
+                vision_text, is_medical = await analyze_pdf(upload, pdf_info, None, lang, user_id=user_id)
 
-                vision_text = ""
-                for img_path in image_paths:
-                    try:
-                        page_text, _ = await send_to_gpt_vision(img_path, lang)
-                        if page_text:  # Проверяем что текст получен
-                            vision_text += page_text + "\n\n"
-                    except Exception as page_error:
-                        # Логируем ошибку страницы, но продолжаем
-                        logger.warning(f"Ошибка обработки страницы {img_path}: {page_error}")
-                        continue
-
-                vision_text = vision_text.strip()
-                
                 # Если не удалось извлечь текст ни с одной страницы
                 if not vision_text:
                     await message.answer(t("pdf_read_failed", lang))
@@ -118,31 +107,34 @@ async def handle_document_upload(message: types.Message, bot):
             except Exception as e:
                 # Детальное логирование для диагностики
                 logger.error(f"Ошибка PDF для пользователя {user_id}: {str(e)}")
-                logger.error(f"PDF файл: {local_file}")
                 logger.error(f"Тип ошибки: {type(e).__name__}")
                 
                 await message.answer(t("pdf_processing_error", lang))
                 return  # ← НЕ записываем лимит при ошибке PDF
         else:
             try:
-                vision_text, _ = await send_to_gpt_vision(local_file, lang)
+                vision_text, _ = await send_to_gpt_vision(upload.source, lang, file_unique_id=file.file_unique_id,
+                                                          user_id=user_id)
+                is_medical = None
             except Exception as e:
                 logger.error(f"Ошибка анализа изображения для пользователя {user_id}: {str(e)}")
                 await message.answer(t("image_analysis_error", lang))
                 return  # ← НЕ записываем лимит при ошибке изображения
 
-        if not await is_medical_text(vision_text):
+        timer.mark("extract")
+
+        if is_medical is None:
+            is_medical = await is_medical_text(vision_text)
+        timer.mark("classify")
+
+        if not is_medical:
             await message.answer(t("not_medical_doc", lang))
             return  # ← НЕ записываем лимит для немедицинских документов
         
-        # ✅ НОВЫЙ ПОРЯДОК: Сначала заголовок!
-        auto_title = await generate_title_from_text(text=vision_text[:1500], lang=lang)
-        
-        # ✅ Затем структурированный текст БЕЗ заголовка
-        raw_text = await ask_structured(vision_text[:8000], lang=lang)
-        
-        # ✅ И резюме для векторной базы
-        summary = await generate_medical_summary(vision_text[:8000], lang)
+        # ✅ Заголовок, структурированный текст и резюме для векторной базы
+        # зависят только от vision_text - готовим их параллельно
+        auto_title, raw_text, summary = await build_document_texts(vision_text, lang)
+        timer.mark("texts")
 
         if raw_text:
             # ✅ Импортируем функции разбивки сообщений
@@ -179,12 +171,15 @@ async def handle_document_upload(message: types.Message, bot):
             await message.answer(t("vision_failed", lang))
             return  # ← НЕ записываем лимит если обработка не удалась
 
+        timer.mark("reply")
+
         storage = get_file_storage()
-        success, permanent_path = storage.save_file(
+        success, permanent_path = await storage.save_upload(
             user_id=user_id,
             filename=original_filename,
-            source_path=local_file
+            upload=upload
         )
+        timer.mark("storage")
 
         if not success:
             await message.answer(t("file_storage_error", lang))
@@ -204,9 +199,11 @@ async def handle_document_upload(message: types.Message, bot):
             raw_text=raw_text,
             summary=summary
         )
+        timer.mark("save")
         
         chunks = await split_into_chunks(summary, document_id, user_id)
         await add_chunks_to_vector_db(document_id, user_id, chunks)
+        timer.mark("index")
 
         try:
             
@@ -228,6 +225,8 @@ async def handle_document_upload(message: types.Message, bot):
                 "user_id": user_id, 
                 "document_id": document_id
             })
+        timer.mark("timeline")
+        timer.finish()
 
         # ✅ ЗАПИСЫВАЕМ ЛИМИТ ТОЛЬКО ПОСЛЕ ПОЛНОЙ УСПЕШНОЙ ОБРАБОТКИ
         await record_user_action(user_id, "document")
@@ -262,4 +261,9 @@ async def handle_document_upload(message: types.Message, bot):
             "file_type": "document"  # без деталей файла
         })
         
-        await message.answer(t("processing_error", lang))
\ No newline at end of file
+        await message.answer(t("processing_error", lang))
+
+    finally:
+        # Освобождаем буфер и временный файл (если был)
+        if upload is not None:
+            upload.close()
\ No newline at end of file
@@ -0,0 +1,176 @@
+# upload_buffer.py - Буфер загружаемого файла в памяти
+#
+# Небольшие файлы (фото, короткие PDF) целиком остаются в памяти и передаются
+# в Vision, хэширование и хранилище как bytes/memoryview - без записи на диск.
+# Только файлы больше UPLOAD_SPOOL_THRESHOLD сбрасываются во временный файл.
+
+import io
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import Optional, Union
+
+from file_utils import MAX_FILE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Порог, после которого содержимое переносится во временный файл
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(2 * 1024 * 1024)))
+
+# Размер блока при чтении загружаемого файла (веб)
+UPLOAD_READ_CHUNK = 256 * 1024
+
+
+class FileTooLargeError(ValueError):
+    """Файл превышает допустимый размер"""
+    pass
+
+
+class UploadBuffer:
+    """
+    Буфер загрузки с ограничением размера
+
+    Поддерживает write/flush/seek, поэтому может быть передан как destination
+    в aiogram bot.download_file(). Закрывается через close() или with.
+    """
+
+    def __init__(self, filename: str, max_size: int = MAX_FILE_SIZE,
+                 spool_threshold: int = UPLOAD_SPOOL_THRESHOLD):
+        self.filename = filename
+        self.max_size = max_size
+        self.spool_threshold = spool_threshold
+        self.size = 0
+        self.path: Optional[str] = None
+        self._memory = bytearray()
+        self._file = None
+
+    # ==========================================
+    # ✍️ ЗАПИСЬ
+    # ==========================================
+
+    def write(self, data: bytes) -> int:
+        """Дописывает данные (FileTooLargeError при превышении max_size)"""
+        if self.size + len(data) > self.max_size:
+            raise FileTooLargeError(f"File exceeds {self.max_size} bytes")
+
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._memory.extend(data)
+            if self.size + len(data) > self.spool_threshold:
+                self._spill()
+
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        """Совместимость с BinaryIO (позиция записи всегда в конце)"""
+        return 0
+
+    def _spill(self):
+        """Переносит содержимое во временный файл"""
+        suffix = os.path.splitext(self.filename)[1].lower()
+        self._file = tempfile.NamedTemporaryFile(prefix="upload_", suffix=suffix, delete=False)
+        self.path = self._file.name
+        self._file.write(self._memory)
+        self._memory = bytearray()
+        logger.debug(f"💾 Загрузка сброшена во временный файл ({self.size} bytes)")
+
+    async def read_from(self, upload_file) -> "UploadBuffer":
+        """Читает starlette UploadFile частями (с проверкой размера на лету)"""
+        while True:
+            chunk = await upload_file.read(UPLOAD_READ_CHUNK)
+            if not chunk:
+                break
+            self.write(chunk)
+        self.flush()
+        return self
+
+    # ==========================================
+    # 📤 ЧТЕНИЕ
+    # ==========================================
+
+    @property
+    def in_memory(self) -> bool:
+        return self._file is None
+
+    @property
+    def source(self) -> Union[memoryview, str]:
+        """memoryview содержимого или путь к временному файлу"""
+        if self.in_memory:
+            return memoryview(self._memory)
+        self.flush()
+        return self.path
+
+    def read_bytes(self) -> bytes:
+        """Содержимое целиком (для временного файла - читает с диска)"""
+        if self.in_memory:
+            return bytes(self._memory)
+        self.flush()
+        with open(self.path, "rb") as file:
+            return file.read()
+
+    def text(self) -> str:
+        """Содержимое как текст (utf-8, затем cp1251)"""
+        data = self.read_bytes()
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            return data.decode("cp1251")
+
+    async def ensure_path(self) -> str:
+        """Путь к файлу на диске (для poppler и других внешних программ)"""
+        if self.in_memory:
+            await asyncio.to_thread(self._spill)
+        self.flush()
+        return self.path
+
+    def sha256(self) -> str:
+        """SHA-256 содержимого"""
+        if self.in_memory:
+            return hashlib.sha256(self._memory).hexdigest()
+        self.flush()
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def open(self) -> io.BufferedIOBase:
+        """Поток для чтения содержимого"""
+        if self.in_memory:
+            return io.BytesIO(self._memory)
+        self.flush()
+        return open(self.path, "rb")
+
+    # ==========================================
+    # 🧹 ЗАКРЫТИЕ
+    # ==========================================
+
+    def close(self):
+        """Освобождает память и удаляет временный файл"""
+        self._memory = bytearray()
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,45 +1,143 @@
 # user_state_manager.py - Создай этот файл в корне проекта
 
+import os
+import sys
+import heapq
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
+from state_store import get_state_store, STATE_CACHE_TTL
+from metrics import register_collector
+
 logger = logging.getLogger(__name__)
 
+# Менеджеры по пространствам имен (для подгрузки состояний из хранилища)
+_managers: Dict[str, "UserStateManager"] = {}
+
+# Когда состояния пользователя последний раз подтягивались из хранилища
+_prefetched_at: Dict[int, float] = {}
+
+# Максимум записей в одном менеджере (дальше вытесняются давно не использованные)
+USER_STATE_MAX_SIZE = int(os.getenv("USER_STATE_MAX_SIZE", "50000"))
+
+# Оценка памяти: запись состояния и элемент кучи (без учета самих значений)
+_ENTRY_SIZE = 56 + 8  # объект со __slots__ + ссылка в словаре
+_HEAP_ITEM_SIZE = 56 + 8  # кортеж из двух элементов + ссылка в списке
+
+class _StateEntry:
+    """Компактная запись состояния (без __dict__)"""
+
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value: Any, expires_at: float):
+        self.value = value
+        self.expires_at = expires_at
+
+
 class UserStateManager:
     """
     Менеджер состояний пользователей с автоматической очисткой
     Исправляет утечку памяти из registration.py
+
+    - записи в OrderedDict в порядке последнего обращения (LRU);
+    - сроки жизни в min-куче: просроченные записи снимаются с ее вершины
+      при каждом обращении и в фоновом цикле (O(log n), без полного обхода);
+    - при превышении max_size вытесняются давно не использованные записи.
+
+    Чтение - из локального кэша, изменения асинхронно уходят в хранилище
+    (см. state_store.py) под своим пространством имен.
     """
     
-    def __init__(self, ttl_minutes: int = 60):
-        self.states: Dict[int, Any] = {}
-        self.timestamps: Dict[int, datetime] = {}
+    def __init__(self, ttl_minutes: int = 60, namespace: str = "user_states",
+                 max_size: int = USER_STATE_MAX_SIZE):
+        self.states: "OrderedDict[int, _StateEntry]" = OrderedDict()
+        self._expiry_heap: List[Tuple[float, int]] = []  # (expires_at, user_id)
         self.ttl = timedelta(minutes=ttl_minutes)
+        self.max_size = max(1, max_size)
+        self.namespace = namespace
+        self.store = get_state_store()
         self.cleanup_task = None
-        logger.info(f"UserStateManager initialized with TTL={ttl_minutes} minutes")
+        self.counters = {"expired": 0, "evicted": 0}
+        _managers[namespace] = self
+        logger.info(f"UserStateManager initialized with TTL={ttl_minutes} minutes, max_size={self.max_size}")
     
     def set_state(self, user_id: int, state: Any):
         """Установить состояние пользователя"""
-        self.states[user_id] = state
-        self.timestamps[user_id] = datetime.now()
+        if state is None:
+            self.clear_state(user_id)
+            return
+        self._set_local(user_id, state)
+        self.store.schedule_write(self.namespace, user_id, state, self.ttl.total_seconds())
         logger.debug(f"State set for user")
+
+    def _set_local(self, user_id: int, state: Any, ttl_left: Optional[float] = None):
+        """Запись только в локальный кэш (ttl_left - оставшееся время жизни)"""
+        now = time.monotonic()
+        self._expire_due(now)
+
+        expires_at = now + (self.ttl.total_seconds() if ttl_left is None else ttl_left)
+        entry = self.states.get(user_id)
+        if entry is None:
+            self.states[user_id] = _StateEntry(state, expires_at)
+        else:
+            entry.value = state
+            entry.expires_at = expires_at
+            self.states.move_to_end(user_id)
+        heapq.heappush(self._expiry_heap, (expires_at, user_id))
+
+        while len(self.states) > self.max_size:
+            self.states.popitem(last=False)
+            self.counters["evicted"] += 1
+        self._compact_heap()
     
     def get_state(self, user_id: int) -> Optional[Any]:
-        """Получить состояние пользователя"""
-        if user_id in self.states:
-            # Проверяем, не истекло ли время
-            if datetime.now() - self.timestamps[user_id] > self.ttl:
-                self.clear_state(user_id)
-                return None
-            return self.states[user_id]
-        return None
+        """
+        Получить состояние пользователя
+
+        Изменения возвращенного объекта на месте в хранилище не попадают и
+        перезаписываются при подгрузке - после изменения вызывайте set_state.
+        """
+        now = time.monotonic()
+        self._expire_due(now)
+        entry = self.states.get(user_id)
+        if entry is None:
+            return None
+        self.states.move_to_end(user_id)
+        return entry.value
     
     def clear_state(self, user_id: int):
         """Очистить состояние пользователя"""
+        existed = self.states.pop(user_id, None) is not None
+        if existed or self.store.persistent:
+            self.store.schedule_delete(self.namespace, user_id)
+    
+    def _clear_local(self, user_id: int):
+        # Запись в куче станет устаревшей и будет пропущена
         self.states.pop(user_id, None)
-        self.timestamps.pop(user_id, None)
+
+    def _expire_due(self, now: float) -> int:
+        """Снимает просроченные записи с вершины кучи (в хранилище они удаляются по expires_at)"""
+        expired = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, user_id = heapq.heappop(heap)
+            entry = self.states.get(user_id)
+            # Запись кучи актуальна, только если срок совпадает с текущим сроком записи
+            if entry is not None and entry.expires_at == expires_at:
+                del self.states[user_id]
+                expired += 1
+        self.counters["expired"] += expired
+        return expired
+
+    def _compact_heap(self):
+        """Перестраивает кучу, если в ней накопилось много устаревших сроков"""
+        if len(self._expiry_heap) > 2 * len(self.states) + 1000:
+            self._expiry_heap = [(entry.expires_at, user_id) for user_id, entry in self.states.items()]
+            heapq.heapify(self._expiry_heap)
     
     async def start_cleanup_loop(self):
         """Запустить автоматическую очистку"""
@@ -59,10 +157,10 @@ class UserStateManager:
             logger.info("🛑 User state cleanup loop stopped")
     
     async def _cleanup_loop(self):
-        """Цикл автоматической очистки каждые 5 минут"""
+        """Цикл автоматической очистки каждую минуту (для неактивных менеджеров)"""
         while True:
             try:
-                await asyncio.sleep(300)  # 5 минут
+                await asyncio.sleep(60)
                 await self._cleanup_expired()
             except asyncio.CancelledError:
                 break
@@ -71,26 +169,126 @@ class UserStateManager:
     
     async def _cleanup_expired(self):
         """Очистить истекшие состояния"""
-        now = datetime.now()
-        expired_users = [
-            user_id for user_id, timestamp in self.timestamps.items()
-            if now - timestamp > self.ttl
-        ]
-        
-        for user_id in expired_users:
-            self.clear_state(user_id)
-        
-        if expired_users:
-            logger.info(f"🧹 Cleaned up expired user states")
+        expired = self._expire_due(time.monotonic())
+        self._compact_heap()
+        if expired:
+            logger.info(f"🧹 Cleaned up {expired} expired user states")
     
-    def get_stats(self) -> Dict[str, int]:
+    def get_stats(self) -> Dict[str, Any]:
         """Получить статистику для мониторинга"""
+        approx_bytes = (
+            sys.getsizeof(self.states)
+            + len(self.states) * _ENTRY_SIZE
+            + sys.getsizeof(self._expiry_heap)
+            + len(self._expiry_heap) * _HEAP_ITEM_SIZE
+        )
         return {
+            "namespace": self.namespace,
             "total_states": len(self.states),
-            "active_timestamps": len(self.timestamps),
-            "cleanup_running": self.cleanup_task is not None
+            "max_size": self.max_size,
+            "heap_size": len(self._expiry_heap),
+            "expired": self.counters["expired"],
+            "evicted": self.counters["evicted"],
+            "approx_memory_bytes": approx_bytes,
+            "cleanup_running": self.cleanup_task is not None,
+            "store": self.store.get_stats()
         }
 
+
+# ==========================================
+# 🔄 СИНХРОНИЗАЦИЯ С ХРАНИЛИЩЕМ
+# ==========================================
+
+async def prefetch_user_state(user_id: int, force: bool = False):
+    """
+    Подтягивает состояния пользователя из хранилища (одним запросом для всех
+    пространств имен), если локальная копия старше STATE_CACHE_TTL.
+    Ключи с еще не сохраненными локальными изменениями не перезаписываются.
+    """
+    store = get_state_store()
+    if not store.persistent:
+        return
+
+    now = time.monotonic()
+    if not force and now - _prefetched_at.get(user_id, 0.0) < STATE_CACHE_TTL:
+        return
+
+    try:
+        loaded = await store.load_user(user_id)
+    except Exception as e:
+        logger.error(f"Ошибка загрузки состояния пользователя: {type(e).__name__}")
+        return
+
+    _prefetched_at[user_id] = now
+    if len(_prefetched_at) > 50000:
+        cutoff = now - STATE_CACHE_TTL
+        for key in [key for key, value in _prefetched_at.items() if value < cutoff]:
+            del _prefetched_at[key]
+
+    for namespace, manager in _managers.items():
+        if store.has_pending(namespace, user_id):
+            continue
+        if namespace in loaded:
+            value, ttl_left = loaded[namespace]
+            manager._set_local(user_id, value, ttl_left)
+        else:
+            manager._clear_local(user_id)
+
+
+async def start_state_store():
+    """Запуск очистки, хранилища и прогрев кэша (состояния переживают перезапуск)"""
+    for manager in _managers.values():
+        await manager.start_cleanup_loop()
+    store = get_state_store()
+    await store.start()
+    if not store.persistent:
+        return 0
+
+    loaded = await store.load_all()
+    restored = 0
+    for namespace, states in loaded.items():
+        manager = _managers.get(namespace)
+        if manager is None:
+            continue
+        for user_id, (value, ttl_left) in states.items():
+            manager._set_local(user_id, value, ttl_left)
+            restored += 1
+    logger.info(f"✅ Состояния диалогов восстановлены: {restored}")
+    return restored
+
+
+async def stop_state_store():
+    for manager in _managers.values():
+        await manager.stop_cleanup_loop()
+    await get_state_store().stop()
+
+
+def get_state_stats() -> Dict[str, Dict]:
+    """Статистика всех менеджеров состояний"""
+    return {namespace: manager.get_stats() for namespace, manager in _managers.items()}
+
+
+def _collect_state_metrics():
+    """Состояния диалогов для /metrics"""
+    stats = get_state_stats()
+    return [
+        ("user_state_entries", "gauge", "Состояния в локальном кэше", [
+            ({"namespace": ns}, s["total_states"]) for ns, s in stats.items()
+        ]),
+        ("user_state_memory_bytes", "gauge", "Оценка памяти кэша состояний", [
+            ({"namespace": ns}, s["approx_memory_bytes"]) for ns, s in stats.items()
+        ]),
+        ("user_state_expired_total", "counter", "Состояния, удаленные по сроку", [
+            ({"namespace": ns}, s["expired"]) for ns, s in stats.items()
+        ]),
+        ("user_state_evicted_total", "counter", "Состояния, вытесненные по LRU", [
+            ({"namespace": ns}, s["evicted"]) for ns, s in stats.items()
+        ]),
+    ]
+
+register_collector(_collect_state_metrics)
+
+
 # ✅ ГЛОБАЛЬНЫЙ МЕНЕДЖЕР (заменяет user_states словарь)
 user_state_manager = UserStateManager(ttl_minutes=60)
 
@@ -110,21 +308,30 @@ def clear_user_state(user_id: int):
 # ✅ СЛОВАРЬ ДЛЯ СОВМЕСТИМОСТИ (чтобы не ломать существующий код)
 class StateDict:
     """Объект который ведет себя как словарь, но использует UserStateManager"""
+
+    def __init__(self, manager: Optional[UserStateManager] = None):
+        self.manager = manager or user_state_manager
     
     def __getitem__(self, user_id: int):
-        return user_state_manager.get_state(user_id)
+        return self.manager.get_state(user_id)
     
     def __setitem__(self, user_id: int, value: Any):
-        user_state_manager.set_state(user_id, value)
+        self.manager.set_state(user_id, value)
+
+    def __delitem__(self, user_id: int):
+        self.manager.clear_state(user_id)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.manager.get_state(user_id) is not None
     
     def get(self, user_id: int, default=None):
-        state = user_state_manager.get_state(user_id)
+        state = self.manager.get_state(user_id)
         return state if state is not None else default
     
     def pop(self, user_id: int, default=None):
-        state = user_state_manager.get_state(user_id)
+        state = self.manager.get_state(user_id)
         if state is not None:
-            user_state_manager.clear_state(user_id)
+            self.manager.clear_state(user_id)
             return state
         return default
 
@@ -0,0 +1,116 @@
+# user_stats.py - Счетчики пользователя для личного кабинета
+#
+# Количество документов и сообщений хранится в таблице user_stats и
+# обновляется триггерами на documents и chat_history (уровня оператора,
+# с таблицами переходов - пакетная вставка или удаление GDPR дает одно
+# обновление на пользователя, а не на строку). Так счетчики верны для
+# любого пути записи: save_message, save_document, delete_document,
+# удаление из веб-кабинета, каскадное удаление.
+#
+# Раз в сутки счетчики сверяются с реальными COUNT(*) и исправляются
+# (расхождения возможны, например, если строки менялись во время сверки).
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from db_postgresql import get_db_connection, release_db_connection
+from error_handler import log_error_with_context
+from metrics import track_cycle
+
+logger = logging.getLogger(__name__)
+
+# Час ночной сверки (UTC)
+USER_STATS_RECONCILE_HOUR = int(os.getenv("USER_STATS_RECONCILE_HOUR", "4"))
+
+# Пересчет всех пользователей одним запросом; обновляются только расхождения
+RECONCILE_SQL = """
+    INSERT INTO user_stats (user_id, total_documents, total_messages, updated_at)
+    SELECT u.user_id, COALESCE(d.total, 0), COALESCE(m.total, 0), NOW()
+    FROM users u
+    LEFT JOIN (SELECT user_id, COUNT(*) AS total FROM documents GROUP BY user_id) d
+        ON d.user_id = u.user_id
+    LEFT JOIN (SELECT user_id, COUNT(*) AS total FROM chat_history GROUP BY user_id) m
+        ON m.user_id = u.user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET total_documents = EXCLUDED.total_documents,
+        total_messages = EXCLUDED.total_messages,
+        updated_at = NOW()
+    WHERE user_stats.total_documents IS DISTINCT FROM EXCLUDED.total_documents
+       OR user_stats.total_messages IS DISTINCT FROM EXCLUDED.total_messages
+    RETURNING user_id
+"""
+
+
+class UserStatsReconciler:
+    """Ночная сверка счетчиков user_stats"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {"runs": 0, "rows_fixed": 0, "last_run_duration": 0.0, "last_run_at": None}
+
+    @track_cycle("user_stats_reconcile")
+    async def reconcile(self) -> int:
+        """Пересчитывает счетчики, возвращает число исправленных строк"""
+        started = time.monotonic()
+        conn = await get_db_connection("analytics")
+        try:
+            rows = await conn.fetch(RECONCILE_SQL)
+        finally:
+            await release_db_connection(conn)
+
+        self.stats["runs"] += 1
+        self.stats["rows_fixed"] += len(rows)
+        self.stats["last_run_duration"] = round(time.monotonic() - started, 3)
+        self.stats["last_run_at"] = datetime.utcnow().isoformat()
+        logger.info(f"📊 Сверка user_stats: исправлено {len(rows)} строк за {self.stats['last_run_duration']} сек")
+        return len(rows)
+
+    @staticmethod
+    def _seconds_until_next_run() -> float:
+        now = datetime.utcnow()
+        next_run = now.replace(hour=USER_STATS_RECONCILE_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self._seconds_until_next_run())
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_error_with_context(e, {"function": "user_stats_reconcile"})
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._loop())
+            logger.info(f"✅ Сверка user_stats: ежедневно в {USER_STATS_RECONCILE_HOUR:02d}:00 UTC")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "running": self.task is not None}
+
+
+# Глобальный экземпляр
+_reconciler = None
+
+def get_user_stats_reconciler() -> UserStatsReconciler:
+    """Получить сверку счетчиков (Singleton)"""
+    global _reconciler
+    if _reconciler is None:
+        _reconciler = UserStatsReconciler()
+    return _reconciler
@@ -0,0 +1,140 @@
+# vision_cache.py - Кэш результатов распознавания изображений (Gemini Vision)
+#
+# Один и тот же документ часто приходит повторно (пересланное сообщение,
+# повторная загрузка после ошибки). Результат Vision кэшируется в PostgreSQL
+# по хэшу содержимого файла и по Telegram file_unique_id.
+#
+# Кэш отдельный для каждого пользователя: ключ содержит user_id, и запись
+# хранит user_id - удаление аккаунта (gdpr_purge) удаляет и его кэш.
+
+import os
+import time
+import hashlib
+import logging
+from typing import List, Optional
+
+from db_postgresql import get_db_connection, release_db_connection
+from error_handler import log_error_with_context
+
+logger = logging.getLogger(__name__)
+
+# Время жизни записи кэша
+VISION_CACHE_TTL_DAYS = int(os.getenv("VISION_CACHE_TTL_DAYS", "30"))
+
+# Меняется при изменении промпта/предобработки/формата ключа - старые записи перестают совпадать
+VISION_CACHE_VERSION = "v2"
+
+# Как часто удалять просроченные записи (секунды)
+CLEANUP_INTERVAL = 3600
+_last_cleanup = 0.0
+
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 содержимого файла (блокирующая, вызывать через asyncio.to_thread)"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_sha256(source) -> str:
+    """SHA-256 пути к файлу или bytes/memoryview (блокирующая)"""
+    if isinstance(source, str):
+        return file_sha256(source)
+    return hashlib.sha256(source).hexdigest()
+
+
+def build_cache_keys(user_id: int, content_hash: str, lang: str, file_unique_id: str = None) -> List[str]:
+    """Ключи кэша пользователя: по содержимому и (если известен) по Telegram file_unique_id"""
+    prefix = f"{VISION_CACHE_VERSION}:{user_id}"
+    keys = [f"{prefix}:sha256:{content_hash}:{lang}"]
+    if file_unique_id:
+        keys.append(f"{prefix}:tg:{file_unique_id}:{lang}")
+    return keys
+
+
+async def get_cached_vision_result(user_id: int, cache_keys: List[str]) -> Optional[str]:
+    """
+    Ищет результат распознавания по любому из ключей
+
+    Если результат найден не по всем ключам (например, тот же файл пришел
+    с новым file_unique_id) - недостающие ключи добавляются.
+    """
+    if not cache_keys:
+        return None
+
+    conn = None
+    try:
+        conn = await get_db_connection()
+        rows = await conn.fetch("""
+            SELECT cache_key, result_text FROM vision_cache
+            WHERE cache_key = ANY($1::text[]) AND user_id = $2 AND expires_at > NOW()
+        """, cache_keys, user_id)
+    except Exception as e:
+        log_error_with_context(e, {"function": "get_cached_vision_result"})
+        return None
+    finally:
+        if conn:
+            await release_db_connection(conn)
+
+    if not rows:
+        return None
+
+    result_text = rows[0]["result_text"]
+    if len(rows) < len(cache_keys):
+        found = {row["cache_key"] for row in rows}
+        await save_vision_result(user_id, [key for key in cache_keys if key not in found], result_text)
+
+    logger.info("♻️ Vision: результат взят из кэша")
+    return result_text
+
+
+async def save_vision_result(user_id: int, cache_keys: List[str], result_text: str) -> bool:
+    """Сохраняет результат распознавания пользователя под всеми ключами"""
+    if not cache_keys or not result_text:
+        return False
+
+    conn = None
+    try:
+        conn = await get_db_connection()
+        await conn.executemany("""
+            INSERT INTO vision_cache (cache_key, user_id, result_text, expires_at)
+            VALUES ($1, $2, $3, NOW() + make_interval(days => $4))
+            ON CONFLICT (cache_key) DO UPDATE
+            SET result_text = EXCLUDED.result_text,
+                expires_at = EXCLUDED.expires_at
+        """, [(key, user_id, result_text, VISION_CACHE_TTL_DAYS) for key in cache_keys])
+    except Exception as e:
+        log_error_with_context(e, {"function": "save_vision_result"})
+        return False
+    finally:
+        if conn:
+            await release_db_connection(conn)
+
+    await cleanup_expired_vision_cache()
+    return True
+
+
+async def cleanup_expired_vision_cache(force: bool = False) -> int:
+    """Удаляет просроченные записи (не чаще раза в CLEANUP_INTERVAL)"""
+    global _last_cleanup
+    now = time.monotonic()
+    if not force and now - _last_cleanup < CLEANUP_INTERVAL:
+        return 0
+    _last_cleanup = now
+
+    conn = None
+    try:
+        conn = await get_db_connection("background")
+        result = await conn.execute("DELETE FROM vision_cache WHERE expires_at <= NOW()")
+        deleted = int(result.split()[-1])
+        if deleted:
+            logger.info(f"🧹 Vision кэш: удалено {deleted} просроченных записей")
+        return deleted
+    except Exception as e:
+        log_error_with_context(e, {"function": "cleanup_expired_vision_cache"})
+        return 0
+    finally:
+        if conn:
+            await release_db_connection(conn)
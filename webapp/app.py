@@ -7,7 +7,7 @@ import sys
 from pathlib import Path
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
@@ -61,7 +61,7 @@ async def lifespan(app: FastAPI):
     print("🔄 Инициализация базы данных...")
     
     try:
-        await initialize_db_pool()
+        await initialize_db_pool(profiles=("interactive",))
         print("✅ База данных подключена!")
     except Exception as e:
         print(f"❌ Ошибка подключения к БД: {e}")
@@ -106,6 +106,22 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ Ошибка при закрытии векторной БД: {e}")
 
+    # Закрываем HTTP-клиент файлового хранилища
+    try:
+        from file_storage import close_file_storage
+        await close_file_storage()
+        print("✅ Файловое хранилище закрыто")
+    except Exception as e:
+        print(f"⚠️ Ошибка при закрытии хранилища: {e}")
+
+    # Останавливаем пул процессов рендеринга PDF
+    try:
+        from pdf_renderer import shutdown_pdf_executor
+        shutdown_pdf_executor()
+        print("✅ Пул рендеринга PDF остановлен")
+    except Exception as e:
+        print(f"⚠️ Ошибка при остановке пула PDF: {e}")
+
     # Закрываем основную БД с таймаутом (для разработки)
     try:
         await asyncio.wait_for(close_db_pool(), timeout=2.0)
@@ -273,6 +289,16 @@ async def health_check():
         }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """Метрики Prometheus (см. metrics.py)"""
+    from metrics import render_metrics, is_authorized, CONTENT_TYPE
+    
+    if not is_authorized(request.headers.get("authorization")):
+        return Response(status_code=401)
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
 # ==========================================
 # 🚀 ЗАПУСК (для локальной разработки)
 # ==========================================
@@ -4,8 +4,11 @@
 
 import os
 import sys
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
 from fastapi import APIRouter, Request, Depends, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 
 # Добавляем корневую папку в путь
@@ -21,7 +24,9 @@ from db_postgresql import (
     get_user_language,      # ✅ async
     get_user_profile,       # ✅ async
     get_db_connection,      # ✅ async
-    release_db_connection   # ✅ async
+    release_db_connection,  # ✅ async
+    get_documents_page,     # ✅ async (keyset-пагинация, только метаданные)
+    get_document_body       # ✅ async (текст документа по запросу)
 )
 
 # ✅ Импорт форматирования для веба
@@ -310,6 +315,7 @@ async def upload_document(
     
     # ✅ СНАЧАЛА получаем язык пользователя
     lang = await get_user_language(user_id)
+    upload = None
     
     try:
         if not file.filename:
@@ -335,66 +341,57 @@ async def upload_document(
         
         print(f"📤 Загрузка документа от user_id={user_id}: {filename}")
         
-        # Создаём временную папку для загрузок
-        temp_dir = f"temp_{user_id}"
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Сохраняем файл ВРЕМЕННО
-        local_file = os.path.join(temp_dir, filename)
-        
-        # ✅ Сохраняем асинхронно
-        content = await file.read()
-        with open(local_file, 'wb') as f:
-            f.write(content)
+        # ✅ Читаем файл частями в буфер в памяти (на диск - только большие файлы)
+        from upload_buffer import UploadBuffer, FileTooLargeError
+        from metrics import StageTimer, UPLOAD_STAGE_SECONDS
+        timer = StageTimer(UPLOAD_STAGE_SECONDS, source="web")
+        upload = UploadBuffer(filename)
+        try:
+            await upload.read_from(file)
+        except FileTooLargeError:
+            from db_postgresql import t
+            return JSONResponse(
+                status_code=400,
+                content={'success': False, 'error': t('file_too_large', lang)}
+            )
+        timer.mark("download")
         
-        print(f"✅ Файл сохранён временно: {local_file}")
+        print(f"✅ Файл получен: {upload.size} bytes ({'память' if upload.in_memory else 'временный файл'})")
         
         # ===================================================
         # 🔧 КОПИРУЕМ ЛОГИКУ ИЗ upload.py (TELEGRAM БОТА)
         # ===================================================
         
         # Импортируем функции из бота
-        from save_utils import send_to_gpt_vision, convert_pdf_to_images
-        from gpt import (
-            ask_structured, 
-            is_medical_text, 
-            generate_medical_summary, 
-            generate_title_from_text
-        )
+        from save_utils import send_to_gpt_vision
+        from gpt import is_medical_text
+        from document_pipeline import analyze_pdf, build_document_texts
+        from pdf_renderer import inspect_pdf
         from db_postgresql import save_document, t
         from vector_db_postgresql import split_into_chunks, add_chunks_to_vector_db
         from file_storage import get_file_storage
         
         file_type = "pdf" if file_ext == "pdf" else "image"
         vision_text = ""
+        is_medical = None
         
         # STEP 1: Извлекаем текст в зависимости от типа файла
         if file_ext == 'pdf':
             try:
-                image_paths = convert_pdf_to_images(local_file, f"{temp_dir}/pages")
+                pdf_info = await inspect_pdf(upload.read_bytes(), max_pages=5)
                 
-                if not image_paths:
+                if not pdf_info or not pdf_info['page_count']:
                     return JSONResponse(
                         status_code=400,
                         content={'success': False, 'error': t('pdf_read_failed', lang)}
                     )
                 
                 # Ограничиваем до 5 страниц
-                if len(image_paths) > 5:
-                    print(f"⚠️ PDF содержит {len(image_paths)} страниц, обрабатываем первые 5")
-                    image_paths = image_paths[:5]
+                if pdf_info['page_count'] > 5:
+                    print(f"⚠️ PDF содержит {pdf_info['page_count']} страниц, обрабатываем первые 5")
                 
-                # Извлекаем текст с каждой страницы
-                for img_path in image_paths:
-                    try:
-                        page_text, _ = await send_to_gpt_vision(img_path, lang)
-                        if page_text:
-                            vision_text += page_text + "\n\n"
-                    except Exception as page_error:
-                        print(f"⚠️ Ошибка обработки страницы: {page_error}")
-                        continue
-                
-                vision_text = vision_text.strip()
+                # Текстовый слой или потоковое распознавание страниц (тот же конвейер, что в боте)
+                vision_text, is_medical = await analyze_pdf(upload, pdf_info, None, lang, user_id=user_id)
                 
                 if not vision_text:
                     return JSONResponse(
@@ -414,7 +411,7 @@ async def upload_document(
         elif file_ext in ['jpg', 'jpeg', 'png', 'webp']:
             # Изображение → анализируем через Vision API
             try:
-                vision_text, _ = await send_to_gpt_vision(local_file, lang)
+                vision_text, _ = await send_to_gpt_vision(upload.source, lang, user_id=user_id)
             except Exception as e:
                 print(f"❌ Ошибка анализа изображения: {e}")
                 return JSONResponse(
@@ -425,45 +422,46 @@ async def upload_document(
         else:
             # Текстовый файл → читаем напрямую
             try:
-                with open(local_file, 'r', encoding='utf-8') as f:
-                    vision_text = f.read()
-            except UnicodeDecodeError:
-                try:
-                    with open(local_file, 'r', encoding='cp1251') as f:
-                        vision_text = f.read()
-                except Exception as e:
-                    print(f"❌ Ошибка чтения файла: {e}")
-                    return JSONResponse(
-                        status_code=400,
-                        content={'success': False, 'error': t('file_read_error', lang)}
-                    )
+                vision_text = upload.text()
+            except Exception as e:
+                print(f"❌ Ошибка чтения файла: {e}")
+                return JSONResponse(
+                    status_code=400,
+                    content={'success': False, 'error': t('file_read_error', lang)}
+                )
         
+        timer.mark("extract")
+
         # STEP 2: Проверяем что это медицинский документ
-        if not await is_medical_text(vision_text):
+        # (для PDF проверка уже выполнена по первой странице)
+        if is_medical is None:
+            is_medical = await is_medical_text(vision_text)
+        timer.mark("classify")
+
+        if not is_medical:
             return JSONResponse(
                 status_code=400,
                 content={'success': False, 'error': t('not_medical_doc', lang)}
             )
         
-        # STEP 3: Генерируем заголовок
-        if title and title.strip():
-            auto_title = title.strip()
+        # STEP 3-4: Заголовок, структурированный текст и резюме - параллельно
+        user_title = title.strip() if title and title.strip() else None
+        auto_title, raw_text, summary = await build_document_texts(vision_text, lang, title=user_title)
+        timer.mark("texts")
+
+        if user_title:
             print(f"✅ Используем название от пользователя: {auto_title}")
         else:
-            auto_title = await generate_title_from_text(text=vision_text[:1500], lang=lang)
             print(f"🤖 Сгенерирован заголовок: {auto_title}")
         
-        # STEP 4: Создаём структурированный текст и резюме
-        raw_text = await ask_structured(vision_text[:8000], lang=lang)
-        summary = await generate_medical_summary(vision_text[:8000], lang)
-        
         # STEP 5: Сохраняем файл в постоянное хранилище
         storage = get_file_storage()
-        success, permanent_path = storage.save_file(
+        success, permanent_path = await storage.save_upload(
             user_id=user_id,
             filename=filename,
-            source_path=local_file
+            upload=upload
         )
+        timer.mark("storage")
         
         if not success:
             return JSONResponse(
@@ -482,28 +480,18 @@ async def upload_document(
             raw_text=raw_text,
             summary=summary
         )
+        timer.mark("save")
         
         print(f"✅ Документ сохранён в БД: document_id={document_id}")
         
         # STEP 7: Добавляем в векторную базу
         chunks = await split_into_chunks(summary, document_id, user_id)
         await add_chunks_to_vector_db(document_id, user_id, chunks)
+        timer.mark("index")
+        timer.finish()
         
         print(f"✅ Документ добавлен в векторную базу")
         
-        # STEP 8: Удаляем временные файлы
-        try:
-            if os.path.exists(local_file):
-                os.remove(local_file)
-            pages_dir = f"{temp_dir}/pages"
-            if os.path.exists(pages_dir):
-                import shutil
-                shutil.rmtree(pages_dir)
-            if os.path.exists(temp_dir) and not os.listdir(temp_dir):
-                os.rmdir(temp_dir)
-        except Exception as cleanup_error:
-            print(f"⚠️ Не удалось удалить временные файлы: {cleanup_error}")
-        
         print(f"🎉 Документ успешно обработан!")
         
         # ✅ Возвращаем успех
@@ -521,20 +509,6 @@ async def upload_document(
         import traceback
         traceback.print_exc()
         
-        # Пытаемся удалить временные файлы даже при ошибке
-        try:
-            if 'local_file' in locals() and os.path.exists(local_file):
-                os.remove(local_file)
-            if 'temp_dir' in locals():
-                pages_dir = f"{temp_dir}/pages"
-                if os.path.exists(pages_dir):
-                    import shutil
-                    shutil.rmtree(pages_dir)
-                if os.path.exists(temp_dir) and not os.listdir(temp_dir):
-                    os.rmdir(temp_dir)
-        except:
-            pass  # Игнорируем ошибки очистки
-        
         return JSONResponse(
             status_code=500,
             content={
@@ -542,6 +516,11 @@ async def upload_document(
                 'error': t('document_processing_error', lang) if 'lang' in locals() else 'Error processing document'
             }
         )
+    
+    finally:
+        # Освобождаем буфер загрузки и временный файл (если был)
+        if upload is not None:
+            upload.close()
 
 # ==========================================
 # 🗑️ УДАЛЕНИЕ ДОКУМЕНТА
@@ -597,4 +576,101 @@ async def delete_document(
         return JSONResponse(
             status_code=500,
             content={'success': False, 'error': 'Ошибка удаления'}
-        )
\ No newline at end of file
+        )
+
+
+# ==========================================
+# 📄 БИБЛИОТЕКА ДОКУМЕНТОВ (ПОСТРАНИЧНО)
+# ==========================================
+
+# Максимум документов за один запрос списка
+DOCUMENTS_PAGE_MAX = 50
+
+
+@router.get("/documents")
+async def list_documents(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    user_id: int = Depends(get_current_user)
+):
+    """
+    Список документов без текста (keyset-пагинация)
+
+    Следующая страница запрашивается с cursor=next_cursor из ответа.
+    """
+    limit = max(1, min(limit, DOCUMENTS_PAGE_MAX))
+    try:
+        documents, next_cursor = await get_documents_page(
+            user_id, limit=limit, cursor=cursor, confirmed_only=False
+        )
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={'success': False, 'error': 'Некорректный курсор'}
+        )
+
+    return {
+        'success': True,
+        'documents': [
+            {
+                'id': doc['id'],
+                'title': doc['title'],
+                'file_type': doc['file_type'],
+                'uploaded_at': doc['date'].strftime('%d.%m.%Y %H:%M') if doc['date'] else None
+            }
+            for doc in documents
+        ],
+        'next_cursor': next_cursor
+    }
+
+
+@router.get("/documents/{document_id}/body")
+async def document_body(
+    document_id: int,
+    request: Request,
+    user_id: int = Depends(get_current_user)
+):
+    """
+    AI-анализ документа по запросу (раскрытие карточки)
+
+    Ответ кэшируется браузером: ETag по содержимому и Last-Modified по дате
+    загрузки; при совпадении возвращается 304 без тела.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    known_etag = if_none_match.replace('W/', '').strip().strip('"') if if_none_match else None
+
+    body = await get_document_body(document_id, user_id, known_etag)
+    if not body:
+        return JSONResponse(
+            status_code=404,
+            content={'success': False, 'error': 'Документ не найден'}
+        )
+
+    headers = {'ETag': f'"{body["etag"]}"', 'Cache-Control': 'private, no-cache'}
+    last_modified = None
+    if body['uploaded_at']:
+        last_modified = body['uploaded_at'].replace(tzinfo=timezone.utc, microsecond=0)
+        headers['Last-Modified'] = format_datetime(last_modified, usegmt=True)
+
+    if body['not_modified']:
+        return Response(status_code=304, headers=headers)
+
+    # If-Modified-Since учитываем только без If-None-Match (текст документа после загрузки не меняется)
+    if_modified_since = request.headers.get('if-modified-since')
+    if not if_none_match and if_modified_since and last_modified:
+        try:
+            if last_modified <= parsedate_to_datetime(if_modified_since):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    from webapp.routes.dashboard import markdown_filter
+    return JSONResponse(
+        content={
+            'success': True,
+            'has_analysis': bool(body['raw_text']),
+            'html': markdown_filter(body['raw_text'])
+        },
+        headers=headers
+    )
@@ -28,6 +28,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspa
 from db_postgresql import (
     get_user_profile,           # ✅ async функция
     get_documents_by_user,      # ✅ async функция
+    get_documents_page,         # ✅ async функция (keyset-пагинация)
     get_last_messages           # ✅ async функция (возвращает list of tuples)
 )
 
@@ -41,39 +42,35 @@ router = APIRouter()
 # 📁 НАСТРОЙКА ШАБЛОНОВ
 # templates = Jinja2Templates(directory="webapp/templates")
 
+# Документов на первой странице списка (остальные - по кнопке "Показать ещё")
+DOCUMENTS_FIRST_PAGE = 20
+
 async def get_user_stats(user_id: int) -> dict:
     """
     Получить статистику пользователя
     ✅ ПОЛНОСТЬЮ ASYNC!
+
+    Счетчики читаются из user_stats (поддерживаются триггерами, см. user_stats.py)
+    вместе с лимитами - один запрос вместо COUNT(*) по chat_history и documents.
     """
     from db_postgresql import get_db_connection, release_db_connection
     
     conn = await get_db_connection()
     
     try:
-        # Количество документов
-        total_docs = await conn.fetchval(
-            "SELECT COUNT(*) FROM documents WHERE user_id = $1", 
-            user_id
-        )
-        
-        # Количество сообщений
-        total_messages = await conn.fetchval(
-            "SELECT COUNT(*) FROM chat_history WHERE user_id = $1", 
-            user_id
-        )
-        
-        # Лимиты
-        limits = await conn.fetchrow(
-            "SELECT documents_left, gpt4o_queries_left FROM user_limits WHERE user_id = $1",
-            user_id
-        )
+        row = await conn.fetchrow("""
+            SELECT s.total_documents, s.total_messages,
+                   l.documents_left, l.gpt4o_queries_left
+            FROM (SELECT $1::bigint AS user_id) u
+            LEFT JOIN user_stats s ON s.user_id = u.user_id
+            LEFT JOIN user_limits l ON l.user_id = u.user_id
+        """, user_id)
         
         return {
-            'total_documents': total_docs or 0,
-            'total_messages': total_messages or 0,
-            'documents_left': limits['documents_left'] if limits else 2,
-            'queries_left': limits['gpt4o_queries_left'] if limits else 10
+            'total_documents': row['total_documents'] or 0,
+            'total_messages': row['total_messages'] or 0,
+            'documents_left': row['documents_left'] if row['documents_left'] is not None else 2,
+            'queries_left': row['gpt4o_queries_left'] if row['gpt4o_queries_left'] is not None else 10
         }
         
     except Exception as e:
@@ -154,50 +151,23 @@ async def dashboard(request: Request, user_id: int = Depends(get_current_user)):
 async def documents_page(request: Request, user_id: int = Depends(get_current_user)):
     """
     Страница документов
-    
-    ✅ С ПРАВИЛЬНОЙ ЗАГРУЗКОЙ raw_text и summary!
+
+    ✅ Первая страница списка - только метаданные (без raw_text и summary).
+    Следующие страницы подгружаются через /api/documents?cursor=...,
+    AI-анализ - при раскрытии карточки через /api/documents/{id}/body.
     """
-    from db_postgresql import get_db_connection, release_db_connection
-    
-    conn = await get_db_connection()
-    
-    try:
-        # ✅ ВАЖНО: Выбираем ВСЕ поля, включая raw_text и summary
-        documents = await conn.fetch("""
-            SELECT 
-                id, 
-                title, 
-                file_path, 
-                file_type, 
-                raw_text,      -- ✅ ОБЯЗАТЕЛЬНО!
-                summary,       -- ✅ ОБЯЗАТЕЛЬНО!
-                uploaded_at
-            FROM documents
-            WHERE user_id = $1
-            ORDER BY uploaded_at DESC
-        """, user_id)
-        
-        # Преобразуем в список словарей
-        docs_list = [dict(doc) for doc in documents]
-        
-        # 🐛 DEBUG: Выводим в консоль для проверки
-        print(f"\n📋 Загружено документов: {len(docs_list)}")
-        for doc in docs_list:
-            print(f"  - ID: {doc['id']}, title: {doc['title']}")
-            print(f"    has raw_text: {bool(doc.get('raw_text'))}")
-            print(f"    has summary: {bool(doc.get('summary'))}")
-            if doc.get('raw_text'):
-                print(f"    raw_text length: {len(doc['raw_text'])} chars")
-            if doc.get('summary'):
-                print(f"    summary length: {len(doc['summary'])} chars")
-        
-    finally:
-        await release_db_connection(conn)
-    
-    # ✅ ИСПОЛЬЗУЕМ get_template_context как в старой версии!
+    documents, next_cursor = await get_documents_page(
+        user_id, limit=DOCUMENTS_FIRST_PAGE, confirmed_only=False
+    )
+    stats = await get_user_stats(user_id)
+
     context = get_template_context(request)
-    context['documents'] = docs_list
-    
+    context.update({
+        'documents': documents,
+        'next_cursor': next_cursor,
+        'total_documents': stats['total_documents']
+    })
+
     return templates.TemplateResponse("documents.html", context)
 
 
@@ -7,6 +7,8 @@ from datetime import datetime
 from aiohttp import web
 from subscription_manager import SubscriptionManager
 from db_postgresql import get_user_language, t, get_db_connection, release_db_connection
+from metrics import render_metrics, is_authorized as is_metrics_authorized, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from telegram_outbox import send_message, PRIORITY_NOTIFICATION
 
 logger = logging.getLogger(__name__)
 
@@ -164,7 +166,10 @@ class SubscriptionWebhookHandler:
                                 user_id = int(session.metadata.get('user_id'))
                                 lang = await get_user_language(user_id)
                                 localized_message = t("webhook_payment_processed_auto", lang, message=message)
-                                await self.bot.send_message(user_id, localized_message, parse_mode="HTML")
+                                await send_message(
+                                    self.bot, user_id, localized_message,
+                                    priority=PRIORITY_NOTIFICATION, parse_mode="HTML"
+                                )
                                 logger.info(f"✅ Notification sent for checkout session: {session_id}")
                             except Exception as notify_error:
                                 logger.warning(f"❌ Notification failed for checkout session: {notify_error}")
@@ -362,8 +367,8 @@ class SubscriptionWebhookHandler:
             # ✅ ИСПОЛЬЗУЕМ ЛОКАЛИЗОВАННОЕ СООБЩЕНИЕ
             message = t("webhook_subscription_renewed", lang, package_id=package_id)
             
-            # Отправляем сообщение через бота
-            await self.bot.send_message(user_id, message)
+            # Отправляем сообщение через очередь исходящих
+            await send_message(self.bot, user_id, message, priority=PRIORITY_NOTIFICATION)
             
         except Exception as e:
             logger.error(f"Renewal notification failed: {e}")
@@ -376,21 +381,30 @@ class SubscriptionWebhookHandler:
             # ✅ ИСПОЛЬЗУЕМ ЛОКАЛИЗОВАННОЕ СООБЩЕНИЕ
             message = t("webhook_payment_failed", lang)
             
-            # Отправляем сообщение через бота
-            await self.bot.send_message(user_id, message)
+            # Отправляем сообщение через очередь исходящих
+            await send_message(self.bot, user_id, message, priority=PRIORITY_NOTIFICATION)
             
         except Exception as e:
             logger.error(f"Payment failure notification failed: {e}")
 
 # Функция для создания веб-приложения
-def create_webhook_app(bot):
-    """Создает веб-приложение для обработки webhook"""
+def create_webhook_app(bot, telegram_ingress=None, stripe_enabled=True):
+    """
+    Создает веб-приложение для обработки webhook
+
+    telegram_ingress - прием обновлений Telegram (см. telegram_webhook.py)
+    монтируется на этот же сервер.
+    """
     
-    handler = SubscriptionWebhookHandler(bot)
     app = web.Application()
     
     # Добавляем маршрут для webhook
-    app.router.add_post('/webhook/stripe', handler.handle_subscription_webhook)
+    if stripe_enabled:
+        handler = SubscriptionWebhookHandler(bot)
+        app.router.add_post('/webhook/stripe', handler.handle_subscription_webhook)
+
+    if telegram_ingress is not None:
+        telegram_ingress.setup_routes(app)
     
     # Добавляем health check
     async def health_check(request):
@@ -401,14 +415,23 @@ def create_webhook_app(bot):
         })
     
     app.router.add_get('/health', health_check)
+
+    # Метрики Prometheus (см. metrics.py)
+    async def metrics_endpoint(request):
+        if not is_metrics_authorized(request.headers.get("Authorization")):
+            return web.Response(status=401)
+        return web.Response(body=render_metrics().encode("utf-8"),
+                            headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+    app.router.add_get('/metrics', metrics_endpoint)
     
     return app
 
 # Функция для запуска webhook сервера
-async def start_webhook_server(bot, host='0.0.0.0', port=8080):
+async def start_webhook_server(bot, host='0.0.0.0', port=8080, telegram_ingress=None, stripe_enabled=True):
     """Запускает webhook сервер"""
     
-    app = create_webhook_app(bot)
+    app = create_webhook_app(bot, telegram_ingress=telegram_ingress, stripe_enabled=stripe_enabled)
     
     runner = web.AppRunner(app)
     await runner.setup()